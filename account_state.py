@@ -0,0 +1,214 @@
+# account_state.py
+# ---------------------------------------------------------------------------
+# In-memory mirror of open positions and pending orders.
+#
+# One full reconcile seeds the mirror. After that it is kept current by:
+#
+#   - execution events: state.apply({"kind": "position", "id": 123, "data": {...}})
+#     (data=None removes the item; {"kind": "resync"} forces a reseed).
+#     The cTrader client pushes these from ProtoOAExecutionEvent.
+#   - a change token: a cheap broker call whose value moves whenever positions
+#     or orders do (MT5: position/order/deal counts plus a checksum of each
+#     item's SL/TP, price and volume). AccountSyncWorker polls
+#     it every second and reseeds when it changes. MT5 has no event push.
+#   - drift checks: every `drift_interval` seconds a full reconcile is
+#     compared with the mirror. Differences are logged, counted and fixed.
+#
+# Token polls and drift checks are background work and queue as WARMUP; a
+# reseed keeps its POSITIONS class, since requests may be waiting on it.
+#
+# Reads return copies of one consistent snapshot and cost no broker call
+# unless the mirror is stale (never seeded, after a reconnect, after our own
+# writes).
+
+import threading
+import time
+
+from metrics import counter, span
+from scheduler import WARMUP, prioritized
+
+DRIFTS = counter(
+    "smc_account_state_drift_total",
+    "Items the account-state mirror had wrong when a drift check reconciled it.",
+    ("kind", "change"),
+)
+
+
+class AccountState:
+    """
+    Args:
+        fetch_positions: () → [position dict with "position_id"]
+        fetch_orders: () → {"orders": [order dict with "order_id"]}
+    """
+
+    def __init__(self, fetch_positions, fetch_orders):
+        self.fetch_positions = fetch_positions
+        self.fetch_orders = fetch_orders
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._items = {"position": {}, "order": {}}
+        self._stale = True
+        self._events = 0            # bumped by apply(); a reseed that raced an event is discarded
+        self.version = 0
+        self.synced_at = None
+        self.counters = {"seeds": 0, "events": 0, "drift_checks": 0, "drifted": 0}
+
+    # ── seeding ─────────────────────────────────────────────────────────────
+    def _fetch(self) -> dict:
+        with span("account_state.reconcile"):
+            positions = self.fetch_positions()
+            orders = self.fetch_orders().get("orders", [])
+        return {
+            "position": {p["position_id"]: dict(p) for p in positions},
+            "order": {o["order_id"]: dict(o) for o in orders},
+        }
+
+    def seed(self, only_if_stale: bool = False):
+        """Replace the mirror with a full reconcile."""
+        with self._seed_lock:
+            if only_if_stale and not self._stale:
+                return                  # another thread reseeded while we waited
+            events = self._events
+            items = self._fetch()
+            with self._lock:
+                self._install(items, stale=self._events != events)
+            self.counters["seeds"] += 1
+
+    def _install(self, items: dict, stale: bool):
+        self._items = items
+        self._stale = stale
+        self.version += 1
+        self.synced_at = time.time()
+
+    @property
+    def stale(self) -> bool:
+        return self._stale
+
+    def mark_stale(self):
+        """Reseed on the next read (e.g. after an order placed through this process)."""
+        self._stale = True
+
+    def _ensure(self):
+        if self._stale:
+            self.seed(only_if_stale=True)
+
+    # ── events ──────────────────────────────────────────────────────────────
+    def apply(self, event: dict):
+        """Apply one execution event (see module comment)."""
+        kind = event.get("kind")
+        if kind == "resync":
+            self.mark_stale()
+            return
+        with self._lock:
+            items = self._items.get(kind)
+            if items is None:
+                return
+            self._events += 1
+            self.counters["events"] += 1
+            if event.get("data") is None:
+                items.pop(event["id"], None)
+            else:
+                items[event["id"]] = dict(event["data"])
+            self.version += 1
+
+    # ── reads ───────────────────────────────────────────────────────────────
+    def snapshot(self) -> dict:
+        self._ensure()
+        with self._lock:
+            return {
+                "positions": [dict(p) for p in self._items["position"].values()],
+                "orders": [dict(o) for o in self._items["order"].values()],
+                "version": self.version,
+                "synced_at": self.synced_at,
+            }
+
+    def positions(self) -> list:
+        return self.snapshot()["positions"]
+
+    def pending_orders(self) -> dict:
+        return {"orders": self.snapshot()["orders"]}
+
+    # ── drift ───────────────────────────────────────────────────────────────
+    def check_drift(self) -> dict:
+        """Reconcile against the broker; returns {kind: {"added", "removed", "changed"}} of what was wrong."""
+        with self._seed_lock:
+            events = self._events
+            fresh = self._fetch()
+            with self._lock:
+                report = {}
+                for kind, items in fresh.items():
+                    mine = self._items[kind]
+                    diff = {
+                        "added": sorted(set(items) - set(mine), key=str),
+                        "removed": sorted(set(mine) - set(items), key=str),
+                        "changed": sorted((k for k in items.keys() & mine.keys() if items[k] != mine[k]), key=str),
+                    }
+                    for change, ids in diff.items():
+                        if ids:
+                            DRIFTS.inc(len(ids), kind=kind, change=change)
+                    report[kind] = diff
+                drifted = any(ids for diff in report.values() for ids in diff.values())
+                self._install(fresh, stale=self._events != events)
+            self.counters["drift_checks"] += 1
+            if drifted:
+                self.counters["drifted"] += 1
+                print(f"[INFO] Account state drift corrected: {report}")
+        return report
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters,
+                positions=len(self._items["position"]),
+                orders=len(self._items["order"]),
+                version=self.version,
+                stale=self._stale,
+                age_seconds=round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            )
+
+
+class AccountSyncWorker(threading.Thread):
+    """
+    Keep an AccountState current in the background.
+
+    Args:
+        state: AccountState to maintain
+        change_token: Optional cheap () → hashable that changes when positions/orders do
+        poll_interval: Seconds between change-token polls
+        drift_interval: Seconds between full drift checks (0 = never)
+    """
+
+    def __init__(self, state: AccountState, change_token=None, poll_interval: float = 1.0,
+                 drift_interval: float = 60.0):
+        super().__init__(name="account-sync-worker", daemon=True)
+        self.state = state
+        self.change_token = change_token
+        self.poll_interval = poll_interval
+        self.drift_interval = drift_interval
+        self._stop_event = threading.Event()
+        self._token = None
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def run(self):
+        next_drift = time.time() + self.drift_interval
+        while not self._stop_event.is_set():
+            try:
+                if self.change_token is not None:
+                    with prioritized(WARMUP):
+                        token = self.change_token()
+                    if token != self._token:
+                        if self._token is not None:
+                            self.state.mark_stale()
+                        self._token = token
+                if self.drift_interval and time.time() >= next_drift:
+                    with prioritized(WARMUP):
+                        self.state.check_drift()
+                    next_drift = time.time() + self.drift_interval
+                elif self.state.stale:
+                    self.state.seed(only_if_stale=True)
+            except Exception as e:
+                print(f"[ERROR] Account state sync: {e}")
+            self._stop_event.wait(self.poll_interval)
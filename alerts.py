@@ -0,0 +1,619 @@
+# alerts.py
+# ---------------------------------------------------------------------------
+# Watchlist alert rules evaluated on every bar close.
+#
+#   engine = AlertEngine(fetch_candles, level_engine, store=AlertStore("alerts.db"))
+#   engine.add({"symbol": "GBPUSD", "tf": "M15",
+#               "condition": {"type": "sweep", "level": "London High"}})
+#   engine.start()
+#
+# Conditions (all fire on the closed bar that makes them true, not while
+# they stay true):
+#
+#   sweep       {"level": "PDH" | "PDL" | "<Session> High" | "<Session> Low"}
+#               the bar trades through the level; the bar before did not
+#   zone_entry  {"zone": "macro_ob" | "minor_ob" | "fvg"}
+#               the bar's range enters the zone detect_order_block / detect_fvg report
+#   choch       {"label": "macro" | "minor" | null}   the bar is a new CHOCH
+#   engulfing   {"direction": "bullish" | "bearish" | null}
+#   price       {"op": "above" | "below", "value": 1.2345}   close crosses the value
+#
+# Rules are grouped into a plan per (symbol, timeframe). On a bar close the
+# plan computes each analysis feature its rules need once (levels, order
+# blocks, FVG, CHOCH, engulfing), evaluates each distinct condition once and
+# fans the result out to every rule that shares it. Per-bar cost is therefore
+# bounded by the number of distinct conditions, not by the number of rules.
+#
+# Bar closes are found without polling /analyze: each (symbol, timeframe) is
+# fetched right after its next bar boundary (hourly at most for H4/D1, whose
+# boundaries depend on the broker's day offset), and retried for a few
+# seconds until the new bar shows up. Every bar that closed since the last
+# check is evaluated in order (as far back as the fetched window reaches), so
+# a slow fetch or a missed boundary does not skip bars. Fired alerts go to
+# subscribers (SSE) and to the rule's webhook (http/https only, redirects
+# not followed), if it has one, on a separate delivery thread.
+#
+# Several uvicorn workers can share one AlertStore: a file lock elects the
+# worker that evaluates and delivers (another takes over if it exits), rules
+# added on any worker reach it through SQLite, and fired alerts are recorded
+# there so SSE subscribers of every worker see each alert once.
+
+import asyncio
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:                     # no flock: every engine owns itself
+    fcntl = None
+
+from analysis import (
+    detect_bullish_or_bearish_engulfing,
+    detect_choch,
+    detect_fvg,
+    detect_order_block,
+)
+from levels import SESSIONS, session_of
+from metrics import counter, histogram
+import resample
+
+CONDITIONS = ("sweep", "zone_entry", "choch", "engulfing", "price")
+FEATURES = {
+    "sweep": "levels",
+    "zone_entry": None,                 # depends on the zone (order_block or fvg)
+    "choch": "choch",
+    "engulfing": "engulfing",
+    "price": None,
+}
+SESSION_NAMES = tuple(name for name, _, _ in SESSIONS)
+
+ALERT_EVAL = histogram(
+    "smc_alert_eval_seconds",
+    "Time to evaluate every alert rule of one symbol/timeframe on a bar close.",
+    ("tf",),
+)
+ALERTS_FIRED = counter(
+    "smc_alerts_fired_total",
+    "Alerts fired, by condition type.",
+    ("condition",),
+)
+WEBHOOKS = counter(
+    "smc_alert_webhooks_total",
+    "Alert webhook deliveries by outcome.",
+    ("outcome",),
+)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None                     # a 3xx is reported as an error, never followed
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def _epoch(candle: dict) -> int:
+    ts = datetime.fromisoformat(candle["time"].replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+def parse_rule(rule: dict) -> dict:
+    """Validate and normalise a rule dict; raises ValueError."""
+    symbol = str(rule.get("symbol", "")).strip().upper()
+    tf = str(rule.get("tf", "")).strip().upper()
+    if not symbol:
+        raise ValueError("symbol is required")
+    resample.parse_timeframe(tf)
+    condition = dict(rule.get("condition") or {})
+    kind = condition.get("type")
+    if kind not in CONDITIONS:
+        raise ValueError(f"condition.type must be one of {', '.join(CONDITIONS)}")
+    if kind == "sweep":
+        level = condition.get("level", "")
+        valid = {"PDH", "PDL"} | {f"{s} {side}" for s in SESSION_NAMES for side in ("High", "Low")}
+        if level not in valid:
+            raise ValueError(f"sweep level must be one of {', '.join(sorted(valid))}")
+    elif kind == "zone_entry":
+        if condition.get("zone") not in ("macro_ob", "minor_ob", "fvg"):
+            raise ValueError("zone_entry zone must be macro_ob, minor_ob or fvg")
+    elif kind == "choch":
+        if condition.get("label") not in (None, "macro", "minor"):
+            raise ValueError("choch label must be macro, minor or null")
+    elif kind == "engulfing":
+        if condition.get("direction") not in (None, "bullish", "bearish"):
+            raise ValueError("engulfing direction must be bullish, bearish or null")
+    elif kind == "price":
+        if condition.get("op") not in ("above", "below"):
+            raise ValueError("price op must be above or below")
+        condition["value"] = float(condition["value"])
+    webhook = rule.get("webhook") or None
+    if webhook is not None:
+        url = urlparse(str(webhook))
+        if url.scheme not in ("http", "https") or not url.netloc:
+            raise ValueError("webhook must be an http:// or https:// URL")
+    return {
+        "id": rule.get("id"),
+        "symbol": symbol,
+        "tf": tf,
+        "condition": condition,
+        "webhook": webhook,
+        "once": bool(rule.get("once", False)),
+        "note": rule.get("note") or "",
+    }
+
+
+def _signature(condition: dict) -> tuple:
+    return tuple(sorted((k, json.dumps(v)) for k, v in condition.items()))
+
+
+def _feature(condition: dict):
+    if condition["type"] == "zone_entry":
+        return "fvg" if condition["zone"] == "fvg" else "order_block"
+    return FEATURES[condition["type"]]
+
+
+# ── conditions ─────────────────────────────────────────────────────────────
+def _session_level(levels: dict, name: str, side: str, bar_session: str):
+    """Today's range of a finished session, else the previous day's."""
+    today = levels.get("sessions", {}).get(name)
+    if today and name != bar_session:
+        return today[side]
+    previous = levels.get("previous_day_sessions", {}).get(name)
+    return previous[side] if previous else None
+
+
+def evaluate(condition: dict, bar: dict, prev: dict, features: dict):
+    """(fired, detail) for one condition on the closed `bar` (prev = the bar before)."""
+    kind = condition["type"]
+    if kind == "sweep":
+        levels = features["levels"]
+        level = condition["level"]
+        if level in ("PDH", "PDL"):
+            pd = levels.get("previous_day")
+            value = pd and pd["high" if level == "PDH" else "low"]
+        else:
+            name, side = level.rsplit(" ", 1)
+            hour = datetime.fromtimestamp(_epoch(bar), timezone.utc).hour
+            value = _session_level(levels, name, side.lower(), session_of(hour))
+        if value is None:
+            return False, None
+        if level == "PDH" or level.endswith("High"):
+            fired = bar["high"] > value and prev["high"] <= value
+        else:
+            fired = bar["low"] < value and prev["low"] >= value
+        return fired, {"level": value}
+
+    if kind == "zone_entry":
+        if condition["zone"] == "fvg":
+            zone = features["fvg"]
+        else:
+            ob = features["order_block"] or {}
+            zone = ob.get("macro" if condition["zone"] == "macro_ob" else "minor")
+        if not zone:
+            return False, None
+        inside = bar["low"] <= zone["high"] and bar["high"] >= zone["low"]
+        was_inside = prev["low"] <= zone["high"] and prev["high"] >= zone["low"]
+        return inside and not was_inside, {"zone": zone}
+
+    if kind == "choch":
+        chochs = features["choch"] or {}
+        labels = [condition["label"]] if condition.get("label") else ["macro", "minor"]
+        for label in labels:
+            choch = chochs.get(label)
+            if choch and choch["time"] == bar["time"]:
+                return True, {"choch": choch}
+        return False, None
+
+    if kind == "engulfing":
+        pattern = features["engulfing"]
+        wanted = condition.get("direction")
+        fired = pattern is not None and (wanted is None or pattern.lower().startswith(wanted))
+        return fired, {"pattern": pattern}
+
+    if kind == "price":
+        value = condition["value"]
+        if condition["op"] == "above":
+            return bar["close"] > value >= prev["close"], None
+        return bar["close"] < value <= prev["close"], None
+    return False, None
+
+
+# ── plan per symbol/timeframe ──────────────────────────────────────────────
+class _Plan:
+    def __init__(self, symbol: str, tf: str):
+        self.symbol = symbol
+        self.tf = tf
+        self.seconds = resample.parse_timeframe(tf)
+        self.groups = {}                # {condition signature: (condition, {rule id: rule})}
+        self.last_closed = None         # epoch of the last closed bar evaluated
+        self.next_check = 0.0
+        self.boundary = 0.0
+
+    def features(self) -> set:
+        return {f for condition, _ in self.groups.values() if (f := _feature(condition))}
+
+
+class AlertStore:
+    """Rules and fired alerts in SQLite: they survive restarts and are shared by every worker."""
+
+    def __init__(self, path: str = "alerts.db", keep_events: int = 10_000):
+        self.path = path
+        self.keep_events = keep_events
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS alert_rules (id INTEGER PRIMARY KEY, rule TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS alert_events (id INTEGER PRIMARY KEY, event TEXT NOT NULL)")
+
+    def load(self) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, rule FROM alert_rules ORDER BY id").fetchall()
+        return [dict(json.loads(rule), id=rid) for rid, rule in rows]
+
+    def insert(self, rule: dict) -> int:
+        """Store a new rule; SQLite assigns the id, so workers never collide."""
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO alert_rules (rule) VALUES (?)",
+                                     (json.dumps({k: v for k, v in rule.items() if k != "id"}),))
+            return cur.lastrowid
+
+    def delete(self, rule_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,)).rowcount > 0
+
+    def version(self) -> int:
+        """Changes whenever another connection (worker) has written to the database."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def record(self, event: dict) -> int:
+        with self._lock:
+            event_id = self._conn.execute("INSERT INTO alert_events (event) VALUES (?)",
+                                          (json.dumps(event, default=str),)).lastrowid
+            if event_id % 1000 == 0:
+                self._conn.execute("DELETE FROM alert_events WHERE id <= ?", (event_id - self.keep_events,))
+            return event_id
+
+    def events_after(self, event_id: int, limit: int = 1000) -> list:
+        """[(id, event)] recorded after `event_id`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, event FROM alert_events WHERE id > ? ORDER BY id LIMIT ?",
+                                      (event_id, limit)).fetchall()
+        return [(rid, json.loads(event)) for rid, event in rows]
+
+    def last_event_id(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM alert_events").fetchone()[0]
+
+
+class AlertEngine(threading.Thread):
+    """
+    Args:
+        fetch_candles: (symbol, tf, n) → candle dicts, oldest first, last one still forming
+        level_engine: levels.LevelEngine fed with every fetched bar (PDH/PDL, sessions)
+        store: Optional AlertStore for persistence and for sharing rules/alerts between workers
+        owner_lock: Lock file electing the one engine (worker) that evaluates and delivers;
+            None = this engine always does
+        bars: Candles fetched per evaluation (detectors look back up to 200); also how far
+            back missed bar closes are caught up
+        fetch_threads: Concurrent fetches when several plans are due together
+        retry_seconds: How long after a boundary to keep looking for the new bar
+        webhook_timeout: Seconds per webhook POST
+    """
+
+    def __init__(self, fetch_candles, level_engine, store: AlertStore = None, owner_lock: str = None,
+                 bars: int = 300, fetch_threads: int = 4, retry_seconds: float = 10.0,
+                 webhook_timeout: float = 5.0):
+        super().__init__(name="alert-engine", daemon=True)
+        self.fetch_candles = fetch_candles
+        self.level_engine = level_engine
+        self.store = store
+        self.owner_lock = owner_lock
+        self.owner = False
+        self._owner_file = None
+        self.bars = bars
+        self.retry_seconds = retry_seconds
+        self.webhook_timeout = webhook_timeout
+        self._plans = {}                # {(SYMBOL, TF): _Plan}
+        self._rules = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=fetch_threads, thread_name_prefix="alert-fetch")
+        self._webhooks = queue.Queue(maxsize=10_000)
+        self._subscribers = set()       # (loop, asyncio.Queue)
+        self.history = deque(maxlen=500)
+        self._ids = itertools.count(1)
+        self.counters = {"evaluations": 0, "fired": 0, "fetch_errors": 0, "caught_up": 0}
+        self._store_version = None
+        self._last_event = 0
+        if store is not None:
+            self._sync_rules()
+            self._last_event = store.last_event_id()
+            self.history.extend(event for _, event in store.events_after(max(0, self._last_event - 500), 500))
+
+    # ── rules ───────────────────────────────────────────────────────────────
+    def _install(self, rule: dict):
+        self._rules[rule["id"]] = rule
+        key = (rule["symbol"], rule["tf"])
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = _Plan(*key)
+        sig = _signature(rule["condition"])
+        plan.groups.setdefault(sig, (rule["condition"], {}))[1][rule["id"]] = rule
+
+    def _uninstall(self, rule_id: int):
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return None
+        key = (rule["symbol"], rule["tf"])
+        plan = self._plans[key]
+        sig = _signature(rule["condition"])
+        plan.groups[sig][1].pop(rule_id, None)
+        if not plan.groups[sig][1]:
+            del plan.groups[sig]
+        if not plan.groups:
+            del self._plans[key]
+        return rule
+
+    def _sync_rules(self):
+        """Pick up rules other workers added to or removed from the shared store."""
+        version = self.store.version()
+        if version == self._store_version:
+            return
+        self._store_version = version
+        stored = {r["id"]: r for r in self.store.load()}
+        with self._lock:
+            for rule_id in set(self._rules) - set(stored):
+                self._uninstall(rule_id)
+            for rule_id, rule in stored.items():
+                if rule_id in self._rules:
+                    continue
+                try:
+                    self._install(dict(parse_rule(rule), id=rule_id))
+                except ValueError as e:
+                    print(f"[ERROR] Alerts: stored rule {rule_id} skipped: {e}")
+
+    def add(self, rule: dict) -> dict:
+        rule = parse_rule(rule)
+        with self._lock:
+            rule["id"] = self.store.insert(rule) if self.store is not None else next(self._ids)
+            self._install(rule)
+        self._wake.set()
+        return rule
+
+    def remove(self, rule_id: int) -> bool:
+        with self._lock:
+            removed = self._uninstall(rule_id) is not None
+        if self.store is not None:
+            removed = self.store.delete(rule_id) or removed   # possibly added on another worker
+        return removed
+
+    def rules(self) -> list:
+        if self.store is not None:
+            self._sync_rules()
+        with self._lock:
+            return [dict(r) for r in self._rules.values()]
+
+    # ── subscribers (SSE) ───────────────────────────────────────────────────
+    def subscribe(self, maxsize: int = 1000) -> asyncio.Queue:
+        """Queue on the calling event loop that receives every fired alert."""
+        q = asyncio.Queue(maxsize=maxsize)
+        self._subscribers.add((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._subscribers = {(loop, s) for loop, s in self._subscribers if s is not q}
+
+    @staticmethod
+    def _offer(q: asyncio.Queue, event: dict):
+        if q.full():
+            q.get_nowait()          # slow consumer: drop its oldest alert
+        q.put_nowait(event)
+
+    # ── loop ────────────────────────────────────────────────────────────────
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._wake.set()
+        self.join(timeout)
+        self._pool.shutdown(wait=False)
+
+    def _try_own(self) -> bool:
+        """Take the owner lock if no other worker holds it."""
+        if self.owner:
+            return True
+        if self.owner_lock is None or fcntl is None:
+            self.owner = True
+            return True
+        f = open(self.owner_lock, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.truncate(0)
+        f.write(str(os.getpid()))
+        f.flush()
+        self._owner_file = f            # held (and the lock with it) for the life of the process
+        self.owner = True
+        return True
+
+    def _follow(self):
+        """Non-owner: relay the alerts the owner recorded to this worker's subscribers."""
+        for event_id, event in self.store.events_after(self._last_event):
+            self._last_event = event_id
+            self._publish(event)
+
+    def run(self):
+        while not self._stop_event.is_set() and not self._try_own():
+            if self.store is not None:
+                self._sync_rules()
+                self._follow()
+            self._stop_event.wait(1.0)
+        if self._stop_event.is_set():
+            return
+        threading.Thread(target=self._deliver, name="alert-webhooks", daemon=True).start()
+        while not self._stop_event.is_set():
+            if self.store is not None:
+                self._sync_rules()
+            now = time.time()
+            with self._lock:
+                plans = list(self._plans.values())
+            for plan in plans:
+                if not plan.next_check:
+                    self._schedule(plan, now, first=True)
+            due = [p for p in plans if p.next_check <= now]
+            if due:
+                list(self._pool.map(self._check, due))
+            with self._lock:
+                waits = [p.next_check for p in self._plans.values() if p.next_check]
+            timeout = max(0.05, min(waits) - time.time()) if waits else None
+            if self.store is not None:
+                timeout = 1.0 if timeout is None else min(timeout, 1.0)   # rules from other workers
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _schedule(self, plan: _Plan, now: float, first: bool = False):
+        if first:
+            plan.boundary, plan.next_check = now, now      # prime the plan right away
+            return
+        period = min(plan.seconds, 3600)    # whole-hour broker offsets keep hourly boundaries
+        plan.boundary = (now // period + 1) * period
+        plan.next_check = plan.boundary + 0.5
+
+    def _check(self, plan: _Plan):
+        now = time.time()
+        try:
+            candles = self.fetch_candles(plan.symbol, plan.tf, self.bars)
+        except Exception as e:
+            self.counters["fetch_errors"] += 1
+            print(f"[ERROR] Alerts: fetch {plan.symbol} {plan.tf}: {e}")
+            self._schedule(plan, now)
+            return
+        closed = candles[:-1]
+        latest = _epoch(closed[-1]) if len(closed) >= 2 else None
+        if latest is not None and plan.last_closed is None:
+            # the first fetch only establishes where we are; alerts fire on closes from now on
+            plan.last_closed = latest
+            self._evaluate(plan, closed, fire=False)
+            self._schedule(plan, now)
+        elif latest is not None and latest > plan.last_closed:
+            # every bar that closed since the last check, oldest first
+            first = len(closed) - 1
+            while first > 1 and _epoch(closed[first - 1]) > plan.last_closed:
+                first -= 1
+            new = range(first, len(closed))
+            self.counters["caught_up"] += len(new) - 1
+            plan.last_closed = latest
+            for i in new:
+                self._evaluate(plan, closed[:i + 1])
+            self._schedule(plan, now)
+        elif now - plan.boundary < self.retry_seconds:
+            plan.next_check = now + 1.0     # the broker has not published the new bar yet
+        else:
+            self._schedule(plan, now)
+
+    def _evaluate(self, plan: _Plan, closed: list, fire: bool = True):
+        started = time.perf_counter()
+        with self._lock:
+            groups = list(plan.groups.values())
+            needed = plan.features()
+        features = {}
+        if "levels" in needed:
+            self.level_engine.update(plan.symbol, closed, plan.tf, closed=True)
+            features["levels"] = self.level_engine.snapshot(plan.symbol)
+        # zones must exist before the bar that enters them
+        if "order_block" in needed:
+            features["order_block"] = detect_order_block(closed[:-1])
+        if "fvg" in needed:
+            features["fvg"] = detect_fvg(closed[:-1])
+        if "choch" in needed:
+            features["choch"] = detect_choch(closed)
+        if "engulfing" in needed:
+            features["engulfing"] = detect_bullish_or_bearish_engulfing(closed)
+
+        bar, prev = closed[-1], closed[-2]
+        fired = []
+        for condition, rules in groups:
+            try:
+                hit, detail = evaluate(condition, bar, prev, features)
+            except Exception as e:
+                print(f"[ERROR] Alerts: {plan.symbol} {plan.tf} {condition}: {e}")
+                continue
+            if hit and fire:
+                fired.extend((rule, condition, detail) for rule in list(rules.values()))
+        self.counters["evaluations"] += 1
+        ALERT_EVAL.observe(time.perf_counter() - started, tf=plan.tf)
+
+        for rule, condition, detail in fired:
+            self._fire(rule, condition, detail, bar)
+
+    def _fire(self, rule: dict, condition: dict, detail, bar: dict):
+        event = {
+            "rule_id": rule["id"],
+            "symbol": rule["symbol"],
+            "tf": rule["tf"],
+            "condition": condition,
+            "note": rule["note"],
+            "bar_time": bar["time"],
+            "close": bar["close"],
+            "detail": detail,
+            "fired_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.counters["fired"] += 1
+        ALERTS_FIRED.inc(condition=condition["type"])
+        if self.store is not None:
+            self._last_event = self.store.record(event)
+        self._publish(event)
+        if rule["webhook"]:
+            try:
+                self._webhooks.put_nowait((rule["webhook"], event))
+            except queue.Full:
+                WEBHOOKS.inc(outcome="dropped")
+        if rule["once"]:
+            self.remove(rule["id"])
+
+    def _publish(self, event: dict):
+        self.history.append(event)
+        for loop, q in list(self._subscribers):
+            try:
+                loop.call_soon_threadsafe(self._offer, q, event)
+            except RuntimeError:            # the subscriber's loop is gone
+                self._subscribers.discard((loop, q))
+
+    def _deliver(self):
+        while not self._stop_event.is_set():
+            try:
+                url, event = self._webhooks.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            request = urllib.request.Request(
+                url, data=json.dumps(event, default=str).encode(),
+                headers={"Content-Type": "application/json"}, method="POST",
+            )
+            try:
+                _opener.open(request, timeout=self.webhook_timeout).close()
+                WEBHOOKS.inc(outcome="ok")
+            except Exception as e:
+                WEBHOOKS.inc(outcome="error")
+                print(f"[ERROR] Alert webhook {url}: {e}")
+
+    def status(self) -> dict:
+        with self._lock:
+            plans = list(self._plans.values())
+            conditions = sum(len(p.groups) for p in plans)
+            rules = len(self._rules)
+        return dict(self.counters, owner=self.owner, rules=rules, conditions=conditions, plans=len(plans),
+                    subscribers=len(self._subscribers), webhook_backlog=self._webhooks.qsize())
@@ -1,23 +1,33 @@
 # analysis.py
 
+from contextlib import nullcontext
+from datetime import datetime
+from functools import lru_cache
 from typing import Optional, List, Dict, Tuple
 
-def tag_sessions_local(candles):
-    from datetime import datetime
-
-    def label_session(utc_iso_time: str) -> str:
-        dt = datetime.fromisoformat(utc_iso_time.replace("Z", "+00:00"))
-        hour = dt.hour
-        if 0 <= hour < 7:
-            return "Asia"
-        elif 7 <= hour < 12:
-            return "London"
-        elif 12 <= hour < 17:
-            return "NewYork"
-        elif 17 <= hour < 24:
-            return "PostNY"
-        return "Unknown"
+from trend import ols_trend
+
+# Timeframes /analyze reads and how many bars of each (the newest one is the forming bar)
+ANALYZE_DEPTHS = {"D1": 60, "H4": 1200, "H1": 1200, "M15": 500, "M5": 300}
+
 
+@lru_cache(maxsize=65536)
+def label_session(utc_iso_time: str) -> str:
+    # cached: the same bar times come back on every /analyze call and replay step
+    dt = datetime.fromisoformat(utc_iso_time.replace("Z", "+00:00"))
+    hour = dt.hour
+    if 0 <= hour < 7:
+        return "Asia"
+    elif 7 <= hour < 12:
+        return "London"
+    elif 12 <= hour < 17:
+        return "NewYork"
+    elif 17 <= hour < 24:
+        return "PostNY"
+    return "Unknown"
+
+
+def tag_sessions_local(candles):
     return [
         {**c, "session": label_session(c["time"])}
         for c in candles
@@ -157,7 +167,7 @@ def detect_sweep(candles: list, pdh: float, pdl: float, session_levels: dict = N
                 if levels["low"] and c["low"] < levels["low"]:
                     sweeps.append(f"{session} Low sweep")
 
-    return {"sweeps": list(set(sweeps))}  # ✅ Now returns a dict
+    return {"sweeps": list(dict.fromkeys(sweeps))}  # ✅ Now returns a dict (deduplicated, first-seen order)
 
 
 def detect_bullish_or_bearish_engulfing(candles: list) -> Optional[str]:
@@ -190,8 +200,12 @@ def detect_bullish_or_bearish_engulfing(candles: list) -> Optional[str]:
 
 
 def detect_trend_bias(candles: list) -> str:
-    # Example dummy logic
-    if candles[-1]['close'] > candles[0]['close']:
+    """
+    HTF bias from the OLS slope of closes over the whole series
+    (see trend.ols_trend), rather than the first/last close alone.
+    """
+    slope, _ = ols_trend([c["close"] for c in candles])
+    if slope > 0:
         return "bullish"
     return "bearish"
 
@@ -243,3 +257,92 @@ def detect_choch(candles: list, macro_threshold: int = 100) -> Optional[dict]:
     return None
 
 
+def _untimed(stage: str, tf: str = ""):
+    return nullcontext()
+
+
+def analyze_candles(candles: dict, pdh: float, pdl: float, span=_untimed) -> dict:
+    """
+    The /analyze pipeline on already fetched candles.
+
+    Args:
+        candles: {tf: candle dicts} for every timeframe in ANALYZE_DEPTHS
+        pdh: Previous day high
+        pdl: Previous day low
+        span: Context manager factory (stage, tf) wrapped around each detector,
+            e.g. metrics.span; no timing by default
+
+    Returns:
+        Dict with the AnalyzeResponse fields (HTF_Bias, MTF_Zones, LTF_Entry,
+        Previous_Day_High/Low, Session_Levels, Checklist, News)
+    """
+    with span("analysis.tag_sessions", tf="M15"):
+        tagged_m15 = tag_sessions_local(candles["M15"])
+        session_levels = compute_session_levels(tagged_m15)
+
+    # High Timeframe Bias
+    with span("analysis.detect_trend_bias", tf="D1"):
+        htf_bias = detect_trend_bias(candles["D1"])
+
+    # Detect macro + minor OB for H4 & H1
+    with span("analysis.detect_order_block", tf="H4"):
+        h4_ob_data = detect_order_block(candles["H4"], lookback=200, macro_threshold=100)
+    with span("analysis.detect_order_block", tf="H1"):
+        h1_ob_data = detect_order_block(candles["H1"], lookback=200, macro_threshold=100)
+    with span("analysis.detect_fvg", tf="H4"):
+        h4_fvg = detect_fvg(candles["H4"])
+    with span("analysis.detect_fvg", tf="H1"):
+        h1_fvg = detect_fvg(candles["H1"])
+
+    mtf_zones = {
+        "H4_Macro_OB": h4_ob_data.get("macro") if h4_ob_data else None,
+        "H4_Minor_OB": h4_ob_data.get("minor") if h4_ob_data else None,
+        "H1_Macro_OB": h1_ob_data.get("macro") if h1_ob_data else None,
+        "H1_Minor_OB": h1_ob_data.get("minor") if h1_ob_data else None,
+        "H4_FVG": h4_fvg,
+        "H1_FVG": h1_fvg,
+    }
+
+    # LTF entry detection
+    with span("analysis.detect_ltf_entry", tf="M5"):
+        ltf_entry = detect_ltf_entry(tagged_m15, candles["M5"], pdh, pdl, session_levels)
+
+    # Candle pattern detection
+    with span("analysis.detect_engulfing", tf="M5"):
+        raw_candle = detect_bullish_or_bearish_engulfing(candles["M5"])
+    candle_dict = {"type": raw_candle} if isinstance(raw_candle, str) else raw_candle
+
+    # Detect macro + minor OB & CHOCH for checklist
+    with span("analysis.detect_order_block", tf="M15"):
+        m15_ob_data = detect_order_block(candles["M15"], lookback=200, macro_threshold=100)
+    with span("analysis.detect_choch", tf="M5"):
+        m5_choch_data = detect_choch(candles["M5"], macro_threshold=100)
+    with span("analysis.detect_fvg", tf="M15"):
+        m15_fvg = detect_fvg(candles["M15"])
+    with span("analysis.detect_sweep", tf="M15"):
+        sweep = detect_sweep(tagged_m15, pdh, pdl, session_levels)
+
+    checklist = {
+        "CHOCH": {
+            "Macro": m5_choch_data.get("macro") if m5_choch_data else None,
+            "Minor": m5_choch_data.get("minor") if m5_choch_data else None,
+        },
+        "OB": {
+            "Macro": m15_ob_data.get("macro") if m15_ob_data else None,
+            "Minor": m15_ob_data.get("minor") if m15_ob_data else None,
+        },
+        "FVG": m15_fvg,
+        "Sweep": sweep,
+        "Candle": candle_dict,
+    }
+
+    return {
+        "HTF_Bias": htf_bias,
+        "MTF_Zones": mtf_zones,
+        "LTF_Entry": ltf_entry,
+        "Previous_Day_High": pdh,
+        "Previous_Day_Low": pdl,
+        "Session_Levels": session_levels,
+        "Checklist": checklist,
+        "News": "",  # Placeholder
+    }
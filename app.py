@@ -1,5 +1,5 @@
 # app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel          # ←  put this line back
 from typing import Optional, Literal
 from notion_client import Client as NotionClient
@@ -7,46 +7,92 @@ from notion_client import Client as NotionClient
 #     init_client,                       # still need this
 #     get_open_positions,
 #     get_ohlc_data,
+#     get_rates,
 #     place_order,
 #     wait_for_deferred,
 #     symbol_name_to_id,
 #     client,
 # )
 
-from mt5_client import (
-    get_open_positions,
-    get_ohlc_data,
-    place_order,
-    wait_for_deferred,
-    symbol_name_to_id,
-)
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 🛰️ With BROKER_GATEWAY_SOCKET set, every terminal call goes through broker_gateway.py
+# (one MT5 session shared by all workers) instead of a session per worker.
+BROKER_GATEWAY_SOCKET = os.getenv("BROKER_GATEWAY_SOCKET")
+if BROKER_GATEWAY_SOCKET:
+    from broker_gateway import (
+        get_open_positions,
+        get_ohlc_data,
+        get_pending_orders,
+        get_rates,
+        get_ticks,
+        get_connection_status,
+        get_change_token,
+        get_symbol_specs,
+        get_account_info,
+        place_order,
+        wait_for_deferred,
+        symbol_name_to_id,
+    )
+else:
+    from mt5_client import (
+        get_open_positions,
+        get_ohlc_data,
+        get_pending_orders,
+        get_rates,
+        get_ticks,
+        get_connection_status,
+        get_change_token,
+        get_symbol_specs,
+        get_account_info,
+        place_order,
+        wait_for_deferred,
+        symbol_name_to_id,
+    )
 
-from twisted.internet import reactor
 import threading
 # from ctrader_client import ACCOUNT_ID
 import time
-from typing import List, Literal
-from datetime import datetime
 from typing import List
-from fastapi import  APIRouter
+from datetime import datetime
 # from ctrader_client import is_forex_symbol
-import os
-from dotenv import load_dotenv
 from collections import defaultdict
-from analysis import (
-    detect_order_block,
-    detect_fvg,
-    detect_sweep,
-    detect_bullish_or_bearish_engulfing,
-    detect_trend_bias,
-    detect_ltf_entry,
-    detect_choch
-)
 from charts import generate_smc_chart
-from analysis import detect_choch
-from pydantic import BaseModel
-from analysis import tag_sessions_local, compute_session_levels  # Add this
-from fastapi.responses import Response
+from analysis import analyze_candles, ANALYZE_DEPTHS
+from fastapi.responses import Response, PlainTextResponse, StreamingResponse
+from metrics import (
+    span,
+    render_prometheus,
+    start_request_collection,
+    server_timing_header,
+    HTTP_DURATION,
+)
+from profiler import SamplingProfiler, ProfileStore
+from journal_queue import JournalQueue, NotionJournalWorker
+from journal_store import JournalStore
+from levels import LevelEngine
+import resample
+from shared_bars import SharedBars
+from singleflight import SingleFlight
+from account_state import AccountState, AccountSyncWorker
+from risk import RiskEngine
+from correlation import CorrelationBook, correlated_pairs, clusters
+from trend import TrendBook, rolling_trend
+from event_index import EventStore, KINDS as EVENT_KINDS, pip_size
+from zones import ZoneBook, ZoneTracker
+from alerts import AlertEngine, AlertStore
+from snapshots import SnapshotScheduler, SnapshotStore, forming_key, live_freshness
+from ticks import TickStore, TickIngestor
+from levels import session_of
+from starlette.concurrency import run_in_threadpool
+from scheduler import WARMUP, prioritized
+
+import asyncio
+import json
+import numpy as np
 
 
 
@@ -56,7 +102,32 @@ app = FastAPI()
 @app.on_event("startup")
 async def start_mt5():
     """Spin up the cTrader Open API client once per worker."""
-    pass
+    global journal_worker
+    if journal_queue is not None and journal_worker is None:
+        journal_worker = NotionJournalWorker(
+            journal_queue,
+            send=lambda payload: notion.pages.create(**payload),
+            rate_per_sec=NOTION_RATE_PER_SEC,
+        )
+        journal_worker.start()
+    if account_sync is not None and not account_sync.is_alive():
+        account_sync.start()
+    if alert_engine is not None and not alert_engine.is_alive():
+        alert_engine.start()
+    if tick_ingestor is not None and not tick_ingestor.is_alive():
+        tick_ingestor.start()
+    global snapshot_scheduler
+    if snapshot_store is not None and snapshot_scheduler is None:
+        snapshot_scheduler = SnapshotScheduler(
+            snapshot_store,
+            SNAPSHOT_WATCHLIST,
+            compute_snapshot,
+            sessions=SNAPSHOT_SESSIONS,
+            lead_seconds=SNAPSHOT_LEAD_MINUTES * 60,
+            trail_seconds=SNAPSHOT_TRAIL_MINUTES * 60,
+        )
+        if SNAPSHOT_WATCHLIST:       # without one, only POST /snapshots/refresh?symbols= computes
+            snapshot_scheduler.start()
     # if not reactor.running:                 # cheap guard
     #     threading.Thread(target=init_client, daemon=True).start()
 # 🔌 ─────────────────────────────────────────────────────────────
@@ -67,7 +138,368 @@ load_dotenv()  # ⬅️ This loads variables from .env file
 
 NOTION_SECRET = os.getenv("NOTION_SECRET")
 NOTION_DB_ID = os.getenv("NOTION_DB_ID")
-notion = NotionClient(auth=NOTION_SECRET)
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL")  # e.g. a local notion_standin.py
+notion = (
+    NotionClient(auth=NOTION_SECRET, base_url=NOTION_BASE_URL)
+    if NOTION_BASE_URL else NotionClient(auth=NOTION_SECRET)
+)
+
+# 📬 Journal writes go through a durable queue drained in the background
+NOTION_JOURNAL_ENABLED = os.getenv("NOTION_JOURNAL_ENABLED", "false").lower() == "true"
+NOTION_QUEUE_PATH = os.getenv("NOTION_QUEUE_PATH", "journal_queue.db")
+NOTION_RATE_PER_SEC = float(os.getenv("NOTION_RATE_PER_SEC", "2.5"))
+
+journal_queue = JournalQueue(NOTION_QUEUE_PATH) if NOTION_JOURNAL_ENABLED else None
+journal_worker = None
+
+# 📐 Rolling PDH/PDL, N-day, weekly/monthly and session levels, updated as bars arrive
+BROKER_DAY_OFFSET_HOURS = float(os.getenv("BROKER_DAY_OFFSET_HOURS", "0"))
+LEVEL_BAR_WINDOWS = [int(w) for w in os.getenv("LEVEL_BAR_WINDOWS", "20,50").split(",") if w.strip()]
+LEVEL_REFRESH_SECONDS = float(os.getenv("LEVEL_REFRESH_SECONDS", "5"))
+LEVEL_FEEDS = (("D1", 60), ("H1", 50), ("M15", 100))   # fed in this order: days before sessions
+level_engine = LevelEngine(day_offset_hours=BROKER_DAY_OFFSET_HOURS, bar_windows=LEVEL_BAR_WINDOWS)
+levels_fed_at = {}   # SYMBOL → wall time of its last level feed
+
+# 🧮 Resampling: non-native timeframes (M3, H2, H8...) and optional one-fetch /analyze
+NATIVE_TIMEFRAMES = {"M1", "M5", "M15", "M30", "H1", "H4", "D1"}
+ANALYZE_BASE_TF = os.getenv("ANALYZE_BASE_TF", "")          # e.g. "M5"; empty = one fetch per timeframe
+RESAMPLE_MAX_BASE_BARS = int(os.getenv("RESAMPLE_MAX_BASE_BARS", "100000"))
+
+
+async def fetch_resampled(symbol: str, depths: dict, base_tf: str) -> dict:
+    """
+    Fetch one base series and derive every timeframe in `depths` from it.
+
+    Returns {tf: get_ohlc_data-shaped result} with up to `depth` bars each.
+    """
+    base_seconds = resample.parse_timeframe(base_tf)
+    # calendar span → base bars, with headroom for weekends
+    needed = max(resample.parse_timeframe(tf) * n for tf, n in depths.items()) // base_seconds
+    count = min(int(needed * 7 / 5) + 86400 // base_seconds, RESAMPLE_MAX_BASE_BARS)
+
+    rates = await fetch_rates(symbol, base_tf, count)
+    results = {}
+    for tf, n in depths.items():
+        with span("resample", tf=tf.upper()):
+            bars = resample.resample(rates, tf, BROKER_DAY_OFFSET_HOURS)[-n:]
+            results[tf] = resample.ohlc_result(resample.to_candles(bars), tf)
+    return results
+
+# 🧵 Shared-memory bars filled by `python shared_bars.py`: one broker feed for all workers
+SHARED_BARS = os.getenv("SHARED_BARS", "false").lower() == "true"
+SHARED_BARS_MAX_AGE = float(os.getenv("SHARED_BARS_MAX_AGE", "10"))
+shared_bars = SharedBars(max_age=SHARED_BARS_MAX_AGE) if SHARED_BARS else None
+OHLC_MAX_BARS = 50  # get_ohlc_data returns at most this many bars
+# What the detectors see on either /analyze path, so ANALYZE_BASE_TF changes the fetch, not the analysis
+DETECTOR_DEPTHS = {tf: min(n, OHLC_MAX_BARS) for tf, n in ANALYZE_DEPTHS.items()}
+
+
+def load_ohlc(symbol: str, tf: str, n: int) -> dict:
+    """get_ohlc_data, served from shared memory when the feeder carries the symbol/timeframe."""
+    if shared_bars is not None:
+        with span("shared_bars.read", tf=tf.upper()):
+            result = shared_bars.read(
+                symbol, tf, min(n, OHLC_MAX_BARS),
+                lambda bars: resample.ohlc_result(resample.to_candles(bars), tf),
+            )
+        if result is not None:
+            return result
+    with span("broker.get_ohlc_data", tf=tf.upper()):
+        return get_ohlc_data(symbol, tf, n)
+
+
+def load_rates(symbol: str, tf: str, n: int):
+    """get_rates, served from shared memory when the feeder holds at least n bars."""
+    if shared_bars is not None:
+        with span("shared_bars.read", tf=tf.upper()):
+            rates = shared_bars.read(symbol, tf, n)
+        if rates is not None:
+            return rates
+    with span("broker.get_rates", tf=tf.upper()):
+        return get_rates(symbol, tf, n)
+
+
+# 🛬 Single-flight: concurrent requests for the same bars share one fetch (run in the threadpool)
+ohlc_flight = SingleFlight(
+    load_ohlc,
+    lambda key, result, n: resample.ohlc_result(result["candles"][-n:], key[1]),
+    name="ohlc",
+)
+rates_flight = SingleFlight(load_rates, lambda key, rates, n: rates[-n:], name="rates")
+
+
+async def fetch_ohlc(symbol: str, tf: str, n: int) -> dict:
+    # get_ohlc_data never returns more than OHLC_MAX_BARS, so deeper requests are the same request
+    return await ohlc_flight.get((symbol, tf), min(n, OHLC_MAX_BARS))
+
+
+async def fetch_rates(symbol: str, tf: str, n: int):
+    return await rates_flight.get((symbol, tf), n)
+
+
+async def in_background(coro):
+    """Await `coro` with its broker calls queued as WARMUP (behind interactive requests)."""
+    with prioritized(WARMUP):
+        return await coro
+
+
+async def feed_levels(symbol: str):
+    """
+    Bring the symbol's levels up to date. A cold symbol gets the full LEVEL_FEEDS
+    depth; after that only the bars closed since the last feed (plus the one
+    that was forming) are fetched, all timeframes concurrently, and not more
+    than once every LEVEL_REFRESH_SECONDS. With SHARED_BARS on, fetch_ohlc
+    reads the shared rings, so no broker call is made at all.
+    """
+    key = symbol.upper()
+    now = time.time()
+    fed_at = levels_fed_at.get(key)
+    if fed_at is not None and now - fed_at < LEVEL_REFRESH_SECONDS:
+        return
+    depths = [
+        n if fed_at is None or level_engine.last_bar(key, tf) is None
+        else min(n, int((now - fed_at) // resample.parse_timeframe(tf)) + 2)
+        for tf, n in LEVEL_FEEDS
+    ]
+    results = await asyncio.gather(*(fetch_ohlc(symbol, tf, d) for (tf, _), d in zip(LEVEL_FEEDS, depths)))
+    for (tf, _), result in zip(LEVEL_FEEDS, results):
+        level_engine.update(symbol, result["candles"], tf)
+    levels_fed_at[key] = now
+
+# 📡 Positions / pending orders served from an in-memory mirror instead of a reconcile per poll
+ACCOUNT_STATE_ENABLED = os.getenv("ACCOUNT_STATE_ENABLED", "true").lower() == "true"
+ACCOUNT_STATE_POLL_SECONDS = float(os.getenv("ACCOUNT_STATE_POLL_SECONDS", "1"))
+ACCOUNT_STATE_DRIFT_SECONDS = float(os.getenv("ACCOUNT_STATE_DRIFT_SECONDS", "60"))
+
+account_state = AccountState(get_open_positions, get_pending_orders) if ACCOUNT_STATE_ENABLED else None
+account_sync = AccountSyncWorker(
+    account_state,
+    change_token=get_change_token,
+    poll_interval=ACCOUNT_STATE_POLL_SECONDS,
+    drift_interval=ACCOUNT_STATE_DRIFT_SECONDS,
+) if ACCOUNT_STATE_ENABLED else None
+
+# 🛡️ Risk: exposure, sizing from SL distance, covariance VaR and pre-trade checks (risk.py)
+RISK_CHECK_ENABLED = os.getenv("RISK_CHECK_ENABLED", "true").lower() == "true"
+RISK_ENFORCE = os.getenv("RISK_ENFORCE", "false").lower() == "true"   # reject orders that break a limit
+RISK_TF = os.getenv("RISK_TF", "H1")
+RISK_BARS = int(os.getenv("RISK_BARS", "500"))
+RISK_MARKET_TTL = float(os.getenv("RISK_MARKET_TTL", "60"))
+RISK_DEFAULT_PCT = float(os.getenv("RISK_DEFAULT_PCT", "1.0"))
+ACCOUNT_INFO_TTL = float(os.getenv("ACCOUNT_INFO_TTL", "5"))
+
+def _env_limit(key: str):
+    value = os.getenv(key, "")
+    return float(value) if value else None
+
+risk_engine = RiskEngine(
+    confidence=float(os.getenv("RISK_CONFIDENCE", "0.99")),
+    limits={
+        "max_trade_risk_pct": _env_limit("RISK_MAX_TRADE_PCT"),
+        "max_var_pct": _env_limit("RISK_MAX_VAR_PCT"),
+        "max_symbol_notional": _env_limit("RISK_MAX_SYMBOL_NOTIONAL"),
+        "max_currency_notional": _env_limit("RISK_MAX_CURRENCY_NOTIONAL"),
+        "max_margin_pct": _env_limit("RISK_MAX_MARGIN_PCT"),
+    },
+)
+_risk_rates = {}            # {SYMBOL: (fetched_at, rates)}
+_account_info = [0.0, None]  # [fetched_at, info]
+
+# 🔗 Rolling return correlations across a watchlist, updated incrementally as bars close
+CORRELATION_WATCHLIST = [s.strip().upper() for s in os.getenv("CORRELATION_WATCHLIST", "").split(",") if s.strip()]
+CORRELATION_TF = os.getenv("CORRELATION_TF", "H1")
+CORRELATION_WINDOW = int(os.getenv("CORRELATION_WINDOW", "200"))
+CORRELATION_THRESHOLD = float(os.getenv("CORRELATION_THRESHOLD", "0.7"))
+CORRELATION_REFRESH_SECONDS = float(os.getenv("CORRELATION_REFRESH_SECONDS", "30"))
+correlation_book = CorrelationBook(window=CORRELATION_WINDOW)
+
+# 📈 Trend-strength ranking across a watchlist (trend.py), updated incrementally as bars close
+TREND_WATCHLIST = [s.strip().upper() for s in os.getenv("TREND_WATCHLIST", "").split(",") if s.strip()] or CORRELATION_WATCHLIST
+TREND_TF = os.getenv("TREND_TF", "H1")
+TREND_WINDOW = int(os.getenv("TREND_WINDOW", "100"))
+TREND_WINDOWS = os.getenv("TREND_WINDOWS", "20,50")     # shorter windows reported next to the ranking one
+trend_book = TrendBook()
+
+# 🗂️ Every OB/FVG/CHOCH/sweep in the bar archive, indexed for /events (event_index.py)
+event_store = EventStore(day_offset_hours=BROKER_DAY_OFFSET_HOURS)
+
+# 🧱 OB/FVG zones tracked until mitigated (zones.py); seeded from the bar archive when present
+ZONE_FETCH_BARS = int(os.getenv("ZONE_FETCH_BARS", "5000"))
+zone_book = ZoneBook()
+
+# 🔔 Alert rules evaluated on every bar close (alerts.py); fire over SSE and webhooks
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "false").lower() == "true"
+ALERTS_DB_PATH = os.getenv("ALERTS_DB_PATH", "alerts.db")
+ALERT_BARS = int(os.getenv("ALERT_BARS", "300"))
+
+
+def alert_candles(symbol: str, tf: str, n: int) -> list:
+    with prioritized(WARMUP):       # bar-close checks run behind interactive requests
+        return resample.to_candles(load_rates(symbol_name_to_id.get(symbol, symbol), tf, n))
+
+
+alert_engine = AlertEngine(
+    alert_candles,
+    level_engine,
+    store=AlertStore(ALERTS_DB_PATH),
+    owner_lock=ALERTS_DB_PATH + ".owner",   # one worker evaluates and delivers; the others relay
+    bars=ALERT_BARS,
+) if ALERTS_ENABLED else None
+
+# 📸 Pre-session /analyze snapshots for a watchlist (snapshots.py), served until the next bar closes
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+SNAPSHOT_WATCHLIST = [s.strip().upper() for s in os.getenv("SNAPSHOT_WATCHLIST", "").split(",") if s.strip()]
+SNAPSHOT_SESSIONS = [s.strip() for s in os.getenv("SNAPSHOT_SESSIONS", "London,NewYork").split(",") if s.strip()]
+SNAPSHOT_LEAD_MINUTES = float(os.getenv("SNAPSHOT_LEAD_MINUTES", "60"))
+SNAPSHOT_TRAIL_MINUTES = float(os.getenv("SNAPSHOT_TRAIL_MINUTES", "15"))
+ANALYZE_FINEST_TF = min(ANALYZE_DEPTHS, key=resample.parse_timeframe)   # its forming bar keys a snapshot
+
+snapshot_store = SnapshotStore(period=resample.parse_timeframe(ANALYZE_FINEST_TF)) if SNAPSHOT_ENABLED else None
+snapshot_scheduler = None       # created in startup: it needs run_analysis and the event loop
+
+# 🧾 Tick capture (ticks.py): MT5 ticks into a compressed columnar store for M1 rebuilds and exact sweep times
+TICKS_ENABLED = os.getenv("TICKS_ENABLED", "false").lower() == "true"
+TICK_SYMBOLS = [s.strip().upper() for s in os.getenv("TICK_SYMBOLS", "").split(",") if s.strip()]
+TICK_POLL_SECONDS = float(os.getenv("TICK_POLL_SECONDS", "1"))
+TICK_BACKFILL_HOURS = float(os.getenv("TICK_BACKFILL_HOURS", "24"))
+TICK_BLOCK_TICKS = int(os.getenv("TICK_BLOCK_TICKS", "65536"))
+_symbol_digits = {}
+
+
+def symbol_digits(symbol: str):
+    """Broker price digits for the symbol (None if the broker does not list it)."""
+    if not _symbol_digits:
+        _symbol_digits.update({name.upper(): spec.get("digits") for name, spec in get_symbol_specs().items()})
+    return _symbol_digits.get(symbol.upper())
+
+
+async def pips_to_price(symbol: str, pips: float) -> float:
+    """`pips` as a price distance, using the broker's digits when it lists the symbol."""
+    try:
+        digits = await run_in_threadpool(symbol_digits, symbol)
+    except Exception:
+        digits = None                   # broker unreachable: archive queries still work
+    return pips * pip_size(symbol, digits)
+
+
+tick_store = TickStore(digits=symbol_digits, block_ticks=TICK_BLOCK_TICKS) if TICKS_ENABLED else None
+tick_ingestor = TickIngestor(
+    tick_store,
+    lambda symbol, start, end: get_ticks(symbol_name_to_id.get(symbol, symbol), start, end),
+    TICK_SYMBOLS,
+    poll_seconds=TICK_POLL_SECONDS,
+    backfill_seconds=TICK_BACKFILL_HOURS * 3600,
+) if TICKS_ENABLED and TICK_SYMBOLS else None
+
+# 📒 Local journal database (source of truth; Notion is an optional replica)
+JOURNAL_DB_PATH = os.getenv("JOURNAL_DB_PATH", "journal.db")
+journal_store = JournalStore(JOURNAL_DB_PATH)
+
+# ⏱️ Server-Timing header: always on, or opt-in per request with `X-Server-Timing: 1`
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+
+# ⏱️ Request timing middleware ───────────────────────────────────
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    want_header = SERVER_TIMING_ENABLED or request.headers.get("x-server-timing") == "1"
+    spans = start_request_collection()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    HTTP_DURATION.observe(
+        elapsed,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    if want_header:
+        response.headers["Server-Timing"] = server_timing_header(spans, total=elapsed)
+    return response
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# 🔬 Sampling profiler (disabled unless PROFILER_ENABLED=true) ───
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILED_PATHS = {"/analyze", "/chart"}
+THREADPOOL_THREAD_NAME = "AnyIO worker thread"     # run_in_threadpool workers (anyio)
+
+profile_store = ProfileStore(capacity=20)
+_profile_lock = asyncio.Lock()
+
+
+def _check_profiler_access(request: Request):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+    if PROFILER_TOKEN and request.headers.get("x-admin-token") != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.middleware("http")
+async def profile_middleware(request: Request, call_next):
+    # Per-request mode: `X-Profile: 1` on /analyze or /chart samples the event-loop thread and the
+    # threadpool workers its fetches and detectors run on (shared with concurrent requests)
+    if not (PROFILER_ENABLED and request.url.path in PROFILED_PATHS
+            and request.headers.get("x-profile") == "1"):
+        return await call_next(request)
+    if PROFILER_TOKEN and request.headers.get("x-admin-token") != PROFILER_TOKEN:
+        return await call_next(request)
+
+    profiler = SamplingProfiler(interval=0.001, thread_ids=[threading.get_ident()],
+                                thread_names=[THREADPOOL_THREAD_NAME]).start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile = profiler.stop()
+    response.headers["X-Profile-Id"] = profile_store.add(profile)
+    return response
+
+
+@app.get("/admin/profile")
+async def admin_profile(
+    request: Request,
+    seconds: float = 10,
+    format: Literal["collapsed", "speedscope"] = "collapsed",
+    interval_ms: float = 5,
+):
+    """Sample every thread of this worker for `seconds` and return the profile."""
+    _check_profiler_access(request)
+    seconds = max(0.1, min(seconds, PROFILER_MAX_SECONDS))
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A capture is already running")
+
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval=max(interval_ms, 1) / 1000).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile = profiler.stop()
+
+    body, media_type = profile.render(format, name=f"worker-{os.getpid()}")
+    return Response(content=body, media_type=media_type)
+
+
+@app.get("/admin/profiles/{profile_id}")
+def admin_profile_by_id(
+    profile_id: str,
+    request: Request,
+    format: Literal["collapsed", "speedscope"] = "collapsed",
+):
+    """Fetch a per-request profile captured with the `X-Profile: 1` header."""
+    _check_profiler_access(request)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    body, media_type = profile.render(format, name=profile_id)
+    return Response(content=body, media_type=media_type)
 
 
 class Candle(BaseModel):
@@ -170,15 +602,21 @@ class JournalEntry(BaseModel):
     status: Optional[str] = "Pending"  # 👈 Default to Pending if not specified
 
 
+class JournalClose(BaseModel):
+    exit_price: float
+    closed_at: Optional[str] = None  # ISO-8601, defaults to now
+
+
 # 📤 Trade Execution Schema
 class PlaceOrderRequest(BaseModel):
     symbol: str
     order_type: Literal["MARKET", "LIMIT", "STOP"]
     direction: Literal["BUY", "SELL"]
-    volume: float
+    volume: Optional[float] = None      # omitted → sized from stop_loss and risk_pct
     entry_price: Optional[float] = None
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
+    risk_pct: Optional[float] = None    # % of equity lost at the stop (default RISK_DEFAULT_PCT)
 
 # ✅ Wait until symbols loaded
 def wait_until_symbols_loaded(timeout=10):
@@ -188,56 +626,155 @@ def wait_until_symbols_loaded(timeout=10):
         time.sleep(0.1)
     return False
 
+def broker_http_error(e: Exception) -> HTTPException:
+    # 🔌 a dropped broker connection is temporary (503), anything else is a 500
+    return HTTPException(status_code=503 if isinstance(e, ConnectionError) else 500, detail=str(e))
+
+def gateway_status():
+    if not BROKER_GATEWAY_SOCKET:
+        return None
+    from broker_gateway import gateway_stats
+    try:
+        return gateway_stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def scheduler_status():
+    # in gateway mode the queue lives in the gateway process (see broker_gateway stats)
+    if BROKER_GATEWAY_SOCKET:
+        return None
+    from mt5_client import broker_scheduler
+    return broker_scheduler.stats()
+
+
 @app.get("/health")
 def health():
+    try:
+        broker = get_connection_status()
+    except Exception as e:
+        broker = {"state": "unknown", "connected": False, "latency_ms": None, "last_error": str(e)}
     return {
         "symbols_loaded": len(symbol_name_to_id),
-        "connected": True #client.connected
+        "connected": broker["connected"],
+        "broker": broker,
+        "shared_bars": shared_bars.status() if shared_bars is not None else None,
+        "broker_gateway": gateway_status(),
+        "broker_queue": scheduler_status(),
+        "account_state": account_state.status() if account_state is not None else None,
+        "correlations": correlation_book.status(),
+        "event_indexes": event_store.status(),
+        "zones": zone_book.status(),
+        "alerts": alert_engine.status() if alert_engine is not None else None,
+        "snapshots": snapshot_store.status() if snapshot_store is not None else None,
+        "ticks": dict(tick_store.status(), ingestor=tick_ingestor.status() if tick_ingestor else None)
+        if tick_store is not None else None,
+        "inflight_fetches": ohlc_flight.inflight() + rates_flight.inflight(),
     }
 
+def journal_status(entry: JournalEntry) -> str:
+    return "Open" if entry.order_type.upper() == "MARKET" else "Pending"
+
+
+def build_notion_properties(entry: JournalEntry) -> dict:
+    """Map a JournalEntry to Notion database properties."""
+    status = journal_status(entry)
+
+    properties = {
+        "Title": {"title": [{"text": {"content": entry.title}}]},
+        "Date": {"date": {"start": datetime.utcnow().isoformat()}},
+        "Symbol": {"rich_text": [{"text": {"content": entry.symbol}}]},
+        "Session": {"rich_text": [{"text": {"content": entry.session}}]},
+        "HTF Bias": {"rich_text": [{"text": {"content": entry.htf_bias}}]},
+        "Entry Type": {"rich_text": [{"text": {"content": entry.entry_type}}]},
+        "Entry Price": {"number": entry.entry_price},
+        "Stop Loss": {"number": entry.stop_loss},
+        "Target Price": {"number": entry.target_price},
+        "Order Type": {"rich_text": [{"text": {"content": entry.order_type}}]},
+        # 👇 Use dynamic status here
+        "Status": {"rich_text": [{"text": {"content": status}}]},
+        "Note": {"rich_text": [{"text": {"content": entry.note}}]},
+        "Checklist": {"rich_text": [{"text": {"content": entry.checklist}}]},
+        "News & Events": {"rich_text": [{"text": {"content": entry.news_events}}]},
+    }
+
+    if entry.chart_url:
+        properties["Files & media"] = {
+            "files": [
+                {
+                    "name": "Chart",
+                    "external": {
+                        "url": entry.chart_url
+                    }
+                }
+            ]
+        }
+    return properties
+
+
 # 📟 Notion Entry Endpoint
 @app.post("/journal-entry")
 async def journal_entry(entry: JournalEntry):
     try:
-        # 👇 Add this line before building properties
-        status = "Open" if entry.order_type.upper() == "MARKET" else "Pending"
-
-        properties = {
-            "Title": {"title": [{"text": {"content": entry.title}}]},
-            "Date": {"date": {"start": datetime.utcnow().isoformat()}},
-            "Symbol": {"rich_text": [{"text": {"content": entry.symbol}}]},
-            "Session": {"rich_text": [{"text": {"content": entry.session}}]},
-            "HTF Bias": {"rich_text": [{"text": {"content": entry.htf_bias}}]},
-            "Entry Type": {"rich_text": [{"text": {"content": entry.entry_type}}]},
-            "Entry Price": {"number": entry.entry_price},
-            "Stop Loss": {"number": entry.stop_loss},
-            "Target Price": {"number": entry.target_price},
-            "Order Type": {"rich_text": [{"text": {"content": entry.order_type}}]},
-            # 👇 Use dynamic status here
-            "Status": {"rich_text": [{"text": {"content": status}}]},
-            "Note": {"rich_text": [{"text": {"content": entry.note}}]},
-            "Checklist": {"rich_text": [{"text": {"content": entry.checklist}}]},
-            "News & Events": {"rich_text": [{"text": {"content": entry.news_events}}]},
-        }
-
-        if entry.chart_url:
-            properties["Files & media"] = {
-                "files": [
-                    {
-                        "name": "Chart",
-                        "external": {
-                            "url": entry.chart_url
-                        }
-                    }
-                ]
-            }
-
-        # para salvar no Notion, descomente a linha abaixo apt
-        # notion.pages.create(parent={"database_id": NOTION_DB_ID}, properties=properties)
-        return {"status": "success"}
+        entry_id = journal_store.add(entry.dict(), status=journal_status(entry))
+
+        # Set NOTION_JOURNAL_ENABLED=true to replicate to Notion (queued, sent in the background)
+        if journal_queue is None:
+            return {"status": "success", "id": entry_id}
+        properties = build_notion_properties(entry)
+        queue_id = journal_queue.enqueue({"parent": {"database_id": NOTION_DB_ID}, "properties": properties})
+        return {"status": "success", "id": entry_id, "queued": queue_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# 📒 Journal queries & analytics
+@app.get("/journal-entries")
+def journal_entries(
+    symbol: Optional[str] = None,
+    session: Optional[str] = None,
+    entry_type: Optional[str] = None,
+    htf_bias: Optional[str] = None,
+    status: Optional[str] = None,
+    outcome: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+):
+    filters = dict(symbol=symbol, session=session, entry_type=entry_type,
+                   htf_bias=htf_bias, status=status, outcome=outcome)
+    entries = journal_store.query(filters, date_from, date_to, limit=min(limit, 1000), offset=offset)
+    return {"entries": entries, "count": len(entries)}
+
+
+@app.post("/journal-entry/{entry_id}/close")
+def journal_entry_close(entry_id: int, req: JournalClose):
+    row = journal_store.close(entry_id, req.exit_price, req.closed_at)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Journal entry {entry_id} not found")
+    return row
+
+
+@app.get("/journal-stats")
+def journal_stats(
+    symbol: Optional[str] = None,
+    session: Optional[str] = None,
+    entry_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    filters = dict(symbol=symbol, session=session, entry_type=entry_type)
+    return journal_store.stats(filters, date_from, date_to)
+
+
+
+@app.get("/journal-queue")
+def journal_queue_stats():
+    if journal_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **journal_queue.stats()}
+
 # 📈 OHLC Data
 @app.post("/fetch-data")
 async def fetch_data(req: FetchDataRequest):
@@ -254,7 +791,16 @@ async def fetch_data(req: FetchDataRequest):
                 "D1": 300, "W1": 100
             }.get(tf, 500)
 
-        result = get_ohlc_data(req.symbol, req.timeframe, req.num_bars)
+        tf = req.timeframe.upper()
+        if tf in NATIVE_TIMEFRAMES:
+            result = await fetch_ohlc(req.symbol, req.timeframe, req.num_bars)
+        else:
+            # Arbitrary timeframe derived from M1/M5 bars
+            try:
+                base_tf = resample.base_for(tf)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            result = (await fetch_resampled(req.symbol, {tf: req.num_bars}, base_tf))[tf]
         return {
             "symbol": req.symbol,
             "timeframe": req.timeframe,
@@ -266,23 +812,612 @@ async def fetch_data(req: FetchDataRequest):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise broker_http_error(e)
 
 
 # 📊 Open Positions
 @app.get("/open-positions")
-async def open_positions():
+async def open_positions(refresh: bool = False):
     try:
-        positions = get_open_positions()
+        if account_state is None:
+            with span("broker.get_open_positions"):
+                positions = await run_in_threadpool(get_open_positions)
+        else:
+            if refresh:
+                await run_in_threadpool(account_state.seed)
+            positions = await run_in_threadpool(account_state.positions)
         return {"positions": positions}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise broker_http_error(e)
+
+# 🛡️ Risk ──────────────────────────────────────────────────────
+async def account_info() -> dict:
+    if _account_info[1] is None or time.time() - _account_info[0] > ACCOUNT_INFO_TTL:
+        with span("broker.get_account_info"):
+            info = await run_in_threadpool(get_account_info)
+        _account_info[:] = [time.time(), info]
+    return _account_info[1]
+
+
+async def prepare_risk(symbols=(), fetch: bool = True) -> dict:
+    """
+    Bring the risk engine up to date (specs, bars, positions); returns the account info.
+
+    With fetch=False no bars are requested: prices and covariance stay as last loaded.
+    """
+    info = await account_info()
+    if not risk_engine.symbols:
+        risk_engine.account_currency = info["currency"].upper()
+        risk_engine.set_specs(await run_in_threadpool(get_symbol_specs))
+    risk_engine.leverage = info.get("leverage") or None
+    if account_state is not None:
+        positions = await run_in_threadpool(account_state.positions)
+    else:
+        positions = await run_in_threadpool(get_open_positions)
+
+    wanted = {s.upper() for s in symbols} | {str(p["symbol_name"]).upper() for p in positions}
+    wanted |= set(risk_engine.conversion_symbols(wanted, symbol_name_to_id))
+    now = time.time()
+    stale = sorted(s for s in wanted if s not in _risk_rates or now - _risk_rates[s][0] > RISK_MARKET_TTL)
+    if stale and fetch:
+        fetched = await asyncio.gather(
+            *(fetch_rates(symbol_name_to_id.get(s, s), RISK_TF, RISK_BARS) for s in stale),
+            return_exceptions=True,
+        )
+        for s, rates in zip(stale, fetched):
+            if not isinstance(rates, Exception):
+                _risk_rates[s] = (now, rates)
+        with span("risk.update_market"):
+            risk_engine.update_market({s: rates for s, (_, rates) in _risk_rates.items()})
+    risk_engine.set_positions(positions)
+    return info
+
+
+_risk_warmup = [None]       # background prepare_risk task started by the order path
+
+
+def warm_risk(symbols) -> None:
+    """Load bars for `symbols` in the background (one refresh at a time)."""
+    task = _risk_warmup[0]
+    if task is None or task.done():
+        _risk_warmup[0] = asyncio.get_running_loop().create_task(in_background(prepare_risk(symbols)))
+
+
+def risk_warm(symbol: str) -> bool:
+    """Whether the engine holds bars for the symbol and a rate into the account currency."""
+    return risk_engine.last_price(symbol) is not None and symbol.upper() not in risk_engine.no_rate
+
+
+async def assess_order(order: PlaceOrderRequest, fetch: bool = True) -> dict:
+    """
+    Size (when no volume is given) and limit-check an order.
+
+    With fetch=False (the order path) only the already loaded market data is used; when it
+    is missing or stale the result carries warm=False, no check, and a refresh is started.
+    """
+    info = await prepare_risk([order.symbol], fetch=fetch)
+    equity = info["equity"]
+    warm = risk_warm(order.symbol)
+    cached = _risk_rates.get(order.symbol.upper())
+    if not fetch and (not warm or cached is None or time.time() - cached[0] > RISK_MARKET_TTL):
+        warm_risk([order.symbol])
+    sizing, volume = None, order.volume
+    try:
+        if volume is None:
+            if order.stop_loss is None:
+                raise HTTPException(status_code=422, detail="Give a volume, or a stop_loss to size from")
+            if not warm and not fetch:
+                raise HTTPException(status_code=503, detail=f"Risk data for {order.symbol} is loading; "
+                                                            f"give a volume or retry shortly")
+            entry = order.entry_price or risk_engine.last_price(order.symbol)
+            if entry is None:
+                raise HTTPException(status_code=422, detail=f"No price for {order.symbol}; give entry_price")
+            sizing = risk_engine.size_position(order.symbol, entry, order.stop_loss,
+                                               order.risk_pct or RISK_DEFAULT_PCT, equity, side=order.direction)
+            volume = sizing["lots"]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not warm and not fetch:
+        return {"volume": volume, "sizing": sizing, "check": None, "warm": False}
+    check = risk_engine.check(order.symbol, order.direction, volume, equity,
+                              entry=order.entry_price, stop=order.stop_loss)
+    return {"volume": volume, "sizing": sizing, "check": check, "warm": warm}
+
+
+@app.get("/risk")
+async def risk_summary():
+    try:
+        info = await prepare_risk()
+        return {"account": info, **risk_engine.exposure()}
+    except Exception as e:
+        raise broker_http_error(e)
+
+
+@app.post("/risk/check")
+async def risk_check(order: PlaceOrderRequest):
+    """Size and limit-check an order without placing it."""
+    try:
+        return await assess_order(order)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise broker_http_error(e)
+
+# 🔗 Correlations ────────────────────────────────────────────────
+async def fetch_closes(symbols: list, tf: str, depth: int) -> tuple:
+    """({symbol: rates}, {symbol: error}) for the symbols that could be fetched."""
+    fetched = await asyncio.gather(
+        *(fetch_rates(symbol_name_to_id.get(s, s), tf, depth) for s in symbols),
+        return_exceptions=True,
+    )
+    rates = {s: r for s, r in zip(symbols, fetched) if not isinstance(r, Exception)}
+    errors = {s: str(r) for s, r in zip(symbols, fetched) if isinstance(r, Exception)}
+    return rates, errors
+
+
+async def load_correlations(symbols: list, tf: str, window: int) -> tuple:
+    """Bring the (tf, window) matrix up to date for `symbols`; returns (matrix, errors)."""
+    full_depth = window + window // 4 + 2      # headroom for bars missing on some symbols
+    known = correlation_book.symbols(tf, window)
+    new = [s for s in symbols if s not in known]
+    rates, errors = await fetch_closes(new, tf, full_depth) if new else ({}, {})
+    matrix = correlation_book.get(tf, known + [s for s in new if s in rates], window)
+
+    now = time.time()
+    if matrix.fetched_at is None or now - matrix.fetched_at >= CORRELATION_REFRESH_SECONDS or rates:
+        if matrix.last_time is None or matrix.fetched_at is None:
+            depth = full_depth
+        else:
+            # only the bars that closed since the last fetch, plus the forming one
+            depth = min(full_depth, int((now - matrix.fetched_at) // resample.parse_timeframe(tf)) + 3)
+        missing = [s for s in matrix.symbols if s not in rates]
+        more, more_errors = await fetch_closes(missing, tf, depth)
+        rates.update(more)
+        errors.update(more_errors)
+        if not more_errors:
+            with span("correlation.update", tf=tf.upper()):
+                matrix.update(rates)
+            matrix.fetched_at = now
+    return matrix, errors
+
+
+def _held_symbols() -> dict:
+    """{SYMBOL: open position count} from the account mirror or the broker."""
+    positions = account_state.positions() if account_state is not None else get_open_positions()
+    held = defaultdict(int)
+    for p in positions:
+        held[str(p["symbol_name"]).upper()] += 1
+    return held
+
+
+@app.get("/correlations")
+async def correlations(
+    symbols: str = "",
+    tf: str = CORRELATION_TF,
+    window: int = CORRELATION_WINDOW,
+    threshold: float = CORRELATION_THRESHOLD,
+    covariance: bool = False,
+    focus: Optional[str] = None,
+):
+    """
+    Rolling return correlation across `symbols` (comma separated, default
+    CORRELATION_WATCHLIST). `focus=EURUSD` also lists the symbols correlated
+    with it and the open positions in them, so correlated setups are not stacked.
+    """
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] or list(CORRELATION_WATCHLIST)
+    if focus and focus.upper() not in wanted:
+        wanted.append(focus.upper())
+    if len(wanted) < 2:
+        raise HTTPException(status_code=422, detail="Give at least two symbols (or set CORRELATION_WATCHLIST)")
+    if window < 10:
+        raise HTTPException(status_code=422, detail="window must be at least 10 returns")
+    try:
+        resample.parse_timeframe(tf)
+        matrix, errors = await load_correlations(wanted, tf, window)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise broker_http_error(e)
+
+    names = [s for s in wanted if s in matrix.index]
+    if len(names) < 2:
+        raise HTTPException(status_code=404, detail={"message": "Not enough symbols with bars", "errors": errors})
+    corr = matrix.correlation(names)
+    pairs = correlated_pairs(names, corr, threshold)
+    result = {
+        "tf": tf.upper(),
+        "window": window,
+        "returns": matrix.count,
+        "last_bar": matrix.last_time,
+        "symbols": names,
+        "correlation": np.round(np.nan_to_num(corr), 4).tolist(),
+        "pairs": pairs,
+        "clusters": clusters(names, pairs),
+        "errors": errors,
+    }
+    if covariance:
+        result["covariance"] = np.nan_to_num(matrix.covariance(names)).tolist()
+    if focus:
+        f = focus.upper()
+        if f in names:
+            held = await run_in_threadpool(_held_symbols)
+            row = corr[names.index(f)]
+            result["focus"] = {
+                "symbol": f,
+                "correlated": [
+                    {"symbol": s, "corr": round(float(row[i]), 4), "open_positions": held.get(s, 0)}
+                    for i, s in sorted(enumerate(names), key=lambda item: -abs(row[item[0]]))
+                    if s != f and abs(row[i]) >= threshold
+                ],
+            }
+    return result
+
+# 📈 Trend ranking ──────────────────────────────────────────────
+@app.get("/trend")
+async def trend_ranking(
+    symbols: str = "",
+    tf: str = TREND_TF,
+    window: int = TREND_WINDOW,
+    windows: str = TREND_WINDOWS,
+):
+    """
+    Rank `symbols` (comma separated, default TREND_WATCHLIST) by OLS trend
+    strength over their last `window` closed bars, strongest first. Each row
+    also carries slope/correlation over the shorter `windows`.
+    """
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] or list(TREND_WATCHLIST)
+    if not wanted:
+        raise HTTPException(status_code=422, detail="Give symbols (or set TREND_WATCHLIST)")
+    try:
+        seconds = resample.parse_timeframe(tf)
+        shorter = sorted({int(w) for w in windows.split(",") if w.strip()})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if window < 5 or any(not 2 <= w <= window for w in shorter):
+        raise HTTPException(status_code=422, detail="window must be at least 5 and windows between 2 and window")
+
+    now = time.time()
+    depths = {}
+    for s in wanted:
+        last = trend_book.last_time(s, tf, window)
+        # bars since the last one pushed (plus a day for the broker's clock offset) and the forming one
+        depths[s] = window + 1 if last is None else min(window + 1, int((now - last) // seconds) + 86400 // seconds + 3)
+    fetched = await asyncio.gather(
+        *(fetch_rates(symbol_name_to_id.get(s, s), tf, depths[s]) for s in wanted),
+        return_exceptions=True,
+    )
+    errors = {s: str(r) for s, r in zip(wanted, fetched) if isinstance(r, Exception)}
+    with span("trend.update", tf=tf.upper()):
+        for s, rates in zip(wanted, fetched):
+            if not isinstance(rates, Exception) and len(rates) > 1:
+                closed = rates[:-1]         # the last bar is still forming
+                trend_book.update(s, tf, window, closed["time"], closed["close"])
+        ranking = trend_book.rank(tf, window, [s for s in wanted if s not in errors])
+        if ranking and shorter:
+            names = [row["symbol"] for row in ranking]
+            fits = rolling_trend(trend_book.closes(tf, window, names), shorter)
+            for i, row in enumerate(ranking):
+                row["windows"] = {
+                    w: {"slope": float(fits[w][0][i, -1]), "correlation": float(fits[w][1][i, -1])}
+                    for w in shorter
+                }
+    if not ranking:
+        raise HTTPException(status_code=404, detail={"message": f"No symbol has {window} closed bars", "errors": errors})
+    return {"tf": tf.upper(), "window": window, "ranking": ranking, "errors": errors}
+
+# 🧱 Zones ──────────────────────────────────────────────────────
+async def load_zones(symbol: str, tf: str):
+    """The symbol/tf zone tracker, with every bar closed since its last update folded in."""
+    with span("zones.seed", tf=tf.upper()):
+        tracker = await run_in_threadpool(zone_book.get, symbol, tf)
+    seconds = resample.parse_timeframe(tf)
+    if tracker.last_time is None:
+        depth = ZONE_FETCH_BARS
+    else:
+        # bars since the last one seen, plus a day of headroom for the broker's clock offset
+        depth = min(ZONE_FETCH_BARS, int((time.time() - tracker.last_time) // seconds) + 86400 // seconds + 3)
+    rates = await fetch_rates(symbol_name_to_id.get(symbol.upper(), symbol), tf, max(depth, 3))
+    with span("zones.update", tf=tf.upper()):
+        # the last bar is still forming; a window that starts after last_time reseeds the tracker
+        await run_in_threadpool(tracker.sync, rates[:-1])
+    return tracker
+
+
+_zone_warmups = {}          # (symbol, tf) → background load_zones task started by /chart
+
+
+async def _warm_zones(symbol: str, tf: str):
+    try:
+        await load_zones(symbol, tf)
+    except Exception as e:
+        print(f"[ERROR] Zone warm-up {symbol} {tf}: {e}")
+
+
+def warm_zones(symbol: str, tf: str) -> None:
+    """Seed and sync the symbol/tf zone tracker in the background (one load per key at a time)."""
+    key = (symbol.upper(), tf.upper())
+    task = _zone_warmups.get(key)
+    if task is None or task.done():
+        _zone_warmups[key] = asyncio.get_running_loop().create_task(in_background(_warm_zones(symbol, tf)))
+
+
+@app.get("/zones")
+async def zones(
+    symbol: str,
+    tf: str = "H1",
+    status: Literal["any", "active", "partial", "mitigated", "unmitigated"] = "unmitigated",
+    kind: Optional[Literal["ob", "fvg"]] = None,
+    price: Optional[float] = None,
+    pips: Optional[float] = None,
+    limit: int = 100,
+):
+    """
+    Order-block and FVG zones with their mitigation state, newest first.
+    With `pips` (and optionally `price`, default: last close), only
+    unmitigated zones within that distance are returned.
+    """
+    if price is not None and pips is None:
+        raise HTTPException(status_code=422, detail="price filters by distance: give pips as well")
+    try:
+        tracker = await load_zones(symbol, tf)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise broker_http_error(e)
+    near = distance = None
+    if pips is not None:
+        near = price if price is not None else tracker.last_close
+        distance = await pips_to_price(symbol, pips)
+    found = tracker.zones(status=status, kind=kind, near=near, distance=distance or 0.0)
+    return {
+        "symbol": symbol.upper(),
+        "tf": tf.upper(),
+        "last_bar": tracker.last_time,
+        "price": near,
+        "count": len(found),
+        "zones": found[::-1][:limit],
+    }
+
+# 🧾 Ticks ──────────────────────────────────────────────────────
+def _ticks() -> TickStore:
+    if tick_store is None:
+        raise HTTPException(status_code=503, detail="Tick storage is disabled (TICKS_ENABLED=false)")
+    return tick_store
+
+
+def _msc_iso(time_msc) -> Optional[str]:
+    if time_msc is None:
+        return None
+    return datetime.utcfromtimestamp(time_msc / 1000).isoformat(timespec="milliseconds") + "Z"
+
+
+def _tick_range(start: Optional[float], end: Optional[float], default_seconds: float) -> tuple:
+    end_msc = int((end if end is not None else time.time()) * 1000)
+    start_msc = int(start * 1000) if start is not None else end_msc - int(default_seconds * 1000)
+    if start_msc >= end_msc:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    return start_msc, end_msc
+
+
+@app.get("/ticks")
+async def tick_range(symbol: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 1000):
+    """Stored ticks in [start, end) (epoch seconds; default: the last minute), oldest first."""
+    store = _ticks()
+    start_msc, end_msc = _tick_range(start, end, 60)
+    with span("ticks.read"):
+        found = await run_in_threadpool(store.read, symbol, start_msc, end_msc, limit)
+    return {
+        "symbol": symbol.upper(),
+        "count": len(found),
+        "ticks": [
+            {"time": _msc_iso(int(t)), "time_msc": int(t), "bid": float(b), "ask": float(a)}
+            for t, b, a in zip(found["time_msc"], found["bid"], found["ask"])
+        ],
+    }
+
+
+@app.get("/ticks/bars")
+async def tick_bars(
+    symbol: str,
+    tf: str = "M1",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    price: Literal["bid", "ask", "mid"] = "bid",
+):
+    """Bars rebuilt from stored ticks (default: the last 500 bars of tf); volume is the tick count."""
+    store = _ticks()
+    try:
+        seconds = resample.parse_timeframe(tf)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    start_msc, end_msc = _tick_range(start, end, 500 * seconds)
+    with span("ticks.bars", tf=tf.upper()):
+        bars = await run_in_threadpool(
+            store.bars, symbol, tf, start_msc, end_msc, BROKER_DAY_OFFSET_HOURS, price,
+        )
+    return {"symbol": symbol.upper(), "tf": tf.upper(), "count": len(bars), "candles": resample.to_candles(bars)}
+
+
+@app.get("/ticks/sweeps")
+async def tick_sweeps(symbol: str, start: Optional[float] = None, end: Optional[float] = None):
+    """
+    Exact times PDH/PDL and session highs/lows were traded through in [start, end)
+    (default: the last 24 hours), from stored ticks. A sweep that came back
+    inside the level is a "wick"; one still beyond it at `end` is a "break".
+    """
+    store = _ticks()
+    start_msc, end_msc = _tick_range(start, end, 86400)
+    try:
+        await feed_levels(symbol)
+    except Exception as e:
+        raise broker_http_error(e)
+    snapshot = level_engine.snapshot(symbol)
+
+    levels = []
+    if snapshot.get("previous_day"):
+        levels += [("PDH", snapshot["previous_day"]["high"], "above"), ("PDL", snapshot["previous_day"]["low"], "below")]
+    current = session_of(datetime.utcfromtimestamp(end_msc / 1000).hour)
+    for name in sorted(set(snapshot.get("sessions", {})) | set(snapshot.get("previous_day_sessions", {}))):
+        # a session still running has no fixed range yet: use the previous day's
+        source = snapshot["sessions"] if name in snapshot.get("sessions", {}) and name != current \
+            else snapshot.get("previous_day_sessions", {})
+        if name in source:
+            levels += [(f"{name} High", source[name]["high"], "above"), (f"{name} Low", source[name]["low"], "below")]
+
+    def judge():
+        out = []
+        for name, value, side in levels:
+            hit = store.sweep(symbol, value, side, start_msc, end_msc)
+            out.append({"level": name, "price": value, "side": side, **({
+                "swept_at": _msc_iso(hit["swept_at"]),
+                "extreme": hit["extreme"],
+                "extreme_at": _msc_iso(hit["extreme_at"]),
+                "returned_at": _msc_iso(hit["returned_at"]),
+                "kind": "wick" if hit["returned_at"] is not None else "break",
+            } if hit else {"swept_at": None})})
+        return out
+
+    with span("ticks.sweeps"):
+        judged = await run_in_threadpool(judge)
+    return {
+        "symbol": symbol.upper(),
+        "start": _msc_iso(start_msc),
+        "end": _msc_iso(end_msc),
+        "sweeps": sorted((j for j in judged if j["swept_at"]), key=lambda j: j["swept_at"]),
+        "held": [j["level"] for j in judged if not j["swept_at"]],
+    }
+
+
+# 🔔 Alerts ─────────────────────────────────────────────────────
+class AlertRuleRequest(BaseModel):
+    symbol: str
+    tf: str = "M15"
+    condition: dict                     # {"type": "sweep", "level": "London High"} etc. (see alerts.py)
+    webhook: Optional[str] = None       # POSTed the alert JSON when it fires
+    once: bool = False                  # delete the rule after it fires
+    note: Optional[str] = ""
+
+
+def _alerts():
+    if alert_engine is None:
+        raise HTTPException(status_code=404, detail="Alerts are disabled (ALERTS_ENABLED=false)")
+    return alert_engine
+
+
+@app.post("/alerts")
+def create_alert(rule: AlertRuleRequest):
+    try:
+        return _alerts().add(rule.dict())
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/alerts")
+def list_alerts(symbol: Optional[str] = None):
+    rules = _alerts().rules()
+    if symbol:
+        rules = [r for r in rules if r["symbol"] == symbol.upper()]
+    return {"rules": rules, "status": _alerts().status()}
+
+
+@app.delete("/alerts/{rule_id}")
+def delete_alert(rule_id: int):
+    if not _alerts().remove(rule_id):
+        raise HTTPException(status_code=404, detail=f"No alert rule {rule_id}")
+    return {"deleted": rule_id}
+
+
+@app.get("/alerts/history")
+def alert_history(limit: int = 100):
+    return {"alerts": list(_alerts().history)[-limit:][::-1]}
+
+
+@app.get("/alerts/stream")
+async def alert_stream(request: Request):
+    """Server-sent events: one `alert` event per fired alert."""
+    engine = _alerts()
+    q = engine.subscribe()
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: alert\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            engine.unsubscribe(q)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 🗂️ Detector event history ─────────────────────────────────────
+@app.get("/events")
+async def events(
+    symbol: str,
+    tf: str = "H4",
+    kind: Optional[str] = None,
+    status: Literal["any", "unfilled", "filled", "untouched", "touched"] = "any",
+    direction: Optional[Literal["bullish", "bearish"]] = None,
+    price: Optional[float] = None,
+    pips: Optional[float] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    as_of: Optional[int] = None,
+    limit: int = 100,
+):
+    """
+    OB / FVG / CHOCH / sweep events from the archived history of symbol/tf,
+    most recent first. `kind` takes a comma-separated list. With `pips`, only
+    zones within that many pips of `price` (default: last archived close).
+    Times are epoch seconds; `as_of` judges fill status at that time.
+    """
+    kinds = [k.strip().lower() for k in kind.split(",")] if kind else None
+    if kinds and any(k not in EVENT_KINDS for k in kinds):
+        raise HTTPException(status_code=422, detail=f"kind must be one of {', '.join(EVENT_KINDS)}")
+    if price is not None and pips is None:
+        raise HTTPException(status_code=422, detail="price filters by distance: give pips as well")
+    try:
+        with span("events.index", tf=tf.upper()):
+            index = await run_in_threadpool(event_store.get, symbol, tf)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    near = distance = None
+    if pips is not None:
+        near = price if price is not None else index.last_close
+        distance = await pips_to_price(symbol, pips)
+    with span("events.query"):
+        found = index.query(
+            kind=kinds,
+            direction={"bullish": 1, "bearish": -1}.get(direction),
+            status=status,
+            near=near,
+            distance=distance or 0.0,
+            start=start,
+            end=end,
+            as_of=as_of,
+            limit=limit,
+        )
+    return {
+        "symbol": symbol.upper(),
+        "tf": tf.upper(),
+        "archive_last_bar": index.last_bar,
+        "price": near,
+        "distance": distance,
+        "count": len(found),
+        "events": found,
+    }
+
 
 # 🎯 Execute Trade Order
 @app.post("/place-order")
-def execute_trade(order: PlaceOrderRequest):
+async def execute_trade(order: PlaceOrderRequest):
     try:
-        if not wait_until_symbols_loaded():
+        if not await run_in_threadpool(wait_until_symbols_loaded):
             raise HTTPException(status_code=503, detail="Symbols not loaded yet. Try again shortly.")
 
         symbol_key = order.symbol.upper()
@@ -291,20 +1426,41 @@ def execute_trade(order: PlaceOrderRequest):
 
         symbol_id = symbol_name_to_id[symbol_key]
 
-        print(f"[ORDER DEBUG] Sending order: {order=}, {symbol_id=}")
+        # 🛡️ Size (when no volume is given) and check against the risk limits
+        risk, volume = None, order.volume
+        if RISK_CHECK_ENABLED or volume is None:
+            try:
+                # never waits for bars: checks against the warm covariance or fails open with warm=False
+                risk = await assess_order(order, fetch=False)
+            except HTTPException:
+                raise
+            except Exception as e:
+                if volume is None or RISK_ENFORCE:
+                    raise
+                risk = {"error": str(e)}
+            volume = risk.get("volume", volume)
+            if RISK_ENFORCE and risk.get("check") and not risk["check"]["allowed"]:
+                raise HTTPException(status_code=422, detail={"message": "Order breaks risk limits", "risk": risk})
+            if not volume:
+                raise HTTPException(status_code=422, detail={"message": "Sized volume is below the symbol minimum", "risk": risk})
 
         # Para MT5, volume já é em lotes (float)
-        deferred = place_order(
-            symbol=symbol_id,
-            order_type=order.order_type,
-            side=order.direction,
-            volume=order.volume,
-            price=order.entry_price if order.order_type != "MARKET" else None,
-            stop_loss=order.stop_loss,
-            take_profit=order.take_profit
-        )
+        with span("broker.place_order"):
+            deferred = await run_in_threadpool(
+                lambda: place_order(
+                    symbol=symbol_id,
+                    order_type=order.order_type,
+                    side=order.direction,
+                    volume=volume,
+                    price=order.entry_price if order.order_type != "MARKET" else None,
+                    stop_loss=order.stop_loss,
+                    take_profit=order.take_profit
+                )
+            )
 
-        result = wait_for_deferred(deferred, timeout=12)
+            result = await run_in_threadpool(wait_for_deferred, deferred, 12)
+        if account_state is not None:
+            account_state.mark_stale()   # read-your-writes on the next poll
 
         if isinstance(result, str):
             result = {"message": result}
@@ -314,29 +1470,48 @@ def execute_trade(order: PlaceOrderRequest):
         return {
             "status": "success",
             "submitted": True,
-            "details": result
+            "details": result,
+            "risk": risk,
         }
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"[ERROR] Failed placing order: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise broker_http_error(e)
 
 @app.on_event("shutdown")
 async def stop_mt5():
-    import MetaTrader5 as mt5
-    mt5.shutdown()
+    if not BROKER_GATEWAY_SOCKET:   # the gateway owns the terminal session
+        import MetaTrader5 as mt5
+        mt5.shutdown()
+    if journal_worker is not None:
+        journal_worker.stop()
+    if account_sync is not None and account_sync.is_alive():
+        account_sync.stop()
+    if alert_engine is not None and alert_engine.is_alive():
+        alert_engine.stop()
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.stop()
+    if tick_ingestor is not None and tick_ingestor.is_alive():
+        tick_ingestor.stop()
+    elif tick_store is not None:
+        tick_store.flush()
+
 
 
 # 🔄 Pending Orders
 @app.get("/pending-orders")
-async def pending_orders():
+async def pending_orders(refresh: bool = False):
     try:
-        from mt5_client import get_pending_orders
-        return get_pending_orders()
+        if account_state is None:
+            with span("broker.get_pending_orders"):
+                return await run_in_threadpool(get_pending_orders)
+        if refresh:
+            await run_in_threadpool(account_state.seed)
+        return await run_in_threadpool(account_state.pending_orders)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise broker_http_error(e)
 
 
 class LTFEntry(BaseModel):
@@ -350,6 +1525,7 @@ class LTFEntry(BaseModel):
 
 class AnalyzeRequest(BaseModel):
     symbol: str
+    live: bool = False      # skip the pre-session snapshot and recompute
 
 class MTFZones(BaseModel):
     H4_Macro_OB: Optional[dict] = None
@@ -376,110 +1552,144 @@ class AnalyzeResponse(BaseModel):
     Session_Levels: dict
     Checklist: Checklist
     News: str
+    Freshness: Optional[dict] = None
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(req: AnalyzeRequest):
+async def run_analysis(symbol: str) -> tuple:
+    """
+    The /analyze pipeline.
+
+    Returns:
+        (AnalyzeResponse, fingerprint) with fingerprint = {"bars": {tf: open time of the last
+        bar used}, "forming": forming_key of the forming ANALYZE_FINEST_TF bar}
+    """
     try:
-        symbol = req.symbol
-        timeframes = ["D1", "H4", "H1", "M15", "M5"]
+        timeframes = list(ANALYZE_DEPTHS)
         data = {}
 
         # Fetch and store the full result (not just candles)
-        bar_depth = {
-            "D1": 750,
-            "H4": 1200,
-            "H1": 1200,
-            "M15": 500,
-            "M5": 300
-        }
+        # D1 only feeds the HTF bias; PDH/PDL come from the level engine
+        if ANALYZE_BASE_TF:
+            # One broker round trip; every timeframe is resampled from the base series
+            data = await fetch_resampled(symbol, DETECTOR_DEPTHS, ANALYZE_BASE_TF)
 
         for tf in timeframes:
-            result = get_ohlc_data(symbol, tf, n=bar_depth.get(tf, 100))
+            if tf in data:
+                continue
+            result = await fetch_ohlc(symbol, tf, DETECTOR_DEPTHS[tf])
             if not isinstance(result, dict) or "candles" not in result:
                 raise HTTPException(status_code=500, detail=f"Failed to fetch candles for {tf}")
             data[tf] = result
 
+
         # Extract candles from each timeframe
         candles = {tf: data[tf]["candles"] for tf in timeframes}
 
-        # Use local versions
-        tagged_m15 = tag_sessions_local(candles["M15"])
-        pdh = candles["D1"][-2]["high"]
-        pdl = candles["D1"][-2]["low"]
-        session_levels = compute_session_levels(tagged_m15)
-
-        # High Timeframe Bias
-        htf_bias = detect_trend_bias(candles["D1"])
-
-        # Detect macro + minor OB for H4 & H1
-        h4_ob_data = detect_order_block(candles["H4"], lookback=200, macro_threshold=100)
-        h1_ob_data = detect_order_block(candles["H1"], lookback=200, macro_threshold=100)
-
-        mtf_zones = {
-            "H4_Macro_OB": h4_ob_data.get("macro") if h4_ob_data else None,
-            "H4_Minor_OB": h4_ob_data.get("minor") if h4_ob_data else None,
-            "H1_Macro_OB": h1_ob_data.get("macro") if h1_ob_data else None,
-            "H1_Minor_OB": h1_ob_data.get("minor") if h1_ob_data else None,
-            "H4_FVG": detect_fvg(candles["H4"]),
-            "H1_FVG": detect_fvg(candles["H1"]),
-        }
+        with span("levels.update"):
+            # coarse to fine; H1 reaches back into the previous day's sessions, M15 often does not
+            for tf in ("D1", "H1", "M15"):
+                level_engine.update(symbol, candles[tf], tf)
+        previous_day = level_engine.previous_day(symbol)
+        if previous_day:
+            pdh, pdl = previous_day
+        else:
+            pdh = candles["D1"][-2]["high"]
+            pdl = candles["D1"][-2]["low"]
 
-        # LTF entry detection
-        ltf_entry = detect_ltf_entry(tagged_m15, candles["M5"], pdh, pdl, session_levels)
-
-        # Candle pattern detection
-        raw_candle = detect_bullish_or_bearish_engulfing(candles["M5"])
-        candle_dict = {"type": raw_candle} if isinstance(raw_candle, str) else raw_candle
-
-        # Detect macro + minor OB & CHOCH for checklist
-        m15_ob_data = detect_order_block(candles["M15"], lookback=200, macro_threshold=100)
-        m5_choch_data = detect_choch(candles["M5"], macro_threshold=100)
-        
-        checklist = {
-            "CHOCH": {
-                "Macro": m5_choch_data.get("macro") if m5_choch_data else None,
-                "Minor": m5_choch_data.get("minor") if m5_choch_data else None,
-            },
-            "OB": {
-                "Macro": m15_ob_data.get("macro") if m15_ob_data else None,
-                "Minor": m15_ob_data.get("minor") if m15_ob_data else None,
-            },
-            "FVG": detect_fvg(candles["M15"]),
-            "Sweep": detect_sweep(tagged_m15, pdh, pdl, session_levels),
-            "Candle": candle_dict,
-        }
-
-        news = ""  # Placeholder
+        # HTF bias, MTF zones, LTF entry and checklist (shared with replay.py)
+        result = analyze_candles(candles, pdh, pdl, span=span)
 
         try:
-            print("✅ HTF Bias:", htf_bias)
-            print("✅ MTF Zones:", mtf_zones)
-            print("✅ LTF Entry Raw:", repr(ltf_entry))
-            print("✅ Checklist Raw:", repr(checklist))
-
-            response = AnalyzeResponse(
-                HTF_Bias=htf_bias,
-                MTF_Zones=MTFZones(**mtf_zones),
-                LTF_Entry=LTFEntry(**ltf_entry),
-                Previous_Day_High=pdh,
-                Previous_Day_Low=pdl,
-                Session_Levels=session_levels,
-                Checklist=Checklist(**checklist),
-                News=news,
-            )
+            print("✅ HTF Bias:", result["HTF_Bias"])
+            print("✅ MTF Zones:", result["MTF_Zones"])
+            print("✅ LTF Entry Raw:", repr(result["LTF_Entry"]))
+            print("✅ Checklist Raw:", repr(result["Checklist"]))
+
+            with span("analyze.response_model"):
+                response = AnalyzeResponse(**result)
             print("✅ Final response created.")
-            return response
+            fingerprint = {
+                "bars": {tf: candles[tf][-1]["time"] for tf in timeframes},
+                "forming": forming_key(candles[ANALYZE_FINEST_TF][-1]),
+            }
+            return response, fingerprint
         except Exception as e:
             print("🔥 Exception while constructing AnalyzeResponse:", e)
             raise HTTPException(status_code=500, detail=str(e))
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise broker_http_error(e)
 
 
+@app.post("/analyze", response_model=AnalyzeResponse)
+async def analyze(req: AnalyzeRequest):
+    if snapshot_store is not None and not req.live and snapshot_store.candidate(req.symbol) is not None:
+        # one bar instead of the full pipeline: serve only if the forming bar has not moved
+        try:
+            rates = await fetch_rates(symbol_name_to_id.get(req.symbol.upper(), req.symbol), ANALYZE_FINEST_TF, 1)
+        except Exception as e:
+            raise broker_http_error(e)
+        if len(rates):
+            snapshot = snapshot_store.fresh(req.symbol, forming_key(resample.to_candles(rates[-1:])[0]))
+            if snapshot is not None:
+                return {**snapshot.response, "Freshness": snapshot.freshness()}
+    computed_at = time.time()
+    response, fingerprint = await run_analysis(req.symbol)
+    response.Freshness = live_freshness(fingerprint, computed_at)
+    return response
+
+
+async def compute_snapshot(symbol: str) -> tuple:
+    with prioritized(WARMUP):
+        response, fingerprint = await run_analysis(symbol)
+    return response.dict(exclude={"Freshness"}), fingerprint
+
+
+@app.get("/snapshots")
+async def snapshots(symbol: Optional[str] = None, version: Optional[int] = None):
+    """Pre-session /analyze snapshots: status, or one symbol's versions (or a single version)."""
+    if snapshot_store is None:
+        raise HTTPException(status_code=503, detail="Snapshots are disabled (SNAPSHOT_ENABLED=false)")
+    if symbol is None:
+        return {**snapshot_store.status(), "scheduler": snapshot_scheduler.status() if snapshot_scheduler else None}
+    if version is not None:
+        snapshot = snapshot_store.get(symbol, version)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"No snapshot {symbol.upper()} v{version}")
+        return snapshot.to_dict()
+    return {
+        "symbol": symbol.upper(),
+        "versions": [{k: v for k, v in s.to_dict().items() if k != "response"} for s in snapshot_store.versions(symbol)],
+    }
 
 
+@app.post("/snapshots/refresh")
+async def refresh_snapshots(symbols: Optional[str] = None):
+    """Recompute snapshots now (default: the whole watchlist), e.g. from a cron job."""
+    if snapshot_scheduler is None:
+        raise HTTPException(status_code=503, detail="Snapshots are disabled (SNAPSHOT_ENABLED=false)")
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+    if not wanted and not snapshot_scheduler.symbols:
+        raise HTTPException(status_code=422, detail="SNAPSHOT_WATCHLIST is empty; pass ?symbols=EURUSD,...")
+    refreshed = await snapshot_scheduler.run_once(wanted)
+    return {"refreshed": [{k: v for k, v in s.to_dict().items() if k != "response"} for s in refreshed]}
+
+
+@app.get("/levels")
+async def levels(symbol: str):
+    """Rolling key levels: PDH/PDL, 5/20-day, weekly, monthly, session ranges and rolling bar-window extremes."""
+    try:
+        if symbol.upper() not in symbol_name_to_id:
+            raise HTTPException(status_code=404, detail=f"Symbol '{symbol}' not found")
+        await feed_levels(symbol)
+        return {"symbol": symbol.upper(), **level_engine.snapshot(symbol)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise broker_http_error(e)
+
 
 @app.post("/chart")
 async def chart(
@@ -490,28 +1700,37 @@ async def chart(
     take_profit: Optional[float] = None
 ):
     try:
-        candles_data = get_ohlc_data(symbol, timeframe, n=100)
+        candles_data = await fetch_ohlc(symbol, timeframe, 100)
+
         candles = candles_data["candles"]
 
-        # Detect structural SMC elements
-        ob = detect_order_block(candles)
-        fvg = detect_fvg(candles)
-        choch = detect_choch(candles)
+        # OB/FVG zones alive inside the visible range, each bounded by its own lifetime
+        tracker = zone_book.peek(symbol, timeframe)
+        if tracker is not None and tracker.synced_at is not None:
+            tracker = await load_zones(symbol, timeframe)       # only the bars since the last sync
+        else:
+            # cold: zones from the visible window now, deep history (archive + ZONE_FETCH_BARS) in the background
+            warm_zones(symbol, timeframe)
+            tracker = ZoneTracker()
+            rates = await fetch_rates(symbol_name_to_id.get(symbol.upper(), symbol), timeframe, len(candles))
+            tracker.sync(rates[:-1])
+        first, last = (int(datetime.fromisoformat(candles[i]["time"].replace("Z", "+00:00")).timestamp()) for i in (0, -1))
+        low, high = min(c["low"] for c in candles), max(c["high"] for c in candles)
+        visible_zones = [z for z in tracker.zones(start=first, end=last) if z["high"] >= low and z["low"] <= high]
 
         highlights = {
-            "order_block": ob,
-            "fvg": fvg,
-            "choch": choch,
+            "zones": visible_zones,
             "entry": entry,
             "stop_loss": stop_loss,
             "take_profit": take_profit
         }
 
-        image_bytes = generate_smc_chart(
-            candles,
-            title=f"{symbol} SMC Chart - {timeframe}",
-            highlights=highlights
-        )
+        with span("chart.render", tf=timeframe.upper()):
+            image_bytes = generate_smc_chart(
+                candles,
+                title=f"{symbol} SMC Chart - {timeframe}",
+                highlights=highlights
+            )
 
         return Response(content=image_bytes, media_type="image/png")
 
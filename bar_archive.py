@@ -0,0 +1,278 @@
+# bar_archive.py
+# ---------------------------------------------------------------------------
+# On-disk bar history for offline jobs (parameter sweeps, replays).
+#
+#   python bar_archive.py EURUSD GBPUSD --tf M15 H1 --bars 100000   # from MT5
+#   python bar_archive.py EURUSD --tf M15 --stub                    # synthetic
+#   python bar_archive.py --convert                                 # .npz archives → .cbar
+#
+#   bars = load("EURUSD", "M1")                                     # whole history
+#   bars = load("EURUSD", "M1", start=t0, end=t1)                   # only the blocks overlapping [t0, t1)
+#   bars = load("EURUSD", "M1", touching=1.0850)                    # bars that traded at a price
+#   for chunk in iter_chunks("EURUSD", "M1"): ...                   # one block at a time
+#
+# One file per symbol/timeframe, oldest bar first, in resample.BAR_DTYPE
+# layout once loaded. Two formats:
+#
+#   {SYMBOL}_{TF}.npz    plain float64 arrays (48 bytes/bar)
+#   {SYMBOL}_{TF}.cbar   compressed (BAR_ARCHIVE_FORMAT=cbar, the default)
+#
+# .cbar stores prices as fixed-point integers (the symbol's digits, e.g. from
+# symbol_digits_map) in blocks of BAR_ARCHIVE_BLOCK_BARS bars. Each block is
+# six varint columns (columnar.py): time and close as deltas, and the
+# open-to-previous-close gap, both wicks and tick volume as plain values.
+# All of them are small, so an M1 bar takes ~8 bytes. A footer index holds
+# every block's time range and low/high, so time-range and price reads decode
+# only the blocks that can contain a match.
+#
+#   header  <4sHHI   b"CBR1", version, digits, block size
+#   blocks  columnar.encode_columns payloads
+#   index   <QIIqqqq per block: offset, bytes, bars, first/last time, low min, high max
+#   footer  <QIQ4s   index offset, blocks, bars, b"CBR1"
+
+import argparse
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+import columnar
+from resample import BAR_DTYPE, as_bars
+
+load_dotenv()
+
+BAR_ARCHIVE_DIR = os.getenv("BAR_ARCHIVE_DIR", "bar_archive")
+BAR_ARCHIVE_FORMAT = os.getenv("BAR_ARCHIVE_FORMAT", "cbar")          # cbar | npz
+BAR_ARCHIVE_BLOCK_BARS = int(os.getenv("BAR_ARCHIVE_BLOCK_BARS", "4096"))
+
+FORMATS = ("cbar", "npz")
+_MAGIC = b"CBR1"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_BLOCK = struct.Struct("<QIIqqqq")
+_FOOTER = struct.Struct("<QIQ4s")
+MAX_DIGITS = 10
+
+BlockInfo = namedtuple("BlockInfo", "offset length count t_first t_last low high")
+
+
+def path_for(symbol: str, tf: str, directory: str = None, fmt: str = None) -> str:
+    """Path of the archive; without `fmt`, whichever format exists (compressed first)."""
+    stem = os.path.join(directory or BAR_ARCHIVE_DIR, f"{symbol.upper()}_{tf.upper()}")
+    if fmt is not None:
+        return f"{stem}.{fmt}"
+    for ext in FORMATS:
+        if os.path.exists(f"{stem}.{ext}"):
+            return f"{stem}.{ext}"
+    return f"{stem}.{BAR_ARCHIVE_FORMAT}"
+
+
+# ── compressed format ──────────────────────────────────────────────────────
+def price_digits(bars: np.ndarray, hint: int = None) -> int:
+    """Fewest digits (≥ hint) at which every price survives the fixed-point round trip."""
+    prices = np.concatenate([bars[f] for f in ("open", "high", "low", "close")])
+    for digits in range(hint or 0, MAX_DIGITS + 1):
+        if np.array_equal(columnar.from_fixed(columnar.to_fixed(prices, digits), digits), prices):
+            return digits
+    raise ValueError(f"Prices are not on a decimal grid of ≤ {MAX_DIGITS} digits")
+
+
+def encode_block(bars: np.ndarray, digits: int) -> bytes:
+    o, h, l, c = (columnar.to_fixed(bars[f], digits) for f in ("open", "high", "low", "close"))
+    prev_close = np.concatenate(([0], c[:-1]))
+    columns = [
+        bars["time"].astype(np.int64),
+        c,
+        o - prev_close,                    # 0 unless the market gapped
+        h - np.maximum(o, c),              # upper wick
+        np.minimum(o, c) - l,              # lower wick
+        bars["tick_volume"].astype(np.int64),
+    ]
+    return columnar.encode_columns(columns, deltas=[True, True, False, False, False, False])
+
+
+def decode_block(payload, digits: int) -> np.ndarray:
+    time, c, gap, upper, lower, volume = columnar.decode_columns(payload)
+    o = np.concatenate(([0], c[:-1])) + gap
+    bars = np.empty(len(time), dtype=BAR_DTYPE)
+    bars["time"] = time
+    bars["open"] = columnar.from_fixed(o, digits)
+    bars["high"] = columnar.from_fixed(np.maximum(o, c) + upper, digits)
+    bars["low"] = columnar.from_fixed(np.minimum(o, c) - lower, digits)
+    bars["close"] = columnar.from_fixed(c, digits)
+    bars["tick_volume"] = volume
+    return bars
+
+
+def write_compressed(path: str, bars: np.ndarray, digits: int = None, block_bars: int = None) -> int:
+    """Write a .cbar file; returns its size in bytes."""
+    bars = as_bars(bars)
+    digits = price_digits(bars, digits)
+    block_bars = block_bars or BAR_ARCHIVE_BLOCK_BARS
+    tmp = f"{path}.tmp"
+    index = []
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, digits, block_bars))
+        for start in range(0, len(bars), block_bars):
+            block = bars[start:start + block_bars]
+            payload = encode_block(block, digits)
+            index.append(_BLOCK.pack(
+                f.tell(), len(payload), len(block), int(block["time"][0]), int(block["time"][-1]),
+                int(columnar.to_fixed(block["low"].min(), digits)),
+                int(columnar.to_fixed(block["high"].max(), digits)),
+            ))
+            f.write(payload)
+        index_offset = f.tell()
+        f.write(b"".join(index))
+        f.write(_FOOTER.pack(index_offset, len(index), len(bars), _MAGIC))
+        size = f.tell()
+    os.replace(tmp, path)      # readers never see a half-written archive
+    return size
+
+
+def read_index(f) -> tuple:
+    """(digits, [BlockInfo]) from an open .cbar file."""
+    magic, version, digits, _ = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"Not a v{_VERSION} .cbar archive")
+    f.seek(-_FOOTER.size, os.SEEK_END)
+    index_offset, blocks, _, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+    if magic != _MAGIC:
+        raise ValueError("Truncated .cbar archive")
+    f.seek(index_offset)
+    table = f.read(blocks * _BLOCK.size)
+    return digits, [BlockInfo(*_BLOCK.unpack_from(table, i * _BLOCK.size)) for i in range(blocks)]
+
+
+def _iter_compressed(path: str, start: int = None, end: int = None, touching: float = None):
+    with open(path, "rb") as f:
+        digits, blocks = read_index(f)
+        price = None if touching is None else columnar.to_fixed(touching, digits)
+        for b in blocks:
+            if (start is not None and b.t_last < start) or (end is not None and b.t_first >= end):
+                continue
+            if price is not None and not b.low <= price <= b.high:
+                continue
+            f.seek(b.offset)
+            bars = decode_block(f.read(b.length), digits)
+            yield _select(bars, start, end, touching)
+
+
+def read_compressed(path: str, start: int = None, end: int = None, touching: float = None) -> np.ndarray:
+    """A .cbar file (or the part matching start/end/touching) as one BAR_DTYPE array."""
+    return _concat(_iter_compressed(path, start, end, touching))
+
+
+def _concat(chunks) -> np.ndarray:
+    chunks = [c for c in chunks if len(c)]
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=BAR_DTYPE)
+
+
+def _select(bars: np.ndarray, start: int = None, end: int = None, touching: float = None) -> np.ndarray:
+    lo = 0 if start is None else np.searchsorted(bars["time"], start, "left")
+    hi = len(bars) if end is None else np.searchsorted(bars["time"], end, "left")
+    bars = bars[lo:hi]
+    if touching is not None:
+        bars = bars[(bars["low"] <= touching) & (bars["high"] >= touching)]
+    return bars
+
+
+# ── public API ─────────────────────────────────────────────────────────────
+def save(symbol: str, tf: str, rates: np.ndarray, directory: str = None, fmt: str = None,
+         digits: int = None) -> str:
+    """
+    Write the archive, replacing one in the other format.
+
+    Args:
+        fmt: "cbar" or "npz" (default BAR_ARCHIVE_FORMAT)
+        digits: Price digits for .cbar (e.g. symbol_digits_map[symbol]); more if the prices need them
+    """
+    fmt = fmt or BAR_ARCHIVE_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown archive format '{fmt}'; expected one of {FORMATS}")
+    path = path_for(symbol, tf, directory, fmt)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if fmt == "cbar":
+        write_compressed(path, rates, digits)
+    else:
+        np.savez(path, bars=as_bars(rates))
+    for other in FORMATS:
+        stale = path_for(symbol, tf, directory, other)
+        if other != fmt and os.path.exists(stale):
+            os.remove(stale)
+    return path
+
+
+def iter_chunks(symbol: str, tf: str, directory: str = None, start: int = None, end: int = None,
+                touching: float = None):
+    """
+    BAR_DTYPE chunks with start ≤ time < end (epoch s), oldest first; one
+    block at a time for .cbar. With `touching`, only bars whose low-high
+    range includes that price.
+    """
+    path = path_for(symbol, tf, directory)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No archive for {symbol.upper()} {tf.upper()} at {path}")
+    if path.endswith(".cbar"):
+        yield from _iter_compressed(path, start, end, touching)
+    else:
+        with np.load(path) as f:
+            yield _select(f["bars"], start, end, touching)
+
+
+def load(symbol: str, tf: str, directory: str = None, start: int = None, end: int = None,
+         touching: float = None) -> np.ndarray:
+    return _concat(iter_chunks(symbol, tf, directory, start, end, touching))
+
+
+def list_archives(directory: str = None) -> list:
+    """[(symbol, tf)] for every archive file in the directory."""
+    directory = directory or BAR_ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+    out = set()
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext[1:] in FORMATS and "_" in stem:
+            symbol, tf = stem.rsplit("_", 1)
+            out.add((symbol, tf))
+    return sorted(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download bar history into the local archive.")
+    parser.add_argument("symbols", nargs="*")
+    parser.add_argument("--tf", nargs="+", default=["M15", "H1"])
+    parser.add_argument("--bars", type=int, default=100_000)
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--format", choices=FORMATS, default=None, help=f"default: {BAR_ARCHIVE_FORMAT}")
+    parser.add_argument("--convert", action="store_true", help="rewrite existing archives in --format instead")
+    parser.add_argument("--stub", action="store_true", help="synthetic bars from stub_broker, no terminal")
+    args = parser.parse_args()
+
+    if args.convert:
+        for symbol, tf in list_archives(args.dir):
+            before = path_for(symbol, tf, args.dir)
+            size = os.path.getsize(before)
+            after = save(symbol, tf, load(symbol, tf, args.dir), args.dir, args.format)
+            print(f"[INFO] {symbol} {tf}: {size:,} → {os.path.getsize(after):,} bytes ({after})")
+        raise SystemExit(0)
+    if not args.symbols:
+        parser.error("give symbols to download, or --convert")
+
+    if args.stub:
+        import stub_broker
+        stub_broker.install(history=args.bars)
+        os.environ.setdefault("MT5_LOGIN", "0")
+    from mt5_client import get_rates, symbol_digits_map, symbol_name_to_id
+
+    for symbol in args.symbols:
+        name = symbol_name_to_id.get(symbol.upper(), symbol)
+        for tf in args.tf:
+            rates = get_rates(name, tf, args.bars)
+            path = save(symbol, tf, rates, args.dir, args.format, digits=symbol_digits_map.get(name))
+            print(f"[INFO] {symbol} {tf}: {len(rates)} bars → {path}")
@@ -0,0 +1,206 @@
+# bench_analysis.py
+# ---------------------------------------------------------------------------
+# Micro-benchmarks for the analysis.py detectors across history depths.
+#
+#   python bench_analysis.py                         # 100 → 1M synthetic bars
+#   python bench_analysis.py --sizes 100 10000       # custom depths
+#   python bench_analysis.py --recorded eurusd.json  # recorded candles (JSON list or CSV)
+#   python bench_analysis.py --series flat           # worst case: no pattern ever matches
+#
+# Reports ns/bar and peak allocations per detector, and checks that every
+# alternative implementation registered in IMPLEMENTATIONS returns the same
+# result as the reference one.
+
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import analysis
+import stub_broker
+import trend
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+# ── inputs ─────────────────────────────────────────────────────────────────
+def flat_candles(n: int) -> list:
+    """Constant bars: no OB, FVG or CHOCH ever matches, so every scan runs to its limit."""
+    base = stub_broker.synthetic_candles(n, seed=0)
+    return [{**c, "open": 1.1, "high": 1.1, "low": 1.1, "close": 1.1} for c in base]
+
+
+def load_recorded(path: str) -> list:
+    """Load candles from a JSON list of candle dicts or a CSV with time,open,high,low,close,volume."""
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            return [
+                {
+                    "time": row["time"],
+                    "open": float(row["open"]),
+                    "high": float(row["high"]),
+                    "low": float(row["low"]),
+                    "close": float(row["close"]),
+                    "volume": int(float(row.get("volume") or 0)),
+                }
+                for row in csv.DictReader(f)
+            ]
+    with open(path) as f:
+        data = json.load(f)
+    return data["candles"] if isinstance(data, dict) else data
+
+
+def make_inputs(candles: list) -> dict:
+    """Precompute the derived inputs so each case only times its own detector."""
+    tagged = analysis.tag_sessions_local(candles)
+    return {
+        "candles": candles,
+        "closes": [c["close"] for c in candles],
+        "tagged": tagged,
+        "levels": analysis.compute_session_levels(tagged),
+        "pdh": max(c["high"] for c in candles[-200:]),
+        "pdl": min(c["low"] for c in candles[-200:]),
+    }
+
+
+# ── cases ──────────────────────────────────────────────────────────────────
+# name → (callable(impl, inputs), reference implementation)
+CASES = {
+    "detect_order_block": (lambda f, i: f(i["candles"], lookback=200, macro_threshold=100), analysis.detect_order_block),
+    "detect_fvg": (lambda f, i: f(i["candles"]), analysis.detect_fvg),
+    "detect_choch": (lambda f, i: f(i["candles"], macro_threshold=100), analysis.detect_choch),
+    "detect_sweep": (lambda f, i: f(i["tagged"], i["pdh"], i["pdl"], i["levels"]), analysis.detect_sweep),
+    "tag_sessions_local": (lambda f, i: f(i["candles"]), analysis.tag_sessions_local),
+    "compute_session_levels": (lambda f, i: f(i["tagged"]), analysis.compute_session_levels),
+    "ols_trend": (lambda f, i: f(i["closes"]), lambda closes: _polyfit_trend(closes)),
+}
+
+
+def _polyfit_trend(closes) -> tuple:
+    """Previous get_ohlc_data trend math: np.polyfit + np.corrcoef on a fresh arange."""
+    x = np.arange(len(closes))
+    slope, _ = np.polyfit(x, closes, 1)
+    r = np.corrcoef(x, closes)[0, 1]
+    return float(slope), float(r)
+
+
+# name → {label: alternative implementation}; each is checked against the reference.
+IMPLEMENTATIONS = {name: {} for name in CASES}
+IMPLEMENTATIONS["ols_trend"]["closed_form"] = trend.ols_trend
+
+
+def _normalise(result):
+    if isinstance(result, dict) and "sweeps" in result:
+        return {"sweeps": sorted(result["sweeps"])}
+    if isinstance(result, tuple) and all(isinstance(v, float) for v in result):
+        return tuple(float(f"{v:.6g}") for v in result)
+    return result
+
+
+
+def time_case(fn, inputs: dict, min_time: float = 0.2, max_repeat: int = 1000) -> float:
+    """Best-of timing in ns per call."""
+    best = None
+    spent, repeat = 0.0, 0
+    while spent < min_time and repeat < max_repeat:
+        start = time.perf_counter_ns()
+        fn(inputs)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed / 1e9
+        repeat += 1
+    return best
+
+
+def alloc_case(fn, inputs: dict) -> int:
+    """Peak bytes allocated during one call, measured with tracemalloc."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - base
+
+
+def check_equivalence(name: str, inputs: dict) -> list:
+    call, reference = CASES[name]
+    expected = _normalise(call(reference, inputs))
+    return [
+        label for label, impl in IMPLEMENTATIONS[name].items()
+        if _normalise(call(impl, inputs)) != expected
+    ]
+
+
+def run(series: dict, cases: list, measure_alloc: bool = True) -> list:
+    rows = []
+    for label, candles in series.items():
+        inputs = make_inputs(candles)
+        n = len(candles)
+        for name in cases:
+            call, reference = CASES[name]
+            impls = {"reference": reference, **IMPLEMENTATIONS[name]}
+            mismatched = check_equivalence(name, inputs)
+            for impl_label, impl in impls.items():
+                fn = lambda i, impl=impl: call(impl, i)
+                ns = time_case(fn, inputs)
+                peak = alloc_case(fn, inputs) if measure_alloc else None
+                rows.append({
+                    "series": label,
+                    "bars": n,
+                    "case": name,
+                    "impl": impl_label,
+                    "ns_per_call": ns,
+                    "ns_per_bar": ns / n,
+                    "peak_kb": None if peak is None else round(peak / 1024, 1),
+                    "equivalent": impl_label not in mismatched,
+                })
+    return rows
+
+
+def print_report(rows: list):
+    header = f"{'series':<14}{'bars':>10}  {'case':<24}{'impl':<12}{'ns/bar':>12}{'µs/call':>12}{'peak KB':>10}  eq"
+    print(header)
+    print("─" * len(header))
+    for r in rows:
+        peak = "-" if r["peak_kb"] is None else f"{r['peak_kb']:.1f}"
+        print(f"{r['series']:<14}{r['bars']:>10}  {r['case']:<24}{r['impl']:<12}"
+              f"{r['ns_per_bar']:>12.1f}{r['ns_per_call'] / 1000:>12.1f}{peak:>10}  "
+              f"{'✓' if r['equivalent'] else '✗'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark analysis.py detectors.")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--series", choices=["random", "flat"], default="random")
+    parser.add_argument("--recorded", nargs="*", default=[], help="JSON/CSV candle files")
+    parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--no-alloc", action="store_true", help="skip tracemalloc pass")
+    parser.add_argument("--json", help="also write rows to this file")
+    args = parser.parse_args(argv)
+
+    series = {}
+    for n in args.sizes:
+        series[f"{args.series}-{n}"] = (
+            flat_candles(n) if args.series == "flat" else stub_broker.synthetic_candles(n, seed=n)
+        )
+    for path in args.recorded:
+        series[path.rsplit("/", 1)[-1]] = load_recorded(path)
+
+    rows = run(series, args.cases, measure_alloc=not args.no_alloc)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0 if all(r["equivalent"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
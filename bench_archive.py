@@ -0,0 +1,136 @@
+# bench_archive.py
+# ---------------------------------------------------------------------------
+# Size and speed of the bar archive formats (bar_archive.py).
+#
+#   python bench_archive.py                          # 100k and 1M synthetic M1 bars
+#   python bench_archive.py --sizes 5000000          # custom depths
+#   python bench_archive.py --archives               # every archive in BAR_ARCHIVE_DIR
+#
+# For each series it writes raw float64 records (.npy), .npz, .npz with zlib
+# and .cbar, then reports bytes/bar, write time, full-decode throughput in MB/s
+# of BAR_DTYPE output, and the time to read one day out of the middle (where
+# .cbar decodes only the blocks that overlap it). Every format is checked to
+# round-trip bit for bit.
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bar_archive
+import stub_broker
+from resample import BAR_DTYPE, as_bars
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def best_of(fn, min_time: float = 0.3, max_repeat: int = 50) -> float:
+    """Best-of wall time in seconds."""
+    best, spent, repeat = None, 0.0, 0
+    while spent < min_time and repeat < max_repeat:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        repeat += 1
+    return best, result
+
+
+def _npy(path, bars):
+    np.save(path, bars)
+
+
+def _npz_zlib(path, bars):
+    np.savez_compressed(path, bars=bars)
+
+
+def _load_npy(path, start=None, end=None):
+    bars = np.load(path)
+    return bars if start is None else bars[(bars["time"] >= start) & (bars["time"] < end)]
+
+
+def _load_npz(path, start=None, end=None):
+    with np.load(path) as f:
+        bars = f["bars"]
+    return bars if start is None else bars[(bars["time"] >= start) & (bars["time"] < end)]
+
+
+def bench_series(label: str, bars: np.ndarray, directory: str, digits: int = None) -> list:
+    bars = as_bars(bars)
+    n = len(bars)
+    raw_mb = n * BAR_DTYPE.itemsize / 1e6
+    mid = int(bars["time"][n // 2])
+    day = (mid, mid + 86400)
+    expected_day = bars[(bars["time"] >= day[0]) & (bars["time"] < day[1])]
+
+    formats = {
+        "float64 .npy": (os.path.join(directory, "bars.npy"), _npy, _load_npy),
+        ".npz": (os.path.join(directory, "bars.npz"), lambda p, b: np.savez(p, bars=b), _load_npz),
+        ".npz zlib": (os.path.join(directory, "bars_z.npz"), _npz_zlib, _load_npz),
+        ".cbar": (
+            os.path.join(directory, "bars.cbar"),
+            lambda p, b: bar_archive.write_compressed(p, b, digits),
+            bar_archive.read_compressed,
+        ),
+    }
+    rows = []
+    for name, (path, write, read) in formats.items():
+        write_s, _ = best_of(lambda: write(path, bars), max_repeat=3)
+        decode_s, decoded = best_of(lambda: read(path))
+        range_s, window = best_of(lambda: read(path, *day))
+        size = os.path.getsize(path)
+        rows.append({
+            "series": label,
+            "bars": n,
+            "format": name,
+            "bytes_per_bar": size / n,
+            "ratio": n * BAR_DTYPE.itemsize / size,
+            "write_ms": write_s * 1000,
+            "decode_mb_s": raw_mb / decode_s,
+            "day_read_ms": range_s * 1000,
+            "lossless": bool(np.array_equal(decoded, bars) and np.array_equal(window, expected_day)),
+        })
+    return rows
+
+
+def print_report(rows: list):
+    header = (f"{'series':<18}{'bars':>10}  {'format':<14}{'B/bar':>8}{'ratio':>8}"
+              f"{'write ms':>10}{'decode MB/s':>13}{'1-day ms':>10}  ok")
+    print(header)
+    print("─" * len(header))
+    for r in rows:
+        print(f"{r['series']:<18}{r['bars']:>10}  {r['format']:<14}{r['bytes_per_bar']:>8.2f}{r['ratio']:>8.1f}"
+              f"{r['write_ms']:>10.1f}{r['decode_mb_s']:>13.0f}{r['day_read_ms']:>10.2f}  "
+              f"{'✓' if r['lossless'] else '✗'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bar archive formats.")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES, help="synthetic M1 bars")
+    parser.add_argument("--archives", action="store_true", help="also bench every archive in --dir")
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--json", help="also write rows to this file")
+    args = parser.parse_args(argv)
+
+    series = {f"M1-{n}": (stub_broker.synthetic_rates(n, seed=n, step_seconds=60), 5) for n in args.sizes}
+    if args.archives:
+        for symbol, tf in bar_archive.list_archives(args.dir):
+            series[f"{symbol}_{tf}"] = (bar_archive.load(symbol, tf, args.dir), None)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, (bars, digits) in series.items():
+            rows += bench_series(label, bars, directory, digits)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# bench_endpoints.py
+# ---------------------------------------------------------------------------
+# Load / latency benchmark for the FastAPI endpoints against the stub broker.
+#
+#   python bench_endpoints.py                      # run and print a report
+#   python bench_endpoints.py --save-baseline      # store results as baseline
+#   python bench_endpoints.py --compare            # fail (exit 1) on regression
+
+import argparse
+import http.client
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import stub_broker
+
+BASELINE_PATH = os.getenv("BENCH_BASELINE", "bench_baseline.json")
+
+SAMPLE_CANDLES = stub_broker.synthetic_candles(96, step_seconds=900, seed=7)
+
+# name → (method, path, json body or None)
+ENDPOINTS = {
+    "fetch-data": ("POST", "/fetch-data", {"symbol": "EURUSD", "timeframe": "M5"}),
+    "analyze": ("POST", "/analyze", {"symbol": "EURUSD"}),
+    "chart": ("POST", "/chart?" + urlencode({"symbol": "EURUSD", "timeframe": "M15"}), None),
+    "tag-sessions": ("POST", "/tag-sessions", {"candles": SAMPLE_CANDLES}),
+    "session-levels": ("POST", "/session-levels", {"candles": SAMPLE_CANDLES}),
+    "place-order": ("POST", "/place-order", {
+        "symbol": "EURUSD", "order_type": "LIMIT", "direction": "BUY",
+        "volume": 0.1, "entry_price": 1.09, "stop_loss": 1.08, "take_profit": 1.11,
+    }),
+    "open-positions": ("GET", "/open-positions", None),
+}
+
+
+# ── server ─────────────────────────────────────────────────────────────────
+def start_server(port: int, broker_latency_ms: float):
+    """Import app against the stub broker and serve it from a background thread."""
+    stub_broker.install(latency_ms=broker_latency_ms)
+    os.environ.setdefault("MT5_LOGIN", "0")
+
+    import uvicorn
+    from app import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    for _ in range(200):
+        if server.started:
+            return server
+        time.sleep(0.05)
+    raise RuntimeError("uvicorn did not start")
+
+
+# ── load generator ─────────────────────────────────────────────────────────
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _one_request(port, method, path, body):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    payload = json.dumps(body) if body is not None else None
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    start = time.perf_counter()
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        status = resp.status
+    except OSError:
+        status = 0
+    finally:
+        conn.close()
+    return time.perf_counter() - start, status
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_endpoint(port: int, name: str, requests: int, concurrency: int, warmup: int = 5) -> dict:
+    method, path, body = ENDPOINTS[name]
+    for _ in range(warmup):
+        _one_request(port, method, path, body)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _one_request(port, method, path, body), range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "errors": sum(n for s, n in statuses.items() if not s.startswith("2")),
+        "statuses": statuses,
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+
+# ── baselines ──────────────────────────────────────────────────────────────
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a list of human-readable regressions (empty list → no regression)."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms → {cur['p95_ms']}ms")
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} → {cur['throughput_rps']} rps")
+        if cur["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: errors {base.get('errors', 0)} → {cur['errors']}")
+    return regressions
+
+
+def print_report(results: dict):
+    header = f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}{'err':>6}{'rss MB':>9}"
+    print(header)
+    print("─" * len(header))
+    for name, r in results.items():
+        print(f"{name:<16}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_rps']:>10.1f}{r['errors']:>6}{r['rss_mb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FastAPI endpoints against a stub broker.")
+    parser.add_argument("--endpoints", nargs="*", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--broker-latency-ms", type=float, default=2.0, help="simulated terminal latency")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="exit 1 if results regress vs baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    server = start_server(args.port, args.broker_latency_ms)
+    try:
+        results = {
+            name: run_endpoint(args.port, name, args.requests, args.concurrency)
+            for name in args.endpoints
+        }
+    finally:
+        server.should_exit = True
+
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"[ERROR] No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print("[REGRESSION]", r)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# broker_connection.py
+# ---------------------------------------------------------------------------
+# Connection supervision for the cTrader Open API client (Twisted).
+#
+#   supervisor = ConnectionSupervisor("ctrader", handshake=_handshake, probe=_probe)
+#   client = Client(host, port, TcpProtocol, retryPolicy=supervisor.retry_policy)
+#   supervisor.attach(client)
+#
+# States: disconnected → handshake (auth, symbols, spot re-subscription) →
+# ready. Every `interval` seconds a ready connection is probed; the probe
+# round trip is the reported latency. A connection that stays silent for
+# `timeout` seconds or misses `max_missed` probes in a row is aborted, and
+# the client service reconnects with exponential backoff. Requests sent
+# while the connection is not ready, and requests in flight when it drops,
+# fail at once with BrokerUnavailable instead of waiting out their timeout.
+
+import random
+import threading
+import time
+
+from twisted.internet import reactor, task
+
+DISCONNECTED, HANDSHAKE, READY = "disconnected", "handshake", "ready"
+
+
+class BrokerUnavailable(ConnectionError):
+    """The broker connection is down or not yet authenticated."""
+
+
+class ConnectionSupervisor:
+    """
+    Args:
+        name: Label for logs and status
+        handshake: handshake() → Deferred that fires once the session is usable
+        probe: probe() → Deferred for a cheap request/response round trip
+        interval: Seconds between probes
+        timeout: Seconds without any inbound message before the link is declared dead
+        max_missed: Consecutive failed probes before the link is declared dead
+        backoff_initial, backoff_max: Reconnect delay bounds in seconds (doubling, jittered)
+    """
+
+    def __init__(self, name: str, handshake, probe, interval: float = 10.0, timeout: float = 30.0,
+                 max_missed: int = 2, backoff_initial: float = 1.0, backoff_max: float = 60.0, clock=None):
+        self.name = name
+        self.handshake = handshake
+        self.probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.max_missed = max_missed
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.clock = clock or reactor
+
+        self.client = None
+        self.state = DISCONNECTED
+        self.state_since = time.time()
+        self.latency_ms = None
+        self.last_message = None
+        self.last_error = None
+        self.reconnects = 0
+        self._handshake_failures = 0
+        self._missed = 0
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._heartbeat = task.LoopingCall(self._tick)
+        self._heartbeat.clock = self.clock
+        self._on_message = []
+
+    # ── wiring ──────────────────────────────────────────────────────────────
+    def attach(self, client):
+        self.client = client
+        client.setConnectedCallback(self._connected)
+        client.setDisconnectedCallback(self._disconnected)
+        client.setMessageReceivedCallback(self._received)
+        if not self._heartbeat.running:
+            self._heartbeat.start(self.interval, now=False)
+
+    def on_message(self, callback):
+        """Also pass every inbound message to callback(message) (spot events etc.)."""
+        self._on_message.append(callback)
+
+    def retry_policy(self, failed_attempts: int) -> float:
+        """Reconnect delay for the client service; failed handshakes count as failed attempts."""
+        self.reconnects += 1
+        attempt = failed_attempts + self._handshake_failures
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** max(0, attempt - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            self.state_since = time.time()
+
+    # ── client callbacks (reactor thread) ───────────────────────────────────
+    def _connected(self, client):
+        print(f"[INFO] {self.name}: connected, authenticating")
+        self._set_state(HANDSHAKE)
+        self.last_message = time.time()
+        self._missed = 0
+        d = self.handshake()
+        d.addCallbacks(self._handshake_done, self._handshake_failed)
+
+    def _handshake_done(self, _):
+        self._handshake_failures = 0
+        self._set_state(READY)
+        print(f"[INFO] {self.name}: ready")
+
+    def _handshake_failed(self, failure):
+        self._handshake_failures += 1
+        self.last_error = f"handshake: {failure.getErrorMessage()}"
+        print(f"[ERROR] {self.name}: {self.last_error}")
+        self.drop(self.last_error)
+
+    def _disconnected(self, client, reason):
+        message = getattr(reason, "getErrorMessage", lambda: str(reason))()
+        print(f"[INFO] {self.name}: disconnected: {message}")
+        if self.state != DISCONNECTED:      # otherwise drop() already recorded why
+            self.last_error = message
+        self._set_state(DISCONNECTED)
+        self.latency_ms = None
+        self._fail_inflight(BrokerUnavailable(f"{self.name} connection lost: {message}"))
+
+    def _received(self, client, message):
+        self.last_message = time.time()
+        for callback in self._on_message:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"[ERROR] {self.name}: message callback: {e}")
+
+    # ── heartbeat ───────────────────────────────────────────────────────────
+    def _tick(self):
+        if self.state != READY:
+            return
+        silent = time.time() - (self.last_message or 0)
+        if silent > self.timeout:
+            self.drop(f"no traffic for {silent:.0f}s")
+            return
+        sent = time.perf_counter()
+
+        def _ok(_):
+            self._missed = 0
+            self.latency_ms = round((time.perf_counter() - sent) * 1000, 2)
+
+        def _missed(failure):
+            self._missed += 1
+            if self._missed >= self.max_missed and self.state == READY:
+                self.drop(f"{self._missed} heartbeats missed ({failure.getErrorMessage()})")
+
+        self.probe().addCallbacks(_ok, _missed)
+
+    def drop(self, reason: str):
+        """Abort the current transport; the client service reconnects with backoff."""
+        print(f"[INFO] {self.name}: dropping connection: {reason}")
+        self.last_error = reason
+        self._set_state(DISCONNECTED)
+        self._fail_inflight(BrokerUnavailable(f"{self.name} connection dropped: {reason}"))
+
+        def _abort(protocol):
+            transport = getattr(protocol, "transport", None)
+            if transport is not None:
+                transport.abortConnection()
+
+        self.client.whenConnected(failAfterFailures=1).addCallbacks(_abort, lambda f: None)
+
+    # ── request side (any thread) ───────────────────────────────────────────
+    def check(self):
+        """Raise BrokerUnavailable unless the session is ready for requests."""
+        if self.state != READY:
+            raise BrokerUnavailable(f"{self.name} is {self.state}" + (f" ({self.last_error})" if self.last_error else ""))
+
+    def track(self, d):
+        """Fail Deferred `d` with BrokerUnavailable if the connection drops before it fires."""
+        with self._lock:
+            self._inflight.add(d)
+
+        def _done(result):
+            with self._lock:
+                self._inflight.discard(d)
+            return result
+
+        d.addBoth(_done)
+        return d
+
+    def _fail_inflight(self, error: BrokerUnavailable):
+        with self._lock:
+            pending, self._inflight = self._inflight, set()
+        for d in pending:
+            if not d.called:
+                d.errback(error)
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "state": self.state,
+            "connected": self.state == READY,
+            "state_seconds": round(now - self.state_since, 1),
+            "latency_ms": self.latency_ms,
+            "last_message_age": round(now - self.last_message, 1) if self.last_message else None,
+            "reconnects": self.reconnects,
+            "inflight": len(self._inflight),
+            "last_error": self.last_error,
+        }
+
+
+def wait_result(d, timeout: float, parse=lambda res: res):
+    """
+    Block the calling (non-reactor) thread until Deferred `d` fires and return
+    parse(result). Failures, including BrokerUnavailable, are raised;
+    TimeoutError after `timeout` seconds.
+    """
+    done, box = threading.Event(), {}
+
+    def _ok(res):
+        try:
+            box["result"] = parse(res)
+        except Exception as e:
+            box["error"] = e
+        done.set()
+
+    def _err(failure):
+        box["error"] = failure.value
+        done.set()
+
+    d.addCallbacks(_ok, _err)
+    if not done.wait(timeout):
+        raise TimeoutError(f"No broker response within {timeout}s")
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
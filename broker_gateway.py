@@ -0,0 +1,432 @@
+# broker_gateway.py
+# ---------------------------------------------------------------------------
+# One process owns the MetaTrader5 session; API workers talk to it over a
+# Unix socket.
+#
+#   python broker_gateway.py                                  # owns the terminal
+#   BROKER_GATEWAY_SOCKET=/tmp/smc-broker.sock uvicorn app:app --workers 4
+#
+# The gateway runs terminal calls one at a time through mt5_client's scheduler
+# (the MT5 API is not thread-safe; orders go ahead of queued bar fetches) and
+# coalesces identical read requests that arrive while one is already in
+# flight, so N workers asking for the same bars cost one call. Only requests
+# of the same priority share a call (an interactive fetch never waits on a
+# queued WARMUP one); WARMUP requests may join any of them.
+#
+# Wire format, both directions (little-endian):
+#
+#   header  <IIBB   payload length, request id, op (request) / status (reply),
+#                   priority + 1 (request; 0 = the op's own class) / encoding (reply)
+#   payload         JSON (utf-8), or raw resample.BAR_DTYPE / ticks.TICK_DTYPE records
+#
+# A worker's scheduler.prioritized() block (e.g. WARMUP for background jobs)
+# travels in the request header, so the gateway queues those calls behind
+# interactive ones just as an in-process scheduler would. A call that fails
+# because the broker is disconnected (any ConnectionError, e.g.
+# BrokerUnavailable) replies STATUS_UNAVAILABLE, which the worker raises as
+# GatewayUnavailable, so the API still answers 503 rather than 500.
+#
+# Importing this module gives the mt5_client function surface backed by the
+# gateway (get_ohlc_data, get_rates, place_order, ... and symbol_name_to_id).
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from resample import BAR_DTYPE, as_bars
+from scheduler import WARMUP, effective_priority, prioritized
+from ticks import TICK_DTYPE, as_ticks
+
+load_dotenv()
+
+BROKER_GATEWAY_SOCKET = os.getenv("BROKER_GATEWAY_SOCKET", "/tmp/smc-broker.sock")
+
+HEADER = struct.Struct("<IIBB")
+
+OPS = (
+    "ping", "stats", "symbols", "get_rates", "get_ohlc_data",
+    "get_open_positions", "get_pending_orders",
+    "place_order", "modify_position_sltp", "modify_pending_order_sltp",
+    "get_connection_status", "get_change_token", "get_symbol_specs", "get_account_info",
+    "get_ticks",
+)
+OP_CODES = {name: code for code, name in enumerate(OPS, start=1)}
+# Never coalesced: two identical orders are two orders
+WRITE_OPS = {"place_order", "modify_position_sltp", "modify_pending_order_sltp"}
+
+STATUS_OK, STATUS_ERROR, STATUS_UNAVAILABLE = 0, 1, 2
+ENC_JSON, ENC_BARS, ENC_TICKS = 0, 1, 2
+
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+
+class GatewayError(RuntimeError):
+    """Error raised by the broker call inside the gateway."""
+
+
+class GatewayUnavailable(GatewayError, ConnectionError):
+    """The gateway's broker connection is down (a ConnectionError inside the gateway)."""
+
+
+# ── result encoding ────────────────────────────────────────────────────────
+def _plain(obj):
+    """JSON-ready form of MT5 results; namedtuples keep their type name."""
+    if hasattr(obj, "_asdict"):
+        return {"__type__": type(obj).__name__, **{k: _plain(v) for k, v in obj._asdict().items()}}
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+_RESULT_TYPES = {}
+
+
+def _rebuild(obj):
+    """Inverse of _plain: namedtuples come back with the same repr as in the gateway."""
+    if isinstance(obj, dict):
+        fields = {k: _rebuild(v) for k, v in obj.items() if k != "__type__"}
+        if "__type__" not in obj:
+            return fields
+        key = (obj["__type__"], tuple(fields))
+        if key not in _RESULT_TYPES:
+            _RESULT_TYPES[key] = namedtuple(obj["__type__"], fields)
+        return _RESULT_TYPES[key](**fields)
+    if isinstance(obj, list):
+        return [_rebuild(v) for v in obj]
+    return obj
+
+
+def _frame(request_id: int, code: int, encoding: int, payload: bytes) -> bytes:
+    return HEADER.pack(len(payload), request_id, code, encoding) + payload
+
+
+# ── gateway (server) side ──────────────────────────────────────────────────
+class BrokerGateway:
+    """Unix-socket server serializing and coalescing calls to one broker session."""
+
+    def __init__(self, broker, path: str = None):
+        self.broker = broker
+        self.path = path or BROKER_GATEWAY_SOCKET
+        # Several threads so queued calls reach the broker client's scheduler,
+        # which runs them one at a time in priority order (orders first)
+        self._terminal = ThreadPoolExecutor(max_workers=8, thread_name_prefix="terminal")
+        self._inflight = {}
+        self.counters = {"requests": 0, "coalesced": 0, "terminal_calls": 0, "errors": 0, "clients": 0}
+
+    def _call(self, op: str, args: dict, priority: int = None):
+        if priority is not None:
+            with prioritized(priority):
+                return self._call(op, args)
+        self.counters["terminal_calls"] += 1
+        if op == "symbols":
+            return dict(self.broker.symbol_name_to_id)
+        if op == "get_rates":
+            return as_bars(self.broker.get_rates(**args))
+        if op == "get_ticks":
+            return as_ticks(self.broker.get_ticks(**args))
+        return getattr(self.broker, op)(**args)
+
+    async def _execute(self, op: str, payload: bytes, priority: int = None):
+        if op == "ping":
+            return {"pong": time.time()}
+        if op == "stats":
+            scheduler = getattr(self.broker, "broker_scheduler", None)
+            return dict(self.counters, inflight=len(self._inflight),
+                        scheduler=scheduler.stats() if scheduler else None)
+        args = json.loads(payload) if payload else {}
+        loop = asyncio.get_running_loop()
+        if op in WRITE_OPS:
+            return await loop.run_in_executor(self._terminal, self._call, op, args, priority)
+
+        key = (op, payload, priority)
+        future = self._inflight.get(key)
+        if future is None and priority == WARMUP:
+            # nothing is queued behind background work, so it can ride along any flight
+            future = next((f for (o, p, _), f in self._inflight.items() if o == op and p == payload), None)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = loop.run_in_executor(self._terminal, self._call, op, args, priority)
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _respond(self, writer, request_id: int, code: int, payload: bytes, priority: int = None):
+        self.counters["requests"] += 1
+        try:
+            if not 1 <= code <= len(OPS):
+                raise ValueError(f"Unknown op {code}")
+            result = await self._execute(OPS[code - 1], payload, priority)
+            if isinstance(result, np.ndarray):
+                encoding = ENC_TICKS if result.dtype == TICK_DTYPE else ENC_BARS
+                frame = _frame(request_id, STATUS_OK, encoding, result.tobytes())
+            else:
+                frame = _frame(request_id, STATUS_OK, ENC_JSON, json.dumps(_plain(result)).encode())
+        except Exception as e:
+            self.counters["errors"] += 1
+            status = STATUS_UNAVAILABLE if isinstance(e, ConnectionError) else STATUS_ERROR
+            frame = _frame(request_id, status, ENC_JSON, json.dumps(f"{type(e).__name__}: {e}").encode())
+        if not writer.is_closing():
+            writer.write(frame)
+
+    async def _serve_client(self, reader, writer):
+        self.counters["clients"] += 1
+        tasks = set()
+        try:
+            while True:
+                length, request_id, code, priority = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if length > MAX_PAYLOAD:
+                    break
+                payload = await reader.readexactly(length) if length else b""
+                task = asyncio.create_task(
+                    self._respond(writer, request_id, code, payload, priority - 1 if priority else None))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.counters["clients"] -= 1
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._serve_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        print(f"[INFO] Broker gateway listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+
+# ── worker (client) side ───────────────────────────────────────────────────
+class GatewayClient:
+    """
+    Thread-safe client: one socket per process, requests multiplexed by id and
+    matched to replies by a reader thread. Reconnects on the next call after
+    the gateway goes away; calls in flight at that moment fail fast.
+    """
+
+    def __init__(self, path: str = None, timeout: float = 15.0, on_connect=None):
+        self.path = path or BROKER_GATEWAY_SOCKET
+        self.timeout = timeout
+        self.on_connect = on_connect
+        self._sock = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next_id = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self._sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True, name="gateway-reader").start()
+
+    def _read_exact(self, sock, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("Broker gateway closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def _read_loop(self, sock):
+        try:
+            while True:
+                length, request_id, status, encoding = HEADER.unpack(self._read_exact(sock, HEADER.size))
+                payload = self._read_exact(sock, length) if length else b""
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if status == STATUS_UNAVAILABLE:
+                    future.set_exception(GatewayUnavailable(json.loads(payload)))
+                elif status != STATUS_OK:
+                    future.set_exception(GatewayError(json.loads(payload)))
+                elif encoding == ENC_BARS:
+                    future.set_result(np.frombuffer(payload, dtype=BAR_DTYPE))
+                elif encoding == ENC_TICKS:
+                    future.set_result(np.frombuffer(payload, dtype=TICK_DTYPE))
+                else:
+                    future.set_result(_rebuild(json.loads(payload)))
+        except (OSError, ConnectionError) as e:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError(f"Broker gateway connection lost: {e}"))
+            sock.close()
+
+    def call(self, op: str, **args):
+        payload = json.dumps(args, sort_keys=True).encode() if args else b""
+        priority = effective_priority(None)
+        future = Future()
+        connected = False
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+                connected = True
+            self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+            request_id = self._next_id
+            self._pending[request_id] = future
+            try:
+                self._sock.sendall(_frame(request_id, OP_CODES[op], 0 if priority is None else priority + 1, payload))
+            except OSError:
+                self._pending.pop(request_id, None)
+                self._sock.close()
+                self._sock = None
+                raise
+        try:
+            if connected and self.on_connect is not None and op != "symbols":
+                self.on_connect()
+            return future.result(timeout=self.timeout)
+        finally:
+            # a timed-out request would otherwise stay in _pending until the socket dropped
+            with self._lock:
+                if self._pending.get(request_id) is future:
+                    del self._pending[request_id]
+
+
+# ── mt5_client-compatible surface ──────────────────────────────────────────
+class _SymbolMap(dict):
+    """{name.upper(): name}, fetched from the gateway on first use and on every reconnect."""
+
+    def _ensure(self):
+        if not dict.__len__(self):
+            try:
+                load_symbols()
+            except (OSError, GatewayError, TimeoutError) as e:
+                print(f"[ERROR] Broker gateway unavailable at {client.path}: {e}")
+
+    def __contains__(self, key):
+        self._ensure()
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self._ensure()
+        return dict.__getitem__(self, key)
+
+    def __len__(self):
+        self._ensure()
+        return dict.__len__(self)
+
+    def get(self, key, default=None):
+        self._ensure()
+        return dict.get(self, key, default)
+
+
+symbol_name_to_id = _SymbolMap()
+
+
+def load_symbols():
+    symbols = client.call("symbols")
+    dict.clear(symbol_name_to_id)
+    dict.update(symbol_name_to_id, symbols)
+
+
+client = GatewayClient(on_connect=load_symbols)
+
+
+def get_rates(symbol: str, tf: str = "M5", n: int = 1000):
+    return client.call("get_rates", symbol=symbol, tf=tf, n=n)
+
+
+def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
+    return client.call("get_ohlc_data", symbol=symbol, tf=tf, n=n)
+
+
+def get_ticks(symbol: str, start_msc: int, end_msc: int):
+    return client.call("get_ticks", symbol=symbol, start_msc=start_msc, end_msc=end_msc)
+
+
+def get_open_positions():
+    return client.call("get_open_positions")
+
+
+def get_pending_orders():
+    return client.call("get_pending_orders")
+
+
+def place_order(*, symbol, order_type, side, volume, price=None, stop_loss=None,
+                take_profit=None, client_msg_id=None):
+    return client.call(
+        "place_order", symbol=symbol, order_type=order_type, side=side, volume=volume,
+        price=price, stop_loss=stop_loss, take_profit=take_profit, client_msg_id=client_msg_id,
+    )
+
+
+def modify_position_sltp(position_id, stop_loss=None, take_profit=None):
+    return client.call("modify_position_sltp", position_id=position_id, stop_loss=stop_loss, take_profit=take_profit)
+
+
+def modify_pending_order_sltp(order_id, stop_loss=None, take_profit=None):
+    return client.call("modify_pending_order_sltp", order_id=order_id, stop_loss=stop_loss, take_profit=take_profit)
+
+
+def wait_for_deferred(result, timeout=10):
+    # Gateway calls are synchronous, as with mt5_client
+    return result
+
+
+def get_connection_status() -> dict:
+    """The gateway's broker link, plus this worker's round trip to the gateway."""
+    started = time.perf_counter()
+    try:
+        status = client.call("get_connection_status")
+    except (OSError, GatewayError) as e:
+        return {"state": "disconnected", "connected": False, "latency_ms": None,
+                "last_error": f"gateway: {e}"}
+    status["gateway_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return status
+
+
+def get_change_token():
+    return client.call("get_change_token")
+
+
+def get_symbol_specs():
+    return client.call("get_symbol_specs")
+
+
+def get_account_info():
+    return client.call("get_account_info")
+
+
+def gateway_stats() -> dict:
+    return client.call("stats")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Own the MT5 session and serve API workers over a Unix socket.")
+    parser.add_argument("--socket", default=BROKER_GATEWAY_SOCKET)
+    parser.add_argument("--stub", action="store_true", help="stub_broker terminal instead of MetaTrader5")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub terminal latency per call")
+    args = parser.parse_args()
+
+    if args.stub:
+        import stub_broker
+        stub_broker.install(latency_ms=args.latency_ms)
+        os.environ.setdefault("MT5_LOGIN", "0")
+    import mt5_client
+
+    try:
+        asyncio.run(BrokerGateway(mt5_client, args.socket).serve())
+    except KeyboardInterrupt:
+        pass
@@ -1,6 +1,13 @@
 # charts.py
 import plotly.graph_objects as go
-from datetime import datetime
+from datetime import datetime, timezone
+
+ZONE_COLORS = {
+    ("ob", 1): "rgba(0,255,0,0.2)",
+    ("ob", -1): "rgba(255,0,0,0.2)",
+    ("fvg", 1): "rgba(255,165,0,0.3)",
+    ("fvg", -1): "rgba(255,165,0,0.3)",
+}
 
 def generate_smc_chart(candles: list, title="SMC Chart", highlights=None) -> str:
     """
@@ -9,7 +16,8 @@ def generate_smc_chart(candles: list, title="SMC Chart", highlights=None) -> str
     Args:
         candles (list): List of OHLC dicts with 'time', 'open', 'high', 'low', 'close'
         title (str): Chart title
-        highlights (dict): Optional dict with CHOCH, OB, FVG, SL, TP
+        highlights (dict): Optional dict with CHOCH, OB, FVG, SL, TP and
+            "zones" (zones.py dicts, drawn from formation to mitigation)
 
     Returns:
         str: Base64-encoded image of the chart
@@ -28,6 +36,20 @@ def generate_smc_chart(candles: list, title="SMC Chart", highlights=None) -> str
     )])
 
     if highlights:
+        highlights = {k: v for k, v in highlights.items() if v is not None}
+
+        for zone in highlights.get("zones", []):
+            # a zone is drawn only while it existed: from its bar to the bar that mitigated it
+            start = datetime.fromtimestamp(zone["time"], timezone.utc)
+            end = zone.get("mitigated_at")
+            fig.add_shape(type="rect",
+                          x0=max(start, df["time"][0]),
+                          x1=datetime.fromtimestamp(end, timezone.utc) if end else df["time"][-1],
+                          y0=zone["low"], y1=zone["high"],
+                          fillcolor=ZONE_COLORS.get((zone["kind"], 1 if zone["direction"] == "bullish" else -1)),
+                          opacity=0.5 if zone["status"] == "mitigated" else 1.0,
+                          line_width=0, name=f"{zone['kind'].upper()} {zone['direction']}")
+
         if "order_block" in highlights:
             ob = highlights["order_block"]
             fig.add_shape(type="rect", x0=df["time"][0], x1=df["time"][-1],
@@ -0,0 +1,136 @@
+# columnar.py
+# ---------------------------------------------------------------------------
+# Integer column codecs for the tick store (ticks.py) and the bar archive.
+#
+#   fixed = to_fixed(prices, digits=5)            # 1.10234 → 110234
+#   payload = encode_columns([times_ms, fixed])   # bytes
+#   times_ms, fixed = decode_columns(payload)     # int64 arrays
+#
+# A column is stored as the varint stream of its zigzagged first differences.
+# Consecutive timestamps and fixed-point prices move by small amounts, so
+# most values take one or two bytes instead of eight. Columns that are
+# already small (wicks, gaps, volumes) can skip the differencing. Encoding
+# and decoding are vectorized NumPy; nothing loops per value in Python.
+#
+#   zigzag   0, -1, 1, -2, 2 ... → 0, 1, 2, 3, 4 ...   (small magnitude → small code)
+#   varint   7 bits per byte, high bit set on every byte but the last
+
+import struct
+
+import numpy as np
+
+_COUNT = struct.Struct("<IH")      # values per column, column count
+_LENGTH = struct.Struct("<I")      # bytes per column; the top bit marks a column stored without deltas
+_PLAIN = 0x80000000
+
+
+def to_fixed(prices, digits: int) -> np.ndarray:
+    """Prices → int64 units of 10**-digits."""
+    return np.rint(np.asarray(prices, dtype=np.float64) * 10.0 ** digits).astype(np.int64)
+
+
+def from_fixed(values, digits: int) -> np.ndarray:
+    """int64 units of 10**-digits → float64 prices (division keeps 110234 → 1.10234 exact)."""
+    return np.asarray(values, dtype=np.int64) / 10.0 ** digits
+
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    v = np.asarray(values, dtype=np.int64)
+    return ((v << 1) ^ (v >> 63)).view(np.uint64)
+
+
+def unzigzag(codes: np.ndarray) -> np.ndarray:
+    u = np.asarray(codes, dtype=np.uint64)
+    return (u >> np.uint64(1)).view(np.int64) ^ -(u & np.uint64(1)).view(np.int64)
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """LEB128 bytes for an array of unsigned 64-bit integers."""
+    u = np.ascontiguousarray(values, dtype=np.uint64)
+    if not len(u):
+        return b""
+    nbytes = np.ones(len(u), dtype=np.int64)
+    rest = u >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    if nbytes.max() == 1:
+        return u.astype(np.uint8).tobytes()
+    offsets = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(offsets[-1] + nbytes[-1]), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        chunk = ((u[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        chunk[nbytes[mask] > k + 1] |= 0x80
+        out[offsets[mask] + k] = chunk
+    return out.tobytes()
+
+
+def varint_decode(data, count: int = None) -> np.ndarray:
+    """Inverse of varint_encode; `count` is checked when given."""
+    b = np.frombuffer(data, dtype=np.uint8)
+    last = b < 0x80
+    if last.all():
+        values = b.astype(np.uint64)
+    else:
+        ends = np.flatnonzero(last)
+        if not len(ends) or ends[-1] != len(b) - 1:
+            raise ValueError("Truncated varint stream")
+        starts = np.empty(len(ends), dtype=np.int64)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+        if lengths.max() > 10:
+            raise ValueError("Varint longer than 64 bits")
+        values = (b[starts] & 0x7F).astype(np.uint64)
+        # byte k of every value that has one; most values are 1-2 bytes so this stops early
+        idx, k = np.flatnonzero(lengths > 1), 1
+        while len(idx):
+            values[idx] |= (b[starts[idx] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+            k += 1
+            idx = idx[lengths[idx] > k]
+    if count is not None and len(values) != count:
+        raise ValueError(f"Expected {count} values, decoded {len(values)}")
+    return values
+
+
+def encode_deltas(values: np.ndarray) -> bytes:
+    v = np.asarray(values, dtype=np.int64)
+    return varint_encode(zigzag(np.diff(v, prepend=np.int64(0))))
+
+
+def decode_deltas(data, count: int = None) -> np.ndarray:
+    return np.cumsum(unzigzag(varint_decode(data, count)))
+
+
+def encode_columns(columns: list, deltas=None) -> bytes:
+    """
+    Equal-length int64 columns → one self-describing payload.
+
+    Args:
+        deltas: Per column, whether to store first differences (default: all)
+    """
+    count = len(columns[0]) if columns else 0
+    if any(len(c) != count for c in columns):
+        raise ValueError("Columns must have the same length")
+    deltas = [True] * len(columns) if deltas is None else list(deltas)
+    streams = [encode_deltas(c) if d else varint_encode(zigzag(c)) for c, d in zip(columns, deltas)]
+    words = [len(s) | (0 if d else _PLAIN) for s, d in zip(streams, deltas)]
+    return b"".join([_COUNT.pack(count, len(streams)), *(_LENGTH.pack(w) for w in words), *streams])
+
+
+def decode_columns(payload, columns: list = None) -> list:
+    """int64 arrays from encode_columns; `columns` picks a subset by position and skips the rest."""
+    view = memoryview(payload)
+    count, n = _COUNT.unpack_from(view, 0)
+    words = [_LENGTH.unpack_from(view, _COUNT.size + i * _LENGTH.size)[0] for i in range(n)]
+    offset = _COUNT.size + n * _LENGTH.size
+    out = {}
+    wanted = set(range(n) if columns is None else columns)
+    for i, word in enumerate(words):
+        length = word & ~_PLAIN
+        if i in wanted:
+            data = view[offset:offset + length]
+            out[i] = unzigzag(varint_decode(data, count)) if word & _PLAIN else decode_deltas(data, count)
+        offset += length
+    return [out[i] for i in (range(n) if columns is None else columns)]
@@ -0,0 +1,6 @@
+# conftest.py
+# ---------------------------------------------------------------------------
+# pytest runs the tests/ suite against stub_broker; test_mt5.py is a manual
+# script for a live terminal and is not collected.
+
+collect_ignore = ["test_mt5.py"]
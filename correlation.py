@@ -0,0 +1,226 @@
+# correlation.py
+# ---------------------------------------------------------------------------
+# Rolling return correlation/covariance across a watchlist.
+#
+#   book = CorrelationBook(window=200)
+#   matrix = book.get("H1", ["EURUSD", "GBPUSD", "USDJPY"])
+#   matrix.update({"EURUSD": rates, "GBPUSD": rates, "USDJPY": rates})
+#   matrix.correlation(["EURUSD", "GBPUSD"])
+#
+# Closes are aligned on the bar times every symbol has, and the last `window`
+# log returns are kept in a ring buffer R (window × n). The matrix stores
+# S = Σr and P = R'R. When k new bars close, only the rows that enter and
+# leave the window are touched:
+#
+#   P += N'N − O'O,   S += ΣN − ΣO          O(k·n²) instead of O(n²·window)
+#
+# covariance = (P − SS'/w) / (w − 1). P is rebuilt from R every `window`
+# updates, so float error cannot accumulate and the rebuild stays O(n²)
+# per bar amortized. Adding symbols rebuilds once from fresh bars.
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+_NO_BARS = np.empty(0, dtype=[("time", np.int64), ("close", np.float64)])
+
+
+def _closed(rates):
+    """Drop the still-forming last bar; only closed bars move the matrix."""
+    if rates is None or len(rates) < 2:
+        return _NO_BARS
+    return rates[:-1]
+
+
+def _aligned(rates: dict, symbols: list, after: float = None) -> tuple:
+    """(times, closes[m, n]) on the bar times all symbols share, optionally only times > after."""
+    times = None
+    for s in symbols:
+        t = rates[s]["time"]
+        if after is not None:
+            t = t[t > after]
+        times = t if times is None else np.intersect1d(times, t, assume_unique=True)
+    if times is None or not len(times):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(symbols)))
+    cols = [rates[s]["close"][np.searchsorted(rates[s]["time"], times)] for s in symbols]
+    return times, np.column_stack(cols).astype(np.float64)
+
+
+class RollingCorrelation:
+    """
+    Incrementally updated covariance/correlation for a fixed symbol set.
+
+    Args:
+        symbols: Symbols in matrix order
+        window: Returns in the rolling window
+    """
+
+    def __init__(self, symbols: list, window: int = 200):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.window = window
+        n = len(self.symbols)
+        self._ring = np.zeros((window, n))
+        self._head = 0                  # next row to overwrite
+        self.count = 0                  # returns currently in the window
+        self._sum = np.zeros(n)
+        self._cross = np.zeros((n, n))
+        self._since_rebuild = 0
+        self.last_time = None           # open time of the last aligned closed bar
+        self._last_close = None
+        self.updated_at = None
+        self.fetched_at = None          # set by the caller that feeds update()
+        self._lock = threading.Lock()
+        self.counters = {"rebuilds": 0, "updates": 0, "bars": 0}
+
+    def _rebuild(self):
+        rows = self._rows()
+        self._sum = rows.sum(axis=0)
+        self._cross = rows.T @ rows
+        self._since_rebuild = 0
+        self.counters["rebuilds"] += 1
+
+    def _rows(self) -> np.ndarray:
+        if self.count < self.window:
+            return self._ring[:self.count]
+        return np.roll(self._ring, -self._head, axis=0)
+
+    def _push(self, returns: np.ndarray):
+        k = len(returns)
+        if k >= self.window:
+            self._ring[:] = returns[-self.window:]
+            self._head, self.count = 0, self.window
+            self._rebuild()
+            return
+        slots = (self._head + np.arange(k)) % self.window
+        # until the window is full, slots past `count` are empty and nothing leaves
+        leaving = (np.arange(k) + self.count) >= self.window
+        outgoing = self._ring[slots[leaving]].copy()
+        self._ring[slots] = returns
+        self._sum += returns.sum(axis=0) - outgoing.sum(axis=0)
+        self._cross += returns.T @ returns - outgoing.T @ outgoing
+        self._head = (self._head + k) % self.window
+        self.count = min(self.window, self.count + k)
+        self._since_rebuild += k
+        if self._since_rebuild >= self.window:
+            self._rebuild()
+
+    def update(self, rates: dict) -> int:
+        """Fold newly closed bars from {symbol: rates with time/close} in; returns bars added."""
+        closed = {s: _closed(rates[s]) for s in self.symbols}
+        with self._lock:
+            return self._update(closed)
+
+    def _update(self, closed: dict) -> int:
+        times, closes = _aligned(closed, self.symbols, after=self.last_time)
+        if not len(times):
+            return 0
+        if self._last_close is not None:
+            closes = np.vstack([self._last_close, closes])
+        returns = np.diff(np.log(closes), axis=0)
+        if len(returns):
+            self._push(returns)
+        self.last_time = int(times[-1])
+        self._last_close = closes[-1]
+        self.updated_at = time.time()
+        self.counters["updates"] += 1
+        self.counters["bars"] += len(returns)
+        return len(returns)
+
+    # ── reads ───────────────────────────────────────────────────────────────
+    def _select(self, symbols) -> np.ndarray:
+        return np.arange(len(self.symbols)) if symbols is None else np.array([self.index[s] for s in symbols], dtype=np.intp)
+
+    def covariance(self, symbols=None) -> np.ndarray:
+        idx = self._select(symbols)
+        with self._lock:
+            w = self.count
+            if w < 2:
+                return np.full((len(idx), len(idx)), np.nan)
+            s = self._sum[idx]
+            return (self._cross[np.ix_(idx, idx)] - np.outer(s, s) / w) / (w - 1)
+
+    def correlation(self, symbols=None) -> np.ndarray:
+        cov = self.covariance(symbols)
+        sd = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(sd, sd)
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+    def status(self) -> dict:
+        return dict(self.counters, symbols=len(self.symbols), window=self.window, returns=self.count,
+                    last_bar=self.last_time)
+
+
+def correlated_pairs(symbols: list, corr: np.ndarray, threshold: float) -> list:
+    """[{"a", "b", "corr"}] for |corr| ≥ threshold, strongest first."""
+    i, j = np.triu_indices(len(symbols), k=1)
+    values = corr[i, j]
+    keep = np.nonzero(np.abs(np.nan_to_num(values)) >= threshold)[0]
+    keep = keep[np.argsort(-np.abs(values[keep]))]
+    return [{"a": symbols[i[k]], "b": symbols[j[k]], "corr": round(float(values[k]), 4)} for k in keep]
+
+
+def clusters(symbols: list, pairs: list) -> list:
+    """Groups of symbols linked by correlated pairs (union-find); singletons are left out."""
+    parent = {s: s for s in symbols}
+
+    def root(s):
+        while parent[s] != s:
+            parent[s] = parent[parent[s]]
+            s = parent[s]
+        return s
+
+    for p in pairs:
+        parent[root(p["a"])] = root(p["b"])
+    groups = {}
+    for s in symbols:
+        groups.setdefault(root(s), []).append(s)
+    return sorted((g for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+class CorrelationBook:
+    """
+    One RollingCorrelation per (timeframe, window), holding the union of the
+    symbols asked for so far. Requests for a subset read a sub-matrix;
+    asking for new symbols grows the matrix with a single rebuild.
+
+    Args:
+        window: Default rolling window in returns
+        max_matrices: (timeframe, window) matrices kept before the oldest is dropped
+    """
+
+    def __init__(self, window: int = 200, max_matrices: int = 8):
+        self.window = window
+        self.max_matrices = max_matrices
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def symbols(self, tf: str, window: int = None) -> list:
+        """Symbols the (tf, window) matrix already covers."""
+        with self._lock:
+            matrix = self._matrices.get((tf.upper(), window or self.window))
+            return list(matrix.symbols) if matrix is not None else []
+
+    def get(self, tf: str, symbols: list, window: int = None) -> RollingCorrelation:
+        """The matrix for (tf, window) covering `symbols`; a new one (empty) when symbols were added."""
+        key = (tf.upper(), window or self.window)
+        with self._lock:
+            matrix = self._matrices.get(key)
+            if matrix is None or not set(symbols) <= set(matrix.symbols):
+                known = matrix.symbols if matrix is not None else []
+                matrix = RollingCorrelation(known + [s for s in symbols if s not in known], key[1])
+                self._matrices[key] = matrix
+            self._matrices.move_to_end(key)
+            while len(self._matrices) > self.max_matrices:
+                self._matrices.popitem(last=False)
+            return matrix
+
+    def status(self) -> dict:
+        with self._lock:
+            return {f"{tf}/{w}": m.status() for (tf, w), m in self._matrices.items()}
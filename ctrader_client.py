@@ -12,18 +12,27 @@ from ctrader_open_api.messages.OpenApiMessages_pb2 import (
     ProtoOANewOrderReq,
     ProtoOAAmendOrderReq,
     ProtoOAAmendPositionSLTPReq,
+    ProtoOASubscribeSpotsReq,
+    ProtoOAVersionReq,
 )
 from ctrader_open_api.messages.OpenApiModelMessages_pb2 import (
+    ProtoOAOrderStatus,
     ProtoOAOrderType,
+    ProtoOAPositionStatus,
     ProtoOATradeSide,
     ProtoOATrendbarPeriod,
 )
 from twisted.internet import reactor
 from datetime import datetime, timezone, timedelta
-import calendar, time, threading, json
+import calendar, time, threading
 import os
 from dotenv import load_dotenv
 import numpy as np
+import trend
+import levels
+from resample import BAR_DTYPE
+from scheduler import ORDER, POSITIONS, BARS, from_env
+from broker_connection import ConnectionSupervisor, wait_result
 
 
 
@@ -35,10 +44,22 @@ CLIENT_SECRET = os.getenv("CTRADER_CLIENT_SECRET")
 ACCESS_TOKEN = os.getenv("CTRADER_ACCESS_TOKEN")
 ACCOUNT_ID = int(os.getenv("CTRADER_ACCOUNT_ID"))
 HOST_TYPE = os.getenv("CTRADER_HOST_TYPE")
-
+HEARTBEAT_INTERVAL = float(os.getenv("CTRADER_HEARTBEAT_INTERVAL", "10"))
+HEARTBEAT_TIMEOUT = float(os.getenv("CTRADER_HEARTBEAT_TIMEOUT", "30"))
+RECONNECT_MAX_DELAY = float(os.getenv("CTRADER_RECONNECT_MAX_DELAY", "60"))
+
+# Heartbeats, reconnect backoff and resync after a drop (see broker_connection.py)
+supervisor = ConnectionSupervisor(
+    "ctrader",
+    handshake=lambda: _handshake(),
+    probe=lambda: client.send(ProtoOAVersionReq()),
+    interval=HEARTBEAT_INTERVAL,
+    timeout=HEARTBEAT_TIMEOUT,
+    backoff_max=RECONNECT_MAX_DELAY,
+)
 
 host = EndPoints.PROTOBUF_LIVE_HOST if HOST_TYPE.lower() == "live" else EndPoints.PROTOBUF_DEMO_HOST
-client = Client(host, EndPoints.PROTOBUF_PORT, TcpProtocol)
+client = Client(host, EndPoints.PROTOBUF_PORT, TcpProtocol, retryPolicy=supervisor.retry_policy)
 
 # ── symbol maps ────────────────────────────────────────────────────────────
 symbol_map        : dict[int, str] = {}   # {id: name}
@@ -53,6 +74,22 @@ def pips_to_relative(pips: int, digits: int) -> int:
 def on_error(failure):  # generic errback
     print("[ERROR]", failure)
 
+# Open API rate limits are per connection: 50 messages/s, 5/s for historical
+# data. Request-path sends are paced below that, orders and amendments first.
+broker_scheduler = from_env("ctrader", rate=45, burst=45, reserve=5, history_rate=4.5)
+
+def _paced_send(c, req, priority, **kwargs):
+    supervisor.check()   # fail fast while disconnected instead of waiting out a timeout
+    with broker_scheduler.slot(priority):
+        return supervisor.track(c.send(req, **kwargs))
+
+def _checked(res):
+    """Raise on ProtoOAErrorRes / ProtoErrorRes replies, which arrive as callbacks."""
+    msg = Protobuf.extract(res)
+    if type(msg).__name__ in ("ProtoOAErrorRes", "ProtoErrorRes"):
+        raise RuntimeError(f"{msg.errorCode}: {getattr(msg, 'description', '')}")
+    return res
+
 # ── auth & symbol bootstrap ────────────────────────────────────────────────
 def symbols_response_cb(res):
     global symbol_map, symbol_name_to_id, symbol_digits_map
@@ -70,39 +107,84 @@ def symbols_response_cb(res):
     print(f"[DEBUG] Loaded {len(symbol_map)} symbols.")
 
 
-# ── account‑level auth → ask for symbol list ─────────────────────────────
-def account_auth_cb(_):
-    req = ProtoOASymbolsListReq(
-        ctidTraderAccountId=ACCOUNT_ID,
-        includeArchivedSymbols=False,
-    )
-    # when the symbols arrive we’ll call symbols_response_cb
-    client.send(req).addCallbacks(symbols_response_cb, on_error)
-
-
-def app_auth_cb(_):
-    req = ProtoOAAccountAuthReq(
+# ── handshake: app auth → account auth → symbols → spots ───────────────────
+# Replayed on every (re)connect by the supervisor.
+def _handshake():
+    d = client.send(ProtoOAApplicationAuthReq(clientId=CLIENT_ID, clientSecret=CLIENT_SECRET))
+    d.addCallback(_checked)
+    d.addCallback(lambda _: client.send(ProtoOAAccountAuthReq(
         ctidTraderAccountId=ACCOUNT_ID,
         accessToken=ACCESS_TOKEN,
-    )
-    # account_auth_cb must exist in the same module
-    client.send(req).addCallbacks(account_auth_cb, on_error)
-
-
-def connected(_):
-    req = ProtoOAApplicationAuthReq(clientId=CLIENT_ID, clientSecret=CLIENT_SECRET)
-    client.send(req).addCallbacks(app_auth_cb, on_error)
+    )))
+    d.addCallback(_checked)
+    d.addCallback(lambda _: client.send(ProtoOASymbolsListReq(
+        ctidTraderAccountId=ACCOUNT_ID,
+        includeArchivedSymbols=False,
+    )))
+    d.addCallback(_checked)
+    d.addCallback(symbols_response_cb)
+    d.addCallback(lambda _: _resubscribe_spots())
+    d.addCallback(lambda _: _emit({"kind": "resync"}))   # events may have been missed while down
+    return d
 
 def init_client():
-    client.setConnectedCallback(connected)
-    client.setDisconnectedCallback(lambda c, r: print("[INFO] Disconnected:", r))
-    client.setMessageReceivedCallback(lambda c, m: None)
+    supervisor.attach(client)
+    supervisor.on_message(_spot_event_cb)
+    supervisor.on_message(_execution_event_cb)
     client.startService()
     reactor.run(installSignalHandlers=False)
 
+def get_connection_status() -> dict:
+    return dict(supervisor.status(), symbols=len(symbol_name_to_id), spots=len(spot_subscriptions))
+
+
+# ── spot subscriptions ─────────────────────────────────────────────────────
+spot_subscriptions: set[int] = set()     # symbol ids, re-subscribed after every reconnect
+spot_prices: dict[int, dict] = {}        # {symbol id: {"bid", "ask", "time"}}
+spot_listeners: list = []                # (symbol, time_msc, bid, ask) callables, e.g. TickStore.record
+
+def _spot_event_cb(message):
+    if type(Protobuf.extract(message)).__name__ != "ProtoOASpotEvent":
+        return
+    ev = Protobuf.extract(message)
+    quote = spot_prices.setdefault(ev.symbolId, {})
+    if ev.HasField("bid"):
+        quote["bid"] = ev.bid / 100_000
+    if ev.HasField("ask"):
+        quote["ask"] = ev.ask / 100_000
+    quote["time"] = time.time()
+    if spot_listeners and "bid" in quote and "ask" in quote:
+        time_msc = ev.timestamp if ev.HasField("timestamp") else int(quote["time"] * 1000)
+        for listener in spot_listeners:
+            try:
+                listener(symbol_map.get(ev.symbolId, str(ev.symbolId)), time_msc, quote["bid"], quote["ask"])
+            except Exception as e:
+                print(f"[ERROR] Spot listener: {e}")
+
+def _resubscribe_spots():
+    if not spot_subscriptions:
+        return None
+    req = ProtoOASubscribeSpotsReq(ctidTraderAccountId=ACCOUNT_ID, symbolId=sorted(spot_subscriptions))
+    return client.send(req).addCallback(_checked)
+
+def subscribe_spots(symbols, timeout=10):
+    """Subscribe to spot quotes (kept across reconnects); prices land in spot_prices."""
+    ids = []
+    for symbol in symbols:
+        sid = symbol_name_to_id.get(symbol.upper())
+        if sid is None:
+            raise ValueError(f"Unknown symbol '{symbol}'")
+        ids.append(sid)
+    new = sorted(set(ids) - spot_subscriptions)
+    if new:
+        req = ProtoOASubscribeSpotsReq(ctidTraderAccountId=ACCOUNT_ID, symbolId=new)
+        wait_result(_paced_send(client, req, POSITIONS), timeout, _checked)
+        spot_subscriptions.update(new)
+    return {symbol_map[i]: spot_prices.get(i) for i in ids}
+
 
 # ── OHLC fetch (used by /fetch-data) ───────────────────────────────────────
-daily_bars, ready_event = [], threading.Event()
+daily_bars = []
 
 def _trendbars_cb(res):
     bars = Protobuf.extract(res).trendbar
@@ -118,12 +200,11 @@ def _trendbars_cb(res):
         )
     global daily_bars
     daily_bars = list(map(_tb, bars))[-50:]
-    ready_event.set()
+    return daily_bars
 
 
 
 def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
-    ready_event.clear()
     sid = symbol_name_to_id.get(symbol.upper())
     if sid is None:
         raise ValueError(f"Unknown symbol '{symbol}'")
@@ -136,41 +217,18 @@ def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
         fromTimestamp       = int(calendar.timegm((now - timedelta(weeks=52)).utctimetuple())) * 1000,
         toTimestamp         = int(calendar.timegm(now.utctimetuple())) * 1000,
     )
-    client.send(req).addCallbacks(_trendbars_cb, on_error)
-    ready_event.wait(10)
+    bars = wait_result(_paced_send(client, req, BARS), 10, lambda res: _trendbars_cb(_checked(res)))
 
-    candles = daily_bars[-n:]
-    highs = [bar["high"] for bar in candles]
-    lows = [bar["low"] for bar in candles]
+    candles = bars[-n:]
     closes = [bar["close"] for bar in candles]
 
     # Ensure we have enough for context
-    context_levels = {}
-    if len(candles) >= 2:
-        context_levels = {
-            "today_high": candles[-1]["high"],
-            "today_low": candles[-1]["low"],
-            "prev_day_high": candles[-2]["high"],
-            "prev_day_low": candles[-2]["low"],
-            "range_high_5": max(highs[-5:]),
-            "range_low_5": min(lows[-5:])
-        }
+    context_levels = levels.context_levels(candles)
 
     # Optional HTF trend logic (D1/H4 only)
     trend_strength = {}
     if tf in ("D1", "H4") and len(closes) >= 5:
-        x = np.arange(len(closes))
-        slope, intercept = np.polyfit(x, closes, 1)
-        r = np.corrcoef(x, closes)[0, 1]
-        trend_strength = {
-            "slope": float(slope),
-            "correlation": float(r),
-            "confidence": (
-                "Ultra Strong Bullish" if slope > 0.5 and r > 0.9 else
-                "Strong Bearish" if slope < -0.5 and r > 0.9 else
-                "Sideways/Neutral"
-            )
-        }
+        trend_strength = trend.trend_strength(closes)
 
     return {
         "candles": candles,
@@ -179,32 +237,67 @@ def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
     }
 
 
+# ── raw bars (used by resample / archives) ─────────────────────────────────
+_PERIOD_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D1": 86400}
+
+def get_rates(symbol: str, tf: str = "M5", n: int = 1000):
+    """Last n trendbars as a structured NumPy array (resample.BAR_DTYPE)."""
+    sid = symbol_name_to_id.get(symbol.upper())
+    if sid is None:
+        raise ValueError(f"Unknown symbol '{symbol}'")
+
+    def _cb(res):
+        bars = Protobuf.extract(res).trendbar
+        arr = np.empty(len(bars), dtype=BAR_DTYPE)
+        for i, tb in enumerate(bars):
+            arr[i] = (
+                tb.utcTimestampInMinutes * 60,
+                (tb.low + tb.deltaOpen) / 100_000,
+                (tb.low + tb.deltaHigh) / 100_000,
+                tb.low / 100_000,
+                (tb.low + tb.deltaClose) / 100_000,
+                tb.volume,
+            )
+        return arr[-n:]
+
+    # weekends/holidays: ask for ~1.5x the calendar span n bars would need
+    now = datetime.utcnow()
+    span = timedelta(seconds=_PERIOD_SECONDS[tf.upper()] * n * 1.5 + 3 * 86400)
+    req = ProtoOAGetTrendbarsReq(
+        symbolId            = sid,
+        ctidTraderAccountId = ACCOUNT_ID,
+        period              = getattr(ProtoOATrendbarPeriod, tf.upper()),
+        fromTimestamp       = int(calendar.timegm((now - span).utctimetuple())) * 1000,
+        toTimestamp         = int(calendar.timegm(now.utctimetuple())) * 1000,
+    )
+    rates = wait_result(_paced_send(client, req, BARS), 12, lambda res: _cb(_checked(res)))
+    if len(rates) == 0:
+        raise ValueError(f"No OHLC data for {symbol} {tf}")
+    return rates
+
+
 # ── reconcile helpers ──────────────────────────────────────────────────────
-open_positions, pos_ready = [], threading.Event()
+open_positions = []
+
+
+def _position_dict(p) -> dict:
+    td = p.tradeData
+    return dict(
+        symbol_name = symbol_map.get(td.symbolId, str(td.symbolId)),
+        position_id = p.positionId,
+        direction   = "buy" if td.tradeSide == ProtoOATradeSide.BUY else "sell",
+        entry_price = getattr(p, "price", 0),  # already a float like 1.17700
+        volume_lots = td.volume / 10_000_000,  # 1 lot = 10 000 000
+    )
 
 def _reconcile_cb(res):
     global open_positions
-    open_positions = []
-    rec = Protobuf.extract(res)
-    for p in rec.position:
-        td = p.tradeData
-        open_positions.append(
-            dict(
-                symbol_name = symbol_map.get(td.symbolId, str(td.symbolId)),
-                position_id = p.positionId,
-                direction   = "buy" if td.tradeSide == ProtoOATradeSide.BUY else "sell",
-                entry_price = getattr(p, "price", 0),  # already a float like 1.17700
-                volume_lots = td.volume / 10_000_000,  # 1 lot = 10 000 000
-            )
-        )
-    pos_ready.set()
+    open_positions = [_position_dict(p) for p in Protobuf.extract(res).position]
+    return open_positions
 
 def get_open_positions():
-    pos_ready.clear()
     req = ProtoOAReconcileReq(ctidTraderAccountId = ACCOUNT_ID)
-    client.send(req).addCallbacks(_reconcile_cb, on_error)
-    pos_ready.wait(5)
-    return open_positions
+    return wait_result(_paced_send(client, req, POSITIONS), 5, lambda res: _reconcile_cb(_checked(res)))
 
 
 def is_forex_symbol(symbol: str) -> bool:
@@ -260,7 +353,7 @@ def place_order(
         f"[DEBUG] Sending order: {order_type=} {side=} "
         f"price={price} SL={stop_loss} TP={take_profit}"
     )
-    d = client.send(req, client_msg_id=client_msg_id, timeout=12)
+    d = _paced_send(client, req, ORDER, client_msg_id=client_msg_id, timeout=12)
 
     # legacy patch after MARKET fill (unchanged)
     if order_type.upper() == "MARKET":
@@ -292,7 +385,7 @@ def modify_position_sltp(client, account_id, position_id, stop_loss=None, take_p
     req = ProtoOAAmendPositionSLTPReq(ctidTraderAccountId = account_id, positionId = position_id)
     if stop_loss   is not None: req.stopLoss   = stop_loss
     if take_profit is not None: req.takeProfit = take_profit
-    return client.send(req)
+    return _paced_send(client, req, ORDER)
 
 def modify_pending_order_sltp(client, account_id, order_id, version, stop_loss=None, take_profit=None):
     req = ProtoOAAmendOrderReq(
@@ -302,7 +395,7 @@ def modify_pending_order_sltp(client, account_id, order_id, version, stop_loss=N
     )
     if stop_loss   is not None: req.stopLoss   = stop_loss
     if take_profit is not None: req.takeProfit = take_profit
-    return client.send(req)
+    return _paced_send(client, req, ORDER)
 
 # ── blocking helper used by FastAPI layer ─────────────────────────────────
 def wait_for_deferred(d, timeout=10):
@@ -313,48 +406,67 @@ def wait_for_deferred(d, timeout=10):
 
 
 
-def get_pending_orders():
-    from ctrader_open_api.messages.OpenApiModelMessages_pb2 import ProtoOAOrderType, ProtoOATradeSide
-
-    result_ready = threading.Event()
-    pending_orders = []
-
-    def callback(response):
-        res = Protobuf.extract(response)
-
-        for o in res.order:
-            order_type = "LIMIT" if o.orderType == ProtoOAOrderType.LIMIT else "STOP"
-            direction = "buy" if o.tradeData.tradeSide == ProtoOATradeSide.BUY else "sell"
+def _pending_order_dict(o) -> dict:
+    order_type = "LIMIT" if o.orderType == ProtoOAOrderType.LIMIT else "STOP"
+    direction = "buy" if o.tradeData.tradeSide == ProtoOATradeSide.BUY else "sell"
 
-            entry_price = None
-            if hasattr(o, "limitPrice"):
-                entry_price = o.limitPrice / 100000
-            elif hasattr(o, "stopPrice"):
-                entry_price = o.stopPrice / 100000
+    entry_price = None
+    if hasattr(o, "limitPrice"):
+        entry_price = o.limitPrice / 100000
+    elif hasattr(o, "stopPrice"):
+        entry_price = o.stopPrice / 100000
 
-            symbol_id = o.tradeData.symbolId
-            timestamp_ms = getattr(o, "orderTimestamp", None) or getattr(o, "lastUpdateTimestamp", 0)
-            pending_orders.append({
-                "order_id": o.orderId,
-                "symbol_id": symbol_id,
-                "symbol_name": symbol_map.get(symbol_id, str(symbol_id)),
-                "direction": direction,
-                "order_type": order_type,
-                "entry_price": entry_price,
-                "stop_loss": getattr(o, "stopLoss", None),
-                "take_profit": getattr(o, "takeProfit", None),
-                "volume": o.tradeData.volume,
-
-                "creation_time": datetime.utcfromtimestamp(timestamp_ms / 1000).isoformat()
+    symbol_id = o.tradeData.symbolId
+    timestamp_ms = getattr(o, "orderTimestamp", None) or getattr(o, "lastUpdateTimestamp", 0)
+    return {
+        "order_id": o.orderId,
+        "symbol_id": symbol_id,
+        "symbol_name": symbol_map.get(symbol_id, str(symbol_id)),
+        "direction": direction,
+        "order_type": order_type,
+        "entry_price": entry_price,
+        "stop_loss": getattr(o, "stopLoss", None),
+        "take_profit": getattr(o, "takeProfit", None),
+        "volume": o.tradeData.volume,
+
+        "creation_time": datetime.utcfromtimestamp(timestamp_ms / 1000).isoformat()
 
-            })
+    }
 
-        result_ready.set()
+def _pending_orders_cb(response):
+    res = Protobuf.extract(_checked(response))
+    return {"orders": [_pending_order_dict(o) for o in res.order]}
 
+def get_pending_orders():
     req = ProtoOAReconcileReq(ctidTraderAccountId=ACCOUNT_ID)
-    d = client.send(req)
-    d.addCallbacks(callback, on_error)
-    result_ready.wait(timeout=12)
-
-    return {"orders": pending_orders}
+    d = _paced_send(client, req, POSITIONS)
+    return wait_result(d, 12, _pending_orders_cb)
+
+
+# ── execution events → account-state mirror (see account_state.py) ─────────
+execution_listeners = []   # callables taking {"kind", "id", "data"} events
+
+def on_execution(callback):
+    """Call callback(event) for every position/order change the server pushes."""
+    execution_listeners.append(callback)
+
+def _emit(event: dict):
+    for callback in execution_listeners:
+        callback(event)
+
+def _execution_event_cb(message):
+    if type(Protobuf.extract(message)).__name__ != "ProtoOAExecutionEvent":
+        return
+    ev = Protobuf.extract(message)
+    if ev.HasField("position"):
+        p = ev.position
+        is_open = p.positionStatus == ProtoOAPositionStatus.POSITION_STATUS_OPEN
+        _emit({"kind": "position", "id": p.positionId, "data": _position_dict(p) if is_open else None})
+    if ev.HasField("order"):
+        o = ev.order
+        resting = (
+            o.orderStatus == ProtoOAOrderStatus.ORDER_STATUS_ACCEPTED
+            and o.orderType in (ProtoOAOrderType.LIMIT, ProtoOAOrderType.STOP)
+        )
+        _emit({"kind": "order", "id": o.orderId, "data": _pending_order_dict(o) if resting else None})
 
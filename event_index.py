@@ -0,0 +1,305 @@
+# event_index.py
+# ---------------------------------------------------------------------------
+# Every detector event in archived history, indexed for range queries.
+#
+#   index = build_events(bar_archive.load("EURUSD", "H4"))
+#   index.query(kind="fvg", status="unfilled", near=1.0850, distance=0.0050)
+#
+# The analysis.py detectors only report the most recent pattern in a window.
+# Here the same patterns are found at every bar with vectorized masks:
+#
+#   ob      engulfing reversal; zone = the candle before it (as detect_order_block)
+#   fvg     gap between bar i-2 and bar i; zone = the gap, time = bar i-1
+#   choch   outside bar; zone = its range, direction = its body (dojis are skipped)
+#   sweep   first bar of a day to trade through the previous day's high/low;
+#           zone = level → wick extreme
+#
+# Bullish zones sit below price and bearish zones above it. An event is
+# "touched" at the first later bar that trades into its zone and "filled" at
+# the first later bar that trades through it. Both are found for all events
+# at once by binary lifting over a sparse min/max table: O(m log n).
+#
+# Events are stored columnar, in time order, with a permutation sorted by
+# zone low. A price query is two searchsorted calls on the sorted lows
+# (bounded by the widest zone of that kind) plus a mask over the candidates,
+# so it takes microseconds instead of a rescan of the history.
+
+import os
+import threading
+
+import numpy as np
+
+import bar_archive
+import resample
+
+KINDS = ("ob", "fvg", "choch", "sweep")
+NEVER = -1
+
+
+def pip_size(symbol: str, digits: int = None) -> float:
+    """
+    Pip for distance filters. From the broker's price digits when known: 10 points
+    on 3/5-digit quotes (fractional pips), one point otherwise (indices, crypto,
+    2-digit metals). Without digits (archive-only symbols) it is guessed from the
+    name: 0.01 for JPY quotes, 0.1 for gold, 0.0001 otherwise.
+    """
+    if digits is not None:
+        return 10.0 ** -(digits - 1) if digits in (3, 5) else 10.0 ** -digits
+    symbol = symbol.upper()
+    if symbol.endswith("JPY"):
+        return 0.01
+    if symbol.startswith(("XAU", "XPT", "XPD")):
+        return 0.1
+    if symbol.startswith("XAG"):
+        return 0.01
+    return 0.0001
+
+
+def _sparse(values: np.ndarray, fn) -> list:
+    """tables[k][i] = fn over values[i : i + 2**k] (shorter near the end)."""
+    tables = [values]
+    while (1 << len(tables)) <= len(values):
+        prev, half = tables[-1], 1 << (len(tables) - 1)
+        nxt = prev.copy()
+        nxt[:-half] = fn(prev[:-half], prev[half:])
+        tables.append(nxt)
+    return tables
+
+
+def _first_at_or_below(min_tables: list, start: np.ndarray, level: np.ndarray) -> np.ndarray:
+    """First index j >= start with values[j] <= level, else NEVER (vectorized binary lifting)."""
+    n = len(min_tables[0])
+    pos = start.astype(np.int64).copy()
+    for k in reversed(range(len(min_tables))):
+        step = 1 << k
+        ok = pos + step <= n
+        idx = np.minimum(pos, n - 1)
+        skip = ok & (min_tables[k][idx] > level)
+        pos = np.where(skip, pos + step, pos)
+    inside = pos < n
+    hit = inside & (min_tables[0][np.minimum(pos, n - 1)] <= level)
+    return np.where(hit, pos, NEVER)
+
+
+class EventIndex:
+    """Columnar detector events for one symbol/timeframe (see module comment)."""
+
+    FIELDS = ("kind", "direction", "bar", "time", "confirmed_at", "low", "high", "touched_at", "filled_at")
+
+    def __init__(self, columns: dict, bar_times: np.ndarray, last_close: float = None):
+        order = np.lexsort((columns["kind"], columns["time"]))
+        self.cols = {f: np.ascontiguousarray(columns[f][order]) for f in self.FIELDS}
+        self.bar_times = bar_times
+        self.last_bar = int(bar_times[-1]) if len(bar_times) else None
+        self.last_close = last_close
+        self._by_kind = {}
+        for code, kind in enumerate(KINDS):
+            rows = np.nonzero(self.cols["kind"] == code)[0]           # time order
+            by_low = rows[np.argsort(self.cols["low"][rows], kind="stable")]
+            widths = self.cols["high"][rows] - self.cols["low"][rows]
+            self._by_kind[kind] = {
+                "rows": rows,
+                "by_low": by_low,
+                "lows": self.cols["low"][by_low],
+                "max_width": float(widths.max()) if len(widths) else 0.0,
+            }
+
+    def __len__(self):
+        return len(self.cols["time"])
+
+    def counts(self) -> dict:
+        return {kind: len(k["rows"]) for kind, k in self._by_kind.items()}
+
+    def _candidates(self, kind: str, near, distance) -> np.ndarray:
+        k = self._by_kind[kind]
+        if near is None:
+            return k["rows"]
+        lo, hi = near - distance, near + distance
+        # zone [low, high] overlaps [lo, hi] ⇔ low <= hi and high >= lo; high <= low + max_width
+        a = np.searchsorted(k["lows"], lo - k["max_width"], side="left")
+        b = np.searchsorted(k["lows"], hi, side="right")
+        rows = k["by_low"][a:b]
+        return rows[self.cols["high"][rows] >= lo]
+
+    def query(self, kind=None, direction: int = None, status: str = "any", near: float = None,
+              distance: float = 0.0, start: int = None, end: int = None, as_of: int = None,
+              limit: int = 100) -> list:
+        """
+        Events matching every given filter, most recent first.
+
+        Args:
+            kind: One of KINDS, or a list of them (None = all)
+            direction: 1 bullish, -1 bearish (None = both)
+            status: "unfilled", "filled", "untouched", "touched" or "any", judged at `as_of`
+            near, distance: Only zones within `distance` of price `near`
+            start, end: Event time bounds (epoch seconds, inclusive)
+            as_of: Epoch time the status is judged at; events confirmed later
+                are left out (default: the last archived bar)
+        """
+        kinds = KINDS if kind is None else ([kind] if isinstance(kind, str) else list(kind))
+        rows = np.concatenate([self._candidates(k, near, distance) for k in kinds]) if kinds else np.empty(0, np.intp)
+        c = self.cols
+        mask = np.ones(len(rows), dtype=bool)
+        if direction is not None:
+            mask &= c["direction"][rows] == direction
+        if start is not None:
+            mask &= c["time"][rows] >= start
+        if end is not None:
+            mask &= c["time"][rows] <= end
+        if as_of is not None:
+            # an event exists from the bar that completes the pattern, not from its zone bar
+            mask &= self.bar_times[c["confirmed_at"][rows]] <= as_of
+        if status != "any":
+            column = "filled_at" if status in ("filled", "unfilled") else "touched_at"
+            at = c[column][rows]
+            happened = at != NEVER
+            if as_of is not None:
+                happened &= self.bar_times[np.maximum(at, 0)] <= as_of
+            mask &= happened if status in ("filled", "touched") else ~happened
+        rows = rows[mask]
+        rows = rows[np.argsort(-c["time"][rows], kind="stable")][:limit]
+        return [self._event(i, as_of) for i in rows]
+
+    def _event(self, i: int, as_of: int = None) -> dict:
+        c = self.cols
+
+        def at(column):
+            j = int(c[column][i])
+            if j == NEVER or (as_of is not None and self.bar_times[j] > as_of):
+                return None         # not yet happened at as_of
+            return int(self.bar_times[j])
+
+        return {
+            "kind": KINDS[c["kind"][i]],
+            "direction": "bullish" if c["direction"][i] > 0 else "bearish",
+            "time": int(c["time"][i]),
+            "confirmed_at": at("confirmed_at"),
+            "low": float(c["low"][i]),
+            "high": float(c["high"][i]),
+            "touched_at": at("touched_at"),
+            "filled_at": at("filled_at"),
+        }
+
+
+def _first_per_group(mask: np.ndarray, group: np.ndarray) -> np.ndarray:
+    """mask restricted to the first True of each run of equal `group` values."""
+    idx = np.flatnonzero(mask)
+    keep = np.ones(len(idx), dtype=bool)
+    keep[1:] = group[idx[1:]] != group[idx[:-1]]
+    out = np.zeros(len(mask), dtype=bool)
+    out[idx[keep]] = True
+    return out
+
+
+def build_events(bars: np.ndarray, day_offset_hours: float = 0) -> EventIndex:
+    """Find every ob/fvg/choch/sweep event in time-sorted bars and index them."""
+    t = bars["time"].astype(np.int64)
+    o, h, l, c = (bars[f].astype(np.float64) for f in ("open", "high", "low", "close"))
+    n = len(bars)
+    red, green = c < o, c > o
+    parts = []
+
+    def add(kind, pattern, direction, time_idx, low, high):
+        # pattern: bar index the event is confirmed on; fills are searched from the next bar
+        parts.append((KINDS.index(kind), pattern, direction, time_idx, low, high))
+
+    if n >= 2:
+        i = np.arange(1, n)
+        bull = red[:-1] & green[1:] & (c[1:] > h[:-1])
+        bear = green[:-1] & red[1:] & (c[1:] < l[:-1])
+        for mask, d in ((bull, 1), (bear, -1)):
+            j = i[mask]
+            add("ob", j, np.full(len(j), d), j - 1, l[j - 1], h[j - 1])
+
+        outside = (h[1:] > h[:-1]) & (l[1:] < l[:-1]) & (c[1:] != o[1:])
+        j = i[outside]
+        add("choch", j, np.sign(c[j] - o[j]).astype(np.int64), j, l[j], h[j])
+
+    if n >= 3:
+        i = np.arange(2, n)
+        up = l[2:] > h[:-2]
+        down = h[2:] < l[:-2]
+        j = i[up]
+        add("fvg", j, np.ones(len(j), np.int64), j - 1, h[j - 2], l[j])
+        j = i[down]
+        add("fvg", j, -np.ones(len(j), np.int64), j - 1, h[j], l[j - 2])
+
+    if n:
+        day = resample.bucket_starts(t, "D1", day_offset_hours)
+        starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        day_no = np.cumsum(np.r_[False, day[1:] != day[:-1]])
+        day_high = np.maximum.reduceat(h, starts)
+        day_low = np.minimum.reduceat(l, starts)
+        has_prev = day_no > 0
+        pdh = np.where(has_prev, day_high[np.maximum(day_no - 1, 0)], np.inf)
+        pdl = np.where(has_prev, day_low[np.maximum(day_no - 1, 0)], -np.inf)
+        for crossed, d in ((h > pdh, -1), (l < pdl, 1)):
+            j = np.flatnonzero(_first_per_group(crossed, day_no))   # first crossing bar of each day
+            if d < 0:
+                add("sweep", j, np.full(len(j), d), j, pdh[j], h[j])
+            else:
+                add("sweep", j, np.full(len(j), d), j, l[j], pdl[j])
+
+    if parts:
+        kind = np.concatenate([np.full(len(p[1]), p[0], np.int8) for p in parts])
+        pattern = np.concatenate([p[1] for p in parts]).astype(np.int64)
+        direction = np.concatenate([p[2] for p in parts]).astype(np.int8)
+        time_idx = np.concatenate([p[3] for p in parts]).astype(np.int64)
+        low = np.concatenate([p[4] for p in parts])
+        high = np.concatenate([p[5] for p in parts])
+    else:
+        kind = direction = np.empty(0, np.int8)
+        pattern = time_idx = np.empty(0, np.int64)
+        low = high = np.empty(0)
+
+    # bullish zones (below price): touched at low <= high, filled at low <= low
+    # bearish zones (above price): touched at high >= low, filled at high >= high
+    touched = np.full(len(kind), NEVER, np.int64)
+    filled = np.full(len(kind), NEVER, np.int64)
+    if n and len(kind):
+        mins, maxs_neg = _sparse(l, np.minimum), _sparse(-h, np.minimum)
+        start = pattern + 1
+        bull = direction > 0
+        touched[bull] = _first_at_or_below(mins, start[bull], high[bull])
+        filled[bull] = _first_at_or_below(mins, start[bull], low[bull])
+        touched[~bull] = _first_at_or_below(maxs_neg, start[~bull], -low[~bull])
+        filled[~bull] = _first_at_or_below(maxs_neg, start[~bull], -high[~bull])
+
+    columns = {
+        "kind": kind, "direction": direction, "bar": time_idx, "time": t[time_idx] if n else time_idx,
+        "confirmed_at": pattern,
+        "low": low, "high": high, "touched_at": touched, "filled_at": filled,
+    }
+    return EventIndex(columns, t, last_close=float(c[-1]) if n else None)
+
+
+class EventStore:
+    """
+    EventIndex per archived symbol/timeframe, built on first use and rebuilt
+    when the archive file changes.
+    """
+
+    def __init__(self, directory: str = None, day_offset_hours: float = 0):
+        self.directory = directory
+        self.day_offset_hours = day_offset_hours
+        self._indexes = {}          # {(SYMBOL, TF): (mtime, EventIndex)}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, tf: str) -> EventIndex:
+        key = (symbol.upper(), tf.upper())
+        path = bar_archive.path_for(*key, self.directory)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No archive for {key[0]} {key[1]} (run bar_archive.py)")
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        index = build_events(bar_archive.load(*key, self.directory), self.day_offset_hours)
+        with self._lock:
+            self._indexes[key] = (mtime, index)
+        return index
+
+    def status(self) -> dict:
+        with self._lock:
+            return {f"{s}_{tf}": len(index) for (s, tf), (_, index) in self._indexes.items()}
@@ -0,0 +1,199 @@
+# journal_queue.py
+# ---------------------------------------------------------------------------
+# Durable SQLite-backed queue for Notion journal writes + background drainer.
+#
+# /journal-entry only inserts a row here and returns; NotionJournalWorker
+# claims due rows in batches, paces requests under Notion's rate limit
+# (~3 req/s average), honours 429 Retry-After and retries other failures
+# with exponential backoff. Rows survive restarts until they are sent.
+
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from metrics import span
+
+
+class JournalQueue:
+    """Persistent FIFO of Notion `pages.create` payloads."""
+
+    def __init__(self, path: str = "journal_queue.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notion_queue (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload      TEXT    NOT NULL,
+                status       TEXT    NOT NULL DEFAULT 'pending',   -- pending | dead
+                attempts     INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL    NOT NULL,
+                created      REAL    NOT NULL,
+                last_error   TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_notion_queue_due ON notion_queue(status, next_attempt)"
+        )
+
+    def enqueue(self, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO notion_queue (payload, next_attempt, created) VALUES (?, ?, ?)",
+                (json.dumps(payload), now, now),
+            )
+        return cur.lastrowid
+
+    def due(self, limit: int, now: float = None) -> list:
+        """Oldest pending rows whose retry time has passed: [(id, payload, attempts)]."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, attempts FROM notion_queue "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows]
+
+    def ack(self, ids: list):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM notion_queue WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, row_id: int, attempts: int, delay: float, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notion_queue SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error[:500], row_id),
+            )
+
+    def bury(self, row_id: int, attempts: int, error: str):
+        """Give up on a row; it stays in the table with status 'dead' for inspection."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notion_queue SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error[:500], row_id),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM notion_queue GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created) FROM notion_queue WHERE status = 'pending'"
+            ).fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _retry_after(error) -> float:
+    """Seconds from a 429's Retry-After header, if the client exposed one."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class NotionJournalWorker(threading.Thread):
+    """
+    Drain a JournalQueue into Notion.
+
+    Args:
+        queue: JournalQueue to drain
+        send: Callable taking one payload, e.g. lambda p: notion.pages.create(**p)
+        rate_per_sec: Average request rate to stay under (Notion allows ~3/s)
+        batch_size: Rows claimed per pass
+        base_backoff / max_backoff: Exponential backoff bounds in seconds
+        max_attempts: Attempts before a row is marked dead
+        poll_interval: Sleep between passes when the queue is empty
+    """
+
+    def __init__(self, queue: JournalQueue, send, rate_per_sec: float = 2.5, batch_size: int = 10,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0, max_attempts: int = 8,
+                 poll_interval: float = 1.0):
+        super().__init__(name="notion-journal-worker", daemon=True)
+        self.queue = queue
+        self.send = send
+        self.min_gap = 1.0 / rate_per_sec
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._paused_until = 0.0
+        self._last_send = 0.0
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def drain_once(self) -> int:
+        """Send one batch of due rows; returns how many were delivered."""
+        now = time.time()
+        if now < self._paused_until:
+            return 0
+
+        sent = 0
+        for row_id, payload, attempts in self.queue.due(self.batch_size, now):
+            if self._stop_event.is_set():
+                break
+            wait = self._last_send + self.min_gap - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_send = time.time()
+
+            try:
+                with span("notion.pages.create"):
+                    self.send(payload)
+            except Exception as e:
+                attempts += 1
+                status = getattr(e, "status", None)
+                if status == 429:
+                    # Rate limited: pause the whole worker, not just this row
+                    delay = _retry_after(e) or self.backoff(attempts)
+                    self._paused_until = time.time() + delay
+                    self.queue.retry(row_id, attempts - 1, delay, str(e))
+                    print(f"[NOTION] Rate limited, pausing {delay:.1f}s")
+                    break
+                if attempts >= self.max_attempts or status in (400, 401, 403, 404):
+                    self.queue.bury(row_id, attempts, str(e))
+                    print(f"[NOTION] Giving up on journal row {row_id}: {e}")
+                else:
+                    self.queue.retry(row_id, attempts, self.backoff(attempts), str(e))
+            else:
+                # Ack at once: a failure later in the batch (or a crash) must not resend this page
+                self.queue.ack([row_id])
+                sent += 1
+        return sent
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                delivered = self.drain_once()
+            except Exception as e:
+                print("[NOTION] Worker error:", e)
+                delivered = 0
+            if not delivered:
+                self._stop_event.wait(self.poll_interval)
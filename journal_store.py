@@ -0,0 +1,195 @@
+# journal_store.py
+# ---------------------------------------------------------------------------
+# Local embedded trade journal (SQLite). Source of truth for /journal-entry;
+# Notion is only a replica fed through journal_queue.py.
+#
+# Indexed on symbol, session, entry_type and date so filtered queries and the
+# aggregate stats stay in the millisecond range with tens of thousands of rows.
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+FILTERS = ("symbol", "session", "entry_type", "htf_bias", "status", "outcome", "direction")
+
+# R-multiple histogram bucket width
+R_BUCKET = 0.5
+
+
+def r_multiple(direction: str, entry: float, stop: float, exit_price: float):
+    """Realised R: profit in units of initial risk (None if the stop equals entry)."""
+    risk = entry - stop if direction == "long" else stop - entry
+    if not risk:
+        return None
+    reward = exit_price - entry if direction == "long" else entry - exit_price
+    return reward / risk
+
+
+class JournalStore:
+    """SQLite-backed journal with indexed filters and aggregate analytics."""
+
+    def __init__(self, path: str = "journal.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                created      TEXT NOT NULL,            -- ISO-8601 UTC
+                date         TEXT NOT NULL,            -- YYYY-MM-DD (UTC)
+                title        TEXT,
+                symbol       TEXT NOT NULL,
+                session      TEXT,
+                htf_bias     TEXT,
+                entry_type   TEXT,
+                order_type   TEXT,
+                direction    TEXT,                     -- long | short
+                entry_price  REAL,
+                stop_loss    REAL,
+                target_price REAL,
+                status       TEXT,
+                note         TEXT,
+                checklist    TEXT,
+                news_events  TEXT,
+                chart_url    TEXT,
+                exit_price   REAL,
+                closed_at    TEXT,
+                r_multiple   REAL,
+                outcome      TEXT                      -- win | loss | breakeven
+            );
+            CREATE INDEX IF NOT EXISTS idx_journal_symbol     ON journal(symbol, date);
+            CREATE INDEX IF NOT EXISTS idx_journal_session    ON journal(session, date);
+            CREATE INDEX IF NOT EXISTS idx_journal_entry_type ON journal(entry_type, date);
+            CREATE INDEX IF NOT EXISTS idx_journal_date       ON journal(date);
+            """
+        )
+
+    # ── writes ──────────────────────────────────────────────────────────────
+    def add(self, entry: dict, status: str) -> int:
+        """Insert a journal entry (JournalEntry fields as a dict); returns its id."""
+        now = datetime.now(timezone.utc)
+        direction = "long" if entry["target_price"] >= entry["entry_price"] else "short"
+        row = {
+            "created": now.isoformat(),
+            "date": now.date().isoformat(),
+            "title": entry.get("title", ""),
+            "symbol": entry["symbol"].upper(),
+            "session": entry.get("session", ""),
+            "htf_bias": entry.get("htf_bias", ""),
+            "entry_type": entry.get("entry_type", ""),
+            "order_type": entry.get("order_type", ""),
+            "direction": direction,
+            "entry_price": entry["entry_price"],
+            "stop_loss": entry["stop_loss"],
+            "target_price": entry["target_price"],
+            "status": status,
+            "note": entry.get("note", ""),
+            "checklist": entry.get("checklist", ""),
+            "news_events": entry.get("news_events", ""),
+            "chart_url": entry.get("chart_url", ""),
+        }
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self._lock:
+            cur = self._conn.execute(f"INSERT INTO journal ({cols}) VALUES ({marks})", tuple(row.values()))
+        return cur.lastrowid
+
+    def close(self, entry_id: int, exit_price: float, closed_at: str = None):
+        """Record the exit of a trade and its realised R. Returns the updated row or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM journal WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                return None
+            r = r_multiple(row["direction"], row["entry_price"], row["stop_loss"], exit_price)
+            outcome = None if r is None else "win" if r > 0 else "loss" if r < 0 else "breakeven"
+            self._conn.execute(
+                "UPDATE journal SET exit_price = ?, closed_at = ?, r_multiple = ?, outcome = ?, status = 'Closed' "
+                "WHERE id = ?",
+                (exit_price, closed_at or datetime.now(timezone.utc).isoformat(), r, outcome, entry_id),
+            )
+            return dict(self._conn.execute("SELECT * FROM journal WHERE id = ?", (entry_id,)).fetchone())
+
+    # ── reads ───────────────────────────────────────────────────────────────
+    @staticmethod
+    def _where(filters: dict, date_from: str = None, date_to: str = None):
+        clauses, params = [], []
+        for key in FILTERS:
+            value = filters.get(key)
+            if value:
+                clauses.append(f"{key} = ?")
+                params.append(value.upper() if key == "symbol" else value)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to[:10])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, filters: dict = None, date_from: str = None, date_to: str = None,
+              limit: int = 100, offset: int = 0) -> list:
+        where, params = self._where(filters or {}, date_from, date_to)
+        sql = f"SELECT * FROM journal{where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, entry_id: int):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM journal WHERE id = ?", (entry_id,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self, filters: dict = None, date_from: str = None, date_to: str = None) -> dict:
+        """Win rate by session and HTF bias, plus the R-multiple distribution of closed trades."""
+        where, params = self._where(filters or {}, date_from, date_to)
+        closed = (where + " AND " if where else " WHERE ") + "r_multiple IS NOT NULL"
+
+        def grouped(column):
+            sql = (
+                f"SELECT {column} AS k, COUNT(*) AS n, SUM(r_multiple > 0) AS wins, "
+                f"AVG(r_multiple) AS avg_r, SUM(r_multiple) AS total_r "
+                f"FROM journal{closed} GROUP BY {column} ORDER BY n DESC"
+            )
+            return {
+                (r["k"] or "Unknown"): {
+                    "trades": r["n"],
+                    "win_rate": round(r["wins"] / r["n"], 4) if r["n"] else None,
+                    "avg_r": round(r["avg_r"], 3),
+                    "total_r": round(r["total_r"], 3),
+                }
+                for r in self._conn.execute(sql, params).fetchall()
+            }
+
+        with self._lock:
+            totals = self._conn.execute(
+                f"SELECT COUNT(*) AS n, SUM(r_multiple IS NOT NULL) AS closed, "
+                f"SUM(r_multiple > 0) AS wins, AVG(r_multiple) AS avg_r FROM journal{where}",
+                params,
+            ).fetchone()
+            by_session = grouped("session")
+            by_bias = grouped("htf_bias")
+            x = f"(r_multiple / {R_BUCKET})"
+            buckets = self._conn.execute(
+                # floor() without relying on SQLite's optional math functions
+                f"SELECT CAST({x} AS INTEGER) - ({x} < CAST({x} AS INTEGER)) AS b, COUNT(*) AS n "
+                f"FROM journal{closed} GROUP BY b ORDER BY b",
+                params,
+            ).fetchall()
+
+        closed_n = totals["closed"] or 0
+        return {
+            "entries": totals["n"],
+            "closed": closed_n,
+            "win_rate": round(totals["wins"] / closed_n, 4) if closed_n else None,
+            "avg_r": round(totals["avg_r"], 3) if totals["avg_r"] is not None else None,
+            "by_session": by_session,
+            "by_htf_bias": by_bias,
+            "r_distribution": [
+                {"from_r": b["b"] * R_BUCKET, "to_r": (b["b"] + 1) * R_BUCKET, "trades": b["n"]}
+                for b in buckets
+            ],
+        }
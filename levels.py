@@ -0,0 +1,324 @@
+# levels.py
+# ---------------------------------------------------------------------------
+# Rolling high/low level engine.
+#
+# Bars of any timeframe are folded into per-day / per-week / per-month and
+# per-session extremes as they arrive (max/min are idempotent, so overlapping
+# D1, H1 and M15 feeds can all be pushed into the same symbol). Completed days
+# go into an append-only sparse table, so the high/low of *any* N-day window is
+# an O(1) query and each closed day costs O(log days) to add. Closed bars of
+# each timeframe also feed monotonic deques, one per configured bar window
+# (e.g. the last 20 / 50 H1 bars), at amortised O(1) per bar.
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+SESSIONS = (("Asia", 0, 7), ("London", 7, 12), ("NewYork", 12, 17), ("PostNY", 17, 24))
+INTRADAY_TFS = {"M1", "M5", "M15", "M30", "H1"}
+
+
+def session_of(hour: int) -> str:
+    for name, start, end in SESSIONS:
+        if start <= hour < end:
+            return name
+    return "Unknown"
+
+
+def context_levels(candles: list) -> dict:
+    """The `context` block returned by get_ohlc_data (last/previous bar and 5-bar range)."""
+    if len(candles) < 2:
+        return {}
+    recent = candles[-5:]
+    return {
+        "today_high": candles[-1]["high"],
+        "today_low": candles[-1]["low"],
+        "prev_day_high": candles[-2]["high"],
+        "prev_day_low": candles[-2]["low"],
+        "range_high_5": max(c["high"] for c in recent),
+        "range_low_5": min(c["low"] for c in recent),
+    }
+
+
+# ── rolling structures ─────────────────────────────────────────────────────
+class RollingExtrema:
+    """Max/min of the last `window` values with monotonic deques (amortised O(1))."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._i = 0
+        self._max = deque()   # (index, value), values decreasing
+        self._min = deque()   # (index, value), values increasing
+
+    def __len__(self):
+        return min(self._i, self.window)
+
+    def push(self, high: float, low: float = None):
+        low = high if low is None else low
+        while self._max and self._max[-1][1] <= high:
+            self._max.pop()
+        self._max.append((self._i, high))
+        while self._min and self._min[-1][1] >= low:
+            self._min.pop()
+        self._min.append((self._i, low))
+        self._i += 1
+        cutoff = self._i - self.window
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+
+class AppendSparseTable:
+    """
+    Sparse table that grows at the end: append is O(log n), range query O(1).
+
+    `op` must be idempotent (max or min).
+    """
+
+    def __init__(self, op):
+        self.op = op
+        self._levels = [[]]   # _levels[k][i] = op over values[i : i + 2**k]
+
+    def __len__(self):
+        return len(self._levels[0])
+
+    def append(self, value):
+        self._levels[0].append(value)
+        n = len(self._levels[0])
+        k = 1
+        while (1 << k) <= n:
+            if len(self._levels) == k:
+                self._levels.append([])
+            prev = self._levels[k - 1]
+            i = n - (1 << k)            # the one new window of length 2**k
+            self._levels[k].append(self.op(prev[i], prev[i + (1 << (k - 1))]))
+            k += 1
+
+    def query(self, start: int, end: int):
+        """op over values[start:end] (end exclusive); None for an empty range."""
+        start, end = max(start, 0), min(end, len(self))
+        if start >= end:
+            return None
+        k = (end - start).bit_length() - 1
+        row = self._levels[k]
+        return self.op(row[start], row[end - (1 << k)])
+
+
+# ── per-symbol state ───────────────────────────────────────────────────────
+class _Bucket:
+    __slots__ = ("key", "high", "low")
+
+    def __init__(self, key, high, low):
+        self.key, self.high, self.low = key, high, low
+
+    def add(self, high, low):
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+
+    def as_dict(self):
+        return {"high": self.high, "low": self.low}
+
+
+class _SymbolLevels:
+    def __init__(self):
+        self.day = None             # current (forming) day bucket
+        self.week = None
+        self.month = None
+        self.prev_week = None
+        self.prev_month = None
+        self.sessions = {}          # {session: _Bucket} for the current day
+        self.prev_sessions = {}     # previous day's session ranges
+        self.days = []              # keys of completed days
+        self.day_highs = AppendSparseTable(max)
+        self.day_lows = AppendSparseTable(min)
+        self.last_time = None
+        self.fed = {}               # {tf: open time of the newest bar fed}
+        self.rolling = {}           # {tf: {window: RollingExtrema}} over closed bars
+        self.closed = {}            # {tf: open time of the last bar pushed into rolling}
+
+
+class LevelEngine:
+    """
+    Incrementally maintained PDH/PDL, N-day, weekly, monthly and session highs/lows.
+
+    Args:
+        day_offset_hours: Shift applied before bucketing into days (e.g. 2 for
+            a broker whose trading day starts at 22:00 UTC). Sessions always
+            use UTC hours, as label_session does.
+        bar_windows: Rolling windows, in bars of each timeframe fed, whose
+            high/low the snapshot reports under `rolling`
+    """
+
+    def __init__(self, day_offset_hours: float = 0, bar_windows=(20, 50)):
+        self.offset = timedelta(hours=day_offset_hours)
+        self.bar_windows = tuple(bar_windows)
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def _state(self, symbol: str) -> _SymbolLevels:
+        key = symbol.upper()
+        if key not in self._symbols:
+            self._symbols[key] = _SymbolLevels()
+        return self._symbols[key]
+
+    def update(self, symbol: str, candles: list, tf: str = "M15", closed: bool = False) -> int:
+        """
+        Fold bars into the symbol's levels and return how many were used.
+
+        Re-sent bars (e.g. the forming bar on every poll) are absorbed by
+        max/min. Bars of an already completed day only fill in its session
+        ranges when it is the previous day (a cold symbol fed D1 before M15);
+        its extremes are already in the day tables, and older days are
+        skipped. Session ranges only take bars of H1 or shorter.
+
+        The rolling bar windows take each closed bar once: the last candle is
+        taken as forming unless `closed` says every candle has closed.
+        """
+        tf = tf.upper()
+        intraday = tf in INTRADAY_TFS
+        used = 0
+        with self._lock:
+            st = self._state(symbol)
+            bars = []
+            for c in candles:
+                ts = datetime.fromisoformat(c["time"].replace("Z", "+00:00"))
+                if ts.tzinfo is None:
+                    ts = ts.replace(tzinfo=timezone.utc)
+                bars.append((ts, c["high"], c["low"]))
+                if self._add(st, ts, c["high"], c["low"], intraday):
+                    used += 1
+                    if st.last_time is None or ts > st.last_time:
+                        st.last_time = ts
+            if bars:
+                newest = max(ts for ts, _, _ in bars)
+                if tf not in st.fed or newest > st.fed[tf]:
+                    st.fed[tf] = newest
+                self._roll(st, tf, bars if closed else bars[:-1])
+        return used
+
+    def _roll(self, st: _SymbolLevels, tf: str, bars: list):
+        if not self.bar_windows:
+            return
+        windows = st.rolling.get(tf)
+        if windows is None:
+            windows = st.rolling[tf] = {w: RollingExtrema(w) for w in self.bar_windows}
+        last = st.closed.get(tf)
+        for ts, high, low in bars:
+            if last is None or ts > last:
+                for extrema in windows.values():
+                    extrema.push(high, low)
+                last = ts
+        if last is not None:
+            st.closed[tf] = last
+
+    def last_bar(self, symbol: str, tf: str):
+        """Open time (datetime) of the newest `tf` bar fed for the symbol, or None."""
+        with self._lock:
+            st = self._symbols.get(symbol.upper())
+            return st.fed.get(tf.upper()) if st is not None else None
+
+    def _day(self, ts):
+        return (ts + self.offset).date()
+
+    def _add(self, st: _SymbolLevels, ts, high, low, intraday: bool) -> bool:
+        day = self._day(ts)
+        week = day.isocalendar()[:2]
+        month = (day.year, day.month)
+
+        if st.day is None or day > st.day.key:
+            if st.day is not None:
+                st.days.append(st.day.key)
+                st.day_highs.append(st.day.high)
+                st.day_lows.append(st.day.low)
+                st.prev_sessions = st.sessions
+                st.sessions = {}
+            st.day = _Bucket(day, high, low)
+        elif day == st.day.key:
+            st.day.add(high, low)
+        elif intraday and st.days and day == st.days[-1]:
+            # previous day: its extremes are in the tables, its sessions may not be yet
+            self._add_session(st.prev_sessions, ts, high, low)
+            return True
+        else:
+            return False   # completed day: its extremes are already in the tables
+
+        if st.week is None or week > st.week.key:
+            st.prev_week = st.week
+            st.week = _Bucket(week, high, low)
+        else:
+            st.week.add(high, low)
+
+        if st.month is None or month > st.month.key:
+            st.prev_month = st.month
+            st.month = _Bucket(month, high, low)
+        else:
+            st.month.add(high, low)
+
+        if intraday:
+            self._add_session(st.sessions, ts, high, low)
+        return True
+
+    @staticmethod
+    def _add_session(sessions: dict, ts, high, low):
+        session = session_of(ts.hour)
+        if session in sessions:
+            sessions[session].add(high, low)
+        else:
+            sessions[session] = _Bucket(session, high, low)
+
+    # ── queries (O(1)) ──────────────────────────────────────────────────────
+    def previous_day(self, symbol: str):
+        """(high, low) of the last completed day, or None."""
+        st = self._symbols.get(symbol.upper())
+        if st is None or not st.days:
+            return None
+        n = len(st.days)
+        return st.day_highs.query(n - 1, n), st.day_lows.query(n - 1, n)
+
+    def n_day(self, symbol: str, n: int, include_today: bool = False):
+        """(high, low) over the last `n` completed days (optionally plus today)."""
+        st = self._symbols.get(symbol.upper())
+        if st is None:
+            return None
+        total = len(st.days)
+        high = st.day_highs.query(total - n, total)
+        low = st.day_lows.query(total - n, total)
+        if include_today and st.day is not None:
+            high = st.day.high if high is None else max(high, st.day.high)
+            low = st.day.low if low is None else min(low, st.day.low)
+        return None if high is None else (high, low)
+
+    def snapshot(self, symbol: str, windows=(5, 20)) -> dict:
+        st = self._symbols.get(symbol.upper())
+        if st is None:
+            return {}
+        pd = self.previous_day(symbol)
+        return {
+            "today": st.day.as_dict() if st.day else None,
+            "previous_day": {"high": pd[0], "low": pd[1]} if pd else None,
+            **{
+                f"{n}_day": dict(zip(("high", "low"), self.n_day(symbol, n)))
+                for n in windows if self.n_day(symbol, n)
+            },
+            "week": st.week.as_dict() if st.week else None,
+            "previous_week": st.prev_week.as_dict() if st.prev_week else None,
+            "month": st.month.as_dict() if st.month else None,
+            "previous_month": st.prev_month.as_dict() if st.prev_month else None,
+            "sessions": {k: v.as_dict() for k, v in st.sessions.items()},
+            "previous_day_sessions": {k: v.as_dict() for k, v in st.prev_sessions.items()},
+            "rolling": {
+                tf: {f"{w}_bars": {"high": r.max(), "low": r.min(), "bars": len(r)} for w, r in extrema.items() if len(r)}
+                for tf, extrema in st.rolling.items()
+            },
+            "completed_days": len(st.days),
+            "last_bar": st.last_time.isoformat() if st.last_time else None,
+        }
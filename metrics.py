@@ -0,0 +1,192 @@
+# metrics.py
+# ---------------------------------------------------------------------------
+# Lightweight timing spans + Prometheus text exposition (no external deps).
+#
+#   with span("analysis.detect_fvg", tf="H4"):
+#       detect_fvg(candles)
+#
+# Every span feeds the `smc_stage_duration_seconds` histogram. When a request
+# collector is active (see app.py middleware) spans are also recorded for the
+# per-request `Server-Timing` header.
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# list of (name, seconds) for the request being served, or None
+_request_spans: ContextVar = ContextVar("request_spans", default=None)
+
+
+# ── histogram ──────────────────────────────────────────────────────────────
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values, safe across threads."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # {label values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(k, list(v)) for k, v in items]
+        for key, series in items:
+            base = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+            for bound, count in zip(self.buckets, series):
+                le = ",".join(base + ['le="%s"' % bound])
+                lines.append(f"{self.name}_bucket{{{le}}} {count}")
+            le = ",".join(base + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{le}}} {series[-1]}")
+            labels = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return "\n".join(lines)
+
+
+class Counter:
+    """Monotonic counter keyed by label values, safe across threads."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, value in items:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class Gauge:
+    """Last-set value keyed by label values, safe across threads."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._series[key] = value
+
+    def value(self, **labels) -> float:
+        return self._series.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, value in items:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ── registry ───────────────────────────────────────────────────────────────
+REGISTRY = []
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    h = Histogram(name, documentation, labelnames, buckets)
+    REGISTRY.append(h)
+    return h
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    c = Counter(name, documentation, labelnames)
+    REGISTRY.append(c)
+    return c
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    g = Gauge(name, documentation, labelnames)
+    REGISTRY.append(g)
+    return g
+
+
+STAGE_DURATION = histogram(
+    "smc_stage_duration_seconds",
+    "Duration of instrumented stages (broker calls, detectors, rendering, Notion).",
+    ("stage", "tf"),
+)
+HTTP_DURATION = histogram(
+    "smc_http_request_duration_seconds",
+    "End-to-end HTTP request duration.",
+    ("method", "route", "status"),
+)
+
+def render_prometheus() -> str:
+    return "\n".join(h.render() for h in REGISTRY) + "\n"
+
+
+# ── spans ──────────────────────────────────────────────────────────────────
+@contextmanager
+def span(stage: str, tf: str = ""):
+    """Time a block into STAGE_DURATION (and the current request's Server-Timing)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage, tf=tf)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((f"{stage}.{tf}" if tf else stage, elapsed))
+
+
+def start_request_collection() -> list:
+    """Start collecting spans for the current request; returns the list that fills up."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+def server_timing_header(spans: list, total: float = None) -> str:
+    """Format spans as an HTTP `Server-Timing` header value (durations in ms)."""
+    parts = [f"{_TOKEN_RE.sub('_', name)};dur={seconds * 1000:.2f}" for name, seconds in spans]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
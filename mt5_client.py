@@ -3,10 +3,13 @@
 
 import MetaTrader5 as mt5
 from datetime import datetime, timezone, timedelta
-import threading
 import os
+import time
+import zlib
 from dotenv import load_dotenv
-import numpy as np
+import trend
+import levels
+from scheduler import ORDER, POSITIONS, BARS, from_env
 
 # ── MT5 credentials & client ───────────────────────────────────────────────
 load_dotenv()
@@ -19,19 +22,34 @@ MT5_PATH = os.getenv("MT5_PATH", None)
 if not mt5.initialize(path=MT5_PATH, login=MT5_LOGIN, password=MT5_PASSWORD, server=MT5_SERVER):
     raise RuntimeError(f"MT5 initialize() failed, error code: {mt5.last_error()}")
 
+# The MetaTrader5 API is not thread-safe: one call at a time, admitted by
+# priority so a queue of bar fetches never holds up an order
+broker_scheduler = from_env("mt5", max_inflight=1)
+
 # ── symbol maps ────────────────────────────────────────────────────────────
 symbol_map = {}        # {name: name}
 symbol_name_to_id = {} # {name.upper(): name}
 symbol_digits_map = {} # {name: digits}
+symbol_specs = {}      # {name: contract size, currencies, volume limits, digits} for risk.py / ticks.py
 
+@broker_scheduler.wrap(POSITIONS)
 def load_symbols():
     global symbol_map, symbol_name_to_id, symbol_digits_map
-    symbol_map.clear(); symbol_name_to_id.clear(); symbol_digits_map.clear()
+    symbol_map.clear(); symbol_name_to_id.clear(); symbol_digits_map.clear(); symbol_specs.clear()
     symbols = mt5.symbols_get()
     for s in symbols:
         symbol_map[s.name] = s.name
         symbol_name_to_id[s.name.upper()] = s.name
         symbol_digits_map[s.name] = s.digits
+        symbol_specs[s.name] = {
+            "contract_size": s.trade_contract_size,
+            "base": s.currency_base,
+            "quote": s.currency_profit,
+            "volume_min": s.volume_min,
+            "volume_step": s.volume_step,
+            "volume_max": s.volume_max,
+            "digits": s.digits,
+        }
 
 load_symbols()
 
@@ -42,18 +60,78 @@ def pips_to_relative(pips: int, digits: int) -> float:
 def on_error(failure):
     print("[ERROR]", failure)
 
+_connection_status = [None, None]   # [monotonic time, last reading]
+
+def _read_connection_status() -> dict:
+    info = mt5.terminal_info()
+    if info is None:
+        status = {"state": "disconnected", "connected": False, "latency_ms": None,
+                  "last_error": str(mt5.last_error())}
+    else:
+        status = {
+            "state": "ready" if info.connected else "disconnected",
+            "connected": bool(info.connected),
+            "latency_ms": round(info.ping_last / 1000, 2),   # ping_last is in microseconds
+            "trade_allowed": bool(info.trade_allowed),
+            "symbols": len(symbol_name_to_id),
+        }
+    _connection_status[:] = [time.monotonic(), status]
+    return status
+
+def get_connection_status() -> dict:
+    """Terminal ↔ trade server link; the terminal reconnects on its own.
+
+    Health checks bypass the scheduler queue: while the terminal is busy with
+    another call, the last reading is returned (with its age) instead of waiting.
+    """
+    with broker_scheduler.immediate() as admitted:
+        if admitted:
+            return _read_connection_status()
+    read_at, status = _connection_status
+    if status is None:
+        with broker_scheduler.slot(POSITIONS):
+            return _read_connection_status()
+    return dict(status, cached_seconds=round(time.monotonic() - read_at, 2))
+
 # ── OHLC fetch (used by /fetch-data) ───────────────────────────────────────
+timeframe_map = {
+    "D1": mt5.TIMEFRAME_D1,
+    "H4": mt5.TIMEFRAME_H4,
+    "H1": mt5.TIMEFRAME_H1,
+    "M30": mt5.TIMEFRAME_M30,
+    "M15": mt5.TIMEFRAME_M15,
+    "M5": mt5.TIMEFRAME_M5,
+    "M1": mt5.TIMEFRAME_M1,
+}
+
+@broker_scheduler.wrap(BARS)
+def get_rates(symbol: str, tf: str = "M5", n: int = 1000):
+    """Raw MT5 rates array (time, open, high, low, close, tick_volume, ...) for the last n bars."""
+    timeframe = timeframe_map.get(tf.upper())
+    if timeframe is None:
+        raise ValueError(f"Timeframe '{tf}' is not native to MT5 client")
+    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, n)
+    if rates is None or len(rates) == 0:
+        raise ValueError(f"No OHLC data for {symbol} {tf}")
+    return rates
+
+@broker_scheduler.wrap(BARS)
+def get_ticks(symbol: str, start_msc: int, end_msc: int):
+    """Raw MT5 ticks (time_msc, bid, ask, ...) from start_msc to end_msc, both inclusive."""
+    ticks = mt5.copy_ticks_range(
+        symbol,
+        datetime.fromtimestamp(start_msc / 1000, tz=timezone.utc),
+        datetime.fromtimestamp(end_msc / 1000, tz=timezone.utc),
+        mt5.COPY_TICKS_ALL,
+    )
+    if ticks is None:
+        raise ValueError(f"No tick data for {symbol}: {mt5.last_error()}")
+    return ticks
+
+@broker_scheduler.wrap(BARS)
 def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
-    timeframe_map = {
-        "D1": mt5.TIMEFRAME_D1,
-        "H4": mt5.TIMEFRAME_H4,
-        "H1": mt5.TIMEFRAME_H1,
-        "M30": mt5.TIMEFRAME_M30,
-        "M15": mt5.TIMEFRAME_M15,
-        "M5": mt5.TIMEFRAME_M5,
-        "M1": mt5.TIMEFRAME_M1,
-    }
     timeframe = timeframe_map.get(tf.upper(), mt5.TIMEFRAME_D1)
+
     rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, max(n + 10, 50))
     if rates is None or len(rates) == 0:
         raise ValueError(f"No OHLC data for {symbol} {tf}")
@@ -71,35 +149,13 @@ def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
         })
 
     candles = candles[-n:]
-    highs = [bar["high"] for bar in candles]
-    lows = [bar["low"] for bar in candles]
     closes = [bar["close"] for bar in candles]
 
-    context_levels = {}
-    if len(candles) >= 2:
-        context_levels = {
-            "today_high": candles[-1]["high"],
-            "today_low": candles[-1]["low"],
-            "prev_day_high": candles[-2]["high"],
-            "prev_day_low": candles[-2]["low"],
-            "range_high_5": max(highs[-5:]),
-            "range_low_5": min(lows[-5:])
-        }
+    context_levels = levels.context_levels(candles)
 
     trend_strength = {}
     if tf in ("D1", "H4") and len(closes) >= 5:
-        x = np.arange(len(closes))
-        slope, intercept = np.polyfit(x, closes, 1)
-        r = np.corrcoef(x, closes)[0, 1]
-        trend_strength = {
-            "slope": float(slope),
-            "correlation": float(r),
-            "confidence": (
-                "Ultra Strong Bullish" if slope > 0.5 and r > 0.9 else
-                "Strong Bearish" if slope < -0.5 and r > 0.9 else
-                "Sideways/Neutral"
-            )
-        }
+        trend_strength = trend.trend_strength(closes)
 
     return {
         "candles": candles,
@@ -108,6 +164,7 @@ def get_ohlc_data(symbol: str, tf: str = "D1", n: int = 10):
     }
 
 # ── reconcile helpers ──────────────────────────────────────────────────────
+@broker_scheduler.wrap(POSITIONS)
 def get_open_positions():
     positions = mt5.positions_get()
     open_positions = []
@@ -124,6 +181,36 @@ def get_open_positions():
             )
     return open_positions
 
+def get_symbol_specs() -> dict:
+    return dict(symbol_specs)
+
+@broker_scheduler.wrap(POSITIONS)
+def get_account_info() -> dict:
+    info = mt5.account_info()
+    if info is None:
+        raise RuntimeError(f"MT5 account_info() failed, error code: {mt5.last_error()}")
+    return {
+        "balance": info.balance,
+        "equity": info.equity,
+        "margin": info.margin,
+        "margin_free": info.margin_free,
+        "leverage": info.leverage,
+        "currency": info.currency,
+    }
+
+@broker_scheduler.wrap(POSITIONS)
+def get_change_token():
+    """Cheap fingerprint that moves when positions, pending orders or deals change (no event push in MT5).
+
+    The counts catch opens, closes and fills; the checksum catches SL/TP, price and volume
+    edits, which leave every count unchanged.
+    """
+    now = datetime.now(timezone.utc)
+    deals = mt5.history_deals_total(now - timedelta(days=7), now + timedelta(days=1))
+    items = sorted((p.ticket, p.sl, p.tp, p.price_open, p.volume) for p in mt5.positions_get() or ())
+    items += sorted((o.ticket, o.sl, o.tp, o.price_open, o.volume_initial) for o in mt5.orders_get() or ())
+    return [mt5.positions_total(), mt5.orders_total(), deals, zlib.crc32(repr(items).encode())]
+
 def is_forex_symbol(symbol: str) -> bool:
     return symbol.upper() in {
         "EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "NZDUSD", "USDCHF", "USDCAD",
@@ -131,6 +218,7 @@ def is_forex_symbol(symbol: str) -> bool:
     }
 
 # ── core: place_order ──────────────────────────────────────────────────────
+@broker_scheduler.wrap(ORDER)
 def place_order(
     *, symbol, order_type, side, volume,
     price=None, stop_loss=None, take_profit=None,
@@ -184,6 +272,7 @@ def place_order(
     return result
 
 # ── amend helpers ──────────────────────────────────────────────────────────
+@broker_scheduler.wrap(ORDER)
 def modify_position_sltp(position_id, stop_loss=None, take_profit=None):
     pos = mt5.positions_get(ticket=position_id)
     if not pos:
@@ -201,6 +290,7 @@ def modify_position_sltp(position_id, stop_loss=None, take_profit=None):
     result = mt5.order_send(request)
     return result
 
+@broker_scheduler.wrap(ORDER)
 def modify_pending_order_sltp(order_id, stop_loss=None, take_profit=None):
     order = mt5.orders_get(ticket=order_id)
     if not order:
@@ -226,6 +316,7 @@ def wait_for_deferred(result, timeout=10):
     # For MT5, actions are synchronous, so just return the result
     return result
 
+@broker_scheduler.wrap(POSITIONS)
 def get_pending_orders():
     orders = mt5.orders_get()
     pending_orders = []
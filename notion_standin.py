@@ -0,0 +1,106 @@
+# notion_standin.py
+# ---------------------------------------------------------------------------
+# Local stand-in for the Notion API, for exercising the journal queue.
+#
+#   python notion_standin.py --port 8787 --rate 3 --fail-ratio 0.1
+#   NOTION_BASE_URL=http://127.0.0.1:8787 NOTION_JOURNAL_ENABLED=true uvicorn app:app
+#
+# POST /v1/pages stores the page in memory; GET /v1/pages lists them.
+# Requests above --rate per second get a 429 with Retry-After, and
+# --fail-ratio of the remaining ones get a 503.
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class NotionStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rate: float = 3.0, fail_ratio: float = 0.0, latency_ms: float = 0.0):
+        super().__init__(address, _Handler)
+        self.rate = rate
+        self.fail_ratio = fail_ratio
+        self.latency = latency_ms / 1000
+        self.pages = []
+        self.rejected = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        """Sliding one-second window rate limiter."""
+        now = time.time()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if self.rate and len(self._window) >= self.rate:
+                self.rejected += 1
+                return False
+            self._window.append(now)
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/pages":
+            return self._reply(200, {"object": "list", "results": self.server.pages})
+        self._reply(404, {"object": "error", "status": 404, "code": "object_not_found", "message": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") != "/v1/pages":
+            return self._reply(404, {"object": "error", "status": 404, "code": "object_not_found", "message": "Not found"})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.admit():
+            return self._reply(
+                429,
+                {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"},
+                {"Retry-After": "1"},
+            )
+        if random.random() < self.server.fail_ratio:
+            return self._reply(
+                503,
+                {"object": "error", "status": 503, "code": "service_unavailable", "message": "Unavailable"},
+            )
+        page = {"object": "page", "id": str(uuid.uuid4()), **body}
+        self.server.pages.append(page)
+        self._reply(200, page)
+
+
+def serve(port: int = 8787, **kwargs) -> NotionStandIn:
+    """Start the stand-in on a background thread and return the server."""
+    server = NotionStandIn(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Notion pages API.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--rate", type=float, default=3.0, help="requests/s before 429")
+    parser.add_argument("--fail-ratio", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = NotionStandIn(("127.0.0.1", args.port), rate=args.rate,
+                           fail_ratio=args.fail_ratio, latency_ms=args.latency_ms)
+    print(f"[INFO] Notion stand-in listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
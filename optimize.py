@@ -0,0 +1,432 @@
+# optimize.py
+# ---------------------------------------------------------------------------
+# Parameter sweep for the analysis.py detectors over archived history.
+#
+#   python optimize.py                                        # default grid, every archive
+#   python optimize.py --symbols EURUSD --tf M15 --random 2000
+#   python optimize.py --set order_block.lookback=10:400:10 --horizon 24 48 --rr 1 2
+#   python optimize.py --detectors fvg --json sweep.json
+#
+# A detector's parameters only decide *which* pattern bar it picks from its
+# window; the pattern masks themselves (OB pairs, FVG gaps, outside bars) do
+# not depend on them. Each dataset therefore gets its masks and "last pattern
+# at or before bar i" arrays computed once, and a parameter set is evaluated
+# at every bar of history with a few vectorized gathers instead of re-running
+# the detector per window. Datasets are loaded before the process pool starts,
+# so forked workers share them; spawned workers load them once each.
+#
+# Outcome: the zone a detector reports (OB candle, FVG gap, CHOCH bar) is
+# traded in its direction, stop at the far edge, target `rr` zone-heights past
+# the near edge. A signal is a hit when the target trades before the stop
+# within `horizon` bars. Each zone counts once, from the first bar it is
+# reported on.
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import analysis
+import bar_archive
+import resample
+
+# Parameters /analyze currently uses (window = bars the broker client returns)
+CURRENT = {
+    "order_block": {"window": 50, "lookback": 200, "macro_threshold": 100},
+    "fvg": {"window": 50, "lookback": 50},
+    "choch": {"window": 50, "macro_threshold": 100},
+}
+
+GRID = {
+    "order_block": {
+        "window": [50, 100, 200, 400],
+        "lookback": [20, 50, 100, 200, 400],
+        "macro_threshold": [10, 25, 50, 100, 200],
+    },
+    "fvg": {
+        "window": [50, 100, 200, 400],
+        "lookback": [5, 10, 20, 50, 100, 200],
+    },
+    "choch": {
+        "window": [50, 100, 200, 400],
+        "macro_threshold": [5, 10, 25, 50, 100, 200],
+    },
+}
+
+def _last_true(mask: np.ndarray) -> np.ndarray:
+    """last[i] = largest j <= i with mask[j], or -1."""
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+
+# ── per-dataset shared precomputation ──────────────────────────────────────
+class Dataset:
+    """Pattern masks, zones and forward max tables for one symbol/timeframe."""
+
+    def __init__(self, bars: np.ndarray):
+        self.bars = bars
+        o, h, l, c = (bars[f].astype(np.float64) for f in ("open", "high", "low", "close"))
+        self.high, self.low = h, l
+        n = self.n = len(bars)
+        red, green = c < o, c > o
+
+        ob_bull = np.zeros(n, dtype=bool)
+        ob_bear = np.zeros(n, dtype=bool)
+        ob_bull[1:] = red[:-1] & green[1:] & (c[1:] > h[:-1])
+        ob_bear[1:] = green[:-1] & red[1:] & (c[1:] < l[:-1])
+
+        fvg_up = np.zeros(n, dtype=bool)
+        fvg_down = np.zeros(n, dtype=bool)
+        fvg_up[2:] = l[2:] > h[:-2]
+        fvg_down[2:] = h[2:] < l[:-2]
+
+        outside = np.zeros(n, dtype=bool)
+        outside[1:] = (h[1:] > h[:-1]) & (l[1:] < l[:-1])
+
+        self.last = {
+            "order_block": _last_true(ob_bull | ob_bear),
+            "fvg": _last_true(fvg_up | fvg_down),
+            "choch": _last_true(outside),
+        }
+
+        # zone (low, high, direction) indexed by the pattern bar g
+        prev_h = np.concatenate(([np.nan], h[:-1]))
+        prev_l = np.concatenate(([np.nan], l[:-1]))
+        h2 = np.concatenate(([np.nan, np.nan], h[:-2]))
+        l2 = np.concatenate(([np.nan, np.nan], l[:-2]))
+        self.zones = {
+            # OB zone is the candle before the engulf (analysis returns prev's range)
+            "order_block": (prev_l, prev_h, np.where(ob_bull, 1, np.where(ob_bear, -1, 0))),
+            "fvg": (
+                np.where(fvg_up, h2, h),
+                np.where(fvg_up, l, l2),
+                np.where(fvg_up, 1, np.where(fvg_down, -1, 0)),
+            ),
+            # CHOCH has no direction of its own; take the outside bar's body
+            "choch": (l, h, np.sign(c - o).astype(np.int64)),
+        }
+        self._tables = []
+
+    def _max_tables(self, horizon: int) -> list:
+        """Sparse table over (high, -low): tables[k][side, i] = max of side[i : i + 2**k]."""
+        tables = self._tables
+        if not tables:
+            tables.append(np.stack([self.high, -self.low]))
+        while (1 << len(tables)) <= horizon:
+            prev, half = tables[-1], 1 << (len(tables) - 1)
+            nxt = np.full_like(prev, -np.inf)
+            nxt[:, :-half] = np.maximum(prev[:, :-half], prev[:, half:])
+            tables.append(nxt)
+        return tables[:horizon.bit_length()]
+
+    def first_reach(self, side, start, level, horizon: int, strict: bool) -> np.ndarray:
+        """
+        Bars from `start` until side (0 = high, 1 = -low) reaches `level`
+        (> if strict, else >=), or `horizon` if it does not within the horizon.
+
+        Binary lifting over the sparse table: O(log horizon) vector steps.
+        """
+        pos = start.copy()
+        remaining = np.full(len(start), horizon)
+        for k, table in reversed(list(enumerate(self._max_tables(horizon)))):
+            step = 1 << k
+            block = table[side, np.minimum(pos, self.n - 1)]
+            skip = (step <= remaining) & ((block <= level) if strict else (block < level))
+            pos += step * skip
+            remaining -= step * skip
+        return np.where(remaining > 0, pos - start, horizon)
+
+    def eval_bars(self, window: int, horizon: int) -> np.ndarray:
+        """Bars with a full detector window behind them and a full horizon ahead."""
+        return np.arange(window - 1, self.n - horizon)
+
+
+# ── detector selection (mirrors the scan order in analysis.py) ─────────────
+def _select_order_block(ds, t, window, lookback, macro_threshold):
+    """detect_order_block scans local bars limit-1 .. 1, macro if index > macro_threshold."""
+    s = t - window + 1
+    last = ds.last["order_block"]
+    limit = min(lookback, window - 1)
+    none = np.full(len(t), -1)
+    if limit < 2:
+        return {"ob_macro": none, "ob_minor": none}
+    g = last[s + limit - 1]
+    macro = np.where(g > s + macro_threshold, g, -1)
+    top = min(macro_threshold, limit - 1)
+    if top >= 1:
+        g = last[s + top]
+        minor = np.where(g >= s + 1, g, -1)
+    else:
+        minor = none
+    return {"ob_macro": macro, "ob_minor": minor}
+
+
+def _select_fvg(ds, t, window, lookback):
+    """detect_fvg returns the latest gap among local bars 2 .. min(lookback, window)-1."""
+    s = t - window + 1
+    limit = min(lookback, window)
+    if limit <= 2:
+        return {"fvg": np.full(len(t), -1)}
+    g = ds.last["fvg"][s + limit - 1]
+    return {"fvg": np.where(g >= s + 2, g, -1)}
+
+
+def _select_choch(ds, t, window, macro_threshold):
+    """detect_choch scans the whole window, macro if index > macro_threshold."""
+    s = t - window + 1
+    last = ds.last["choch"]
+    g = last[t]
+    macro = np.where(g > s + macro_threshold, g, -1)
+    g = last[s + min(macro_threshold, window - 1)]
+    minor = np.where(g >= s + 1, g, -1)
+    return {"choch_macro": macro, "choch_minor": minor}
+
+
+SELECTORS = {
+    "order_block": _select_order_block,
+    "fvg": _select_fvg,
+    "choch": _select_choch,
+}
+
+
+def outcomes(ds: Dataset, detector: str, g: np.ndarray, t: np.ndarray, horizon: int, rr: float) -> dict:
+    """Hit / stop / expired counts for the zones in `g` (pattern bar per eval bar, -1 = none)."""
+    valid = g >= 0
+    g, t = g[valid], t[valid]
+    # g never decreases along t, so each zone's first report is where g changes
+    first = np.flatnonzero(np.diff(g, prepend=-1))
+    g, t = g[first], t[first]
+    lo, hi, d = (a[g] for a in ds.zones[detector])
+    height = hi - lo
+    keep = (height > 0) & (d != 0)
+    t, lo, hi, d, height = t[keep], lo[keep], hi[keep], d[keep], height[keep]
+
+    bull = d > 0
+    start = t + 1
+    first_target = ds.first_reach(
+        np.where(bull, 0, 1), start, np.where(bull, hi + rr * height, rr * height - lo), horizon, strict=False,
+    )
+    first_stop = ds.first_reach(np.where(bull, 1, 0), start, np.where(bull, -lo, hi), horizon, strict=True)
+    hits = int(np.count_nonzero(first_target < first_stop))
+    stops = int(np.count_nonzero((first_stop <= first_target) & (first_stop < horizon)))
+    signals = len(t)
+    return {
+        "signals": signals,
+        "hits": hits,
+        "stops": stops,
+        "expired": signals - hits - stops,
+        "hit_rate": round(hits / signals, 4) if signals else None,
+        "expectancy_r": round((hits * rr - stops) / signals, 4) if signals else None,
+    }
+
+
+# ── worker side ────────────────────────────────────────────────────────────
+_DATASETS = {}
+
+
+def _dataset(key, directory) -> Dataset:
+    if key not in _DATASETS:
+        _DATASETS[key] = Dataset(bar_archive.load(*key, directory))
+    return _DATASETS[key]
+
+
+def run_chunk(key, directory, detector, param_sets, horizons, rrs) -> list:
+    """Evaluate a list of parameter sets of one detector on one dataset."""
+    ds = _dataset(key, directory)
+    rows = []
+    for params in param_sets:
+        for horizon in horizons:
+            t = ds.eval_bars(params["window"], horizon)
+            if len(t) == 0:
+                continue
+            picked = SELECTORS[detector](ds, t, **params)
+            for rr in rrs:
+                for kind, g in picked.items():
+                    rows.append({
+                        "symbol": key[0], "tf": key[1], "detector": detector, "kind": kind,
+                        "params": {**params, "horizon": horizon, "rr": rr},
+                        **outcomes(ds, detector, g, t, horizon, rr),
+                    })
+    return rows
+
+
+# ── parameter spaces ───────────────────────────────────────────────────────
+def parse_values(text: str) -> list:
+    """'10,20,50' or 'start:stop:step' (stop inclusive)."""
+    if ":" in text:
+        start, stop, step = (int(x) for x in text.split(":"))
+        return list(range(start, stop + 1, step))
+    return [int(x) for x in text.split(",")]
+
+
+def grid_params(space: dict) -> list:
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(space[k] for k in names))]
+
+
+def random_params(space: dict, n: int, rng: random.Random) -> list:
+    """n distinct parameter sets drawn uniformly from each parameter's [min, max]."""
+    bounds = {k: (min(v), max(v)) for k, v in space.items()}
+    capacity = 1
+    for lo, hi in bounds.values():
+        capacity *= hi - lo + 1
+    seen = set()
+    while len(seen) < min(n, capacity):
+        seen.add(tuple(rng.randint(lo, hi) for lo, hi in bounds.values()))
+    return [dict(zip(bounds, combo)) for combo in sorted(seen)]
+
+
+def verify(bars: np.ndarray, detector: str, params: dict, samples: int = 200, seed: int = 0) -> int:
+    """Run the real analysis.py detector on sampled windows; returns the number of mismatches."""
+    ds = Dataset(bars)
+    t = ds.eval_bars(params["window"], 1)
+    t = np.sort(np.random.default_rng(seed).choice(t, size=min(samples, len(t)), replace=False))
+    picked = SELECTORS[detector](ds, t, **params)
+    times = bars["time"]
+    mismatches = 0
+    for j, end in enumerate(t):
+        window = resample.to_candles(bars[end - params["window"] + 1:end + 1])
+        expected = {kind: g[j] for kind, g in picked.items()}
+        if detector == "order_block":
+            res = analysis.detect_order_block(window, params["lookback"], params["macro_threshold"]) or {}
+            got = {"ob_macro": res.get("macro"), "ob_minor": res.get("minor")}
+            shift = 1   # OB time is the candle before the pattern bar
+        elif detector == "fvg":
+            res = analysis.detect_fvg(window, params["lookback"])
+            got = {"fvg": res and {"time": res["base_time"]}}
+            shift = 1
+        else:
+            res = analysis.detect_choch(window, params["macro_threshold"]) or {}
+            got = {"choch_macro": res.get("macro"), "choch_minor": res.get("minor")}
+            shift = 0
+        for kind, g in expected.items():
+            want = None if g < 0 else resample.to_candles(bars[g - shift:g - shift + 1])[0]["time"]
+            have = got[kind]["time"] if got[kind] else None
+            if want != have:
+                mismatches += 1
+    return mismatches
+
+
+# ── reporting ──────────────────────────────────────────────────────────────
+def _fmt(row) -> str:
+    if row is None or not row["signals"]:
+        return "no signals"
+    return f"{row['hit_rate'] * 100:5.1f}% (n={row['signals']}, E={row['expectancy_r']:+.2f}R)"
+
+
+def best_by_kind(rows: list, min_signals: int) -> list:
+    """Best parameter set per symbol / tf / signal kind, next to the current settings."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["symbol"], row["tf"], row["kind"]), []).append(row)
+    report = []
+    for (symbol, tf, kind), group in sorted(groups.items()):
+        eligible = [r for r in group if r["signals"] >= min_signals]
+        best = max(eligible, key=lambda r: (r["hit_rate"], r["signals"]), default=None)
+        detector = group[0]["detector"]
+        current = [
+            r for r in group
+            if all(r["params"][k] == v for k, v in CURRENT[detector].items())
+        ]
+        report.append({
+            "symbol": symbol, "tf": tf, "kind": kind,
+            "best": best,
+            "current": max(current, key=lambda r: r["signals"], default=None),
+            "evaluated": len(group),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep detector parameters over archived bars.")
+    parser.add_argument("--symbols", nargs="*", help="default: every archived symbol")
+    parser.add_argument("--tf", nargs="*", help="default: every archived timeframe")
+    parser.add_argument("--dir", default=None, help="archive directory (default BAR_ARCHIVE_DIR)")
+    parser.add_argument("--detectors", nargs="*", default=list(GRID), choices=list(GRID))
+    parser.add_argument("--set", action="append", default=[], metavar="DETECTOR.PARAM=VALUES",
+                        help="override a grid axis, e.g. fvg.lookback=5:200:5")
+    parser.add_argument("--random", type=int, default=0, help="sample N parameter sets per detector instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--horizon", type=int, nargs="+", default=[48], help="bars to resolve a signal")
+    parser.add_argument("--rr", type=float, nargs="+", default=[2.0], help="target in zone heights")
+    parser.add_argument("--min-signals", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="0 = run in-process")
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="check the vectorized selection against analysis.py on N windows first")
+    parser.add_argument("--json", help="write the report (and all rows) to this file")
+    args = parser.parse_args()
+
+    space = {d: {k: list(v) for k, v in GRID[d].items()} for d in args.detectors}
+    for item in args.set:
+        name, values = item.split("=", 1)
+        detector, param = name.split(".", 1)
+        if detector not in space or param not in space[detector]:
+            parser.error(f"unknown parameter '{name}'")
+        space[detector][param] = parse_values(values)
+
+    rng = random.Random(args.seed)
+    param_sets = {}
+    for detector, axes in space.items():
+        sets = random_params(axes, args.random, rng) if args.random else grid_params(axes)
+        if CURRENT[detector] not in sets:
+            sets.append(dict(CURRENT[detector]))
+        param_sets[detector] = sets
+
+    keys = [
+        (s, tf) for s, tf in bar_archive.list_archives(args.dir)
+        if (not args.symbols or s in {x.upper() for x in args.symbols})
+        and (not args.tf or tf in {x.upper() for x in args.tf})
+    ]
+    if not keys:
+        parser.error("no archived bars match; create some with bar_archive.py")
+
+    started = time.perf_counter()
+    for key in keys:
+        _dataset(key, args.dir)   # loaded before forking so workers share the masks
+    print(f"[INFO] {len(keys)} dataset(s), {sum(_DATASETS[k].n for k in keys):,} bars, "
+          f"masks in {time.perf_counter() - started:.2f}s")
+
+    if args.verify:
+        for detector in args.detectors:
+            for params in (CURRENT[detector], rng.choice(param_sets[detector])):
+                bad = verify(_DATASETS[keys[0]].bars, detector, params, args.verify, args.seed)
+                print(f"[{'INFO' if not bad else 'ERROR'}] verify {detector} {params}: {bad} mismatch(es)")
+
+    # ~4 chunks per worker per dataset keeps cores busy without per-task overhead
+    workers = max(args.workers, 0)
+    tasks = []
+    for key in keys:
+        for detector, sets in param_sets.items():
+            size = max(1, len(sets) // max(workers * 4, 1))
+            for i in range(0, len(sets), size):
+                tasks.append((key, args.dir, detector, sets[i:i + size], args.horizon, args.rr))
+    total = sum(len(s) for s in param_sets.values()) * len(keys) * len(args.horizon) * len(args.rr)
+    print(f"[INFO] {total:,} evaluations in {len(tasks)} task(s) on {workers or 1} process(es)")
+
+    started = time.perf_counter()
+    rows = []
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(run_chunk, *zip(*tasks)):
+                rows.extend(result)
+    else:
+        for task in tasks:
+            rows.extend(run_chunk(*task))
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] swept in {elapsed:.1f}s ({total / elapsed:,.0f} evaluations/s)\n")
+
+    report = best_by_kind(rows, args.min_signals)
+    for r in report:
+        best = r["best"]
+        settings = " ".join(f"{k}={v}" for k, v in best["params"].items()) if best else "-"
+        print(f"{r['symbol']:<8} {r['tf']:<4} {r['kind']:<12} best {_fmt(best)}  {settings}")
+        print(f"{'':<26}current {_fmt(r['current'])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"report": report, "rows": rows}, f, indent=1)
+        print(f"\n[INFO] wrote {args.json}")
@@ -0,0 +1,155 @@
+# profiler.py
+# ---------------------------------------------------------------------------
+# Low-overhead sampling profiler for the live worker.
+#
+# A daemon thread wakes every `interval` seconds, grabs every thread's current
+# stack with sys._current_frames() and counts identical stacks. Nothing is
+# hooked into the interpreter, so the cost is one stack walk per thread per
+# tick and zero when no capture is running.
+
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+
+class Profile:
+    """Aggregated samples: {(thread name, frame, frame, ...): count}, root frame first."""
+
+    def __init__(self, stacks: Counter, interval: float, started: float, duration: float):
+        self.stacks = stacks
+        self.interval = interval
+        self.started = started
+        self.duration = duration
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format (feed to flamegraph.pl / speedscope)."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def speedscope(self, name: str = "profile") -> dict:
+        """Speedscope 'sampled' file format, one profile per thread."""
+        frames, frame_index = [], {}
+        by_thread = {}
+        for stack, count in self.stacks.items():
+            thread, calls = stack[0], stack[1:]
+            idx = []
+            for frame in calls:
+                if frame not in frame_index:
+                    func, _, location = frame.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": func, "file": file, "line": int(line or 0)})
+                idx.append(frame_index[frame])
+            samples, weights = by_thread.setdefault(thread, ([], []))
+            samples.append(idx)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "chatgpt-trading-strategy-assistant profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread, (samples, weights) in by_thread.items()
+            ],
+        }
+
+    def render(self, fmt: str = "collapsed", name: str = "profile"):
+        """Return (body, media type) for the requested format."""
+        if fmt == "speedscope":
+            return json.dumps(self.speedscope(name)), "application/json"
+        return self.collapsed(), "text/plain"
+
+
+class SamplingProfiler:
+    """
+    Sample Python stacks of the running process.
+
+    Args:
+        interval: Seconds between samples (default 5 ms)
+        thread_ids: Only sample these threads (default: every thread but the sampler)
+        thread_names: Also sample threads whose name starts with one of these prefixes
+        max_depth: Frames kept per stack, innermost frames are dropped first
+    """
+
+    def __init__(self, interval: float = 0.005, thread_ids=None, thread_names=(), max_depth: int = 128):
+        self.interval = interval
+        self.thread_ids = set(thread_ids or ()) if thread_ids or thread_names else None
+        self.thread_names = tuple(thread_names)
+        self.max_depth = max_depth
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = 0.0
+
+    def _wanted(self, tid: int, name: str) -> bool:
+        if self.thread_ids is None:
+            return True
+        return tid in self.thread_ids or bool(self.thread_names) and name.startswith(self.thread_names)
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == me or not self._wanted(tid, names.get(tid, "")):
+                continue
+            calls = []
+            while frame is not None:
+                code = frame.f_code
+                calls.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            calls.reverse()
+            self._stacks[(names.get(tid, str(tid)), *calls[: self.max_depth])] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return Profile(self._stacks, self.interval, self._started, time.time() - self._started)
+
+
+# ── per-request captures (bounded) ─────────────────────────────────────────
+class ProfileStore:
+    """Keeps the most recent `capacity` profiles by id."""
+
+    def __init__(self, capacity: int = 20):
+        self.capacity = capacity
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile) -> str:
+        pid = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[pid] = profile
+            while len(self._profiles) > self.capacity:
+                self._profiles.popitem(last=False)
+        return pid
+
+    def get(self, pid: str):
+        with self._lock:
+            return self._profiles.get(pid)
@@ -0,0 +1,331 @@
+# replay.py
+# ---------------------------------------------------------------------------
+# Walk-forward replay of the /analyze pipeline over archived history.
+#
+#   python replay.py --symbols EURUSD --start 2025-03-03 --end 2025-03-08 --every H1
+#   python replay.py --at 2025-03-04T07:00 2025-03-04T12:00 --out replay.jsonl
+#   python replay.py --every M15 --workers 8 --csv replay.csv      # every archived symbol
+#
+# The row for (symbol, T) is what /analyze would have returned just after the
+# base bar (ANALYZE_BASE_TF, default M5) ending at T closed: every timeframe
+# is rebuilt from the archived base bars, the newest one being the forming
+# bar as it stood at T, and the same analysis.analyze_candles the endpoint
+# uses runs on it. PDH/PDL are the previous D1 bar, which is what the level
+# engine reports once it is warm. The live endpoint hands the detectors
+# OHLC_MAX_BARS bars per timeframe on both fetch paths, so the replay is
+# capped the same way.
+#
+# Timeframes are resampled once per chunk of timestamps. A step then finds
+# its window in each timeframe by binary search, reuses the candle dicts of
+# the complete bars (converted once, shared between steps) and only rebuilds
+# the forming bar from the base bars of its bucket, so it costs little more
+# than the detectors themselves. Chunks of consecutive timestamps go to a
+# process pool; each loads just the archive range it needs (.cbar skips the
+# other blocks). Timestamps with no new base bar since the previous one
+# (weekends, holidays) would repeat the previous row and are skipped.
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+import bar_archive
+import resample
+from analysis import ANALYZE_DEPTHS, analyze_candles
+
+ANALYZE_BASE_TF = os.getenv("ANALYZE_BASE_TF", "")
+BROKER_DAY_OFFSET_HOURS = float(os.getenv("BROKER_DAY_OFFSET_HOURS", "0"))
+OHLC_MAX_BARS = 50          # get_ohlc_data's cap, what /analyze's detectors see
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def parse_time(text: str) -> int:
+    """'2025-03-04', '2025-03-04T07:00' or epoch seconds → epoch seconds (naive = UTC)."""
+    if text.isdigit():
+        return int(text)
+    dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def every(start: int, end: int, tf: str, day_offset_hours: float = 0) -> list:
+    """`tf` boundaries in [start, end]."""
+    step = resample.parse_timeframe(tf)
+    first = int(resample.bucket_starts(np.array([start]), tf, day_offset_hours)[0])
+    first += step if first < start else 0
+    return list(range(first, end + 1, step))
+
+
+def lookback_seconds(depths: dict) -> int:
+    """Calendar span that holds `depths` bars of every timeframe, with room for weekends."""
+    deepest = max(resample.parse_timeframe(tf) * n for tf, n in depths.items())
+    return deepest * 7 // 5 + 7 * 86400
+
+
+class ReplaySeries:
+    """
+    Every /analyze timeframe over one archived base series, queryable as of any time.
+
+    Args:
+        bars: Base bars (BAR_DTYPE), time-sorted
+        base_tf: Timeframe of `bars`
+        depths: {tf: bars} as in analysis.ANALYZE_DEPTHS
+        day_offset_hours: Broker day boundary, as BROKER_DAY_OFFSET_HOURS
+    """
+
+    def __init__(self, bars: np.ndarray, base_tf: str = "M5", depths: dict = None,
+                 day_offset_hours: float = 0):
+        self.base = bars
+        self.base_tf = base_tf.upper()
+        self.base_seconds = resample.parse_timeframe(base_tf)
+        self.depths = dict(depths or ANALYZE_DEPTHS)
+        self.day_offset_hours = day_offset_hours
+        self.frames = {}        # {tf: (bars, index of each bar's first base bar)}
+        self._candles = {}      # {tf: [candle dict or None]}, converted on first use
+        self._filled = {}       # {tf: (lo, hi)} range of _candles already converted
+        for tf in self.depths:
+            if resample.parse_timeframe(tf) % self.base_seconds:
+                raise ValueError(f"{tf} is not a multiple of the base timeframe {self.base_tf}")
+            buckets = resample.bucket_starts(bars["time"], tf, day_offset_hours)
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1)) if len(bars) else np.empty(0, np.int64)
+            self.frames[tf] = (resample.resample(bars, tf, day_offset_hours), starts)
+            self._candles[tf] = [None] * len(starts)
+            self._filled[tf] = (0, 0)
+
+    def cut(self, t: int) -> int:
+        """Number of base bars closed at time t."""
+        return int(np.searchsorted(self.base["time"], t - self.base_seconds, side="right"))
+
+    def _complete(self, tf: str, lo: int, hi: int) -> list:
+        cache, bars = self._candles[tf], self.frames[tf][0]
+        a, b = self._filled[tf]
+        if a == b:
+            a = b = lo
+        if lo < a:
+            cache[lo:a] = resample.to_candles(bars[lo:a])
+            a = lo
+        if hi > b:
+            cache[b:hi] = resample.to_candles(bars[b:hi])
+            b = hi
+        self._filled[tf] = (a, b)
+        return cache[lo:hi]
+
+    def candles(self, k: int) -> dict:
+        """{tf: candle dicts} as /analyze would have fetched them with the first k base bars closed."""
+        out = {}
+        for tf, n in self.depths.items():
+            bars, starts = self.frames[tf]
+            j = int(np.searchsorted(starts, k - 1, side="right")) - 1     # bucket of the last closed base bar
+            end = int(starts[j + 1]) if j + 1 < len(starts) else len(self.base)
+            if end == k:
+                out[tf] = self._complete(tf, max(0, j - n + 1), j + 1)
+            else:
+                forming = resample.resample(self.base[starts[j]:k], tf, self.day_offset_hours)
+                out[tf] = self._complete(tf, max(0, j - n + 1), j) + resample.to_candles(forming)
+        return out
+
+    def analyze(self, t: int, k: int = None):
+        """(AnalyzeResponse fields, {tf: open time of the last bar used}) as of time t, or None before warm-up."""
+        k = self.cut(t) if k is None else k
+        if k == 0:
+            return None
+        candles = self.candles(k)
+        if len(candles["D1"]) < 2:
+            return None
+        previous_day = candles["D1"][-2]
+        response = analyze_candles(candles, previous_day["high"], previous_day["low"])
+        return response, {tf: c[-1]["time"] for tf, c in candles.items()}
+
+
+# ── worker side ────────────────────────────────────────────────────────────
+def replay_chunk(symbol: str, timestamps: list, previous: int = None, directory: str = None,
+                 base_tf: str = "M5", max_bars: int = None, day_offset_hours: float = 0) -> dict:
+    """
+    Replay one symbol at consecutive timestamps.
+
+    Args:
+        previous: Timestamp replayed just before this chunk (for skipping repeats)
+        max_bars: Cap on every depth (OHLC_MAX_BARS mirrors the live endpoint)
+
+    Returns:
+        {"rows": [...], "skipped": repeats and warm-up timestamps}
+    """
+    depths = {tf: min(n, max_bars) if max_bars else n for tf, n in ANALYZE_DEPTHS.items()}
+    start = timestamps[0] - lookback_seconds(depths)
+    start -= start % 86400
+    bars = bar_archive.load(symbol, base_tf, directory, start=start, end=timestamps[-1])
+    series = ReplaySeries(bars, base_tf, depths, day_offset_hours)
+
+    rows, skipped = [], 0
+    last = series.cut(previous) if previous is not None else None
+    for t in timestamps:
+        k = series.cut(t)
+        if k == last:
+            skipped += 1
+            continue
+        last = k
+        row = {"symbol": symbol.upper(), "as_of": _iso(t)}
+        try:
+            result = series.analyze(t, k)
+        except Exception as e:
+            rows.append({**row, "error": str(e)})
+            continue
+        if result is None:
+            skipped += 1
+            continue
+        response, fingerprint = result
+        response["Freshness"] = {"source": "replay", "as_of": row["as_of"], "bars": fingerprint}
+        rows.append({**row, "response": response})
+    return {"rows": rows, "skipped": skipped}
+
+
+def plan(symbols: list, timestamps: list, workers: int, **options) -> list:
+    """replay_chunk argument tuples: ~4 chunks per worker per symbol, each a run of consecutive timestamps."""
+    timestamps = sorted(set(timestamps))
+    size = max(1, -(-len(timestamps) // max(workers * 4, 1)))
+    tasks = []
+    for symbol in symbols:
+        for i in range(0, len(timestamps), size):
+            previous = timestamps[i - 1] if i else None
+            tasks.append(dict(options, symbol=symbol, timestamps=timestamps[i:i + size], previous=previous))
+    return tasks
+
+
+def _run(task: dict) -> dict:
+    return replay_chunk(**task)
+
+
+def replay(symbols: list, timestamps: list, directory: str = None, base_tf: str = None,
+           max_bars: int = None, day_offset_hours: float = None, workers: int = 0) -> dict:
+    """
+    Replay /analyze for every symbol at every timestamp.
+
+    Defaults follow the app's environment: ANALYZE_BASE_TF (else M5), depths
+    capped at OHLC_MAX_BARS like /analyze, and BROKER_DAY_OFFSET_HOURS.
+
+    Returns:
+        {"rows": [...] sorted by symbol then time, "skipped": int}
+    """
+    if max_bars is None:
+        max_bars = OHLC_MAX_BARS
+    tasks = plan(
+        symbols, timestamps, workers,
+        directory=directory, base_tf=(base_tf or ANALYZE_BASE_TF or "M5").upper(), max_bars=max_bars,
+        day_offset_hours=BROKER_DAY_OFFSET_HOURS if day_offset_hours is None else day_offset_hours,
+    )
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run, tasks))
+    else:
+        results = [_run(task) for task in tasks]
+    rows = [row for result in results for row in result["rows"]]
+    return {"rows": rows, "skipped": sum(result["skipped"] for result in results)}
+
+
+# ── output ─────────────────────────────────────────────────────────────────
+def flatten(value, prefix: str = "", out: dict = None) -> dict:
+    """Nested response → {"MTF_Zones.H4_FVG.low": ...}; lists are joined with '|'."""
+    out = {} if out is None else out
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(item, f"{prefix}.{key}" if prefix else key, out)
+    elif isinstance(value, list):
+        out[prefix] = "|".join(sorted(str(v) for v in value))
+    else:
+        out[prefix] = value
+    return out
+
+
+def write_csv(path: str, rows: list):
+    flat = [flatten({k: v for k, v in row.items() if k != "response"}) | flatten(row.get("response", {})) for row in rows]
+    columns = list(dict.fromkeys(key for r in flat for key in r))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(flat)
+
+
+def summary(rows: list) -> dict:
+    """{symbol: {"rows", "errors", "bias": {...}, "entries": {...}}}"""
+    out = {}
+    for row in rows:
+        s = out.setdefault(row["symbol"], {"rows": 0, "errors": 0, "bias": {}, "entries": {}})
+        s["rows"] += 1
+        if "error" in row:
+            s["errors"] += 1
+            continue
+        bias = row["response"]["HTF_Bias"]
+        entry = (row["response"]["LTF_Entry"] or {}).get("entry_type")
+        s["bias"][bias] = s["bias"].get(bias, 0) + 1
+        s["entries"][entry] = s["entries"].get(entry, 0) + 1
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay /analyze over archived history.")
+    parser.add_argument("--symbols", nargs="*", help="default: every symbol with a base archive")
+    parser.add_argument("--start", help="ISO date/time or epoch (default: 7 days before --end)")
+    parser.add_argument("--end", help="default: the archive's last bar")
+    parser.add_argument("--every", default="H1", help="replay at each boundary of this timeframe")
+    parser.add_argument("--at", nargs="*", default=[], help="explicit timestamps instead of --start/--end/--every")
+    parser.add_argument("--base", default=None, help="base timeframe (default ANALYZE_BASE_TF or M5)")
+    parser.add_argument("--max-bars", type=int, default=None,
+                        help=f"cap per timeframe, 0 = full depths (default {OHLC_MAX_BARS}, as /analyze)")
+    parser.add_argument("--dir", default=None, help="archive directory (default BAR_ARCHIVE_DIR)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="0 = run in-process")
+    parser.add_argument("--out", help="write rows as JSON lines")
+    parser.add_argument("--csv", help="write rows flattened to CSV")
+    args = parser.parse_args()
+
+    base_tf = (args.base or ANALYZE_BASE_TF or "M5").upper()
+    symbols = [s.upper() for s in args.symbols] if args.symbols else [
+        s for s, tf in bar_archive.list_archives(args.dir) if tf == base_tf
+    ]
+    if not symbols:
+        parser.error(f"no {base_tf} archives; create some with bar_archive.py --tf {base_tf}")
+
+    if args.at:
+        timestamps = [parse_time(t) for t in args.at]
+    else:
+        if args.end:
+            end = parse_time(args.end)
+        else:
+            end = max(int(bar_archive.load(s, base_tf, args.dir)["time"][-1]) for s in symbols)
+            end += resample.parse_timeframe(base_tf)
+        start = parse_time(args.start) if args.start else end - 7 * 86400
+        timestamps = every(start, end, args.every, BROKER_DAY_OFFSET_HOURS)
+    if not timestamps:
+        parser.error("no timestamps to replay")
+
+    workers = max(args.workers, 0)
+    print(f"[INFO] {len(symbols)} symbol(s) × {len(timestamps):,} timestamp(s) "
+          f"from {_iso(min(timestamps))} to {_iso(max(timestamps))} on {workers or 1} process(es)")
+    started = time.perf_counter()
+    result = replay(symbols, timestamps, args.dir, base_tf, args.max_bars, workers=workers)
+    elapsed = time.perf_counter() - started
+    rows = result["rows"]
+    print(f"[INFO] {len(rows):,} replays in {elapsed:.1f}s ({len(rows) / elapsed:,.0f}/s), "
+          f"{result['skipped']:,} timestamp(s) skipped (no new bar or not enough history)\n")
+
+    for symbol, s in summary(rows).items():
+        bias = " ".join(f"{k}={v}" for k, v in sorted(s["bias"].items()))
+        entries = " ".join(f"{k}={v}" for k, v in sorted(s["entries"].items(), key=str))
+        print(f"{symbol:<8} {s['rows']:>7} rows  {s['errors']} error(s)  bias {bias}  entries {entries}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        print(f"\n[INFO] wrote {args.out}")
+    if args.csv:
+        write_csv(args.csv, rows)
+        print(f"[INFO] wrote {args.csv}")
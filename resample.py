@@ -0,0 +1,208 @@
+# resample.py
+# ---------------------------------------------------------------------------
+# Derive any timeframe from one M1/M5 base series with vectorized OHLCV
+# aggregation over aligned epoch buckets.
+#
+#   base = get_rates("EURUSD", "M5", 60_000)
+#   h4 = resample(base, "H4", day_offset_hours=2)
+#
+#   python resample.py EURUSD XAUUSD --base M5 --tf H1 H4 D1   # compare with the broker's bars
+#
+# Buckets are aligned to the broker's trading day (day_offset_hours shifts
+# midnight, e.g. +2 for a 22:00 UTC rollover), weeks start on Monday, and
+# empty buckets (weekends, holidays) simply produce no bar - the same thing
+# the broker does. `agreement` (and the command line above) checks derived
+# bars against the broker's own; a mismatch usually means a wrong
+# BROKER_DAY_OFFSET_HOURS.
+
+import argparse
+import os
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+
+import levels
+import trend
+
+_TF_RE = re.compile(r"^(M|H|D|W)(\d+)$")
+_UNIT_SECONDS = {"M": 60, "H": 3600, "D": 86400, "W": 7 * 86400}
+
+# 1970-01-01 was a Thursday; weekly buckets are anchored on the following Monday
+_FIRST_MONDAY = 4 * 86400
+
+BAR_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("close", "<f8"), ("tick_volume", "<u8"),
+])
+
+
+def as_bars(rates: np.ndarray) -> np.ndarray:
+    """Copy MT5 rates (or any array with the BAR_DTYPE fields) into BAR_DTYPE."""
+    if rates.dtype == BAR_DTYPE:
+        return rates.copy()
+    bars = np.empty(len(rates), dtype=BAR_DTYPE)
+    for field in BAR_DTYPE.names:
+        bars[field] = rates[field]
+    return bars
+
+
+def parse_timeframe(tf: str) -> int:
+    """'M3' → 180, 'H2' → 7200, 'D1' → 86400, 'W1' → 604800."""
+    m = _TF_RE.match(tf.upper())
+    if not m or int(m.group(2)) == 0:
+        raise ValueError(f"Unsupported timeframe '{tf}'")
+    return _UNIT_SECONDS[m.group(1)] * int(m.group(2))
+
+
+def base_for(tf: str, available=("M1", "M5")) -> str:
+    """Coarsest available base timeframe that divides `tf` evenly."""
+    seconds = parse_timeframe(tf)
+    for base in sorted(available, key=parse_timeframe, reverse=True):
+        if seconds % parse_timeframe(base) == 0:
+            return base
+    raise ValueError(f"No base timeframe in {available} divides {tf}")
+
+
+def bucket_starts(times: np.ndarray, tf: str, day_offset_hours: float = 0) -> np.ndarray:
+    """Epoch start of the bucket each timestamp falls in."""
+    seconds = parse_timeframe(tf)
+    offset = int(day_offset_hours * 3600)
+    anchor = offset - (_FIRST_MONDAY if tf.upper().startswith("W") else 0)
+    shifted = times.astype(np.int64) + anchor
+    return shifted - shifted % seconds - anchor
+
+
+def resample(rates: np.ndarray, tf: str, day_offset_hours: float = 0) -> np.ndarray:
+    """
+    Aggregate time-sorted base bars into `tf` bars.
+
+    Args:
+        rates: Structured array with time (epoch s), open, high, low, close and
+            tick_volume fields (MT5 copy_rates layout or BAR_DTYPE)
+        tf: Target timeframe, any multiple of the base (M3, H2, H8, D1, W1...)
+        day_offset_hours: Broker day boundary relative to UTC midnight
+
+    Returns:
+        BAR_DTYPE array, one row per non-empty bucket; the last row is the
+        forming bar if the base series ends mid-bucket.
+    """
+    if len(rates) == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+    buckets = bucket_starts(rates["time"], tf, day_offset_hours)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(rates)]))
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out["time"] = buckets[starts]
+    out["open"] = rates["open"][starts]
+    out["close"] = rates["close"][ends - 1]
+    out["high"] = np.maximum.reduceat(rates["high"], starts)
+    out["low"] = np.minimum.reduceat(rates["low"], starts)
+    out["tick_volume"] = np.add.reduceat(rates["tick_volume"].astype(np.uint64), starts)
+    return out
+
+
+def resample_many(rates: np.ndarray, timeframes, day_offset_hours: float = 0) -> dict:
+    return {tf: resample(rates, tf, day_offset_hours) for tf in timeframes}
+
+
+def to_candles(bars: np.ndarray) -> list:
+    """Convert bars to the candle dicts used by analysis.py and the endpoints."""
+    return [
+        {
+            "time": datetime.fromtimestamp(int(t), timezone.utc).isoformat(),
+            "open": float(o),
+            "high": float(h),
+            "low": float(lo),
+            "close": float(c),
+            "volume": int(v),
+        }
+        for t, o, h, lo, c, v in zip(
+            bars["time"].tolist(), bars["open"].tolist(), bars["high"].tolist(),
+            bars["low"].tolist(), bars["close"].tolist(), bars["tick_volume"].tolist(),
+        )
+    ]
+
+
+def ohlc_result(candles: list, tf: str) -> dict:
+    """Same shape as get_ohlc_data's return value for an already fetched candle list."""
+    closes = [c["close"] for c in candles]
+    return {
+        "candles": candles,
+        "context": levels.context_levels(candles),
+        "trend": trend.trend_strength(closes) if tf.upper() in ("D1", "H4") and len(closes) >= 5 else {},
+    }
+
+
+def agreement(derived: np.ndarray, broker: np.ndarray, tolerance: float = 1e-9) -> dict:
+    """
+    Compare derived bars with the broker's own bars on the timestamps both have.
+
+    Returns counts of shared / mismatched bars and of timestamps only one side has.
+    Mismatches usually mean a wrong day_offset_hours or a gap in the base series.
+    """
+    common, di, bi = np.intersect1d(derived["time"], broker["time"], return_indices=True)
+    mismatched = np.zeros(len(common), dtype=bool)
+    for field in ("open", "high", "low", "close"):
+        mismatched |= np.abs(derived[field][di] - broker[field][bi]) > tolerance
+    return {
+        "shared": int(len(common)),
+        "mismatched": int(mismatched.sum()),
+        "mismatched_times": common[mismatched][:20].tolist(),
+        "only_derived": int(len(derived) - len(common)),
+        "only_broker": int(len(broker) - len(common)),
+    }
+
+
+def check(base: np.ndarray, broker: np.ndarray, tf: str, day_offset_hours: float = 0,
+          tolerance: float = 1e-9) -> dict:
+    """
+    `agreement` of `base` resampled to `tf` with the broker's `tf` bars, on the
+    span both cover. The first derived bar (the base series may start mid-bucket)
+    and the forming bar on either side are left out, so `agrees` needs every
+    remaining bar on both sides to match.
+    """
+    derived = resample(base, tf, day_offset_hours)[1:-1]
+    broker = broker[:-1]
+    if len(derived):
+        broker = broker[(broker["time"] >= derived["time"][0]) & (broker["time"] <= derived["time"][-1])]
+    result = agreement(derived, broker, tolerance)
+    result["agrees"] = bool(result["shared"]) and not (
+        result["mismatched"] or result["only_derived"] or result["only_broker"])
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check bars derived from a base series against the broker's own bars.")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--base", default="M5")
+    parser.add_argument("--tf", nargs="+", default=["M15", "H1", "H4", "D1"])
+    parser.add_argument("--bars", type=int, default=20_000, help="base bars to fetch")
+    parser.add_argument("--day-offset", type=float, default=float(os.getenv("BROKER_DAY_OFFSET_HOURS", "0")),
+                        help="default BROKER_DAY_OFFSET_HOURS")
+    parser.add_argument("--stub", action="store_true", help="stub_broker terminal (its timeframes are independent)")
+    args = parser.parse_args()
+
+    if args.stub:
+        import stub_broker
+        stub_broker.install()
+        os.environ.setdefault("MT5_LOGIN", "0")
+    from mt5_client import get_rates, symbol_digits_map, symbol_name_to_id
+
+    failed = False
+    for symbol in args.symbols:
+        name = symbol_name_to_id.get(symbol.upper(), symbol)
+        digits = symbol_digits_map.get(name)
+        tolerance = 0.5 * 10.0 ** -digits if digits is not None else 1e-9
+        base = get_rates(name, args.base, args.bars)
+        span_seconds = len(base) * parse_timeframe(args.base)
+        for tf in args.tf:
+            broker = get_rates(name, tf, span_seconds // parse_timeframe(tf) + 2)
+            result = check(base, broker, tf, args.day_offset, tolerance)
+            failed |= not result["agrees"]
+            print(f"[{'INFO' if result['agrees'] else 'ERROR'}] {symbol} {tf} from {args.base}: "
+                  f"{result['shared']} shared, {result['mismatched']} mismatched, "
+                  f"{result['only_derived']} only derived, {result['only_broker']} only at the broker"
+                  + (f" (first at {result['mismatched_times'][:3]})" if result["mismatched"] else ""))
+    raise SystemExit(1 if failed else 0)
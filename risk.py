@@ -0,0 +1,347 @@
+# risk.py
+# ---------------------------------------------------------------------------
+# Portfolio risk: exposure, margin, position sizing and covariance VaR.
+#
+#   engine = RiskEngine(account_currency="USD")
+#   engine.set_specs(get_symbol_specs())
+#   engine.leverage = get_account_info()["leverage"]
+#   engine.update_market({"EURUSD": rates, "USDJPY": rates, ...})   # recent bars
+#   engine.set_positions(account_state.positions())
+#   engine.check("EURUSD", "BUY", lots=0.5, entry=1.1, stop=1.095, equity=10_000)
+#
+# Everything is held as vectors over one symbol index: price, value of one
+# lot in account currency, and the covariance of per-bar log returns. The
+# portfolio is a signed notional vector e, so VaR = z · sqrt(e'Σe · horizon).
+# set_positions() also caches Σe. A pre-trade check that changes e by Δ at
+# symbol k then costs O(1):  e'Σe + 2Δ(Σe)_k + Δ²Σ_kk.
+#
+# Margin is the broker's leverage formula, lots × contract size × price /
+# leverage in account currency, i.e. |net lots| × lot value / leverage per
+# symbol (netting). A check only re-prices symbol k, so it is O(1) as well.
+
+import math
+import re
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+Z_SCORES = {0.9: 1.2816, 0.95: 1.6449, 0.975: 1.96, 0.99: 2.3263, 0.995: 2.5758}
+
+# contract size for symbols the broker gives no spec for
+_METAL_CONTRACTS = {"XAU": 100, "XAG": 5000, "XPT": 100, "XPD": 100}
+_PAIR_RE = re.compile(r"^([A-Z]{3})([A-Z]{3})$")
+
+
+def _locked(fn):
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return fn(self, *args, **kwargs)
+    return wrapper
+
+
+def spec_from_name(symbol: str) -> dict:
+    """Best-effort spec from the symbol name (6-letter pairs and metals; anything else is 1 unit in USD)."""
+    m = _PAIR_RE.match(symbol.upper())
+    if m:
+        base, quote = m.groups()
+        contract = _METAL_CONTRACTS.get(base, 100_000)
+    else:
+        base, quote, contract = symbol.upper(), "USD", 1
+    return {"contract_size": contract, "base": base, "quote": quote,
+            "volume_min": 0.01, "volume_step": 0.01, "volume_max": 100.0}
+
+
+def _align_closes(rates: dict) -> tuple:
+    """(symbols, closes[m, n]) on the bar times every series has in common."""
+    symbols = [s for s, r in rates.items() if r is not None and len(r) > 2]
+    if not symbols:
+        return [], np.empty((0, 0))
+    common = rates[symbols[0]]["time"]
+    for s in symbols[1:]:
+        common = np.intersect1d(common, rates[s]["time"], assume_unique=True)
+    cols = []
+    for s in symbols:
+        r = rates[s]
+        cols.append(r["close"][np.searchsorted(r["time"], common)])
+    return symbols, np.column_stack(cols).astype(np.float64)
+
+
+def _stop_error(side: str, entry: float, stop: float):
+    """Why the stop is on the wrong side of the entry for `side`, or None."""
+    if side.upper() == "BUY" and stop >= entry:
+        return f"Stop {stop} is not below the entry {entry} of a BUY"
+    if side.upper() == "SELL" and stop <= entry:
+        return f"Stop {stop} is not above the entry {entry} of a SELL"
+    return None
+
+
+def _rejected(reason: str, started: float) -> dict:
+    return {"allowed": False, "violations": [reason],
+            "elapsed_us": round((time.perf_counter() - started) * 1e6, 1)}
+
+
+class RiskEngine:
+    """
+    Args:
+        account_currency: Currency equity and notionals are expressed in
+        confidence: VaR confidence level (one of Z_SCORES)
+        horizon_bars: VaR horizon in bars of the data passed to update_market
+        limits: Pre-trade limits; any may be None
+            max_trade_risk_pct: loss at the stop, % of equity
+            max_var_pct: portfolio VaR after the trade, % of equity
+            max_symbol_notional: |notional| per symbol, multiple of equity
+            max_currency_notional: |net exposure| per currency, multiple of equity
+            max_margin_pct: margin used after the trade, % of equity
+        leverage: Account leverage (e.g. 100 for 1:100); margin is not
+            computed while it is unknown
+    """
+
+    def __init__(self, account_currency: str = "USD", confidence: float = 0.99, horizon_bars: int = 1,
+                 limits: dict = None, leverage: float = None):
+        self.account_currency = account_currency.upper()
+        self.leverage = leverage
+        self.z = Z_SCORES[confidence]
+        self.confidence = confidence
+        self.horizon = horizon_bars
+        self.limits = dict(limits or {})
+        self._lock = threading.RLock()    # market/position updates vs concurrent checks
+        self.specs = {}
+        self.symbols = []
+        self._index = {}
+        self.price = np.empty(0)
+        self.lot_value = np.empty(0)       # notional of one lot in account currency
+        self.cov = np.empty((0, 0))
+        self.market_time = None
+        self._currencies = []
+        self._ccy_index = {}
+        self._base_idx = self._quote_idx = np.empty(0, dtype=np.intp)
+        self.no_rate = []                  # loaded symbols whose quote currency cannot be converted
+        self.set_positions([])
+
+    # ── reference data ──────────────────────────────────────────────────────
+    def set_specs(self, specs: dict):
+        self.specs.update({s.upper(): dict(v) for s, v in specs.items()})
+
+    def spec(self, symbol: str) -> dict:
+        symbol = symbol.upper()
+        if symbol not in self.specs:
+            self.specs[symbol] = spec_from_name(symbol)
+        return self.specs[symbol]
+
+    def conversion_symbols(self, symbols, available) -> list:
+        """Pairs needed to convert the symbols' quote currencies into the account currency."""
+        available = {s.upper() for s in available}
+        need = set()
+        for s in symbols:
+            ccy = self.spec(s)["quote"]
+            if ccy == self.account_currency:
+                continue
+            for pair in (ccy + self.account_currency, self.account_currency + ccy):
+                if pair in available:
+                    need.add(pair)
+                    break
+        return sorted(need - {s.upper() for s in symbols})
+
+    @_locked
+    def update_market(self, rates: dict):
+        """Recompute prices and the return covariance from {symbol: bars with time/close}."""
+        rates = {s.upper(): r for s, r in rates.items()}
+        symbols, closes = _align_closes(rates)
+        if not symbols:
+            return
+        returns = np.diff(np.log(closes), axis=0)
+        self.symbols = symbols
+        self._index = {s: i for i, s in enumerate(symbols)}
+        # latest price from each full series, not just the common bars
+        self.price = np.array([float(rates[s]["close"][-1]) for s in symbols])
+        self.cov = np.atleast_2d(np.cov(returns, rowvar=False)) if len(returns) > 1 else np.zeros((len(symbols),) * 2)
+
+        specs = [self.spec(s) for s in symbols]
+        rates_to_account = [self.to_account(sp["quote"]) for sp in specs]
+        # no conversion pair: no notional, so the symbol stays out of VaR and is reported instead
+        self.no_rate = [s for s, r in zip(symbols, rates_to_account) if r is None]
+        to_account = np.array([0.0 if r is None else r for r in rates_to_account])
+        self.lot_value = np.array([sp["contract_size"] for sp in specs]) * self.price * to_account
+
+        self._currencies = sorted({c for sp in specs for c in (sp["base"], sp["quote"])})
+        self._ccy_index = {c: i for i, c in enumerate(self._currencies)}
+        self._base_idx = np.array([self._ccy_index[sp["base"]] for sp in specs], dtype=np.intp)
+        self._quote_idx = np.array([self._ccy_index[sp["quote"]] for sp in specs], dtype=np.intp)
+        self.market_time = time.time()
+        self.set_positions(self._positions)
+
+    def to_account(self, ccy: str):
+        """Units of account currency per unit of `ccy`, or None when no pair is loaded."""
+        ccy = ccy.upper()
+        if ccy == self.account_currency:
+            return 1.0
+        i = self._index.get(ccy + self.account_currency)
+        if i is not None:
+            return float(self.price[i])
+        i = self._index.get(self.account_currency + ccy)
+        if i is not None:
+            return 1.0 / float(self.price[i])
+        return None
+
+    # ── portfolio ───────────────────────────────────────────────────────────
+    def _lots_vector(self, positions) -> np.ndarray:
+        lots = np.zeros(len(self.symbols))
+        idx, signed = [], []
+        for p in positions:
+            i = self._index.get(str(p["symbol_name"]).upper())
+            if i is None:
+                continue
+            idx.append(i)
+            signed.append(p["volume_lots"] if p["direction"].lower() == "buy" else -p["volume_lots"])
+        np.add.at(lots, np.array(idx, dtype=np.intp), np.array(signed, dtype=np.float64))
+        return lots
+
+    @_locked
+    def set_positions(self, positions: list):
+        """Cache the notional vector e, Σe and e'Σe for the current positions."""
+        self._positions = list(positions)
+        self.lots = self._lots_vector(self._positions)
+        self.notional = self.lots * self.lot_value
+        self._cov_e = self.cov @ self.notional if len(self.notional) else np.empty(0)
+        self._variance = float(self.notional @ self._cov_e) if len(self.notional) else 0.0
+        self._ccy = np.zeros(len(self._currencies))
+        np.add.at(self._ccy, self._base_idx, self.notional)
+        np.add.at(self._ccy, self._quote_idx, -self.notional)
+        self._margin = float(np.abs(self.lots) @ self.lot_value) / self.leverage if self.leverage else None
+        held = {str(p["symbol_name"]).upper() for p in self._positions}
+        self.unpriced = sorted((held - set(self._index)) | (held & set(self.no_rate)))
+
+    def _var(self, variance: float) -> float:
+        return self.z * math.sqrt(max(variance, 0.0) * self.horizon)
+
+    @_locked
+    def exposure(self) -> dict:
+        sigma = np.sqrt(np.diag(self.cov)) if len(self.cov) else np.empty(0)
+        return {
+            "account_currency": self.account_currency,
+            "symbols": {
+                s: {"lots": round(float(self.lots[i]), 4), "notional": round(float(self.notional[i]), 2)}
+                for i, s in enumerate(self.symbols) if self.lots[i]
+            },
+            "currencies": {c: round(float(v), 2) for c, v in zip(self._currencies, self._ccy) if v},
+            "gross_notional": round(float(np.abs(self.notional).sum()), 2),
+            "net_notional": round(float(self.notional.sum()), 2),
+            "var": round(self._var(self._variance), 2),
+            # VaR if nothing were correlated: the diversification benefit is the gap
+            "var_undiversified": round(self.z * math.sqrt(self.horizon) * float(np.abs(self.notional) @ sigma), 2),
+            "confidence": self.confidence,
+            "margin": round(self._margin, 2) if self._margin is not None else None,
+            "leverage": self.leverage,
+            "unpriced": self.unpriced,
+        }
+
+    # ── sizing ──────────────────────────────────────────────────────────────
+    def last_price(self, symbol: str):
+        i = self._index.get(symbol.upper())
+        return float(self.price[i]) if i is not None else None
+
+    def loss_per_lot(self, symbol: str, entry: float, stop: float) -> float:
+        spec = self.spec(symbol)
+        rate = self.to_account(spec["quote"])
+        if rate is None:
+            raise ValueError(f"No {spec['quote']}→{self.account_currency} rate for {symbol}; load a conversion pair")
+        return abs(entry - stop) * spec["contract_size"] * rate
+
+    def size_position(self, symbol: str, entry: float, stop: float, risk_pct: float, equity: float,
+                      side: str = None) -> dict:
+        """Lots that lose `risk_pct` % of equity at the stop, rounded down to the volume step."""
+        spec = self.spec(symbol)
+        if not equity or equity <= 0:
+            raise ValueError(f"Cannot size {symbol}: equity is {equity}")
+        if side is not None and _stop_error(side, entry, stop):
+            raise ValueError(_stop_error(side, entry, stop))
+        per_lot = self.loss_per_lot(symbol, entry, stop)
+        if not per_lot:
+            raise ValueError(f"Cannot size {symbol}: no stop distance")
+        raw = equity * risk_pct / 100 / per_lot
+        step = spec["volume_step"]
+        lots = math.floor(raw / step + 1e-9) * step
+        lots = min(max(lots, 0.0), spec["volume_max"])
+        if lots < spec["volume_min"]:
+            lots = 0.0
+        return {
+            "symbol": symbol.upper(),
+            "lots": round(lots, 8),
+            "risk_amount": round(lots * per_lot, 2),
+            "risk_pct": round(lots * per_lot / equity * 100, 4) if equity else None,
+            "loss_per_lot": round(per_lot, 2),
+        }
+
+    # ── pre-trade check ─────────────────────────────────────────────────────
+    @_locked
+    def check(self, symbol: str, side: str, lots: float, equity: float, entry: float = None,
+              stop: float = None) -> dict:
+        """Limit check for adding `lots` to the cached portfolio (O(1) in the number of positions)."""
+        started = time.perf_counter()
+        symbol = symbol.upper()
+        violations = []
+        k = self._index.get(symbol)
+        if not equity or equity <= 0:
+            return _rejected(f"Equity is {equity}; limits cannot be checked", started)
+        if k is None:
+            return _rejected(f"No market data for {symbol}", started)
+        if symbol in self.no_rate:
+            return _rejected(f"No {self.spec(symbol)['quote']}→{self.account_currency} rate for {symbol}; "
+                             f"load a conversion pair", started)
+
+        signed = lots if side.upper() == "BUY" else -lots
+        delta = signed * self.lot_value[k]
+        var_after = self._var(self._variance + 2 * delta * self._cov_e[k] + delta * delta * self.cov[k, k])
+        symbol_after = self.notional[k] + delta
+        margin_after = None
+        if self._margin is not None:
+            margin_after = self._margin + (abs(self.lots[k] + signed) - abs(self.lots[k])) \
+                * self.lot_value[k] / self.leverage
+        spec = self.spec(symbol)
+        ccy_after = {
+            spec["base"]: self._ccy[self._base_idx[k]] + delta,
+            spec["quote"]: self._ccy[self._quote_idx[k]] - delta,
+        }
+
+        trade_risk_pct = None
+        if stop is not None:
+            price = entry if entry is not None else float(self.price[k])
+            wrong_side = _stop_error(side, price, stop)
+            if wrong_side:
+                violations.append(wrong_side)
+            else:
+                trade_risk_pct = float(lots * self.loss_per_lot(symbol, price, stop) / equity * 100)
+
+        lim = self.limits
+        if lim.get("max_trade_risk_pct") is not None and trade_risk_pct is not None \
+                and trade_risk_pct > lim["max_trade_risk_pct"]:
+            violations.append(f"Trade risks {trade_risk_pct:.2f}% of equity (max {lim['max_trade_risk_pct']}%)")
+        if lim.get("max_var_pct") is not None and var_after / equity * 100 > lim["max_var_pct"]:
+            violations.append(f"Portfolio VaR {var_after / equity * 100:.2f}% of equity (max {lim['max_var_pct']}%)")
+        if lim.get("max_symbol_notional") is not None and abs(symbol_after) > lim["max_symbol_notional"] * equity:
+            violations.append(f"{symbol} notional {abs(symbol_after):,.0f} exceeds {lim['max_symbol_notional']}x equity")
+        if lim.get("max_currency_notional") is not None:
+            cap = lim["max_currency_notional"] * equity
+            for c, v in ccy_after.items():
+                if c != self.account_currency and abs(v) > cap:
+                    violations.append(f"{c} exposure {v:,.0f} exceeds {lim['max_currency_notional']}x equity")
+        if lim.get("max_margin_pct") is not None and margin_after is not None \
+                and margin_after / equity * 100 > lim["max_margin_pct"]:
+            violations.append(f"Margin {margin_after / equity * 100:.2f}% of equity (max {lim['max_margin_pct']}%)")
+
+        return {
+            "allowed": not violations,
+            "violations": violations,
+            "trade_risk_pct": round(trade_risk_pct, 4) if trade_risk_pct is not None else None,
+            "var_before": round(self._var(self._variance), 2),
+            "var_after": round(var_after, 2),
+            "var_pct_after": round(var_after / equity * 100, 4),
+            "symbol_notional_after": round(float(symbol_after), 2),
+            "margin_after": round(margin_after, 2) if margin_after is not None else None,
+            "margin_pct_after": round(margin_after / equity * 100, 4) if margin_after is not None else None,
+            "unpriced_positions": self.unpriced,     # held but left out of VaR
+            "elapsed_us": round((time.perf_counter() - started) * 1e6, 1),
+        }
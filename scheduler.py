@@ -0,0 +1,235 @@
+# scheduler.py
+# ---------------------------------------------------------------------------
+# Priority-ordered, rate-limited admission for broker calls.
+#
+#   with broker_scheduler.slot(ORDER):
+#       mt5.order_send(request)
+#
+#   with prioritized(WARMUP):          # everything this thread fetches is background work
+#       get_ohlc_data("EURUSD", "H1", 500)
+#
+# Each call takes a token from a bucket refilled at `rate`/s (bursts up to
+# `burst`), and waiters are admitted strictly by class: ORDER, then
+# POSITIONS, then BARS, then WARMUP. The last `reserve` tokens are kept for
+# orders, so a burst of bar scans can empty the bucket without delaying an
+# order. Classes that hit the broker's historical-data limit (BARS, WARMUP)
+# also draw from a separate `history_rate` bucket. `max_inflight` bounds
+# concurrent calls (1 for the MT5 terminal, whose calls serialize anyway).
+#
+#   with broker_scheduler.immediate() as admitted:   # health checks: never queue
+#       status = read_status() if admitted else last_status
+#
+# immediate() skips the queue and the buckets; it only takes an in-flight slot
+# if one is free, so a health check neither waits behind a bar scan nor runs
+# concurrently with another terminal call.
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from metrics import gauge, histogram
+
+ORDER, POSITIONS, BARS, WARMUP = 0, 1, 2, 3
+PRIORITY_NAMES = {ORDER: "order", POSITIONS: "positions", BARS: "bars", WARMUP: "warmup"}
+HISTORY_CLASSES = {BARS, WARMUP}
+
+QUEUE_WAIT = histogram(
+    "smc_broker_queue_wait_seconds",
+    "Time broker calls waited for admission, by broker and priority class.",
+    ("broker", "priority"),
+)
+QUEUE_DEPTH = gauge(
+    "smc_broker_queue_depth",
+    "Broker calls waiting for admission, by broker and priority class.",
+    ("broker", "priority"),
+)
+
+_priority_override: ContextVar = ContextVar("broker_priority", default=None)
+
+
+@contextmanager
+def prioritized(priority: int):
+    """Run broker calls inside the block at `priority` instead of their default class."""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def effective_priority(default: int) -> int:
+    override = _priority_override.get()
+    return default if override is None else override
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._last = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_for(self, need: float) -> float:
+        """Seconds until `need` tokens are available (0 if they already are)."""
+        return max(0.0, (need - self.tokens) / self.rate) if self.rate else 0.0
+
+
+class BrokerScheduler:
+    """
+    Thread-safe admission queue in front of one broker connection.
+
+    Args:
+        name: Broker label for metrics (e.g. "mt5", "ctrader")
+        rate: Calls per second (0 = unlimited)
+        burst: Bucket size
+        reserve: Tokens only ORDER calls may use
+        history_rate: Separate calls/s limit for BARS and WARMUP (None = none)
+        max_inflight: Concurrent admitted calls (None = unlimited)
+    """
+
+    def __init__(self, name: str, rate: float = 0, burst: float = None, reserve: float = 0,
+                 history_rate: float = None, max_inflight: int = None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst if burst is not None else max(rate, 1))
+        self.history = TokenBucket(history_rate, max(history_rate, 1)) if history_rate else None
+        self.reserve = reserve
+        self.max_inflight = max_inflight
+        self._cond = threading.Condition()
+        self._queue = []               # heap of (priority, seq, waiter id)
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._depth = {p: 0 for p in PRIORITY_NAMES}
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self._held = threading.local()  # nested calls on a thread that holds a slot pass through
+
+    def _blocked_for(self, priority: int, now: float):
+        """None if the head waiter can go now, else seconds to wait (0 = until notified)."""
+        if self.max_inflight is not None and self._inflight >= self.max_inflight:
+            return 0.0
+        wait = 0.0
+        if self.bucket.rate:
+            self.bucket.refill(now)
+            need = 1 + (self.reserve if priority != ORDER else 0)
+            wait = self.bucket.wait_for(need)
+        if self.history is not None and priority in HISTORY_CLASSES:
+            self.history.refill(now)
+            wait = max(wait, self.history.wait_for(1))
+        return wait or None
+
+    @contextmanager
+    def slot(self, priority: int = BARS):
+        """Block until this call is admitted, then hold an in-flight slot for the block."""
+        if getattr(self._held, "depth", 0):
+            self._held.depth += 1
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+        priority = effective_priority(priority)
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        me = next(self._seq)
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, (priority, me, me))
+            self._depth[priority] += 1
+            QUEUE_DEPTH.set(self._depth[priority], broker=self.name, priority=label)
+            while True:
+                if self._queue[0][2] == me:
+                    wait = self._blocked_for(priority, time.monotonic())
+                    if wait is None:
+                        break
+                    self._cond.wait(wait or None)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._queue)
+            self._depth[priority] -= 1
+            QUEUE_DEPTH.set(self._depth[priority], broker=self.name, priority=label)
+            if self.bucket.rate:
+                self.bucket.tokens -= 1
+            if self.history is not None and priority in HISTORY_CLASSES:
+                self.history.tokens -= 1
+            self._inflight += 1
+            self.admitted[priority] += 1
+            self._cond.notify_all()     # the next head re-evaluates
+        QUEUE_WAIT.observe(time.monotonic() - started, broker=self.name, priority=label)
+        self._held.depth = 1
+        try:
+            yield
+        finally:
+            self._held.depth = 0
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def immediate(self):
+        """Hold an in-flight slot for the block if one is free right now; yields whether it was."""
+        if getattr(self._held, "depth", 0):
+            yield True
+            return
+        with self._cond:
+            admitted = self.max_inflight is None or self._inflight < self.max_inflight
+            if admitted:
+                self._inflight += 1
+        if not admitted:
+            yield False
+            return
+        self._held.depth = 1
+        try:
+            yield True
+        finally:
+            self._held.depth = 0
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def wrap(self, priority: int):
+        """Decorator: run the function inside slot(priority)."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.slot(priority):
+                    return fn(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            if self.bucket.rate:
+                self.bucket.refill(now)
+            return {
+                "queued": {PRIORITY_NAMES[p]: n for p, n in self._depth.items()},
+                "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+                "inflight": self._inflight,
+                "tokens": round(self.bucket.tokens, 2) if self.bucket.rate else None,
+            }
+
+
+def _env_float(key: str, default):
+    value = os.getenv(key)
+    return float(value) if value not in (None, "") else default
+
+
+def from_env(name: str, rate: float = 0, burst: float = None, reserve: float = 0,
+             history_rate: float = None, max_inflight: int = None) -> BrokerScheduler:
+    """Scheduler with the client's defaults, overridable via BROKER_RATE_PER_SEC and friends."""
+    return BrokerScheduler(
+        name,
+        rate=_env_float("BROKER_RATE_PER_SEC", rate),
+        burst=_env_float("BROKER_BURST", burst),
+        reserve=_env_float("BROKER_ORDER_RESERVE", reserve),
+        history_rate=_env_float("BROKER_HISTORY_RATE_PER_SEC", history_rate),
+        max_inflight=max_inflight,
+    )
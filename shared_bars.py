@@ -0,0 +1,314 @@
+# shared_bars.py
+# ---------------------------------------------------------------------------
+# Shared-memory bar rings: one feeder process polls the broker, every uvicorn
+# worker reads the same bars without its own fetch.
+#
+#   python shared_bars.py --symbols EURUSD GBPUSD --tf D1 H4 H1 M15 M5 --capacity 5000 M5=30000
+#   SHARED_BARS=true uvicorn app:app --workers 4
+#
+# One segment per symbol/timeframe, named {prefix}_{SYMBOL}_{TF}:
+#
+#   [header 64 B][bar slots: 2 × capacity × resample.BAR_DTYPE]
+#
+# Bar k is written to slot k % capacity *and* its mirror k % capacity +
+# capacity, so the latest n bars are always one contiguous slice and readers
+# get a zero-copy NumPy view. Updates are guarded by a seqlock: the feeder
+# makes `seq` odd while writing and even when done; a reader that sees an odd
+# or changed `seq` around its work retries.
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from dotenv import load_dotenv
+
+from resample import BAR_DTYPE, as_bars
+
+load_dotenv()
+
+SHARED_BARS_PREFIX = os.getenv("SHARED_BARS_PREFIX", "smcbars")
+SHARED_BARS_CAPACITY = int(os.getenv("SHARED_BARS_CAPACITY", "5000"))
+
+_MAGIC = 0x53424152   # "SBAR"
+_HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"), ("version", "<u4"),
+    ("capacity", "<i8"),
+    ("seq", "<u8"),          # seqlock counter, odd while the feeder writes
+    ("count", "<i8"),        # bars written since creation
+    ("updated", "<f8"),      # epoch seconds of the last write
+])
+
+
+def segment_name(symbol: str, tf: str, prefix: str = None) -> str:
+    return f"{prefix or SHARED_BARS_PREFIX}_{symbol.upper()}_{tf.upper()}"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach without handing the segment to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 the tracker would unlink the feeder's segment when a reader exits
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class BarRing:
+    """Mirrored ring of bars in one shared-memory segment."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray(1, dtype=HEADER_DTYPE, buffer=shm.buf)[0]
+        if self.header["magic"] != _MAGIC:
+            raise ValueError(f"Shared memory segment '{shm.name}' is not a bar ring")
+        self.capacity = int(self.header["capacity"])
+        self.slots = np.ndarray(2 * self.capacity, dtype=BAR_DTYPE, buffer=shm.buf, offset=_HEADER_SIZE)
+
+    @classmethod
+    def create(cls, name: str, capacity: int) -> "BarRing":
+        size = _HEADER_SIZE + 2 * capacity * BAR_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a feeder that did not shut down cleanly
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(1, dtype=HEADER_DTYPE, buffer=shm.buf)[0]
+        header["capacity"] = capacity
+        header["seq"] = 0
+        header["count"] = 0
+        header["updated"] = 0.0
+        header["version"] = 1
+        header["magic"] = _MAGIC
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "BarRing":
+        return cls(_attach(name))
+
+    def close(self):
+        self.header = self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # ── feeder side ─────────────────────────────────────────────────────────
+    def last_time(self):
+        count = int(self.header["count"])
+        if not count:
+            return None
+        return int(self.slots["time"][(count - 1) % self.capacity])
+
+    def write(self, rates: np.ndarray) -> int:
+        """
+        Merge time-sorted bars: a bar with the last bar's time replaces it (the
+        forming bar), newer bars are appended, older ones ignored. Returns the
+        number of bars appended.
+        """
+        last = self.last_time()
+        if last is not None:
+            rates = rates[rates["time"] >= last]
+        if len(rates) == 0:
+            return 0
+        count = int(self.header["count"])
+        replace = last is not None and int(rates["time"][0]) == last
+        first = count - 1 if replace else count
+        drop = max(0, len(rates) - self.capacity)    # only the newest `capacity` fit
+        first += drop
+        bars = as_bars(rates[drop:])
+        pos = (first + np.arange(len(bars))) % self.capacity
+
+        self.header["seq"] += 1             # odd: readers back off
+        self.slots[pos] = bars
+        self.slots[pos + self.capacity] = bars
+        self.header["count"] = first + len(bars)
+        self.header["updated"] = time.time()
+        self.header["seq"] += 1             # even: consistent again
+        return first + len(bars) - count
+
+    # ── reader side ─────────────────────────────────────────────────────────
+    def available(self) -> int:
+        return min(int(self.header["count"]), self.capacity)
+
+    def latest(self, n: int) -> np.ndarray:
+        """Zero-copy view of the newest min(n, available) bars, oldest first."""
+        count = int(self.header["count"])
+        n = min(n, count, self.capacity)
+        end = (count - 1) % self.capacity + self.capacity + 1
+        return self.slots[end - n:end]
+
+    def read(self, n: int, fn, retries: int = 100):
+        """
+        fn(view of the newest n bars) under the seqlock; None if the feeder
+        kept writing through every attempt. `fn` must copy what it keeps.
+        """
+        for _ in range(retries):
+            seq = int(self.header["seq"])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            out = fn(self.latest(n))
+            if int(self.header["seq"]) == seq:
+                return out
+        return None
+
+
+class SharedBars:
+    """
+    Worker-side access to the feeder's rings, attached lazily per symbol/timeframe.
+
+    Reads run on several threadpool threads at once. Each one registers on the
+    ring it reads; a stale ring is detached at once but only closed when its
+    last reader is done (closing a segment with live views raises BufferError).
+    """
+
+    def __init__(self, prefix: str = None, max_age: float = 10.0):
+        self.prefix = prefix or SHARED_BARS_PREFIX
+        self.max_age = max_age
+        self._rings = {}
+        self._readers = {}          # ring → threads reading it
+        self._retired = set()       # detached rings waiting for their readers
+        self._lock = threading.Lock()
+
+    def _checkout(self, symbol: str, tf: str):
+        """The current ring for symbol/tf with a reader registered on it, or None."""
+        name = segment_name(symbol, tf, self.prefix)
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is not None and time.time() - float(ring.header["updated"]) > self.max_age:
+                # a restarted feeder creates a new segment under the same name
+                del self._rings[name]
+                self._retire(ring)
+                ring = None
+            if ring is None:
+                try:
+                    ring = self._rings[name] = BarRing.attach(name)
+                except (FileNotFoundError, ValueError):
+                    return None
+            self._readers[ring] = self._readers.get(ring, 0) + 1
+            return ring
+
+    def _checkin(self, ring: BarRing):
+        with self._lock:
+            self._readers[ring] -= 1
+            if not self._readers[ring]:
+                del self._readers[ring]
+                if ring in self._retired:
+                    self._retired.discard(ring)
+                    ring.close()
+
+    def _retire(self, ring: BarRing):
+        if self._readers.get(ring):
+            self._retired.add(ring)
+        else:
+            ring.close()
+
+    def read(self, symbol: str, tf: str, n: int, fn=np.array):
+        """
+        fn(newest n bars) from shared memory, or None when the feeder does not
+        carry the symbol/timeframe, holds fewer than n bars or has gone quiet
+        for more than max_age seconds (callers then go to the broker).
+        """
+        ring = self._checkout(symbol, tf)
+        if ring is None:
+            return None
+        try:
+            if ring.available() < n or time.time() - float(ring.header["updated"]) > self.max_age:
+                return None
+            return ring.read(n, fn)
+        finally:
+            self._checkin(ring)
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "bars": ring.available(),
+                    "capacity": ring.capacity,
+                    "age_seconds": round(now - float(ring.header["updated"]), 3),
+                }
+                for name, ring in self._rings.items()
+            }
+
+
+# ── feeder ─────────────────────────────────────────────────────────────────
+def feed(symbols, timeframes, capacities: dict, interval: float = 1.0, prefix: str = None, poll_bars: int = 3):
+    """Backfill every ring, then poll the newest bars forever (runs in the feeder process)."""
+    if os.getenv("BROKER_GATEWAY_SOCKET"):
+        from broker_gateway import get_rates
+    else:
+        from mt5_client import get_rates
+
+    rings = {}
+    try:
+        for symbol in symbols:
+            for tf in timeframes:
+                capacity = capacities.get(tf.upper(), SHARED_BARS_CAPACITY)
+                ring = rings[(symbol, tf)] = BarRing.create(segment_name(symbol, tf, prefix), capacity)
+                try:
+                    ring.write(get_rates(symbol, tf, capacity))
+                except Exception as e:
+                    print(f"[ERROR] backfill {symbol} {tf}: {e} (retried on the next poll)")
+                print(f"[INFO] {ring.shm.name}: {ring.available()} bars")
+
+        while True:
+            started = time.time()
+            for (symbol, tf), ring in rings.items():
+                try:
+                    rates = get_rates(symbol, tf, poll_bars)
+                    if len(rates) == 0:
+                        continue
+                    last = ring.last_time()
+                    if last is None or int(rates["time"][0]) > last:
+                        # empty ring (failed backfill) or missed bars since the last poll: backfill
+                        rates = get_rates(symbol, tf, ring.capacity)
+                    ring.write(rates)
+                except Exception as e:
+                    print(f"[ERROR] feed {symbol} {tf}: {e}")
+            time.sleep(max(0.0, interval - (time.time() - started)))
+    finally:
+        for ring in rings.values():
+            ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill shared-memory bar rings from the broker.")
+    parser.add_argument("--symbols", nargs="+", required=True)
+    parser.add_argument("--tf", nargs="+", default=["D1", "H4", "H1", "M15", "M5"])
+    parser.add_argument("--capacity", nargs="*", default=[], metavar="[TF=]BARS",
+                        help="ring size, for all timeframes or per timeframe (e.g. 5000 M5=30000)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+    parser.add_argument("--prefix", default=None)
+    parser.add_argument("--stub", action="store_true", help="synthetic bars from stub_broker, no terminal")
+    args = parser.parse_args()
+
+    capacities = {}
+    for item in args.capacity:
+        if "=" in item:
+            tf, bars = item.split("=", 1)
+            capacities[tf.upper()] = int(bars)
+        else:
+            SHARED_BARS_CAPACITY = int(item)
+
+    if args.stub:
+        import stub_broker
+        stub_broker.install(history=max([SHARED_BARS_CAPACITY, *capacities.values()]))
+        os.environ.setdefault("MT5_LOGIN", "0")
+
+    # unlink the segments on `docker stop` / kill as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        feed(args.symbols, args.tf, capacities, args.interval, args.prefix)
+    except KeyboardInterrupt:
+        pass
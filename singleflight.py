@@ -0,0 +1,82 @@
+# singleflight.py
+# ---------------------------------------------------------------------------
+# Request coalescing for broker fetches.
+#
+#   bars = SingleFlight(fetch_bars, slice_bars, name="ohlc")
+#   result = await bars.get(("EURUSD", "M15"), depth=100)
+#
+# While a fetch for a key is in flight, identical requests await the same
+# result instead of starting their own. A request for fewer bars joins any
+# in-flight fetch of the same key that is at least as deep and gets its
+# result sliced down. The fetch itself runs in the threadpool so the event
+# loop keeps accepting the requests that will join it. Joined requests get the
+# same result object, so callers must treat results as read-only.
+#
+# Keys are matched case-insensitively ("eurusd" joins "EURUSD"); the fetch is
+# called with the leader's key as given. A flight stays joinable until its
+# fetch returns, even when the request that started it is cancelled.
+
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import counter
+
+FLIGHTS = counter(
+    "smc_singleflight_requests_total",
+    "Broker fetch requests by outcome: leader (fetched), joined (same depth) or sliced (deeper fetch).",
+    ("flight", "outcome"),
+)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls of `fetch(*key, depth)`.
+
+    Args:
+        fetch: Blocking function called as fetch(*key, depth)
+        slice_fn: slice_fn(key, result, depth) → result for a smaller depth;
+            without it only identical depths are shared
+        name: Label for the metrics
+    """
+
+    def __init__(self, fetch, slice_fn=None, name: str = ""):
+        self.fetch = fetch
+        self.slice_fn = slice_fn
+        self.name = name
+        self._inflight = {}   # {key: {depth: task}}
+
+    @staticmethod
+    def _normalize(key: tuple) -> tuple:
+        return tuple(k.upper() if isinstance(k, str) else k for k in key)
+
+    async def get(self, key: tuple, depth: int):
+        flights = self._inflight.setdefault(self._normalize(key), {})
+        if depth in flights:
+            FLIGHTS.inc(flight=self.name, outcome="joined")
+            return await asyncio.shield(flights[depth])
+        if self.slice_fn is not None:
+            deeper = [d for d in flights if d > depth]
+            if deeper:
+                FLIGHTS.inc(flight=self.name, outcome="sliced")
+                result = await asyncio.shield(flights[min(deeper)])
+                return self.slice_fn(key, result, depth)
+
+        FLIGHTS.inc(flight=self.name, outcome="leader")
+        task = asyncio.ensure_future(run_in_threadpool(self.fetch, *key, depth))
+        flights[depth] = task
+        task.add_done_callback(lambda t: self._land(self._normalize(key), depth, t))
+        return await asyncio.shield(task)
+
+    def _land(self, key: tuple, depth: int, task: asyncio.Future):
+        """Retire a flight once its fetch is done (not when its leader stops waiting)."""
+        if not task.cancelled():
+            task.exception()            # retrieved: a failure nobody awaited is not logged as lost
+        flights = self._inflight.get(key)
+        if flights is not None and flights.get(depth) is task:
+            del flights[depth]
+            if not flights:
+                del self._inflight[key]
+
+    def inflight(self) -> int:
+        return sum(len(f) for f in self._inflight.values())
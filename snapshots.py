@@ -0,0 +1,255 @@
+# snapshots.py
+# ---------------------------------------------------------------------------
+# Pre-session /analyze snapshots.
+#
+#   store = SnapshotStore(period=300)
+#   scheduler = SnapshotScheduler(store, ["EURUSD", "GBPUSD"], compute)
+#   scheduler.start()                      # inside the running event loop
+#   store.fresh("EURUSD", forming)         # Snapshot while its inputs are unchanged, else None
+#
+# Just before London and New York open, everybody asks /analyze for the same
+# majors within a few seconds. The scheduler runs the /analyze pipeline for a
+# watchlist at every base bar close inside a window ahead of each session open
+# (hours as in analysis.label_session / levels.SESSIONS, UTC), and the store
+# keeps the result together with its input fingerprint: the open time of the
+# last bar on every timeframe, plus the OHLC of the forming base (M5) bar.
+#
+# The detectors read the forming bars too. Every timeframe's forming bar is
+# the closed base bars of its bucket plus the forming base bar, so the inputs
+# are unchanged exactly while the forming base bar is: /analyze re-reads that
+# one bar and serves the snapshot only if it matches. No snapshot outlives
+# the next base boundary. A run that sees the same fingerprint keeps the
+# version, a change bumps it, and the last few versions are kept per symbol.
+
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from levels import SESSIONS
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def session_opens(names) -> list:
+    """[(name, open hour UTC)] for the named sessions."""
+    hours = {name: start for name, start, _ in SESSIONS}
+    unknown = [n for n in names if n not in hours]
+    if unknown:
+        raise ValueError(f"Unknown session(s) {unknown}; expected one of {list(hours)}")
+    return [(n, hours[n]) for n in names]
+
+
+def upcoming_session(now: float, opens: list, lead: float, trail: float):
+    """Name of the session whose open is within [-trail, lead] seconds of `now`, else None."""
+    t = now % 86400
+    for name, hour in opens:
+        until = (hour * 3600 - t) % 86400    # seconds until the next open
+        if until <= lead or until >= 86400 - trail:
+            return name
+    return None
+
+
+def forming_key(candle: dict) -> list:
+    """[open time (epoch s), open, high, low, close] of a candle dict: the forming base bar as fingerprinted."""
+    ts = datetime.fromisoformat(str(candle["time"]).replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return [int(ts.timestamp()), candle["open"], candle["high"], candle["low"], candle["close"]]
+
+
+def live_freshness(fingerprint: dict, computed_at: float) -> dict:
+    """Freshness block for a response computed on request."""
+    return {"source": "live", "computed_at": _iso(computed_at), "age_seconds": 0.0, "bars": fingerprint["bars"]}
+
+
+class Snapshot:
+    __slots__ = ("symbol", "version", "fingerprint", "computed_at", "valid_until", "session", "response")
+
+    def __init__(self, symbol, version, fingerprint, computed_at, valid_until, session, response):
+        self.symbol = symbol
+        self.version = version
+        self.fingerprint = fingerprint      # {"bars": {tf: open time of the last bar}, "forming": forming_key}
+        self.computed_at = computed_at
+        self.valid_until = valid_until
+        self.session = session
+        self.response = response            # AnalyzeResponse as a dict
+
+    def freshness(self, now: float = None, source: str = "snapshot") -> dict:
+        now = time.time() if now is None else now
+        return {
+            "source": source,
+            "version": self.version,
+            "computed_at": _iso(self.computed_at),
+            "age_seconds": round(max(0.0, now - self.computed_at), 3),
+            "valid_until": _iso(self.valid_until),
+            "session": self.session,
+            "bars": self.fingerprint["bars"],
+        }
+
+    def to_dict(self) -> dict:
+        return {"symbol": self.symbol, **self.freshness(), "response": self.response}
+
+
+class SnapshotStore:
+    """
+    Latest snapshot plus a short version history per symbol.
+
+    Args:
+        period: Base timeframe in seconds; a snapshot is valid until the next boundary
+        history: Versions kept per symbol
+    """
+
+    def __init__(self, period: int = 300, history: int = 20):
+        self.period = period
+        self.history = history
+        self._snapshots = {}                 # {SYMBOL: deque[Snapshot]}, newest last
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "changed": 0, "stored": 0, "versions": 0}
+
+    def put(self, symbol: str, response: dict, fingerprint: dict, session: str = None, now: float = None) -> Snapshot:
+        now = time.time() if now is None else now
+        key = symbol.upper()
+        valid_until = (now // self.period + 1) * self.period
+        with self._lock:
+            versions = self._snapshots.setdefault(key, deque(maxlen=self.history))
+            latest = versions[-1] if versions else None
+            if latest is not None and latest.fingerprint == fingerprint:
+                versions.pop()               # same inputs: refresh in place
+                version = latest.version
+            else:
+                version = latest.version + 1 if latest is not None else 1
+                self.counters["versions"] += 1
+            snapshot = Snapshot(key, version, fingerprint, now, valid_until, session, response)
+            versions.append(snapshot)
+            self.counters["stored"] += 1
+            return snapshot
+
+    def get(self, symbol: str, version: int = None):
+        with self._lock:
+            versions = self._snapshots.get(symbol.upper())
+            if not versions:
+                return None
+            if version is None:
+                return versions[-1]
+            return next((s for s in versions if s.version == version), None)
+
+    def versions(self, symbol: str) -> list:
+        with self._lock:
+            return list(self._snapshots.get(symbol.upper(), ()))
+
+    def candidate(self, symbol: str, now: float = None):
+        """The latest snapshot if no base bar has closed since it was taken (worth checking), else None."""
+        now = time.time() if now is None else now
+        snapshot = self.get(symbol)
+        return snapshot if snapshot is not None and now < snapshot.valid_until else None
+
+    def fresh(self, symbol: str, forming: list, now: float = None):
+        """The latest snapshot if its forming base bar still reads `forming` (see forming_key), else None."""
+        snapshot = self.candidate(symbol, now)
+        if snapshot is not None and snapshot.fingerprint["forming"] == forming:
+            self.counters["hits"] += 1
+            return snapshot
+        self.counters["changed" if snapshot is not None else "misses"] += 1
+        return None
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            symbols = {
+                key: {"version": v[-1].version, "fresh": now < v[-1].valid_until,
+                      "computed_at": _iso(v[-1].computed_at)}
+                for key, v in self._snapshots.items() if v
+            }
+        return dict(self.counters, period=self.period, symbols=symbols)
+
+
+class SnapshotScheduler:
+    """
+    Refreshes the watchlist's snapshots at each base bar close ahead of the sessions.
+
+    Args:
+        store: SnapshotStore the results go to
+        symbols: Watchlist
+        compute: async (symbol) → (response dict, {"bars": ..., "forming": ...})
+        sessions: Session names from levels.SESSIONS to prepare for
+        lead_seconds: How long before an open the snapshots start
+        trail_seconds: How long after an open they keep being refreshed
+        delay_seconds: Wait after the boundary so the broker has the new bar
+        retries: Extra one-second attempts while the fingerprint has not moved yet
+    """
+
+    def __init__(self, store: SnapshotStore, symbols: list, compute, sessions=("London", "NewYork"),
+                 lead_seconds: float = 3600, trail_seconds: float = 900, delay_seconds: float = 1.0,
+                 retries: int = 3):
+        self.store = store
+        self.symbols = [s.upper() for s in symbols]
+        self.compute = compute
+        self.opens = session_opens(sessions)
+        self.lead_seconds = lead_seconds
+        self.trail_seconds = trail_seconds
+        self.delay_seconds = delay_seconds
+        self.retries = retries
+        self._task = None
+        self.last_run = None
+        self.counters = {"runs": 0, "refreshed": 0, "errors": 0, "retries": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self):
+        period = self.store.period
+        while True:
+            now = time.time()
+            boundary = (now // period + 1) * period
+            await asyncio.sleep(boundary + self.delay_seconds - now)
+            session = upcoming_session(boundary, self.opens, self.lead_seconds, self.trail_seconds)
+            if session is not None:
+                await self.run_once(session=session)
+
+    async def run_once(self, symbols: list = None, session: str = None) -> list:
+        """Refresh the given symbols (default: the watchlist) concurrently; returns the snapshots."""
+        self.counters["runs"] += 1
+        self.last_run = time.time()
+        results = await asyncio.gather(
+            *(self._refresh(s, session) for s in (symbols or self.symbols)), return_exceptions=True
+        )
+        snapshots = []
+        for symbol, result in zip(symbols or self.symbols, results):
+            if isinstance(result, Exception):
+                self.counters["errors"] += 1
+                print(f"[ERROR] Snapshot {symbol}: {result}")
+            else:
+                snapshots.append(result)
+        return snapshots
+
+    async def _refresh(self, symbol: str, session: str = None) -> Snapshot:
+        previous = self.store.get(symbol)
+        for attempt in range(self.retries + 1):
+            response, fingerprint = await self.compute(symbol)
+            if previous is None or fingerprint["bars"] != previous.fingerprint["bars"] or attempt == self.retries:
+                break
+            self.counters["retries"] += 1
+            await asyncio.sleep(1.0)         # the new bar is not at the broker yet
+        self.counters["refreshed"] += 1
+        return self.store.put(symbol, response, fingerprint, session=session)
+
+    def status(self) -> dict:
+        now = time.time()
+        return dict(
+            self.counters,
+            symbols=self.symbols,
+            sessions=[name for name, _ in self.opens],
+            active_session=upcoming_session(now, self.opens, self.lead_seconds, self.trail_seconds),
+            last_run=_iso(self.last_run) if self.last_run else None,
+            running=self._task is not None and not self._task.done(),
+        )
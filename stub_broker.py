@@ -0,0 +1,296 @@
+# stub_broker.py
+# ---------------------------------------------------------------------------
+# In-process stand-in for the MetaTrader5 terminal. Benchmarks install it as
+# the `MetaTrader5` module so mt5_client / app run unchanged with no terminal.
+
+import sys
+import time
+import types
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# ── MT5 constants (same values as the real package) ────────────────────────
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60,
+    TIMEFRAME_M5: 300,
+    TIMEFRAME_M15: 900,
+    TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600,
+    TIMEFRAME_H4: 14400,
+    TIMEFRAME_D1: 86400,
+}
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TYPE_BUY_LIMIT = 2
+ORDER_TYPE_SELL_LIMIT = 3
+ORDER_TYPE_BUY_STOP = 4
+ORDER_TYPE_SELL_STOP = 5
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+ORDER_TIME_GTC = 0
+ORDER_FILLING_IOC = 1
+TRADE_RETCODE_DONE = 10009
+
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("close", "<f8"), ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+
+TICKS_DTYPE = np.dtype([
+    ("time", "<i8"), ("bid", "<f8"), ("ask", "<f8"), ("last", "<f8"), ("volume", "<u8"),
+    ("time_msc", "<i8"), ("flags", "<u4"), ("volume_real", "<f8"),
+])
+
+SymbolInfo = namedtuple(
+    "SymbolInfo",
+    "name digits trade_contract_size currency_base currency_profit volume_min volume_step volume_max",
+)
+AccountInfo = namedtuple("AccountInfo", "login balance equity margin margin_free leverage currency")
+Position = namedtuple("Position", "ticket symbol type price_open volume sl tp")
+Order = namedtuple("Order", "ticket symbol type price_open volume_initial sl tp time_setup")
+OrderSendResult = namedtuple("OrderSendResult", "retcode order price volume comment")
+TerminalInfo = namedtuple("TerminalInfo", "connected ping_last trade_allowed")
+
+DEFAULT_SYMBOLS = {
+    "EURUSD": (5, 1.10), "GBPUSD": (5, 1.27), "USDJPY": (3, 150.0),
+    "AUDUSD": (5, 0.66), "XAUUSD": (2, 2350.0), "NAS100": (2, 18000.0),
+    "US30": (2, 39000.0), "BTCUSD": (2, 65000.0),
+}
+
+
+# ── synthetic series ───────────────────────────────────────────────────────
+def synthetic_rates(n: int, *, seed: int = 0, price: float = 1.10, step_seconds: int = 300,
+                    end_time: int = None, digits: int = 5) -> np.ndarray:
+    """
+    Build a random-walk OHLC series in MT5 `copy_rates_*` layout.
+
+    Args:
+        n: Number of bars
+        seed: RNG seed, same seed → same series
+        price: Starting price
+        step_seconds: Bar duration
+        end_time: Epoch seconds of the last bar (defaults to now, aligned)
+        digits: Rounding applied to prices
+
+    Returns:
+        Structured array with the fields of RATES_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    if end_time is None:
+        end_time = int(time.time()) // step_seconds * step_seconds
+
+    vol = price * 0.0008
+    steps = rng.normal(0.0, vol, size=n)
+    closes = price + np.cumsum(steps)
+    opens = np.empty(n)
+    opens[0] = price
+    opens[1:] = closes[:-1]
+    wick_up = np.abs(rng.normal(0.0, vol * 0.6, size=n))
+    wick_dn = np.abs(rng.normal(0.0, vol * 0.6, size=n))
+
+    rates = np.empty(n, dtype=RATES_DTYPE)
+    rates["time"] = end_time - step_seconds * np.arange(n - 1, -1, -1, dtype=np.int64)
+    rates["open"] = np.round(opens, digits)
+    rates["close"] = np.round(closes, digits)
+    rates["high"] = np.round(np.maximum(opens, closes) + wick_up, digits)
+    rates["low"] = np.round(np.minimum(opens, closes) - wick_dn, digits)
+    rates["tick_volume"] = rng.integers(50, 5000, size=n)
+    rates["spread"] = 10
+    rates["real_volume"] = 0
+    return rates
+
+
+def synthetic_candles(n: int, **kwargs) -> list:
+    """Same as `synthetic_rates`, converted to the candle dicts used by analysis.py."""
+    from datetime import datetime, timezone
+
+    rates = synthetic_rates(n, **kwargs)
+    return [
+        {
+            "time": datetime.fromtimestamp(int(r["time"]), timezone.utc).isoformat(),
+            "open": float(r["open"]),
+            "high": float(r["high"]),
+            "low": float(r["low"]),
+            "close": float(r["close"]),
+            "volume": int(r["tick_volume"]),
+        }
+        for r in rates
+    ]
+
+
+def synthetic_ticks(start_msc: int, end_msc: int, *, seed: int = 0, price: float = 1.10,
+                    digits: int = 5, per_second: float = 5.0) -> np.ndarray:
+    """
+    Random-walk bid/ask ticks in MT5 `copy_ticks_*` layout, start_msc ≤ time_msc < end_msc.
+
+    Ticks are generated per clock hour from (seed, hour), so overlapping
+    requests return the same ticks and a day holds ~per_second × 86400 of them.
+    """
+    chunks = []
+    for hour in range(start_msc // 3_600_000, (end_msc - 1) // 3_600_000 + 1):
+        rng = np.random.default_rng([seed, hour])
+        n = rng.poisson(per_second * 3600)
+        times = np.sort(rng.integers(0, 3_600_000, size=n)) + hour * 3_600_000
+        anchor = price * (1 + 0.002 * np.sin(hour / 5.0))
+        bids = np.round(anchor + np.cumsum(rng.normal(0.0, price * 0.00003, size=n)), digits)
+        keep = (times >= start_msc) & (times < end_msc)
+        chunk = np.zeros(int(keep.sum()), dtype=TICKS_DTYPE)
+        chunk["time_msc"] = times[keep]
+        chunk["time"] = times[keep] // 1000
+        chunk["bid"] = bids[keep]
+        chunk["ask"] = np.round(bids[keep] + 10 ** -digits * rng.integers(2, 15, size=n)[keep], digits)
+        chunk["flags"] = 6
+        chunks.append(chunk)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=TICKS_DTYPE)
+
+
+def _epoch_ms(value) -> int:
+    return int(value.timestamp() * 1000) if hasattr(value, "timestamp") else int(value) * 1000
+
+
+def _symbol_info(name: str, digits: int) -> SymbolInfo:
+    if len(name) == 6 and name.isalpha():
+        base, quote = name[:3], name[3:]
+        contract = 100 if base == "XAU" else 100_000
+    else:
+        base, quote, contract = "USD", "USD", 1
+    return SymbolInfo(name, digits, contract, base, quote, 0.01, 0.01, 100.0)
+
+
+# ── fake terminal ──────────────────────────────────────────────────────────
+class StubTerminal:
+    """Deterministic broker: fixed symbol list, synthetic bars, in-memory orders."""
+
+    def __init__(self, latency_ms: float = 0.0, history: int = 5000, symbols: dict = None):
+        self.latency = latency_ms / 1000
+        self.history = history
+        self.symbols = symbols or DEFAULT_SYMBOLS
+        self._rates = {}
+        self._positions = {}
+        self._orders = {}
+        self._ticket = 1000
+        self._deals = 0
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _series(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self._rates:
+            digits, price = self.symbols[symbol]
+            seed = zlib.crc32(f"{symbol}:{timeframe}".encode())
+            self._rates[key] = synthetic_rates(
+                self.history, seed=seed, price=price,
+                step_seconds=TIMEFRAME_SECONDS[timeframe], digits=digits,
+            )
+        return self._rates[key]
+
+    # MetaTrader5 API surface used by mt5_client
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return (1, "Success")
+
+    def terminal_info(self):
+        return TerminalInfo(True, int(self.latency * 1_000_000), True)
+
+    def symbols_get(self):
+        return tuple(_symbol_info(name, digits) for name, (digits, _) in self.symbols.items())
+
+    def account_info(self):
+        return AccountInfo(0, 10_000.0, 10_000.0, 0.0, 10_000.0, 100, "USD")
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self._delay()
+        if symbol not in self.symbols:
+            return None
+        series = self._series(symbol, timeframe)
+        end = len(series) - start_pos
+        return series[max(0, end - count):end].copy()
+
+    def copy_ticks_range(self, symbol, date_from, date_to, flags):
+        self._delay()
+        if symbol not in self.symbols:
+            return None
+        digits, price = self.symbols[symbol]
+        # MT5 includes ticks stamped at date_to
+        return synthetic_ticks(_epoch_ms(date_from), _epoch_ms(date_to) + 1,
+                               seed=zlib.crc32(symbol.encode()), price=price, digits=digits)
+
+    def positions_get(self, ticket=None):
+        self._delay()
+        if ticket is not None:
+            return tuple(p for p in self._positions.values() if p.ticket == ticket)
+        return tuple(self._positions.values())
+
+    def orders_get(self, ticket=None):
+        self._delay()
+        if ticket is not None:
+            return tuple(o for o in self._orders.values() if o.ticket == ticket)
+        return tuple(self._orders.values())
+
+    def positions_total(self):
+        return len(self._positions)
+
+    def orders_total(self):
+        return len(self._orders)
+
+    def history_deals_total(self, date_from, date_to):
+        return self._deals
+
+    def order_send(self, request):
+        self._delay()
+        self._ticket += 1
+        ticket = self._ticket
+        price = request.get("price") or float(self._series(request["symbol"], TIMEFRAME_M1)["close"][-1])
+        if request["action"] == TRADE_ACTION_DEAL:
+            self._deals += 1
+            self._positions[ticket] = Position(
+                ticket, request["symbol"], request["type"], price,
+                request["volume"], request.get("sl", 0.0), request.get("tp", 0.0),
+            )
+        elif request["action"] == TRADE_ACTION_PENDING:
+            self._orders[ticket] = Order(
+                ticket, request["symbol"], request["type"], price,
+                request["volume"], request.get("sl", 0.0), request.get("tp", 0.0), int(time.time()),
+            )
+        return OrderSendResult(TRADE_RETCODE_DONE, ticket, price, request.get("volume", 0.0), "stub")
+
+
+def install(latency_ms: float = 0.0, history: int = 5000, symbols: dict = None) -> StubTerminal:
+    """Register a `MetaTrader5` module backed by a StubTerminal and return the terminal."""
+    terminal = StubTerminal(latency_ms=latency_ms, history=history, symbols=symbols)
+    module = types.ModuleType("MetaTrader5")
+    for name, value in globals().items():
+        if name.isupper():
+            setattr(module, name, value)
+    for name in ("initialize", "shutdown", "last_error", "terminal_info", "account_info", "symbols_get", "copy_rates_from_pos",
+                 "copy_ticks_range", "positions_get", "orders_get", "positions_total", "orders_total",
+                 "history_deals_total", "order_send"):
+        setattr(module, name, getattr(terminal, name))
+    sys.modules["MetaTrader5"] = module
+    return terminal
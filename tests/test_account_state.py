@@ -0,0 +1,133 @@
+# tests/test_account_state.py
+import threading
+import time
+
+import pytest
+
+from account_state import AccountState, AccountSyncWorker
+
+
+class FakeAccount:
+    """Broker-side positions/orders the mirror reconciles against."""
+
+    def __init__(self):
+        self.positions = {1: {"position_id": 1, "symbol_name": "EURUSD", "sl": 1.09}}
+        self.orders = {7: {"order_id": 7, "symbol_name": "GBPUSD", "price": 1.25}}
+        self.fetches = 0
+        self.during_fetch = None        # called between the positions and orders fetch
+
+    def fetch_positions(self):
+        self.fetches += 1
+        positions = [dict(p) for p in self.positions.values()]
+        if self.during_fetch is not None:
+            self.during_fetch()
+        return positions
+
+    def fetch_orders(self):
+        return {"orders": [dict(o) for o in self.orders.values()]}
+
+
+@pytest.fixture
+def broker():
+    return FakeAccount()
+
+
+@pytest.fixture
+def state(broker):
+    return AccountState(broker.fetch_positions, broker.fetch_orders)
+
+
+def test_reads_seed_once_then_serve_the_mirror(broker, state):
+    assert state.stale
+    assert [p["position_id"] for p in state.positions()] == [1]
+    assert [o["order_id"] for o in state.pending_orders()["orders"]] == [7]
+    state.positions()
+    assert broker.fetches == 1 and not state.stale
+
+
+def test_events_update_the_mirror_without_a_fetch(broker, state):
+    state.seed()
+    state.apply({"kind": "position", "id": 2, "data": {"position_id": 2, "symbol_name": "USDJPY"}})
+    state.apply({"kind": "order", "id": 7, "data": None})
+    state.apply({"kind": "unknown", "id": 9, "data": {}})
+    snapshot = state.snapshot()
+    assert sorted(p["position_id"] for p in snapshot["positions"]) == [1, 2]
+    assert snapshot["orders"] == []
+    assert broker.fetches == 1
+
+    state.apply({"kind": "resync"})
+    assert state.stale
+    state.positions()
+    assert broker.fetches == 2
+
+
+def test_reads_are_copies(state):
+    state.positions()[0]["sl"] = 0
+    assert state.positions()[0]["sl"] == 1.09
+
+
+def test_drift_check_reports_and_fixes_differences(broker, state):
+    state.seed()
+    broker.positions[1]["sl"] = 1.08                                  # changed
+    broker.positions[3] = {"position_id": 3, "symbol_name": "XAUUSD"}  # added
+    del broker.orders[7]                                              # removed
+    report = state.check_drift()
+    assert report["position"] == {"added": [3], "removed": [], "changed": [1]}
+    assert report["order"] == {"added": [], "removed": [7], "changed": []}
+    assert state.counters["drifted"] == 1
+    assert {p["position_id"]: p for p in state.positions()}[1]["sl"] == 1.08
+
+    assert not any(ids for diff in state.check_drift().values() for ids in diff.values())
+    assert state.counters["drifted"] == 1
+
+
+def test_reseed_racing_an_event_stays_stale(broker, state):
+    broker.during_fetch = lambda: state.apply(
+        {"kind": "position", "id": 4, "data": {"position_id": 4, "symbol_name": "EURUSD"}})
+    state.seed()
+    assert state.stale          # the fetched snapshot may predate the event
+    broker.during_fetch = None
+    broker.positions[4] = {"position_id": 4, "symbol_name": "EURUSD"}
+    assert sorted(p["position_id"] for p in state.positions()) == [1, 4]
+    assert not state.stale
+
+
+def test_worker_reseeds_when_the_change_token_moves(broker, state):
+    state.seed()
+    token = [1]
+    worker = AccountSyncWorker(state, change_token=lambda: token[0], poll_interval=0.01, drift_interval=0)
+    worker.start()
+    try:
+        time.sleep(0.05)
+        seeds = state.counters["seeds"]
+        broker.positions[5] = {"position_id": 5, "symbol_name": "GBPUSD"}
+        token[0] = 2
+        deadline = time.time() + 2
+        while state.counters["seeds"] == seeds and time.time() < deadline:
+            time.sleep(0.01)
+        assert 5 in {p["position_id"] for p in state.snapshot()["positions"]}
+        assert broker.fetches == seeds + 1
+    finally:
+        worker.stop()
+
+
+def test_worker_drift_check_corrects_a_missed_event(broker, state):
+    state.seed()
+    checked = threading.Event()
+    check_drift = state.check_drift
+
+    def check_and_signal():
+        report = check_drift()
+        checked.set()
+        return report
+
+    state.check_drift = check_and_signal
+    del broker.positions[1]
+    worker = AccountSyncWorker(state, poll_interval=0.01, drift_interval=0.01)
+    worker.start()
+    try:
+        assert checked.wait(2)
+    finally:
+        worker.stop()
+    assert state.snapshot()["positions"] == []
+    assert state.counters["drifted"] >= 1
@@ -0,0 +1,90 @@
+# tests/test_app.py
+import os
+
+import pytest
+
+import stub_broker
+
+stub_broker.install()
+os.environ.setdefault("MT5_LOGIN", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+from broker_connection import BrokerUnavailable  # noqa: E402
+
+client = TestClient(app.app)
+
+
+@pytest.fixture
+def broker_down(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise BrokerUnavailable("mt5 is disconnected")
+
+    monkeypatch.setattr(app.ohlc_flight, "fetch", unavailable)
+    monkeypatch.setattr(app.rates_flight, "fetch", unavailable)
+    monkeypatch.setattr(app, "levels_fed_at", {})
+
+
+@pytest.mark.parametrize("method,path,kwargs", [
+    ("post", "/analyze", {"json": {"symbol": "EURUSD", "live": True}}),
+    ("get", "/levels", {"params": {"symbol": "EURUSD"}}),
+    ("post", "/fetch-data", {"json": {"symbol": "EURUSD", "timeframe": "H1", "num_bars": 20}}),
+])
+def test_disconnected_broker_is_503(broker_down, method, path, kwargs):
+    response = getattr(client, method)(path, **kwargs)
+    assert response.status_code == 503
+    assert "disconnected" in response.json()["detail"]
+
+
+def test_unparseable_timeframe_is_422():
+    response = client.post("/fetch-data", json={"symbol": "EURUSD", "timeframe": "X7", "num_bars": 20})
+    assert response.status_code == 422
+
+
+def test_derived_timeframe_is_served():
+    response = client.post("/fetch-data", json={"symbol": "EURUSD", "timeframe": "H2", "num_bars": 20})
+    assert response.status_code == 200
+    assert len(response.json()["ohlc"]) == 20
+
+
+@pytest.mark.parametrize("path", ["/zones", "/events"])
+def test_price_without_pips_is_422(path):
+    response = client.get(path, params={"symbol": "EURUSD", "tf": "H1", "price": 1.1})
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def level_fetches(monkeypatch):
+    fetched = []
+    fetch_ohlc = app.fetch_ohlc
+
+    async def recording(symbol, tf, n):
+        fetched.append((tf, n))
+        return await fetch_ohlc(symbol, tf, n)
+
+    monkeypatch.setattr(app, "fetch_ohlc", recording)
+    monkeypatch.setattr(app, "levels_fed_at", {})
+    monkeypatch.setattr(app, "level_engine", app.LevelEngine(bar_windows=(20,)))
+    return fetched
+
+
+def test_levels_fetch_only_new_bars_after_the_first_call(monkeypatch, level_fetches):
+    monkeypatch.setattr(app, "LEVEL_REFRESH_SECONDS", 0)
+    first = client.get("/levels", params={"symbol": "EURUSD"})
+    assert first.status_code == 200
+    assert sorted(level_fetches) == [("D1", 60), ("H1", 50), ("M15", 100)]
+    assert set(first.json()["rolling"]) == {"D1", "H1", "M15"}
+
+    level_fetches.clear()
+    assert client.get("/levels", params={"symbol": "EURUSD"}).status_code == 200
+    assert sorted(level_fetches) == [("D1", 2), ("H1", 2), ("M15", 2)]
+
+
+def test_levels_within_refresh_interval_fetch_nothing(monkeypatch, level_fetches):
+    monkeypatch.setattr(app, "LEVEL_REFRESH_SECONDS", 60)
+    client.get("/levels", params={"symbol": "EURUSD"})
+    level_fetches.clear()
+    response = client.get("/levels", params={"symbol": "EURUSD"})
+    assert response.status_code == 200 and response.json()["previous_day"]
+    assert level_fetches == []
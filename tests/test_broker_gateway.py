@@ -0,0 +1,135 @@
+# tests/test_broker_gateway.py
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import stub_broker
+from broker_gateway import BrokerGateway, GatewayClient, GatewayError, GatewayUnavailable
+from scheduler import WARMUP, prioritized
+
+
+class SlowBroker:
+    """get_rates blocks until `release` is set, so tests can hold a call in flight."""
+
+    symbol_name_to_id = {"EURUSD": "EURUSD"}
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def get_rates(self, symbol, tf, n):
+        self.calls.append((symbol, tf, n))
+        self.release.wait(5)
+        return stub_broker.synthetic_rates(n, end_time=1_717_200_000)
+
+    def get_account_info(self):
+        raise ConnectionError("terminal disconnected")
+
+    def get_symbol_specs(self):
+        raise KeyError("specs")
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    broker = SlowBroker()
+    path = str(tmp_path / "gw.sock")
+    gw = BrokerGateway(broker, path)
+    stop = threading.Event()
+
+    async def serve_until_stopped():
+        serving = asyncio.ensure_future(gw.serve())
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        serving.cancel()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve_until_stopped(),), daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while not gw.counters["clients"] and time.time() < deadline:
+        try:
+            GatewayClient(path).call("ping")
+            break
+        except OSError:
+            time.sleep(0.01)
+    yield gw, broker, path
+    broker.release.set()
+    stop.set()
+    thread.join(5)
+
+
+def _in_thread(fn):
+    out = {}
+
+    def run():
+        try:
+            out["result"] = fn()
+        except Exception as e:
+            out["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, out
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _background_rates(client):
+    with prioritized(WARMUP):
+        return client.call("get_rates", symbol="EURUSD", tf="H1", n=50)
+
+
+def test_interactive_call_does_not_join_a_background_flight(gateway):
+    gw, broker, path = gateway
+    client = GatewayClient(path)
+    background, _ = _in_thread(lambda: _background_rates(client))
+    _wait_for(lambda: len(broker.calls) == 1)
+
+    interactive, out = _in_thread(lambda: client.call("get_rates", symbol="EURUSD", tf="H1", n=50))
+    _wait_for(lambda: len(broker.calls) == 2)          # its own terminal call, not a wait on the WARMUP one
+    broker.release.set()
+    interactive.join(5)
+    background.join(5)
+    assert len(out["result"]) == 50
+    assert gw.counters["coalesced"] == 0
+
+
+def test_background_call_joins_an_interactive_flight(gateway):
+    gw, broker, path = gateway
+    client = GatewayClient(path)
+    interactive, out = _in_thread(lambda: client.call("get_rates", symbol="EURUSD", tf="H1", n=50))
+    _wait_for(lambda: len(broker.calls) == 1)
+    background, joined = _in_thread(lambda: _background_rates(client))
+    _wait_for(lambda: gw.counters["coalesced"] == 1)
+    broker.release.set()
+    interactive.join(5)
+    background.join(5)
+    assert len(broker.calls) == 1
+    np.testing.assert_array_equal(out["result"], joined["result"])
+
+
+def test_timed_out_call_leaves_nothing_pending(gateway):
+    gw, broker, path = gateway
+    client = GatewayClient(path, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        client.call("get_rates", symbol="EURUSD", tf="H1", n=10)
+    assert client._pending == {}
+    broker.release.set()
+    assert len(client.call("get_rates", symbol="EURUSD", tf="H1", n=10)) == 10
+
+
+def test_disconnected_broker_is_a_connection_error(gateway):
+    _, _, path = gateway
+    client = GatewayClient(path)
+    with pytest.raises(GatewayUnavailable) as info:
+        client.call("get_account_info")
+    assert isinstance(info.value, ConnectionError)
+    with pytest.raises(GatewayError) as info:
+        client.call("get_symbol_specs")
+    assert not isinstance(info.value, ConnectionError)
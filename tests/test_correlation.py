@@ -0,0 +1,70 @@
+# tests/test_correlation.py
+import numpy as np
+import pytest
+
+from correlation import RollingCorrelation
+from stub_broker import synthetic_rates
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY"]
+END = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture(scope="module")
+def rates():
+    return {
+        s: synthetic_rates(400, seed=i, price=p, step_seconds=3600, end_time=END)
+        for i, (s, p) in enumerate(zip(SYMBOLS, (1.10, 1.27, 150.0)))
+    }
+
+
+def _feed(matrix, rates, end):
+    """Feed bars [0, end] with bar `end` still forming."""
+    return matrix.update({s: r[:end + 1] for s, r in rates.items()})
+
+
+def _expected(rates, end, window):
+    closes = np.column_stack([rates[s]["close"][:end] for s in SYMBOLS])
+    returns = np.diff(np.log(closes), axis=0)[-window:]
+    return np.cov(returns, rowvar=False), np.corrcoef(returns, rowvar=False), len(returns)
+
+
+def _assert_matches(matrix, rates, end):
+    cov, corr, count = _expected(rates, end, matrix.window)
+    assert matrix.count == count
+    np.testing.assert_allclose(matrix.covariance(), cov, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(matrix.correlation(), corr, rtol=1e-9, atol=1e-12)
+
+
+def test_window_not_yet_full(rates):
+    matrix = RollingCorrelation(SYMBOLS, window=50)
+    _feed(matrix, rates, 20)
+    _assert_matches(matrix, rates, 20)
+    _feed(matrix, rates, 35)
+    _assert_matches(matrix, rates, 35)
+
+
+def test_incremental_updates_wrap_around_the_ring(rates):
+    matrix = RollingCorrelation(SYMBOLS, window=50)
+    end = 10
+    _feed(matrix, rates, end)
+    for step in (7, 1, 13, 49, 2, 30, 1, 50, 3, 29):
+        end += step
+        assert _feed(matrix, rates, end) == step
+        _assert_matches(matrix, rates, end)
+    assert matrix.counters["rebuilds"] >= 2
+
+
+def test_more_new_bars_than_the_window(rates):
+    matrix = RollingCorrelation(SYMBOLS, window=50)
+    _feed(matrix, rates, 30)
+    assert _feed(matrix, rates, 300) == 270
+    _assert_matches(matrix, rates, 300)
+    _feed(matrix, rates, 305)
+    _assert_matches(matrix, rates, 305)
+
+
+def test_missing_series_adds_nothing(rates):
+    matrix = RollingCorrelation(SYMBOLS, window=50)
+    _feed(matrix, rates, 100)
+    assert matrix.update({**{s: r[:120] for s, r in rates.items()}, "USDJPY": None}) == 0
+    _assert_matches(matrix, rates, 100)
@@ -0,0 +1,79 @@
+# tests/test_event_index.py
+import numpy as np
+import pytest
+
+from event_index import KINDS, build_events, pip_size
+from stub_broker import synthetic_rates
+
+END = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture(scope="module")
+def bars():
+    return synthetic_rates(2000, seed=5, price=1.10, step_seconds=3600, end_time=END)
+
+
+@pytest.fixture(scope="module")
+def index(bars):
+    return build_events(bars)
+
+
+def _first(bars, start, hit):
+    for j in range(start, len(bars)):
+        if hit(bars[j]):
+            return int(bars[j]["time"])
+    return None
+
+
+def test_touch_and_fill_times_match_a_scan(bars, index):
+    events = index.query(limit=len(index))
+    assert len(events) == len(index) and set(index.counts()) == set(KINDS)
+    times = {int(t): i for i, t in enumerate(bars["time"])}
+    for e in events[::7]:
+        after = times[e["confirmed_at"]] + 1
+        if e["direction"] == "bullish":
+            touched = _first(bars, after, lambda b: b["low"] <= e["high"])
+            filled = _first(bars, after, lambda b: b["low"] <= e["low"])
+        else:
+            touched = _first(bars, after, lambda b: b["high"] >= e["low"])
+            filled = _first(bars, after, lambda b: b["high"] >= e["high"])
+        assert (e["touched_at"], e["filled_at"]) == (touched, filled), e
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_near_queries_match_a_scan(bars, index, kind):
+    everything = index.query(kind=kind, limit=len(index))
+    for near in np.linspace(bars["low"].min(), bars["high"].max(), 9):
+        distance = 0.0015
+        expected = [e for e in everything if e["low"] <= near + distance and e["high"] >= near - distance]
+        assert index.query(kind=kind, near=near, distance=distance, limit=len(index)) == expected
+
+
+def test_filters_and_order(index):
+    unfilled = index.query(kind=["ob", "fvg"], direction=1, status="unfilled", limit=len(index))
+    assert unfilled
+    assert all(e["kind"] in ("ob", "fvg") and e["direction"] == "bullish" and e["filled_at"] is None
+               for e in unfilled)
+    times = [e["time"] for e in unfilled]
+    assert times == sorted(times, reverse=True)
+    assert len(index.query(limit=3)) == 3
+
+
+def test_status_as_of_an_earlier_time(bars, index):
+    filled = [e for e in index.query(kind="fvg", status="filled", limit=len(index))
+              if e["filled_at"] > e["confirmed_at"]]
+    e = filled[0]
+    as_of = e["filled_at"] - 3600
+    unfilled_then = index.query(kind="fvg", status="unfilled", as_of=as_of, start=e["time"], end=e["time"])
+    assert any(u["low"] == e["low"] and u["filled_at"] is None for u in unfilled_then)
+    # events confirmed after as_of do not exist yet
+    assert all(u["confirmed_at"] <= as_of for u in index.query(as_of=as_of, limit=len(index)))
+
+
+def test_pip_size():
+    assert pip_size("EURUSD", 5) == pytest.approx(0.0001)
+    assert pip_size("USDJPY", 3) == pytest.approx(0.01)
+    assert pip_size("US30", 2) == pytest.approx(0.01)
+    assert pip_size("USDJPY") == 0.01
+    assert pip_size("XAUUSD") == 0.1
+    assert pip_size("EURUSD") == 0.0001
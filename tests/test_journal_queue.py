@@ -0,0 +1,99 @@
+# tests/test_journal_queue.py
+import pytest
+
+from journal_queue import JournalQueue, NotionJournalWorker
+
+
+class NotionError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JournalQueue(str(tmp_path / "journal.db"))
+    yield q
+    q.close()
+
+
+def _worker(queue, send, **kwargs):
+    kwargs.setdefault("rate_per_sec", 1e6)
+    return NotionJournalWorker(queue, send, **kwargs)
+
+
+def _pending_ids(queue):
+    return [row_id for row_id, _, _ in queue.due(100, now=float("inf"))]
+
+
+def test_rows_survive_a_restart_in_order(tmp_path):
+    path = str(tmp_path / "journal.db")
+    q = JournalQueue(path)
+    ids = [q.enqueue({"n": n}) for n in range(3)]
+    q.close()
+    q = JournalQueue(path)
+    assert [(row_id, payload["n"]) for row_id, payload, _ in q.due(10)] == list(zip(ids, range(3)))
+    q.close()
+
+
+def test_delivered_rows_are_acked_even_if_the_batch_then_fails(queue):
+    for n in range(3):
+        queue.enqueue({"n": n})
+    failing = queue.enqueue({"n": "fails"})
+    sent = []
+
+    def send(payload):
+        if payload["n"] == "fails":
+            raise NotionError(500)
+        sent.append(payload["n"])
+
+    def broken_retry(*args):
+        raise RuntimeError("database is locked")
+
+    queue.retry = broken_retry
+    with pytest.raises(RuntimeError):
+        _worker(queue, send).drain_once()
+    assert sent == [0, 1, 2]
+    # the pages Notion accepted are not sent again; only the failing row is left
+    assert _pending_ids(queue) == [failing]
+
+
+def test_transient_errors_back_off_then_permanent_ones_are_buried(queue):
+    retried = queue.enqueue({"n": "retry"})
+    buried = queue.enqueue({"n": "bad request"})
+
+    def send(payload):
+        raise NotionError(503 if payload["n"] == "retry" else 400)
+
+    worker = _worker(queue, send, base_backoff=60)
+    assert worker.drain_once() == 0
+    assert queue.due(10) == []                          # the retry is scheduled in the future
+    assert _pending_ids(queue) == [retried]
+    assert queue.stats()["dead"] == 1 and buried not in _pending_ids(queue)
+
+
+def test_rows_die_after_max_attempts(queue):
+    queue.enqueue({"n": 1})
+    worker = _worker(queue, lambda p: (_ for _ in ()).throw(NotionError(502)), base_backoff=0, max_backoff=0,
+                     max_attempts=3)
+    for _ in range(3):
+        worker.drain_once()
+    assert queue.stats() == {"pending": 0, "dead": 1, "oldest_pending_age": None}
+
+
+def test_rate_limit_pauses_the_worker_and_keeps_the_row(queue):
+    first = queue.enqueue({"n": 1})
+    queue.enqueue({"n": 2})
+    calls = []
+
+    def send(payload):
+        calls.append(payload["n"])
+        raise NotionError(429, {"Retry-After": "30"})
+
+    worker = _worker(queue, send)
+    assert worker.drain_once() == 0
+    assert calls == [1]                                 # the rest of the batch waits too
+    assert worker.drain_once() == 0 and calls == [1]    # still paused
+    row = [r for r in queue.due(10, now=float("inf")) if r[0] == first][0]
+    assert row[2] == 0                                  # a 429 does not count as an attempt
@@ -0,0 +1,83 @@
+# tests/test_levels.py
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from levels import LevelEngine, RollingExtrema
+
+
+def _candles(n, seed=0, step=timedelta(hours=1)):
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 3, 4, tzinfo=timezone.utc)
+    mid = 1.1 + np.cumsum(rng.normal(0, 0.001, n))
+    spread = rng.uniform(0.0001, 0.002, n)
+    return [
+        {"time": (start + i * step).isoformat(), "high": float(m + s), "low": float(m - s)}
+        for i, (m, s) in enumerate(zip(mid, spread))
+    ]
+
+
+@pytest.mark.parametrize("window", [1, 3, 20, 500])
+def test_rolling_extrema_matches_brute_force(window):
+    rng = np.random.default_rng(window)
+    highs = rng.normal(0, 1, 300)
+    lows = highs - rng.uniform(0, 1, 300)
+    extrema = RollingExtrema(window)
+    assert extrema.max() is None and extrema.min() is None
+    for i, (h, lo) in enumerate(zip(highs, lows)):
+        extrema.push(h, lo)
+        start = max(0, i + 1 - window)
+        assert extrema.max() == highs[start:i + 1].max()
+        assert extrema.min() == lows[start:i + 1].min()
+        assert len(extrema) == i + 1 - start
+
+
+def test_rolling_windows_take_each_closed_bar_once():
+    candles = _candles(200)
+    engine = LevelEngine(bar_windows=(5, 50))
+    end = 0
+    for size in (60, 4, 1, 30, 2, 90):
+        end = min(end + size, len(candles))
+        # overlap the previous feed and send the newest bar as still forming
+        batch = [dict(c) for c in candles[max(0, end - size - 3):end]]
+        batch[-1]["high"] += 1.0
+        batch[-1]["low"] -= 1.0
+        engine.update("EURUSD", batch, "H1")
+
+        closed = candles[:end - 1]
+        rolling = engine.snapshot("EURUSD")["rolling"]["H1"]
+        for w in (5, 50):
+            last = closed[-w:]
+            assert rolling[f"{w}_bars"] == {
+                "high": max(c["high"] for c in last),
+                "low": min(c["low"] for c in last),
+                "bars": len(last),
+            }
+    assert engine.last_bar("eurusd", "h1") == datetime.fromisoformat(candles[end - 1]["time"])
+
+
+def test_closed_batches_push_their_last_bar():
+    candles = _candles(30)
+    engine = LevelEngine(bar_windows=(10,))
+    engine.update("EURUSD", candles, "H1", closed=True)
+    rolling = engine.snapshot("EURUSD")["rolling"]["H1"]["10_bars"]
+    assert rolling["high"] == max(c["high"] for c in candles[-10:])
+    assert rolling["bars"] == 10
+
+
+def test_n_day_matches_brute_force():
+    candles = _candles(24 * 30, seed=1)
+    engine = LevelEngine()
+    engine.update("EURUSD", candles, "H1")
+    days = {}
+    for c in candles:
+        day = c["time"][:10]
+        high, low = days.get(day, (-np.inf, np.inf))
+        days[day] = (max(high, c["high"]), min(low, c["low"]))
+    completed = [days[d] for d in sorted(days)][:-1]
+    for n in (1, 5, 20):
+        assert engine.n_day("EURUSD", n) == (
+            max(h for h, _ in completed[-n:]), min(lo for _, lo in completed[-n:]),
+        )
+    assert engine.previous_day("EURUSD") == completed[-1]
@@ -0,0 +1,89 @@
+# tests/test_resample.py
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import resample
+import stub_broker
+
+DAY = 86400
+
+
+def _broker_bars(base, seconds, offset_hours=0, weekly=False):
+    """The broker's own bars, built bar by bar: buckets of `seconds` from the shifted epoch."""
+    buckets = OrderedDict()
+    shift = int(offset_hours * 3600)
+    for row in base:
+        t = int(row["time"]) + shift
+        if weekly:
+            t -= 4 * DAY                       # weeks start on Monday (1970-01-05)
+        start = t - t % seconds - shift + (4 * DAY if weekly else 0)
+        bars = buckets.setdefault(start, [])
+        bars.append(row)
+    out = np.empty(len(buckets), dtype=resample.BAR_DTYPE)
+    for i, (start, rows) in enumerate(buckets.items()):
+        out[i] = (start, rows[0]["open"], max(r["high"] for r in rows), min(r["low"] for r in rows),
+                  rows[-1]["close"], sum(int(r["tick_volume"]) for r in rows))
+    return out
+
+
+@pytest.fixture(scope="module")
+def m5():
+    rates = stub_broker.synthetic_rates(6000, seed=7, step_seconds=300, end_time=1_717_200_000)
+    # a weekend with no bars, as the broker sends them
+    weekend = (rates["time"] >= 1_716_500_000) & (rates["time"] < 1_716_500_000 + 2 * DAY)
+    return rates[~weekend]
+
+
+@pytest.mark.parametrize("tf,seconds,offset", [("M15", 900, 0), ("H1", 3600, 0), ("H4", 14400, 2), ("D1", DAY, 2), ("D1", DAY, -3)])
+def test_derived_bars_agree_with_broker_bars(m5, tf, seconds, offset):
+    broker = _broker_bars(m5, seconds, offset)
+    derived = resample.resample(m5, tf, day_offset_hours=offset)
+    np.testing.assert_array_equal(derived, broker)
+    result = resample.agreement(derived, broker)
+    assert result["mismatched"] == result["only_derived"] == result["only_broker"] == 0
+    assert result["shared"] == len(broker)
+
+
+def test_weekly_buckets_start_on_monday(m5):
+    derived = resample.resample(m5, "W1")
+    np.testing.assert_array_equal(derived, _broker_bars(m5, 7 * DAY, weekly=True))
+    assert all((t // DAY - 4) % 7 == 0 for t in derived["time"].tolist())
+
+
+def test_agreement_flags_a_wrong_day_offset(m5):
+    broker = _broker_bars(m5, DAY, offset_hours=2)
+    result = resample.check(m5, broker, "D1", day_offset_hours=0)
+    assert not result["agrees"]
+    assert result["shared"] == 0 and result["only_derived"] > 0 and result["only_broker"] > 0
+    assert resample.check(m5, broker, "D1", day_offset_hours=2)["agrees"]
+
+
+def test_check_ignores_partial_edge_bars(m5):
+    broker = _broker_bars(m5, 3600)
+    base = m5[3:-2]                             # starts and ends mid-hour
+    result = resample.check(base, broker, "H1")
+    assert result["agrees"]
+    assert result["shared"] == len(resample.resample(base, "H1")) - 2
+
+
+def test_agreement_counts_one_sided_bars(m5):
+    broker = _broker_bars(m5, 3600)
+    derived = resample.resample(m5, "H1")
+    broker = np.delete(broker, [5, 6])
+    broker["close"][10] += 1e-4
+    result = resample.agreement(derived, broker)
+    assert result == {
+        "shared": len(broker), "mismatched": 1, "mismatched_times": [int(broker["time"][10])],
+        "only_derived": 2, "only_broker": 0,
+    }
+
+
+def test_base_for_and_parse_timeframe():
+    assert resample.base_for("H2") == "M5"
+    assert resample.base_for("M3") == "M1"
+    assert resample.parse_timeframe("w1") == 7 * DAY
+    for bad in ("X1", "M0", "H"):
+        with pytest.raises(ValueError):
+            resample.parse_timeframe(bad)
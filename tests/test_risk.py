@@ -0,0 +1,76 @@
+# tests/test_risk.py
+import math
+
+import numpy as np
+import pytest
+
+from risk import RiskEngine
+from stub_broker import synthetic_rates
+
+POSITIONS = [
+    {"symbol_name": "EURUSD", "direction": "buy", "volume_lots": 1.0},
+    {"symbol_name": "GBPUSD", "direction": "sell", "volume_lots": 0.5},
+    {"symbol_name": "USDJPY", "direction": "buy", "volume_lots": 0.3},
+    {"symbol_name": "EURUSD", "direction": "buy", "volume_lots": 0.2},
+]
+
+
+@pytest.fixture
+def engine():
+    engine = RiskEngine(account_currency="USD", confidence=0.99, horizon_bars=4, leverage=100)
+    engine.update_market({
+        "EURUSD": synthetic_rates(300, seed=1, price=1.10, end_time=1_700_000_000),
+        "GBPUSD": synthetic_rates(300, seed=2, price=1.27, end_time=1_700_000_000),
+        "USDJPY": synthetic_rates(300, seed=3, price=150.0, digits=3, end_time=1_700_000_000),
+    })
+    engine.set_positions(POSITIONS)
+    return engine
+
+
+def _full_var(engine, notional):
+    return engine.z * math.sqrt(float(notional @ engine.cov @ notional) * engine.horizon)
+
+
+def _full_margin(engine, lots):
+    return float(np.abs(lots) @ engine.lot_value) / engine.leverage
+
+
+@pytest.mark.parametrize("symbol,side,lots", [
+    ("EURUSD", "BUY", 0.7),
+    ("EURUSD", "SELL", 3.0),      # flips the net position
+    ("GBPUSD", "BUY", 0.5),       # closes it
+    ("USDJPY", "SELL", 1.1),
+])
+def test_check_matches_full_recompute(engine, symbol, side, lots):
+    k = engine.symbols.index(symbol)
+    after = engine.lots.copy()
+    after[k] += lots if side == "BUY" else -lots
+
+    result = engine.check(symbol, side, lots, equity=50_000)
+    assert result["var_before"] == pytest.approx(_full_var(engine, engine.notional), abs=0.01)
+    assert result["var_after"] == pytest.approx(_full_var(engine, after * engine.lot_value), abs=0.01)
+    assert result["margin_after"] == pytest.approx(_full_margin(engine, after), abs=0.01)
+
+
+def test_exposure_margin_uses_net_lots(engine):
+    exposure = engine.exposure()
+    assert exposure["symbols"]["EURUSD"]["lots"] == pytest.approx(1.2)
+    assert exposure["margin"] == pytest.approx(_full_margin(engine, engine.lots), abs=0.01)
+    # 1 lot of USDJPY is 100,000 USD: 1,000 USD of margin at 1:100
+    usdjpy = engine.symbols.index("USDJPY")
+    assert engine.lot_value[usdjpy] / engine.leverage == pytest.approx(1_000)
+
+
+def test_margin_limit(engine):
+    engine.limits["max_margin_pct"] = 10
+    assert engine.check("EURUSD", "BUY", 0.1, equity=50_000)["allowed"]
+    result = engine.check("EURUSD", "BUY", 50, equity=50_000)
+    assert not result["allowed"]
+    assert any("Margin" in v for v in result["violations"])
+
+
+def test_no_leverage_no_margin(engine):
+    engine.leverage = None
+    engine.set_positions(POSITIONS)
+    assert engine.exposure()["margin"] is None
+    assert engine.check("EURUSD", "BUY", 1, equity=50_000)["margin_after"] is None
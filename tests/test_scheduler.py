@@ -0,0 +1,103 @@
+# tests/test_scheduler.py
+import threading
+import time
+
+from scheduler import BARS, ORDER, POSITIONS, WARMUP, BrokerScheduler, effective_priority, prioritized
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiters_are_admitted_by_priority_class():
+    scheduler = BrokerScheduler("test", max_inflight=1)
+    admitted = []
+    release = threading.Event()
+
+    def blocker():
+        with scheduler.slot(BARS):
+            release.wait(2)
+
+    def call(priority):
+        with scheduler.slot(priority):
+            admitted.append(priority)
+
+    holder = threading.Thread(target=blocker)
+    holder.start()
+    _wait_until(lambda: scheduler.stats()["inflight"] == 1)
+    waiters = []
+    for priority in (WARMUP, BARS, WARMUP, ORDER, POSITIONS):
+        t = threading.Thread(target=call, args=(priority,))
+        t.start()
+        waiters.append(t)
+        _wait_until(lambda: sum(scheduler.stats()["queued"].values()) == len(waiters))
+    release.set()
+    for t in [holder] + waiters:
+        t.join(2)
+    # strictly by class; first come first served within one
+    assert admitted == [ORDER, POSITIONS, BARS, WARMUP, WARMUP]
+
+
+def test_prioritized_overrides_the_default_class():
+    scheduler = BrokerScheduler("test")
+    with prioritized(WARMUP):
+        assert effective_priority(ORDER) == WARMUP
+        with scheduler.slot(ORDER):
+            pass
+    assert effective_priority(ORDER) == ORDER
+    assert scheduler.stats()["admitted"]["warmup"] == 1
+    assert scheduler.stats()["admitted"]["order"] == 0
+
+
+def test_nested_slots_pass_through():
+    scheduler = BrokerScheduler("test", max_inflight=1)
+    with scheduler.slot(BARS):
+        with scheduler.slot(POSITIONS):
+            assert scheduler.stats()["inflight"] == 1
+    assert scheduler.stats()["admitted"]["positions"] == 0
+
+
+def test_immediate_never_queues():
+    scheduler = BrokerScheduler("test", max_inflight=1)
+    with scheduler.immediate() as admitted:
+        assert admitted
+        with scheduler.immediate() as nested:
+            assert nested            # same thread, already holds the slot
+
+    inside = threading.Event()
+    release = threading.Event()
+
+    def busy():
+        with scheduler.slot(BARS):
+            inside.set()
+            release.wait(2)
+
+    t = threading.Thread(target=busy)
+    t.start()
+    assert inside.wait(2)
+    started = time.monotonic()
+    with scheduler.immediate() as admitted:
+        assert not admitted
+    assert time.monotonic() - started < 0.1
+    release.set()
+    t.join(2)
+    assert scheduler.stats()["inflight"] == 0
+
+
+def test_reserve_is_kept_for_orders():
+    scheduler = BrokerScheduler("test", rate=5, burst=3, reserve=2)
+    with scheduler.slot(BARS):
+        pass
+    # two tokens left: all reserved, so orders go straight through...
+    started = time.monotonic()
+    with scheduler.slot(ORDER):
+        pass
+    assert time.monotonic() - started < 0.05
+    # ...while bars wait for the bucket to refill above the reserve
+    started = time.monotonic()
+    with scheduler.slot(BARS):
+        pass
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,121 @@
+# tests/test_shared_bars.py
+import os
+import sys
+import threading
+import types
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import shared_bars
+import stub_broker
+from resample import as_bars
+from shared_bars import BarRing, SharedBars, segment_name
+
+
+@pytest.fixture(autouse=True)
+def same_process_attach(monkeypatch):
+    # feeder and reader share this process, so the reader must not unregister
+    # the feeder's segment from the resource tracker
+    monkeypatch.setattr(shared_bars, "_attach", lambda name: shared_memory.SharedMemory(name=name))
+
+
+@pytest.fixture
+def prefix(request):
+    return f"t{os.getpid()}{abs(hash(request.node.name)) % 10**6}"
+
+
+@pytest.fixture
+def rates():
+    return stub_broker.synthetic_rates(50, step_seconds=60, end_time=1_717_200_000)
+
+
+def test_ring_merges_forming_bar_and_wraps(prefix, rates):
+    ring = BarRing.create(segment_name("EURUSD", "M1", prefix), capacity=8)
+    try:
+        assert ring.last_time() is None
+        assert ring.write(rates[:5]) == 5
+        forming = rates[4:5].copy()
+        forming["close"] += 0.001
+        assert ring.write(forming) == 0                     # same time: replaces the forming bar
+        assert ring.write(rates[:3]) == 0                   # older bars are ignored
+        np.testing.assert_array_equal(ring.latest(10), as_bars(np.concatenate([rates[:4], forming])))
+
+        assert ring.write(rates[5:30]) == 25                # wraps several times
+        assert ring.available() == 8
+        np.testing.assert_array_equal(ring.latest(8), as_bars(rates[22:30]))
+        np.testing.assert_array_equal(ring.read(3, np.array), as_bars(rates[27:30]))
+        assert ring.last_time() == int(rates["time"][29])
+    finally:
+        ring.close()
+
+
+def test_reader_sees_feeder_bars_and_rejects_short_or_stale_rings(prefix, rates):
+    ring = BarRing.create(segment_name("EURUSD", "M5", prefix), capacity=100)
+    reader = SharedBars(prefix=prefix, max_age=10)
+    try:
+        ring.write(rates)
+        np.testing.assert_array_equal(reader.read("eurusd", "m5", 20), as_bars(rates[-20:]))
+        assert reader.read("EURUSD", "M5", 51) is None
+        assert reader.read("GBPUSD", "M5", 1) is None
+        ring.header["updated"] = 0.0
+        assert reader.read("EURUSD", "M5", 20) is None
+    finally:
+        ring.close()
+
+
+def test_stale_ring_is_closed_after_its_last_reader(prefix, rates):
+    ring = BarRing.create(segment_name("EURUSD", "H1", prefix), capacity=100)
+    ring.write(rates)
+    reader = SharedBars(prefix=prefix, max_age=10)
+    reading, done = threading.Event(), threading.Event()
+    out = {}
+
+    def slow_copy(view):
+        reading.set()
+        done.wait(5)
+        return np.array(view)
+
+    thread = threading.Thread(target=lambda: out.setdefault("bars", reader.read("EURUSD", "H1", 10, slow_copy)))
+    thread.start()
+    try:
+        reading.wait(5)
+        ring.header["updated"] = 0.0                        # feeder went quiet mid-read
+        assert reader.read("EURUSD", "H1", 10) is None      # detaches the ring; must not close it under the reader
+        assert len(reader._retired) == 1
+        done.set()
+        thread.join(5)
+        assert len(out["bars"]) == 10
+        assert not reader._retired and not reader._readers
+    finally:
+        done.set()
+        ring.close()
+
+
+def test_feed_backfills_a_ring_left_empty(prefix, rates, monkeypatch):
+    calls = []
+
+    def get_rates(symbol, tf, n):
+        calls.append(n)
+        if len(calls) == 1:
+            raise ConnectionError("terminal not ready")     # initial backfill fails
+        return rates[-n:]
+
+    monkeypatch.setitem(sys.modules, "mt5_client", types.SimpleNamespace(get_rates=get_rates))
+    monkeypatch.delenv("BROKER_GATEWAY_SOCKET", raising=False)
+    reader = SharedBars(prefix=prefix)
+    seen = []
+
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds):
+        seen.append(reader.read("EURUSD", "M1", 40))
+        raise Stop
+
+    monkeypatch.setattr(shared_bars.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        shared_bars.feed(["EURUSD"], ["M1"], {"M1": 40}, prefix=prefix, poll_bars=3)
+    assert calls == [40, 3, 40]
+    np.testing.assert_array_equal(seen[0], as_bars(rates[-40:]))
@@ -0,0 +1,119 @@
+# tests/test_singleflight.py
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Fetcher:
+    """Blocking fetch that holds every call until released."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.release = threading.Event()
+        self.fail = fail
+
+    def __call__(self, symbol, tf, depth):
+        self.calls.append((symbol, tf, depth))
+        self.release.wait(2)
+        if self.fail:
+            raise RuntimeError("broker error")
+        return list(range(depth))
+
+
+def _flight(fetch):
+    return SingleFlight(fetch, lambda key, result, depth: result[-depth:], name="test")
+
+
+async def _started(fetch, count=1):
+    while len(fetch.calls) < count:
+        await asyncio.sleep(0.001)
+
+
+def test_identical_requests_share_one_fetch():
+    async def main():
+        fetch = Fetcher()
+        flight = _flight(fetch)
+        tasks = [asyncio.ensure_future(flight.get(("EURUSD", "H1"), 50)) for _ in range(5)]
+        await _started(fetch)
+        fetch.release.set()
+        results = await asyncio.gather(*tasks)
+        assert len(fetch.calls) == 1
+        assert all(r is results[0] for r in results)
+        assert flight.inflight() == 0
+
+    asyncio.run(main())
+
+
+def test_keys_match_case_insensitively_and_fetch_with_the_leaders_key():
+    async def main():
+        fetch = Fetcher()
+        flight = _flight(fetch)
+        leader = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 10))
+        await _started(fetch)
+        joined = asyncio.ensure_future(flight.get(("eurusd", "h1"), 10))
+        other = asyncio.ensure_future(flight.get(("GBPUSD", "H1"), 10))
+        await _started(fetch, 2)
+        fetch.release.set()
+        await asyncio.gather(leader, joined, other)
+        assert sorted(fetch.calls) == [("EURUSD", "H1", 10), ("GBPUSD", "H1", 10)]
+
+    asyncio.run(main())
+
+
+def test_shallower_requests_are_sliced_from_a_deeper_flight():
+    async def main():
+        fetch = Fetcher()
+        flight = _flight(fetch)
+        deep = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 100))
+        await _started(fetch)
+        shallow = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 5))
+        deeper = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 200))
+        await _started(fetch, 2)
+        fetch.release.set()
+        deep, shallow, deeper = await asyncio.gather(deep, shallow, deeper)
+        assert shallow == deep[-5:]
+        assert len(deeper) == 200
+        assert [c[2] for c in fetch.calls] == [100, 200]
+
+    asyncio.run(main())
+
+
+def test_a_failed_flight_fails_its_joiners_and_is_retired():
+    async def main():
+        fetch = Fetcher(fail=True)
+        flight = _flight(fetch)
+        tasks = [asyncio.ensure_future(flight.get(("EURUSD", "H1"), 10)) for _ in range(3)]
+        await _started(fetch)
+        fetch.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.inflight() == 0
+
+        fetch.fail = False
+        assert await flight.get(("EURUSD", "H1"), 10) == list(range(10))
+        assert len(fetch.calls) == 2
+
+    asyncio.run(main())
+
+
+def test_a_cancelled_leader_leaves_the_flight_joinable():
+    async def main():
+        fetch = Fetcher()
+        flight = _flight(fetch)
+        leader = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 10))
+        await _started(fetch)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert flight.inflight() == 1
+        joined = asyncio.ensure_future(flight.get(("EURUSD", "H1"), 10))
+        await asyncio.sleep(0.01)
+        fetch.release.set()
+        assert await joined == list(range(10))
+        assert len(fetch.calls) == 1
+        assert flight.inflight() == 0
+
+    asyncio.run(main())
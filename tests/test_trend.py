@@ -0,0 +1,116 @@
+# tests/test_trend.py
+import numpy as np
+import pytest
+
+from trend import RollingTrend, TrendBook, ols_trend, rank_trend_strength, rolling_trend
+
+
+def _walk(n, seed=0, start=1.1):
+    rng = np.random.default_rng(seed)
+    return start + np.cumsum(rng.normal(0, 1e-3, n))
+
+
+def _reference(y):
+    x = np.arange(len(y))
+    return np.polyfit(x, y, 1)[0], np.corrcoef(x, y)[0, 1]
+
+
+def test_ols_trend_matches_polyfit():
+    y = _walk(300)
+    slope, r = ols_trend(y)
+    ref_slope, ref_r = _reference(y)
+    assert slope == pytest.approx(ref_slope, rel=1e-9)
+    assert r == pytest.approx(ref_r, rel=1e-9)
+
+
+def test_rolling_trend_matches_polyfit_for_every_window_and_symbol():
+    closes = np.stack([_walk(120, seed=s, start=p) for s, p in enumerate((1.1, 150.0, 2400.0))])
+    fits = rolling_trend(closes, [2, 10, 50, 120, 121])
+    for w in (2, 10, 50, 120):
+        slope, r = fits[w]
+        assert slope.shape == closes.shape
+        assert np.isnan(slope[:, :w - 1]).all()
+        for i in range(len(closes)):
+            for end in (w, 77, 120):
+                if end < w:
+                    continue
+                ref_slope, ref_r = _reference(closes[i, end - w:end])
+                assert slope[i, end - 1] == pytest.approx(ref_slope, rel=1e-6, abs=1e-12)
+                assert r[i, end - 1] == pytest.approx(ref_r, rel=1e-6, abs=1e-9)
+    assert np.isnan(fits[121][0]).all()          # window longer than the series
+
+
+def test_rolling_trend_keeps_1d_shape():
+    y = _walk(40)
+    slope, r = rolling_trend(y, [20])[20]
+    assert slope.shape == (40,)
+    assert slope[-1] == pytest.approx(_reference(y[-20:])[0], rel=1e-9)
+
+
+def test_rolling_trend_update_matches_polyfit_across_rebuilds():
+    y = _walk(1000, start=1800.0)
+    trend = RollingTrend(50)
+    for i, close in enumerate(y):
+        slope, r = trend.update(close)
+        if i >= 1:
+            ref_slope, ref_r = _reference(y[max(0, i - 49):i + 1])
+            assert slope == pytest.approx(ref_slope, rel=1e-6, abs=1e-12)
+            assert r == pytest.approx(ref_r, rel=1e-6, abs=1e-9)
+    assert len(trend) == 50
+    np.testing.assert_allclose(trend.closes(), y[-50:], rtol=1e-12)
+    assert trend.mean() == pytest.approx(y[-50:].mean(), rel=1e-12)
+
+
+def test_flat_window_has_zero_correlation():
+    trend = RollingTrend(5)
+    for _ in range(7):
+        slope, r = trend.update(1.25)
+    assert (slope, r) == (0.0, 0.0)
+
+
+def test_rank_trend_strength_orders_by_normalised_slope_times_r():
+    x = np.arange(60)
+    closes = {
+        "UP": 1.0 + 0.002 * x,
+        "DOWN": 100.0 - 0.05 * x,
+        "NOISE": _walk(60, seed=4),
+        "SHORT": np.ones(10),
+    }
+    ranking = rank_trend_strength(closes, window=60)
+    assert [row["symbol"] for row in ranking][:2] == ["UP", "DOWN"]
+    assert "SHORT" not in [row["symbol"] for row in ranking]
+    for row in ranking:
+        y = closes[row["symbol"]]
+        ref_slope, ref_r = _reference(y)
+        assert row["score"] == pytest.approx(ref_slope / y.mean() * abs(ref_r), rel=1e-6, abs=1e-12)
+
+
+def test_trend_book_updates_incrementally_and_ranks_like_a_refit():
+    times = np.arange(400) * 3600
+    closes = {s: _walk(400, seed=i, start=p) for i, (s, p) in enumerate((("EURUSD", 1.1), ("USDJPY", 150.0), ("XAUUSD", 2400.0)))}
+    book = TrendBook()
+    for s, y in closes.items():
+        assert book.update(s, "H1", 100, times[:250], y[:250]) == 100
+        # overlapping fetches only push the bars after the last one seen
+        assert book.update(s, "h1", 100, times[240:300], y[240:300]) == 50
+        assert book.update(s, "H1", 100, times[290:], y[290:]) == 100
+    assert book.last_time("eurusd", "H1", 100) == times[-1]
+
+    expected = rank_trend_strength({s: y for s, y in closes.items()}, window=100)
+    ranked = book.rank("H1", 100, list(closes))
+    assert [row["symbol"] for row in ranked] == [row["symbol"] for row in expected]
+    for got, want in zip(ranked, expected):
+        assert got["score"] == pytest.approx(want["score"], rel=1e-6)
+    np.testing.assert_allclose(book.closes("H1", 100, ["USDJPY"])[0], closes["USDJPY"][-100:])
+
+
+def test_trend_book_reseeds_after_a_gap_and_skips_short_windows():
+    times = np.arange(300) * 60
+    y = _walk(300)
+    book = TrendBook()
+    book.update("EURUSD", "M1", 50, times[:100], y[:100])
+    book.update("EURUSD", "M1", 50, times[200:], y[200:])       # bars 100..199 never seen
+    np.testing.assert_allclose(book.closes("M1", 50, ["EURUSD"])[0], y[-50:])
+
+    book.update("GBPUSD", "M1", 50, times[:20], y[:20])
+    assert [row["symbol"] for row in book.rank("M1", 50, ["EURUSD", "GBPUSD"])] == ["EURUSD"]
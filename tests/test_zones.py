@@ -0,0 +1,92 @@
+# tests/test_zones.py
+import numpy as np
+import pytest
+
+from stub_broker import synthetic_rates
+from zones import ZoneTracker
+
+END = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture(scope="module")
+def bars():
+    return synthetic_rates(1500, seed=11, price=1.10, step_seconds=3600, end_time=END)
+
+
+def _bars(rows, start=END):
+    out = np.zeros(len(rows), dtype=[("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8")])
+    for i, (o, h, lo, c) in enumerate(rows):
+        out[i] = (start + i * 3600, o, h, lo, c)
+    return out
+
+
+def _without_ids(zones):
+    return [{k: v for k, v in z.items() if k != "id"} for z in zones]
+
+
+def _seeded(bars):
+    tracker = ZoneTracker()
+    tracker.seed(bars)
+    return tracker
+
+
+@pytest.mark.parametrize("split", [3, 400, 1499])
+def test_bar_by_bar_updates_match_a_vectorized_seed(bars, split):
+    incremental = _seeded(bars[:split])
+    assert incremental.update(bars[split:]) == len(bars) - split
+    expected = _seeded(bars)
+    assert expected.counters["zones"] > 50
+    got, want = _without_ids(incremental.zones()), _without_ids(expected.zones())
+    assert [(z["kind"], z["time"], z["status"], z["mitigated_at"]) for z in got] == \
+        [(z["kind"], z["time"], z["status"], z["mitigated_at"]) for z in want]
+    for g, w in zip(got, want):
+        assert g["fill"] == pytest.approx(w["fill"], abs=1e-4)
+
+
+def test_sync_skips_bars_already_seen(bars):
+    tracker = ZoneTracker()
+    assert tracker.sync(bars[:1000]) == 1000
+    assert tracker.sync(bars[900:1100]) == 100
+    assert tracker.last_time == int(bars[1099]["time"])
+    assert tracker.counters["reseeds"] == 0
+
+
+def test_sync_reseeds_across_a_gap(bars):
+    tracker = ZoneTracker()
+    tracker.sync(bars[:500])
+    tracker.sync(bars[700:1000])
+    assert tracker.counters["reseeds"] == 1
+    assert _without_ids(tracker.zones()) == _without_ids(_seeded(bars[700:1000]).zones())
+
+
+def test_bullish_order_block_mitigation():
+    tracker = ZoneTracker()
+    tracker.update(_bars([
+        (1.1010, 1.1015, 1.0990, 1.0995),   # red candle: the zone [1.0990, 1.1015]
+        (1.0995, 1.1040, 1.0994, 1.1030),   # green close above its high confirms it
+        (1.1030, 1.1060, 1.1025, 1.1050),
+    ]))
+    (zone,) = tracker.zones(kind="ob")
+    assert (zone["direction"], zone["low"], zone["high"], zone["status"]) == ("bullish", 1.0990, 1.1015, "active")
+
+    tracker.update(_bars([(1.1050, 1.1052, 1.1005, 1.1040)], start=END + 3 * 3600))   # into the zone
+    (zone,) = tracker.zones(kind="ob")
+    assert zone["status"] == "partial"
+    assert zone["fill"] == pytest.approx((1.1015 - 1.1005) / (1.1015 - 1.0990))
+    assert tracker.zones(kind="ob", near=1.1000, distance=0.0001)
+
+    tracker.update(_bars([(1.1040, 1.1041, 1.0980, 1.0985)], start=END + 4 * 3600))   # through it
+    (zone,) = tracker.zones(kind="ob")
+    assert zone["status"] == "mitigated" and zone["fill"] == 1.0
+    assert zone["mitigated_at"] == END + 4 * 3600
+    assert tracker.zones(kind="ob", status="unmitigated") == []
+    assert tracker.zones(kind="ob", start=END + 5 * 3600) == []
+
+
+def test_near_matches_a_scan(bars):
+    tracker = _seeded(bars)
+    active = [z for z in tracker.zones(status="unmitigated")]
+    for near in np.linspace(bars["low"].min(), bars["high"].max(), 15):
+        lo, hi = near - 0.002, near + 0.002
+        expected = sorted(z["id"] for z in active if z["low"] <= hi and z["high"] >= lo)
+        assert sorted(z["id"] for z in tracker.zones(near=near, distance=0.002)) == expected
@@ -0,0 +1,448 @@
+# ticks.py
+# ---------------------------------------------------------------------------
+# Tick capture and storage: MT5 ticks / cTrader spots → compressed columnar
+# blocks on disk, scanned by time range.
+#
+#   store = TickStore("tick_store", digits={"EURUSD": 5})
+#   store.append("EURUSD", get_ticks("EURUSD", start_msc, end_msc))   # MT5 copy_ticks_range
+#   store.record("EURUSD", time_msc, bid, ask)                         # one cTrader spot
+#   for chunk in store.scan("EURUSD", start_msc, end_msc): ...          # TICK_DTYPE arrays
+#   store.bars("EURUSD", "M1", start_msc, end_msc)                      # BAR_DTYPE from bids
+#   store.sweep("EURUSD", 1.0931, "above", start_msc, end_msc)         # when the level went
+#
+# One append-only file per symbol and UTC day: {dir}/{SYMBOL}/{YYYYMMDD}.ticks.
+# A block holds up to `block_ticks` ticks as three delta/varint columns
+# (time_msc, bid, and ask − bid, in fixed-point points; see columnar.py)
+# behind a header with its time range and bid range. The headers are the
+# index: a range scan decodes only the blocks that overlap it, and a sweep
+# search skips every block whose bid range cannot reach the level.
+#
+# Each symbol keeps one open block in memory, so a day of millions of ticks
+# costs block_ticks × 24 bytes of RAM plus a 48-byte header per block. Ticks
+# before the last stored millisecond are dropped on append; ticks at it are
+# kept unless a stored tick at that millisecond has the same bid/ask (matched
+# one for one, in fixed-point points). Polling copy_ticks_range from the last
+# stored time therefore neither duplicates nor loses same-millisecond ticks,
+# and a restart backfills whatever the open block held. The store has no
+# flags column, so ticks that differ only in flags are one tick here. One
+# process writes; any number read.
+
+import os
+import struct
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+import columnar
+from resample import BAR_DTYPE, resample
+
+load_dotenv()
+
+TICK_STORE_DIR = os.getenv("TICK_STORE_DIR", "tick_store")
+
+TICK_DTYPE = np.dtype([("time_msc", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+
+DAY_MS = 86_400_000
+DEFAULT_DIGITS = 5
+
+# magic, ticks, payload bytes, digits, first/last time_msc, bid min/max (fixed-point)
+_HEADER = struct.Struct("<4sIIIqqqq")
+_MAGIC = b"TCK1"
+
+Block = namedtuple("Block", "offset count length digits t_first t_last bid_min bid_max")
+
+
+def as_ticks(ticks: np.ndarray) -> np.ndarray:
+    """MT5 copy_ticks_* records (or anything with time_msc/bid/ask) → TICK_DTYPE."""
+    if ticks.dtype == TICK_DTYPE:
+        return ticks
+    out = np.empty(len(ticks), dtype=TICK_DTYPE)
+    for field in TICK_DTYPE.names:
+        out[field] = ticks[field]
+    return out
+
+
+def day_of(time_msc: int) -> str:
+    return datetime.fromtimestamp(time_msc // 1000, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class _Buffer:
+    """The open block of one symbol: preallocated columns filled up to `n`."""
+
+    def __init__(self, size: int):
+        self.ticks = np.empty(size, dtype=TICK_DTYPE)
+        self.n = 0
+        self.day = None
+
+    def view(self) -> np.ndarray:
+        return self.ticks[:self.n]
+
+
+class TickStore:
+    """
+    Args:
+        directory: Root directory of the per-symbol day files
+        digits: {symbol: price digits} or a callable symbol → digits (e.g. symbol_digits_map.get)
+        block_ticks: Ticks per compressed block (and per open in-memory block)
+    """
+
+    def __init__(self, directory: str = None, digits=None, block_ticks: int = 65536):
+        self.directory = directory or TICK_STORE_DIR
+        self.digits = digits if digits is not None else {}
+        self.block_ticks = block_ticks
+        self._buffers = {}          # {SYMBOL: _Buffer}
+        self._files = {}            # {path: (blocks, indexed bytes)}
+        self._last = {}             # {SYMBOL: last stored time_msc}
+        self._edge = {}             # {SYMBOL: Counter of (bid, ask) points stored at that time_msc}
+        self._lock = threading.RLock()
+        self.counters = {"appended": 0, "dropped": 0, "blocks_written": 0, "bytes_written": 0,
+                         "blocks_read": 0, "blocks_skipped": 0}
+
+    # ── layout ──────────────────────────────────────────────────────────────
+    def path_for(self, symbol: str, day: str) -> str:
+        return os.path.join(self.directory, symbol.upper(), f"{day}.ticks")
+
+    def days(self, symbol: str) -> list:
+        """Days (YYYYMMDD) with a file for the symbol, oldest first."""
+        folder = os.path.join(self.directory, symbol.upper())
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name[:-6] for name in os.listdir(folder) if name.endswith(".ticks"))
+
+    def _digits_for(self, symbol: str) -> int:
+        if callable(self.digits):
+            digits = self.digits(symbol)
+        else:
+            digits = self.digits.get(symbol, self.digits.get(symbol.upper()))
+        return DEFAULT_DIGITS if digits is None else int(digits)
+
+    def _blocks(self, path: str) -> tuple:
+        """(blocks, bytes covered by complete blocks); picks up blocks another process appended."""
+        with self._lock:
+            blocks, end = self._files.get(path, ([], 0))
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return [], 0
+            if size > end:
+                blocks = list(blocks)
+                with open(path, "rb") as f:
+                    f.seek(end)
+                    while end + _HEADER.size <= size:
+                        magic, count, length, digits, t0, t1, lo, hi = _HEADER.unpack(f.read(_HEADER.size))
+                        if magic != _MAGIC or end + _HEADER.size + length > size:
+                            break           # torn block being written (or lost in a crash)
+                        blocks.append(Block(end + _HEADER.size, count, length, digits, t0, t1, lo, hi))
+                        end += _HEADER.size + length
+                        f.seek(end)
+                self._files[path] = (blocks, end)
+            return blocks, end
+
+    # ── writes ──────────────────────────────────────────────────────────────
+    def last_time(self, symbol: str):
+        """time_msc of the newest stored (or buffered) tick, None when there is none."""
+        key = symbol.upper()
+        with self._lock:
+            if key not in self._last:
+                last = None
+                for day in reversed(self.days(key)):
+                    blocks, _ = self._blocks(self.path_for(key, day))
+                    if blocks:
+                        last = blocks[-1].t_last
+                        break
+                self._last[key] = last
+            return self._last[key]
+
+    def _quotes(self, key: str, ticks: np.ndarray):
+        digits = self._digits_for(key)
+        return zip(columnar.to_fixed(ticks["bid"], digits).tolist(), columnar.to_fixed(ticks["ask"], digits).tolist())
+
+    def _edge_of(self, key: str, last: int) -> Counter:
+        """Quotes stored at the last time_msc (read back once after a restart)."""
+        if key not in self._edge:
+            self._edge[key] = Counter(self._quotes(key, self.read(key, last, last + 1)))
+        return self._edge[key]
+
+    def append(self, symbol: str, ticks: np.ndarray) -> int:
+        """Store time-ordered ticks not already stored (see module comment); returns how many were kept."""
+        key = symbol.upper()
+        ticks = as_ticks(ticks)
+        with self._lock:
+            last = self.last_time(key)
+            if last is not None:
+                keep = ticks["time_msc"] > last
+                same = np.flatnonzero(ticks["time_msc"] == last)
+                if len(same):
+                    seen = Counter(self._edge_of(key, last))
+                    for i, quote in zip(same, self._quotes(key, ticks[same])):
+                        if seen[quote]:
+                            seen[quote] -= 1
+                        else:
+                            keep[i] = True
+                self.counters["dropped"] += int(len(ticks) - keep.sum())
+                ticks = ticks[keep]
+            if not len(ticks):
+                return 0
+            days = ticks["time_msc"] // DAY_MS
+            cuts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1, [len(ticks)]))
+            for a, b in zip(cuts[:-1], cuts[1:]):
+                self._put(key, ticks[a:b])
+            newest = int(ticks["time_msc"][-1])
+            at_newest = self._quotes(key, ticks[ticks["time_msc"] == newest])
+            if newest == last:
+                self._edge[key].update(at_newest)
+            else:
+                self._edge[key] = Counter(at_newest)
+            self._last[key] = newest
+            self.counters["appended"] += len(ticks)
+            return len(ticks)
+
+    def record(self, symbol: str, time_msc: int, bid: float, ask: float) -> int:
+        """One quote, e.g. a cTrader spot event."""
+        return self.append(symbol, np.array([(time_msc, bid, ask)], dtype=TICK_DTYPE))
+
+    def _put(self, key: str, ticks: np.ndarray):
+        """Ticks of a single day into the open block, writing it out whenever it fills."""
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = _Buffer(self.block_ticks)
+        day = day_of(int(ticks["time_msc"][0]))
+        if buf.n and buf.day != day:
+            self._flush(key)
+        buf.day = day
+        while len(ticks):
+            take = min(len(ticks), self.block_ticks - buf.n)
+            buf.ticks[buf.n:buf.n + take] = ticks[:take]
+            buf.n += take
+            ticks = ticks[take:]
+            if buf.n == self.block_ticks:
+                self._flush(key)
+                buf.day = day
+
+    def flush(self, symbol: str = None):
+        """Write the open block(s) out, even if not full (short blocks are fine)."""
+        with self._lock:
+            for key in ([symbol.upper()] if symbol else list(self._buffers)):
+                self._flush(key)
+
+    def _flush(self, key: str):
+        buf = self._buffers.get(key)
+        if buf is None or not buf.n:
+            return
+        ticks = buf.view()
+        digits = self._digits_for(key)
+        bid = columnar.to_fixed(ticks["bid"], digits)
+        spread = columnar.to_fixed(ticks["ask"], digits) - bid
+        payload = columnar.encode_columns([ticks["time_msc"], bid, spread])
+        header = _HEADER.pack(_MAGIC, len(ticks), len(payload), digits,
+                              int(ticks["time_msc"][0]), int(ticks["time_msc"][-1]),
+                              int(bid.min()), int(bid.max()))
+        path = self.path_for(key, buf.day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _, end = self._blocks(path)
+        with open(path, "ab") as f:
+            if f.tell() != end:
+                f.truncate(end)     # drop a block torn by a crash before appending after it
+            f.write(header + payload)
+        self._blocks(path)
+        buf.n = 0
+        self.counters["blocks_written"] += 1
+        self.counters["bytes_written"] += len(header) + len(payload)
+
+    # ── reads ───────────────────────────────────────────────────────────────
+    def _decode(self, f, block: Block) -> np.ndarray:
+        f.seek(block.offset)
+        times, bid, spread = columnar.decode_columns(f.read(block.length))
+        out = np.empty(block.count, dtype=TICK_DTYPE)
+        out["time_msc"] = times
+        out["bid"] = columnar.from_fixed(bid, block.digits)
+        out["ask"] = columnar.from_fixed(bid + spread, block.digits)
+        self.counters["blocks_read"] += 1
+        return out
+
+    def scan(self, symbol: str, start: int, end: int, keep=None):
+        """
+        Yield TICK_DTYPE chunks (one per block) with start ≤ time_msc < end, oldest first.
+
+        Args:
+            keep: Optional Block → bool, asked just before each block is decoded;
+                blocks it rejects are skipped
+        """
+        key = symbol.upper()
+        first, last = day_of(max(start, 0)), day_of(max(end - 1, 0))
+        names = set(d for d in self.days(key) if first <= d <= last)
+        buf = self._buffers.get(key)
+        if buf is not None and buf.n and first <= buf.day <= last:
+            names.add(buf.day)
+        for name in sorted(names):
+            path = self.path_for(key, name)
+            blocks, _ = self._blocks(path)
+            wanted = [b for b in blocks if b.t_last >= start and b.t_first < end]
+            self.counters["blocks_skipped"] += len(blocks) - len(wanted)
+            if wanted:
+                with open(path, "rb") as f:
+                    for block in wanted:
+                        if keep is not None and not keep(block):
+                            self.counters["blocks_skipped"] += 1
+                            continue
+                        yield _between(self._decode(f, block), start, end)
+            with self._lock:
+                buf = self._buffers.get(key)
+                pending = buf.view().copy() if buf is not None and buf.n and buf.day == name else None
+            if pending is not None:
+                chunk = _between(pending, start, end)
+                if len(chunk):
+                    yield chunk
+
+    def read(self, symbol: str, start: int, end: int, limit: int = None) -> np.ndarray:
+        """All ticks in [start, end) as one array (at most `limit`, oldest first)."""
+        parts, count = [], 0
+        for chunk in self.scan(symbol, start, end):
+            parts.append(chunk)
+            count += len(chunk)
+            if limit is not None and count >= limit:
+                break
+        ticks = np.concatenate(parts) if parts else np.empty(0, dtype=TICK_DTYPE)
+        return ticks[:limit] if limit is not None else ticks
+
+    def bars(self, symbol: str, tf: str, start: int, end: int, day_offset_hours: float = 0,
+             price: str = "bid") -> np.ndarray:
+        """BAR_DTYPE bars rebuilt from ticks (tick_volume = tick count); `price` is bid, ask or mid."""
+        parts = []
+        for chunk in self.scan(symbol, start, end):
+            p = (chunk["bid"] + chunk["ask"]) / 2 if price == "mid" else chunk[price]
+            rates = np.empty(len(chunk), dtype=BAR_DTYPE)
+            rates["time"] = chunk["time_msc"] // 1000
+            rates["open"] = rates["high"] = rates["low"] = rates["close"] = p
+            rates["tick_volume"] = 1
+            parts.append(resample(rates, tf, day_offset_hours))
+        if not parts:
+            return np.empty(0, dtype=BAR_DTYPE)
+        # bars split across blocks merge the same way base bars do
+        return resample(np.concatenate(parts), tf, day_offset_hours)
+
+    def sweep(self, symbol: str, level: float, side: str, start: int, end: int):
+        """
+        First bid crossing from inside to beyond `level` ("above" or "below") in
+        [start, end), and what followed. Price already beyond the level at
+        `start` only counts once it has been back inside.
+
+        Returns:
+            None if the level held, else {"swept_at", "extreme", "extreme_at", "returned_at"}
+            (time_msc); returned_at is None when price had not come back by `end`.
+        """
+        above = side == "above"
+        beyond = (lambda p: p > level) if above else (lambda p: p < level)
+        reach = ((lambda b: b.bid_max / 10.0 ** b.digits > level) if above
+                 else (lambda b: b.bid_min / 10.0 ** b.digits < level))
+        swept, inside = None, [False]
+        # until a tick inside the level is seen every block counts; after that only those reaching it
+        for chunk in self.scan(symbol, start, end, keep=lambda b: not inside[0] or reach(b)):
+            out = beyond(chunk["bid"])
+            if not inside[0]:
+                first_in = np.flatnonzero(~out)
+                if not len(first_in):
+                    continue
+                inside[0] = True
+                out[:first_in[0]] = False
+            hit = np.flatnonzero(out)
+            if len(hit):
+                swept = int(chunk["time_msc"][hit[0]])
+                break
+        if swept is None:
+            return None
+
+        extreme = extreme_at = returned = None
+        for chunk in self.scan(symbol, swept, end):
+            back = np.flatnonzero(~beyond(chunk["bid"]))
+            outside = chunk[:back[0]] if len(back) else chunk
+            if len(outside):
+                i = int(np.argmax(outside["bid"]) if above else np.argmin(outside["bid"]))
+                value = float(outside["bid"][i])
+                if extreme is None or (value > extreme if above else value < extreme):
+                    extreme, extreme_at = value, int(outside["time_msc"][i])
+            if len(back):
+                returned = int(chunk["time_msc"][back[0]])
+                break
+        return {"swept_at": swept, "extreme": extreme, "extreme_at": extreme_at, "returned_at": returned}
+
+    def status(self) -> dict:
+        with self._lock:
+            buffered = {k: b.n for k, b in self._buffers.items() if b.n}
+        return dict(self.counters, directory=self.directory, block_ticks=self.block_ticks, buffered=buffered)
+
+
+def _between(ticks: np.ndarray, start: int, end: int) -> np.ndarray:
+    t = ticks["time_msc"]
+    return ticks[np.searchsorted(t, start, "left"):np.searchsorted(t, end, "left")]
+
+
+class TickIngestor(threading.Thread):
+    """
+    Poll ticks for a watchlist into a TickStore. MT5's copy_ticks_range is both
+    the backfill and the live feed: every poll asks for [last stored, now], and
+    the store drops the ticks at the last stored millisecond it already holds.
+
+    Args:
+        store: TickStore to append to
+        fetch_ticks: (symbol, start_msc, end_msc) → MT5 tick records
+        symbols: Watchlist
+        poll_seconds: Pause between polls
+        backfill_seconds: How far back an empty store starts
+        flush_seconds: Write partial blocks at least this often
+        chunk_seconds: Widest single fetch while catching up
+    """
+
+    def __init__(self, store: TickStore, fetch_ticks, symbols: list, poll_seconds: float = 1.0,
+                 backfill_seconds: float = 86400, flush_seconds: float = 60, chunk_seconds: float = 3600):
+        super().__init__(name="tick-ingestor", daemon=True)
+        self.store = store
+        self.fetch_ticks = fetch_ticks
+        self.symbols = list(symbols)
+        self.poll_seconds = poll_seconds
+        self.backfill_seconds = backfill_seconds
+        self.flush_seconds = flush_seconds
+        self.chunk_seconds = chunk_seconds
+        self._stop_event = threading.Event()
+        self.counters = {"polls": 0, "ticks": 0, "errors": 0}
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def poll(self, symbol: str) -> int:
+        now = int(time.time() * 1000)
+        last = self.store.last_time(symbol)
+        start = max(last if last is not None else 0, now - int(self.backfill_seconds * 1000))
+        added = 0
+        while start < now:
+            stop = min(now, start + int(self.chunk_seconds * 1000))
+            ticks = self.fetch_ticks(symbol, start, stop)
+            if ticks is not None and len(ticks):
+                added += self.store.append(symbol, ticks)
+            start = stop
+        self.counters["ticks"] += added
+        return added
+
+    def run(self):
+        next_flush = time.time() + self.flush_seconds
+        while not self._stop_event.is_set():
+            self.counters["polls"] += 1
+            for symbol in self.symbols:
+                try:
+                    self.poll(symbol)
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    print(f"[ERROR] Tick ingest {symbol}: {e}")
+            if time.time() >= next_flush:
+                self.store.flush()
+                next_flush = time.time() + self.flush_seconds
+            self._stop_event.wait(self.poll_seconds)
+        self.store.flush()
+
+    def status(self) -> dict:
+        return dict(self.counters, symbols=self.symbols, alive=self.is_alive())
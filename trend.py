@@ -0,0 +1,279 @@
+# trend.py
+# ---------------------------------------------------------------------------
+# OLS trend slope / correlation from closed-form running sums.
+#
+# For x = 0..n-1 the regression only needs Σy, Σxy and Σy² (Σx and Σx² are
+# closed form), so:
+#   - one window costs a single pass with no np.polyfit / lstsq,
+#   - rolling windows over many symbols come from cumulative sums in one
+#     vectorized pass (any number of windows),
+#   - a live window updates in O(1) per bar (RollingTrend), and TrendBook
+#     keeps one per symbol so ranking a watchlist only pushes the bars that
+#     closed since the last request.
+
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+def _confidence(slope: float, r: float) -> str:
+    return (
+        "Ultra Strong Bullish" if slope > 0.5 and r > 0.9 else
+        "Strong Bearish" if slope < -0.5 and r > 0.9 else
+        "Sideways/Neutral"
+    )
+
+
+def _fit(n, sy, sxy, syy):
+    """Slope and Pearson r for x = 0..n-1 from the y sums (works on scalars and arrays)."""
+    sx = n * (n - 1) / 2.0
+    sxx = (n - 1) * n * (2 * n - 1) / 6.0
+    cov = n * sxy - sx * sy
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = cov / var_x
+        r = cov / np.sqrt(var_x * np.maximum(var_y, 0.0))
+    return slope, r
+
+
+def ols_trend(closes) -> tuple:
+    """(slope per bar, correlation) of closes against bar index; r is 0.0 for a flat series."""
+    y = np.asarray(closes, dtype=np.float64)
+    n = len(y)
+    if n < 2:
+        return 0.0, 0.0
+    y = y - y[0]  # shift for precision; slope and r are shift-invariant
+    x = np.arange(n, dtype=np.float64)
+    slope, r = _fit(n, y.sum(), x @ y, y @ y)
+    return float(slope), float(r) if np.isfinite(r) else 0.0
+
+
+def trend_strength(closes) -> dict:
+    """The `trend` block returned by get_ohlc_data."""
+    slope, r = ols_trend(closes)
+    return {
+        "slope": slope,
+        "correlation": r,
+        "confidence": _confidence(slope, r),
+    }
+
+
+def rolling_trend(closes: np.ndarray, windows) -> dict:
+    """
+    Rolling OLS slope and correlation for several windows in one pass.
+
+    Args:
+        closes: 1-D (bars,) or 2-D (symbols, bars) array of closes
+        windows: Iterable of window lengths
+
+    Returns:
+        {window: (slope, r)} with arrays shaped like `closes`; positions without
+        a full window are NaN.
+    """
+    y = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+    y = y - y[:, :1]
+    bars = y.shape[1]
+    idx = np.arange(bars, dtype=np.float64)
+
+    zero = np.zeros((y.shape[0], 1))
+    c_y = np.concatenate([zero, np.cumsum(y, axis=1)], axis=1)
+    c_iy = np.concatenate([zero, np.cumsum(idx * y, axis=1)], axis=1)
+    c_yy = np.concatenate([zero, np.cumsum(y * y, axis=1)], axis=1)
+
+    out = {}
+    for w in windows:
+        slope = np.full(y.shape, np.nan)
+        r = np.full(y.shape, np.nan)
+        if 2 <= w <= bars:
+            end = np.arange(w, bars + 1)       # exclusive end in cumsum space
+            start = end - w
+            sy = c_y[:, end] - c_y[:, start]
+            # Σ (i - start)·y_i over the window = Σ i·y_i - start·Σ y_i
+            sxy = (c_iy[:, end] - c_iy[:, start]) - start * sy
+            syy = c_yy[:, end] - c_yy[:, start]
+            s, c = _fit(w, sy, sxy, syy)
+            slope[:, w - 1:] = s
+            r[:, w - 1:] = np.where(np.isfinite(c), c, 0.0)
+        if np.ndim(closes) == 1:
+            slope, r = slope[0], r[0]
+        out[w] = (slope, r)
+    return out
+
+
+def rank_trend_strength(closes_by_symbol: dict, window: int = 50) -> list:
+    """
+    Rank symbols by trend strength over their last `window` closes in one batched fit.
+
+    Score = slope normalised by mean price (fraction per bar) × |r|, so symbols
+    with different price scales are comparable. Symbols with fewer bars are skipped.
+    """
+    names = [s for s, c in closes_by_symbol.items() if len(c) >= window]
+    if not names:
+        return []
+    y = np.stack([np.asarray(closes_by_symbol[s][-window:], dtype=np.float64) for s in names])
+    slope, r = rolling_trend(y, [window])[window]
+    return _ranked(names, slope[:, -1], r[:, -1], y.mean(axis=1))
+
+
+def _ranked(names: list, slope: np.ndarray, r: np.ndarray, mean: np.ndarray) -> list:
+    score = slope / mean * np.abs(r)
+    order = np.argsort(-np.abs(score))
+    return [
+        {
+            "symbol": names[i],
+            "slope": float(slope[i]),
+            "correlation": float(r[i]),
+            "score": float(score[i]),
+            "confidence": _confidence(float(slope[i]), float(r[i])),
+        }
+        for i in order
+    ]
+
+
+class RollingTrend:
+    """
+    Fixed-length window of closes with O(1) slope/correlation updates per bar.
+
+    The sums are recomputed from the window every `window` pushes, so float
+    error cannot accumulate (O(1) per bar amortized).
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._ys = deque()
+        self._origin = None   # first value seen, subtracted for precision
+        self._sy = self._sxy = self._syy = 0.0
+        self._pushes = 0
+
+    def update(self, close: float) -> tuple:
+        """Push the latest close and return (slope, r) of the current window."""
+        if self._origin is None:
+            self._origin = close
+        y = close - self._origin
+
+        if len(self._ys) == self.window:
+            y0 = self._ys.popleft()
+            # drop index 0 and shift the remaining x's down by one
+            self._sy -= y0
+            self._sxy -= self._sy
+            self._syy -= y0 * y0
+
+        self._sxy += len(self._ys) * y
+        self._sy += y
+        self._syy += y * y
+        self._ys.append(y)
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self._rebuild()
+        return self.value()
+
+    def _rebuild(self):
+        """Re-origin on the oldest close and recompute the sums from the window."""
+        y = np.fromiter(self._ys, dtype=np.float64, count=len(self._ys))
+        self._origin += y[0]
+        y -= y[0]
+        self._ys = deque(y.tolist())
+        self._sy = float(y.sum())
+        self._sxy = float(np.arange(len(y)) @ y)
+        self._syy = float(y @ y)
+
+    def __len__(self) -> int:
+        return len(self._ys)
+
+    def closes(self) -> np.ndarray:
+        """The closes currently in the window, oldest first."""
+        return np.fromiter(self._ys, dtype=np.float64, count=len(self._ys)) + (self._origin or 0.0)
+
+    def mean(self) -> float:
+        return self._origin + self._sy / len(self._ys) if self._ys else 0.0
+
+    def value(self) -> tuple:
+        n = len(self._ys)
+        if n < 2:
+            return 0.0, 0.0
+        slope, r = _fit(n, self._sy, self._sxy, self._syy)
+        return float(slope), float(r) if np.isfinite(r) else 0.0
+
+
+class TrendBook:
+    """
+    One RollingTrend per (symbol, timeframe, window), fed only the bars that
+    closed since it last saw the symbol. Ranking a watchlist then costs O(1)
+    per symbol and new bar instead of a refit of every window.
+
+    Args:
+        max_series: (symbol, timeframe, window) series kept before the oldest is dropped
+    """
+
+    def __init__(self, max_series: int = 512):
+        self.max_series = max_series
+        self._series = OrderedDict()      # key → [RollingTrend, time of the last bar pushed]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(symbol: str, tf: str, window: int) -> tuple:
+        return symbol.upper(), tf.upper(), window
+
+    def last_time(self, symbol: str, tf: str, window: int):
+        """Open time of the last bar pushed for the series, or None if it is new."""
+        with self._lock:
+            entry = self._series.get(self._key(symbol, tf, window))
+            return entry[1] if entry is not None else None
+
+    def update(self, symbol: str, tf: str, window: int, times, closes) -> int:
+        """
+        Push closed bars (time-sorted) newer than the last one seen; returns how many.
+
+        A batch that starts after the last bar seen may have skipped bars, so the
+        series is reseeded from it instead.
+        """
+        key = self._key(symbol, tf, window)
+        times = np.asarray(times, dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None or (len(times) and times[0] > entry[1]):
+                entry = [RollingTrend(window), None]
+                self._series[key] = entry
+                times, closes = times[-window:], closes[-window:]
+            elif len(times):
+                keep = times > entry[1]
+                times, closes = times[keep], closes[keep]
+            for close in closes.tolist():
+                entry[0].update(close)
+            if len(times):
+                entry[1] = int(times[-1])
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+            return len(times)
+
+    def _full(self, tf: str, window: int, symbols: list) -> list:
+        entries = [(s.upper(), self._series.get(self._key(s, tf, window))) for s in symbols]
+        return [(s, e[0]) for s, e in entries if e is not None and len(e[0]) == window]
+
+    def rank(self, tf: str, window: int, symbols: list) -> list:
+        """rank_trend_strength over the symbols whose window is full, from the running sums."""
+        with self._lock:
+            full = self._full(tf, window, symbols)
+            if not full:
+                return []
+            fits = [t.value() for _, t in full]
+            return _ranked(
+                [s for s, _ in full],
+                np.array([f[0] for f in fits]),
+                np.array([f[1] for f in fits]),
+                np.array([t.mean() for _, t in full]),
+            )
+
+    def closes(self, tf: str, window: int, symbols: list) -> np.ndarray:
+        """(symbols, window) closes for `symbols`, all of which must have a full window."""
+        with self._lock:
+            full = dict(self._full(tf, window, symbols))
+            return np.stack([full[s.upper()].closes() for s in symbols])
+
+    def status(self) -> dict:
+        with self._lock:
+            return {f"{s}/{tf}/{w}": {"bars": len(e[0]), "last_bar": e[1]} for (s, tf, w), e in self._series.items()}
@@ -0,0 +1,387 @@
+# zones.py
+# ---------------------------------------------------------------------------
+# Order-block / FVG zones tracked until price mitigates them.
+#
+#   book = ZoneBook()
+#   tracker = book.get("EURUSD", "H1")      # seeded from the bar archive if there is one
+#   tracker.sync(rates)                     # a fetched window of closed bars, oldest first
+#   tracker.zones(start=t0, end=t1)         # every zone alive somewhere in [t0, t1]
+#
+# Zones are found with the same rules as detect_order_block / detect_fvg.
+# Bullish zones sit below price and bearish zones above it. A bar that
+# trades into a zone mitigates it partially (`fill` = fraction of the zone
+# traded through so far); a bar that trades through it mitigates it fully,
+# and the zone leaves the active set with its end time recorded. A fetched
+# window that does not reach back to the last bar already seen (an archive
+# older than the fetch depth, a long idle period) leaves bars unknown in
+# between; the tracker is then reseeded from the window rather than
+# bridging the gap as if the bars were contiguous.
+#
+# Active zones live in two interval treaps (bullish, bearish) keyed by zone
+# low and augmented with the subtree max high. A bar with range [low, high]
+# affects exactly the bullish zones with zone.high >= low and the bearish
+# zones with zone.low <= high, and both are overlap queries answered in
+# O(log n + k), where k is the number of zones the bar actually reaches. A
+# linear scan of thousands of zones per bar is never needed.
+
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import bar_archive
+from event_index import KINDS, NEVER, build_events
+
+ZONE_KINDS = ("ob", "fvg")
+
+
+class Zone:
+    __slots__ = ("id", "kind", "direction", "low", "high", "time", "confirmed_at",
+                 "touched_at", "mitigated_at", "fill")
+
+    def __init__(self, id, kind, direction, low, high, time, confirmed_at):
+        self.id = id
+        self.kind = kind
+        self.direction = direction      # 1 bullish (below price), -1 bearish (above price)
+        self.low = low
+        self.high = high
+        self.time = time                # zone bar
+        self.confirmed_at = confirmed_at
+        self.touched_at = None
+        self.mitigated_at = None
+        self.fill = 0.0
+
+    @property
+    def status(self) -> str:
+        if self.mitigated_at is not None:
+            return "mitigated"
+        return "partial" if self.touched_at is not None else "active"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "direction": "bullish" if self.direction > 0 else "bearish",
+            "low": self.low,
+            "high": self.high,
+            "time": self.time,
+            "confirmed_at": self.confirmed_at,
+            "status": self.status,
+            "fill": round(self.fill, 4),
+            "touched_at": self.touched_at,
+            "mitigated_at": self.mitigated_at,
+        }
+
+
+# ── interval treap ─────────────────────────────────────────────────────────
+class _Node:
+    __slots__ = ("key", "zone", "prio", "left", "right", "max_high")
+
+    def __init__(self, zone: Zone):
+        self.key = (zone.low, zone.id)
+        self.zone = zone
+        self.prio = random.random()
+        self.left = self.right = None
+        self.max_high = zone.high
+
+
+def _pull(node: _Node) -> _Node:
+    m = node.zone.high
+    if node.left is not None and node.left.max_high > m:
+        m = node.left.max_high
+    if node.right is not None and node.right.max_high > m:
+        m = node.right.max_high
+    node.max_high = m
+    return node
+
+
+def _split(node, key):
+    """(keys < key, keys >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _pull(node), right
+    left, node.left = _split(node.left, key)
+    return left, _pull(node)
+
+
+def _merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.prio > b.prio:
+        a.right = _merge(a.right, b)
+        return _pull(a)
+    b.left = _merge(a, b.left)
+    return _pull(b)
+
+
+class IntervalTreap:
+    """Intervals [zone.low, zone.high] with O(log n) insert/remove and O(log n + k) overlap queries."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def insert(self, zone: Zone):
+        left, right = _split(self.root, (zone.low, zone.id))
+        self.root = _merge(_merge(left, _Node(zone)), right)
+        self.size += 1
+
+    def remove(self, zone: Zone):
+        key = (zone.low, zone.id)
+        left, rest = _split(self.root, key)
+        node, right = _split(rest, (zone.low, zone.id + 1))
+        if node is not None:
+            self.size -= 1
+        self.root = _merge(left, right)
+
+    def overlapping(self, lo: float, hi: float) -> list:
+        """Zones with low <= hi and high >= lo."""
+        out, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_high < lo:
+                continue
+            stack.append(node.left)
+            if node.zone.low <= hi:
+                if node.zone.high >= lo:
+                    out.append(node.zone)
+                stack.append(node.right)
+        return out
+
+    def __iter__(self):
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.zone
+            node = node.right
+
+    def __len__(self):
+        return self.size
+
+
+# ── tracker ────────────────────────────────────────────────────────────────
+class ZoneTracker:
+    """
+    Active and recently mitigated zones for one symbol/timeframe.
+
+    Args:
+        max_mitigated: Mitigated zones kept for charts and queries (oldest dropped first)
+    """
+
+    def __init__(self, max_mitigated: int = 5000):
+        self.active = {1: IntervalTreap(), -1: IntervalTreap()}
+        self.mitigated = deque(maxlen=max_mitigated)
+        self.last_time = None
+        self._recent = deque(maxlen=2)     # last two closed bars (time, open, high, low, close)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.synced_at = None
+        self.counters = {"bars": 0, "zones": 0, "mitigated": 0, "touches": 0, "reseeds": 0}
+
+    # ── seeding ─────────────────────────────────────────────────────────────
+    def seed(self, bars: np.ndarray):
+        """Replace the state with every zone in `bars` (time-sorted closed bars), resolved vectorized."""
+        index = build_events(bars)
+        c = index.cols
+        times = bars["time"].astype(np.int64)
+        low, high = bars["low"].astype(np.float64), bars["high"].astype(np.float64)
+        # min low / max high from bar i to the end: how deep price has come since a zone formed
+        suffix_min = np.minimum.accumulate(low[::-1])[::-1]
+        suffix_max = np.maximum.accumulate(high[::-1])[::-1]
+        n = len(bars)
+
+        with self._lock:
+            self.active = {1: IntervalTreap(), -1: IntervalTreap()}
+            self.mitigated.clear()
+            mitigated = []
+            for kind in ZONE_KINDS:
+                for i in np.flatnonzero(c["kind"] == KINDS.index(kind)):
+                    zone = Zone(next(self._ids), kind, int(c["direction"][i]), float(c["low"][i]),
+                                float(c["high"][i]), int(c["time"][i]), int(times[c["confirmed_at"][i]]))
+                    self.counters["zones"] += 1
+                    if c["touched_at"][i] != NEVER:
+                        zone.touched_at = int(times[c["touched_at"][i]])
+                    if c["filled_at"][i] != NEVER:
+                        zone.mitigated_at = int(times[c["filled_at"][i]])
+                        zone.fill = 1.0
+                        mitigated.append(zone)
+                        continue
+                    after = c["confirmed_at"][i] + 1
+                    if zone.touched_at is not None and after < n:
+                        reach = suffix_min[after] if zone.direction > 0 else suffix_max[after]
+                        zone.fill = self._depth(zone, reach)
+                    self.active[zone.direction].insert(zone)
+            mitigated.sort(key=lambda z: z.mitigated_at)
+            self.mitigated.extend(mitigated)
+            self.last_time = int(times[-1]) if n else None
+            self._recent.clear()
+            for b in bars[-2:]:
+                self._recent.append((int(b["time"]), float(b["open"]), float(b["high"]), float(b["low"]), float(b["close"])))
+
+    # ── per bar ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _depth(zone: Zone, reach: float) -> float:
+        """Fraction of the zone traded through by a move to `reach`."""
+        height = zone.high - zone.low
+        if height <= 0:
+            return 1.0
+        if zone.direction > 0:
+            depth = (zone.high - max(reach, zone.low)) / height
+        else:
+            depth = (min(reach, zone.high) - zone.low) / height
+        return min(1.0, max(0.0, depth))
+
+    def update(self, rates) -> int:
+        """Process closed bars (structured array or candle-like rows with time/open/high/low/close); returns bars used."""
+        used = 0
+        with self._lock:
+            for b in rates:
+                t = int(b["time"])
+                if self.last_time is not None and t <= self.last_time:
+                    continue
+                self._bar(t, float(b["open"]), float(b["high"]), float(b["low"]), float(b["close"]))
+                used += 1
+        return used
+
+    def sync(self, rates) -> int:
+        """
+        Fold in a freshly fetched window of closed bars (time-sorted structured array);
+        returns bars used. Reseeds from the window when it starts after the last bar seen.
+        """
+        if not len(rates):
+            return 0
+        gap = self.last_time is not None and int(rates[0]["time"]) > self.last_time
+        if self.last_time is None or gap:
+            self.counters["reseeds"] += gap
+            self.seed(rates)
+            used = len(rates)
+        else:
+            used = self.update(rates)
+        self.synced_at = time.time()
+        return used
+
+    def _bar(self, t, o, h, l, c):
+        # 1) mitigation of zones that existed before this bar
+        for zone in self.active[1].overlapping(l, np.inf):
+            self._reach(zone, t, l, full=l <= zone.low)
+        for zone in self.active[-1].overlapping(-np.inf, h):
+            self._reach(zone, t, h, full=h >= zone.high)
+
+        # 2) zones this bar confirms (same rules as analysis.py)
+        recent = self._recent
+        if recent:
+            pt, po, ph, pl, pc = recent[-1]
+            if pc < po and c > o and c > ph:
+                self._add("ob", 1, pl, ph, pt, t)
+            if pc > po and c < o and c < pl:
+                self._add("ob", -1, pl, ph, pt, t)
+        if len(recent) == 2:
+            h0, l0 = recent[0][2], recent[0][3]
+            mid_time = recent[1][0]
+            if l > h0:
+                self._add("fvg", 1, h0, l, mid_time, t)
+            if h < l0:
+                self._add("fvg", -1, h, l0, mid_time, t)
+
+        recent.append((t, o, h, l, c))
+        self.last_time = t
+        self.counters["bars"] += 1
+
+    def _reach(self, zone: Zone, t: int, reach: float, full: bool):
+        if zone.touched_at is None:
+            zone.touched_at = t
+            self.counters["touches"] += 1
+        zone.fill = 1.0 if full else max(zone.fill, self._depth(zone, reach))
+        if full:
+            zone.mitigated_at = t
+            self.active[zone.direction].remove(zone)
+            self.mitigated.append(zone)
+            self.counters["mitigated"] += 1
+
+    def _add(self, kind, direction, low, high, time, confirmed_at):
+        self.active[direction].insert(Zone(next(self._ids), kind, direction, low, high, time, confirmed_at))
+        self.counters["zones"] += 1
+
+    # ── reads ───────────────────────────────────────────────────────────────
+    @property
+    def last_close(self):
+        return self._recent[-1][4] if self._recent else None
+
+    def zones(self, start: int = None, end: int = None, status: str = "any", kind: str = None,
+              near: float = None, distance: float = 0.0) -> list:
+        """
+        Zone dicts alive at some point in [start, end] (formed by `end`, not
+        mitigated before `start`), oldest first.
+
+        Args:
+            status: "active" (untouched), "partial", "mitigated", "unmitigated" or "any"
+            near, distance: Only active zones overlapping [near - distance, near + distance]
+        """
+        with self._lock:
+            if near is not None:
+                pool = [z for d in (1, -1) for z in self.active[d].overlapping(near - distance, near + distance)]
+            else:
+                pool = [z for d in (1, -1) for z in self.active[d]]
+                if status in ("any", "mitigated"):
+                    pool += [z for z in self.mitigated if start is None or z.mitigated_at >= start]
+            out = []
+            for z in pool:
+                if end is not None and z.confirmed_at > end:
+                    continue
+                if kind is not None and z.kind != kind:
+                    continue
+                if status == "unmitigated" and z.mitigated_at is not None:
+                    continue
+                if status not in ("any", "unmitigated") and z.status != status:
+                    continue
+                out.append(z.to_dict())
+        out.sort(key=lambda z: (z["time"], z["id"]))
+        return out
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self.counters, active=len(self.active[1]) + len(self.active[-1]),
+                        mitigated_kept=len(self.mitigated), last_bar=self.last_time)
+
+
+class ZoneBook:
+    """
+    ZoneTracker per symbol/timeframe. A new tracker is seeded from the bar
+    archive when one exists, so zones from deep history are tracked too.
+    """
+
+    def __init__(self, directory: str = None, max_mitigated: int = 5000):
+        self.directory = directory
+        self.max_mitigated = max_mitigated
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def peek(self, symbol: str, tf: str):
+        """The tracker if one exists, without creating or seeding it."""
+        with self._lock:
+            return self._trackers.get((symbol.upper(), tf.upper()))
+
+    def get(self, symbol: str, tf: str) -> ZoneTracker:
+        key = (symbol.upper(), tf.upper())
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = ZoneTracker(self.max_mitigated)
+                if os.path.exists(bar_archive.path_for(*key, self.directory)):
+                    tracker.seed(bar_archive.load(*key, self.directory))
+            return tracker
+
+    def status(self) -> dict:
+        with self._lock:
+            return {f"{s}_{tf}": t.status() for (s, tf), t in self._trackers.items()}